@@ -0,0 +1,585 @@
+#!/usr/bin/env python
+
+# License: MIT License  (See LICENSE.md)
+# Copyright (c) 2026, the moltemplate contributors
+
+man_page_text = """
+Usage:
+
+run_benchmarks.py [-quick | -large] [-only name1,name2,...] [-repeat N]
+                  [-o results.json] [-keep directory]
+
+run_benchmarks.py -compare old_results.json new_results.json
+
+This program measures how long it takes to build a series of systems of
+increasing size using moltemplate (and a few of the other tools distributed
+with moltemplate).  The input files are generated automatically from the
+force fields in "moltemplate/force_fields/" and the examples in "examples/".
+
+Benchmarks:
+
+  spce           A box of n x n x n SPC/E water molecules ("new SPCE[n][n][n]")
+  oplsaa_alkane  A melt of 2 x n x n hexadecane molecules (OPLSAA)
+  gaff_alkane    A melt of 2 x n x n hexadecane molecules (GAFF)
+  dreiding       A box of n x n x n furan molecules (DREIDING)
+  genpoly_dna    A coarse-grained DNA polymer with n monomers (genpoly_lt.py)
+  ltemplify      An n x n x n SPC/E box, converted back into an .lt file
+                 using ltemplify.py, which is then rebuilt using moltemplate
+  dump2data      A trajectory of an n x n x n SPC/E box (with 10 frames),
+                 converted into 10 DATA files using "dump2data.py -multi"
+
+For every command, the wall time, CPU time and peak memory (RSS) are
+recorded.  Each "moltemplate.sh" command is also run with "-profile",
+so the time and memory used by each stage of the calculation (parsing,
+BuildInstanceTree, AutoAssignVals, ExecCommands, each "By Type" section,
+rendering...) are also recorded.  The results are saved as a table (in JSON
+format) in the file "benchmark_results.json" (or the file following "-o").
+A tab-separated version of the same table is printed to the standard out.
+
+Optional arguments:
+
+-quick       Use only the smallest size for each benchmark
+-large       Use larger sizes (this may take hours)
+-only names  Only run the benchmarks in this (comma-separated) list
+-repeat N    Run each benchmark N times (default: 1)
+-o file      Save the results in this file (default: benchmark_results.json)
+-keep dir    Keep the generated files in this directory (for debugging)
+
+-compare old.json new.json
+             Print the ratio of the wall times for each stage in two
+             different result files (for example, generated using
+             two different versions of moltemplate).  For each stage,
+             the fastest of the repeated measurements is used.
+"""
+
+import sys
+import os
+import time
+import json
+import math
+import random
+import shutil
+import tempfile
+import platform
+import subprocess
+from collections import OrderedDict
+
+
+g_program_name = __file__.split('/')[-1]  # = 'run_benchmarks.py'
+g_date_str = '2026-10-19'
+g_version_str = '0.1.0'
+
+g_repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+g_moltemplate_dir = os.path.join(g_repo_dir, 'moltemplate')
+g_force_field_dir = os.path.join(g_moltemplate_dir, 'force_fields')
+g_examples_dir = os.path.join(g_repo_dir, 'examples')
+g_moltemplate_sh = os.path.join(g_moltemplate_dir, 'scripts', 'moltemplate.sh')
+g_profile_name = 'profile.json'
+
+# The column names of the table of results:
+g_columns = ['benchmark', 'size', 'natoms', 'trial', 'command',
+             'program', 'stage', 'wall_time', 'cpu_time', 'peak_rss_kb']
+
+
+
+class InputError(Exception):
+
+    def __init__(self, err_msg):
+        self.err_msg = err_msg
+
+    def __str__(self):
+        return self.err_msg
+
+
+
+class Command(object):
+    """
+    A command which is run (and timed) as part of a benchmark.
+    If "profile" is True, then the command accepts the "-profile" argument
+    (see moltemplate/ttree_profile.py), and the time and memory used by
+    each stage will be reported as well.  If "before" is not None, it is
+    invoked (without timing it) before the command is run.
+    """
+
+    def __init__(self, label, argv, stdin=None, stdout=None, profile=False,
+                 before=None):
+        self.label = label
+        self.argv = argv
+        self.stdin = stdin
+        self.stdout = stdout
+        self.profile = profile
+        self.before = before
+
+
+
+def PythonScript(name):
+    """ Return the arguments needed to run one of moltemplate's .py files """
+    return [sys.executable, os.path.join(g_moltemplate_dir, name)]
+
+
+def Moltemplate(lt_file='system.lt'):
+    return Command('moltemplate.sh',
+                   [g_moltemplate_sh,
+                    '-profile', g_profile_name,
+                    '-importpath', g_force_field_dir,
+                    lt_file],
+                   profile=True)
+
+
+def CopyExampleFiles(example_dir, file_names, work_dir):
+    for file_name in file_names:
+        shutil.copy(os.path.join(g_examples_dir, example_dir, file_name),
+                    work_dir)
+
+
+def WriteFile(file_name, text):
+    f = open(file_name, 'w')
+    f.write(text)
+    f.close()
+
+
+def BoundaryText(xhi, yhi, zhi):
+    return ('write_once("Data Boundary") {\n'
+            '   0.0  ' + str(xhi) + '  xlo xhi\n'
+            '   0.0  ' + str(yhi) + '  ylo yhi\n'
+            '   0.0  ' + str(zhi) + '  zlo zhi\n'
+            '}\n')
+
+
+
+# ---- The functions below generate the input files for each benchmark ----
+# ---- in "work_dir" and return the list of commands we want to time.  ----
+
+
+def SetupSPCE(work_dir, n):
+    spacing = 3.1
+    WriteFile(os.path.join(work_dir, 'system.lt'),
+              'import "spce.lt"\n\n'
+              'wat = new SPCE [' + str(n) + '].move(0, 0, ' + str(spacing) + ')\n'
+              '               [' + str(n) + '].move(0, ' + str(spacing) + ', 0)\n'
+              '               [' + str(n) + '].move(' + str(spacing) + ', 0, 0)\n\n' +
+              BoundaryText(n * spacing, n * spacing, n * spacing))
+    return [Moltemplate()]
+
+
+def SetupAlkane(work_dir, n, example_dir):
+    CopyExampleFiles(example_dir,
+                     ['ch2group.lt', 'ch3group.lt', 'hexadecane.lt'],
+                     work_dir)
+    spacing = 5.2
+    WriteFile(os.path.join(work_dir, 'system.lt'),
+              'import "hexadecane.lt"\n\n'
+              'molecules = new Hexadecane [' + str(n) + '].move(0, 0, ' + str(spacing) + ')\n'
+              '                           [' + str(n) + '].move(0, ' + str(spacing) + ', 0)\n'
+              '                           [2].move(31.2, 0, 0)\n\n' +
+              BoundaryText(62.4, n * spacing, n * spacing))
+    return [Moltemplate()]
+
+
+def SetupOPLSAAAlkane(work_dir, n):
+    return SetupAlkane(work_dir, n, os.path.join(
+        'all_atom', 'force_field_OPLSAA', 'hexadecane', 'moltemplate_files'))
+
+
+def SetupGAFFAlkane(work_dir, n):
+    return SetupAlkane(work_dir, n, os.path.join(
+        'all_atom', 'force_field_AMBER', 'hexadecane', 'moltemplate_files'))
+
+
+def SetupDreiding(work_dir, n):
+    CopyExampleFiles(os.path.join('all_atom', 'force_field_DREIDING',
+                                  'furan', 'moltemplate_files'),
+                     ['furan.lt'],
+                     work_dir)
+    WriteFile(os.path.join(work_dir, 'system.lt'),
+              'import "furan.lt"\n\n'
+              'molecule = new Furan [' + str(n) + '].move(6.6, 0, 0)\n'
+              '                     [' + str(n) + '].move(0, 6.6, 0)\n'
+              '                     [' + str(n) + '].move(0, 0, 6.6)\n\n' +
+              BoundaryText(n * 6.6, n * 6.6, n * 6.6))
+    return [Moltemplate()]
+
+
+def SetupGenpolyDNA(work_dir, n):
+    example_dir = os.path.join('coarse_grained', 'DNA_models', 'dsDNA_only',
+                               '2strands', '3bp_2particles',
+                               'simple_dna_example', 'moltemplate_files')
+    CopyExampleFiles(example_dir,
+                     ['dna_monomer.lt', 'dna_forcefield.lt', 'system.lt'],
+                     work_dir)
+    # Generate a circular curve for the polymer to follow.
+    # (This is what "STEP_1_generate_initial_path.sh" does in that example.)
+    l_monomer = 0.98293
+    r_circle = l_monomer * n / (2.0 * math.pi)
+    f = open(os.path.join(work_dir, 'init_crds_polymer_backbone.raw'), 'w')
+    for i in range(0, n):
+        phi = (i + 0.5) * 2.0 * math.pi / n
+        f.write(str(r_circle * math.cos(phi)) + ' ' +
+                str(r_circle * math.sin(phi)) + ' 0.0\n')
+    f.close()
+    genpoly = Command('genpoly_lt.py',
+                      PythonScript('genpoly_lt.py') +
+                      ['-helix', '102.7797',
+                       '-bond', 'Backbone', 'a', 'a',
+                       '-bond', 'Backbone', 'b', 'b',
+                       '-dihedral', 'MajorGroove', 'b', 'b', 'a', 'a',
+                       '0', '1', '1', '2',
+                       '-dihedral', 'Torsion', 'a', 'a', 'b', 'b',
+                       '1', '0', '0', '1',
+                       '-polymer-name', 'DNAPolymer',
+                       '-inherits', 'DNAForceField',
+                       '-monomer-name', 'DNAMonomer',
+                       '-header', 'import "dna_monomer.lt"',
+                       '-padding', '20,20,20'],
+                      stdin='init_crds_polymer_backbone.raw',
+                      stdout='dna_polymer.lt')
+    return [genpoly, Moltemplate()]
+
+
+def SetupLtemplify(work_dir, n):
+    commands = SetupSPCE(work_dir, n)
+    commands.append(Command('ltemplify.py',
+                            PythonScript('ltemplify.py') +
+                            ['-name', 'Box',
+                             'system.in.init', 'system.in.settings',
+                             'system.data'],
+                            stdout='box.lt'))
+    WriteFile(os.path.join(work_dir, 'roundtrip.lt'),
+              'import "box.lt"\n\nbox = new Box\n')
+    commands.append(Moltemplate('roundtrip.lt'))
+    return commands
+
+
+def SetupDump2data(work_dir, n):
+    commands = SetupSPCE(work_dir, n)
+    # (The trajectory file can only be created after "system.data" exists.)
+    commands.append(Command('dump2data.py',
+                            PythonScript('dump2data.py') +
+                            ['-multi', 'system.data'],
+                            stdin='traj.lammpstrj',
+                            before=lambda: WriteTrajectory(work_dir, 10)))
+    return commands
+
+
+def WriteTrajectory(work_dir, num_frames):
+    """
+    Create a LAMMPS DUMP file containing "num_frames" copies of the atoms
+    in "system.data" (randomly displaced by a small amount).
+    (This assumes the atom_style is "full".)
+    """
+    lines = open(os.path.join(work_dir, 'system.data')).readlines()
+    box = []
+    atoms = []
+    in_atoms = False
+    for line in lines:
+        tokens = line.split('#')[0].split()
+        if (len(tokens) == 4) and (tokens[2][1:] == 'lo'):
+            box.append(tokens[0] + ' ' + tokens[1])
+        elif (len(tokens) > 0) and (tokens[0] == 'Atoms'):
+            in_atoms = True
+        elif in_atoms and (len(tokens) >= 7):
+            atoms.append((tokens[0], tokens[2],
+                          float(tokens[4]), float(tokens[5]), float(tokens[6])))
+        elif in_atoms and (len(tokens) > 0):
+            in_atoms = False
+    random.seed(1)   # (so that the files are identical every time)
+    f = open(os.path.join(work_dir, 'traj.lammpstrj'), 'w')
+    for frame in range(0, num_frames):
+        f.write('ITEM: TIMESTEP\n' + str(frame * 1000) + '\n'
+                'ITEM: NUMBER OF ATOMS\n' + str(len(atoms)) + '\n'
+                'ITEM: BOX BOUNDS pp pp pp\n' + '\n'.join(box) + '\n'
+                'ITEM: ATOMS id type x y z\n')
+        for atomid, atomtype, x, y, z in atoms:
+            f.write(atomid + ' ' + atomtype + ' ' +
+                    str(x + random.gauss(0.0, 0.05)) + ' ' +
+                    str(y + random.gauss(0.0, 0.05)) + ' ' +
+                    str(z + random.gauss(0.0, 0.05)) + '\n')
+    f.close()
+
+
+
+# The list of benchmarks, and the sizes to use for each one
+#                   (-quick)  (default)        (-large)
+g_benchmarks = OrderedDict([
+    ('spce',          (SetupSPCE,
+                       [4],   [4, 8, 16],      [8, 16, 32])),
+    ('oplsaa_alkane', (SetupOPLSAAAlkane,
+                       [2],   [2, 4, 8],       [4, 8, 16])),
+    ('gaff_alkane',   (SetupGAFFAlkane,
+                       [2],   [2, 4, 8],       [4, 8, 16])),
+    ('dreiding',      (SetupDreiding,
+                       [2],   [2, 4, 8],       [4, 8, 16])),
+    ('genpoly_dna',   (SetupGenpolyDNA,
+                       [50],  [100, 300, 1000], [300, 1000, 3000])),
+    ('ltemplify',     (SetupLtemplify,
+                       [4],   [4, 8, 12],      [8, 12, 16])),
+    ('dump2data',     (SetupDump2data,
+                       [4],   [4, 8, 16],      [8, 16, 32])),
+])
+
+
+
+def RunCommand(command, work_dir):
+    """
+    Run a command (in "work_dir") and return a tuple containing the
+    wall time, the CPU time and the peak memory (RSS, in KiB) it used.
+    (The CPU time and memory are None on platforms lacking os.wait4().)
+    """
+    fin = None
+    fout = None
+    if command.stdin:
+        fin = open(os.path.join(work_dir, command.stdin), 'r')
+    if command.stdout:
+        fout = open(os.path.join(work_dir, command.stdout), 'w')
+    else:
+        fout = open(os.path.join(work_dir, command.label + '.stdout'), 'w')
+    ferr = open(os.path.join(work_dir, command.label + '.log'), 'a')
+    wall_start = time.time()
+    proc = subprocess.Popen(command.argv, cwd=work_dir,
+                            stdin=fin, stdout=fout, stderr=ferr)
+    cpu_time = None
+    peak_rss = None
+    if hasattr(os, 'wait4'):
+        pid, status, rusage = os.wait4(proc.pid, 0)
+        proc.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else 1
+        cpu_time = rusage.ru_utime + rusage.ru_stime
+        peak_rss = rusage.ru_maxrss
+        if sys.platform == 'darwin':
+            peak_rss //= 1024   # (ru_maxrss is reported in bytes on MacOS)
+    else:
+        proc.wait()
+    wall_time = time.time() - wall_start
+    for f in (fin, fout, ferr):
+        if f:
+            f.close()
+    if proc.returncode != 0:
+        raise InputError('Error(' + g_program_name + '):\n'
+                         '       The command \"' + ' '.join(command.argv) + '\"\n'
+                         '       failed in directory \"' + work_dir + '\"\n'
+                         '       (See the file \"' + command.label + '.log\" in that directory.)\n')
+    return wall_time, cpu_time, peak_rss
+
+
+def CountAtoms(work_dir):
+    """ Read the number of atoms from the "system.data" file (if present) """
+    try:
+        for line in open(os.path.join(work_dir, 'system.data')):
+            tokens = line.split()
+            if (len(tokens) == 2) and (tokens[1] == 'atoms'):
+                return int(tokens[0])
+    except IOError:
+        pass
+    return None
+
+
+def RunBenchmark(name, size, trial, work_dir):
+    """
+    Generate the input files for one benchmark (of a given size),
+    run all of its commands, and return a list of rows for the table.
+    """
+    setup_function = g_benchmarks[name][0]
+    os.makedirs(work_dir)
+    commands = setup_function(work_dir, size)
+    rows = []
+    for i_command, command in enumerate(commands):
+        sys.stderr.write('  ' + name + '  size=' + str(size) +
+                         '  trial=' + str(trial) +
+                         '  ' + command.label + '...')
+        if command.before:
+            command.before()
+        profile_file = os.path.join(work_dir, g_profile_name)
+        if os.path.exists(profile_file):
+            os.remove(profile_file)
+        wall_time, cpu_time, peak_rss = RunCommand(command, work_dir)
+        sys.stderr.write(' ' + ('%.2f' % wall_time) + 's\n')
+        command_name = str(i_command + 1) + ':' + command.label
+        natoms = CountAtoms(work_dir)
+        rows.append(OrderedDict(zip(g_columns,
+                                    [name, size, natoms, trial, command_name,
+                                     command.label, 'total',
+                                     wall_time, cpu_time, peak_rss])))
+        if command.profile and os.path.exists(profile_file):
+            report = json.load(open(profile_file),
+                               object_pairs_hook=OrderedDict)
+            for record in report['programs']:
+                for stage in record['stages']:
+                    rows.append(OrderedDict(zip(g_columns,
+                        [name, size, natoms, trial, command_name,
+                         record['program'], stage['name'],
+                         stage['wall_time'], stage['cpu_time'],
+                         stage['process_peak_rss_kb']])))
+    return rows
+
+
+def RowsToText(rows):
+    """ Convert the table of results into tab-separated text """
+    lines = ['\t'.join(g_columns)]
+    for row in rows:
+        values = []
+        for column in g_columns:
+            value = row[column]
+            if isinstance(value, float):
+                value = '%.4f' % value
+            values.append(str(value))
+        lines.append('\t'.join(values))
+    return '\n'.join(lines) + '\n'
+
+
+def FastestStages(rows):
+    """
+    Combine the rows which differ only by their "trial" number
+    (keeping the one with the smallest wall time).  Stages which
+    occur more than once in the same command (eg. "render: parse
+    template", which is invoked once per section) are summed.
+    """
+    per_trial = OrderedDict()
+    for row in rows:
+        key = (row['benchmark'], row['size'], row['command'],
+               row['program'], row['stage'])
+        per_trial.setdefault(key, {})
+        t = per_trial[key].get(row['trial'], 0.0)
+        per_trial[key][row['trial']] = t + row['wall_time']
+    fastest = OrderedDict()
+    for key, times in per_trial.items():
+        fastest[key] = min(times.values())
+    return fastest
+
+
+def Compare(old_file_name, new_file_name):
+    old = FastestStages(json.load(open(old_file_name))['rows'])
+    new = FastestStages(json.load(open(new_file_name))['rows'])
+    sys.stdout.write('\t'.join(['benchmark', 'size', 'command', 'program',
+                                'stage', 'old_wall_time', 'new_wall_time',
+                                'speedup']) + '\n')
+    for key in new:
+        if key not in old:
+            continue
+        t_old = old[key]
+        t_new = new[key]
+        if t_new > 0.0:
+            speedup = '%.3f' % (t_old / t_new)
+        else:
+            speedup = 'inf'
+        sys.stdout.write('\t'.join([str(x) for x in key] +
+                                   ['%.4f' % t_old, '%.4f' % t_new, speedup])
+                         + '\n')
+
+
+def Version():
+    """ Identify the version of moltemplate being benchmarked """
+    try:
+        out = subprocess.check_output(['git', 'describe', '--always', '--dirty'],
+                                      cwd=g_repo_dir,
+                                      stderr=open(os.devnull, 'w'))
+        return out.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main():
+    sys.stderr.write(g_program_name + ' v' +
+                     g_version_str + ' ' + g_date_str + '\n')
+    try:
+        size_index = 2          # (use the default sizes)
+        selected = list(g_benchmarks.keys())
+        num_trials = 1
+        out_file_name = 'benchmark_results.json'
+        keep_dir = None
+
+        argv = [arg for arg in sys.argv]
+        i = 1
+        while i < len(argv):
+            if argv[i].lower() in ('-?', '--?', '-help', '--help'):
+                sys.stdout.write(man_page_text + '\n')
+                return
+            elif argv[i].lower() == '-quick':
+                size_index = 1
+                del(argv[i:i + 1])
+            elif argv[i].lower() == '-large':
+                size_index = 3
+                del(argv[i:i + 1])
+            elif argv[i].lower() == '-only':
+                if i + 1 >= len(argv):
+                    raise InputError('Error: ' + argv[i] + ' flag should be followed by a comma-separated\n'
+                                     '       list of benchmark names.  Choose from:\n'
+                                     '       ' + ', '.join(g_benchmarks.keys()) + '\n')
+                selected = argv[i + 1].split(',')
+                for name in selected:
+                    if name not in g_benchmarks:
+                        raise InputError('Error: Unknown benchmark \"' + name + '\".  Choose from:\n'
+                                         '       ' + ', '.join(g_benchmarks.keys()) + '\n')
+                del(argv[i:i + 2])
+            elif argv[i].lower() == '-repeat':
+                if i + 1 >= len(argv):
+                    raise InputError('Error: ' + argv[i] + ' flag should be followed by a number.\n')
+                num_trials = int(argv[i + 1])
+                del(argv[i:i + 2])
+            elif argv[i].lower() == '-o':
+                if i + 1 >= len(argv):
+                    raise InputError('Error: ' + argv[i] + ' flag should be followed by a file name.\n')
+                out_file_name = argv[i + 1]
+                del(argv[i:i + 2])
+            elif argv[i].lower() == '-keep':
+                if i + 1 >= len(argv):
+                    raise InputError('Error: ' + argv[i] + ' flag should be followed by a directory name.\n')
+                keep_dir = os.path.abspath(argv[i + 1])
+                del(argv[i:i + 2])
+            elif argv[i].lower() == '-compare':
+                if i + 2 >= len(argv):
+                    raise InputError('Error: ' + argv[i] + ' flag should be followed by the names of two\n'
+                                     '       files created by ' + g_program_name + '\n')
+                Compare(argv[i + 1], argv[i + 2])
+                return
+            else:
+                raise InputError('Error(' + g_program_name + '):\n'
+                                 'Unrecogized command line argument \"' + argv[i] + '\"\n'
+                                 '\n' + man_page_text)
+
+        # The tracemalloc module slows moltemplate down considerably.
+        # We only want the time and peak memory used by each stage.
+        # (It is off by default, unless this variable was set by the user.)
+        os.environ['MOLTEMPLATE_PROFILE_NTOP'] = '0'
+
+        if keep_dir:
+            top_dir = keep_dir
+            if not os.path.exists(top_dir):
+                os.makedirs(top_dir)
+        else:
+            top_dir = tempfile.mkdtemp(prefix='moltemplate_benchmarks_')
+
+        rows = []
+        try:
+            for name in selected:
+                for size in g_benchmarks[name][size_index]:
+                    for trial in range(0, num_trials):
+                        work_dir = os.path.join(top_dir, name + '_' + str(size) +
+                                                '_' + str(trial))
+                        if os.path.exists(work_dir):
+                            shutil.rmtree(work_dir)
+                        rows += RunBenchmark(name, size, trial, work_dir)
+        finally:
+            if not keep_dir:
+                shutil.rmtree(top_dir)
+
+        results = OrderedDict()
+        results['version'] = Version()
+        results['date'] = time.strftime('%Y-%m-%d %H:%M:%S')
+        results['python'] = sys.version.split()[0]
+        results['platform'] = platform.platform()
+        results['columns'] = g_columns
+        results['rows'] = rows
+        f = open(out_file_name, 'w')
+        json.dump(results, f, indent=1)
+        f.write('\n')
+        f.close()
+        sys.stdout.write(RowsToText(rows))
+
+    except (ValueError, InputError) as err:
+        sys.stderr.write('\n' + str(err) + '\n')
+        sys.exit(-1)
+
+    return
+
+
+if __name__ == '__main__':
+    main()
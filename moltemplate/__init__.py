@@ -1,22 +1,30 @@
 from .ttree import BasicUISettings, BasicUIParseArgs, EraseTemplateFiles, \
     StackableCommand, PopCommand, PopRightCommand, PopLeftCommand, \
-    PushCommand, PushLeftCommand, PushRightCommand, ScopeCommand, \
-    WriteVarBindingsFile, StaticObj, InstanceObj, ExtractFormattingCommands, \
-    BasicUI, ScopeBegin, ScopeEnd, WriteFileCommand, Render
+    PushCommand, PushLeftCommand, PushRightCommand, PushArrayCommand, \
+    PushFramesCommand, ScopeCommand, WriteVarBindingsFile, StaticObj, \
+    InstanceObj, ExtractFormattingCommands, \
+    BasicUI, ScopeBegin, ScopeEnd, WriteFileCommand, Render, BindTmplList
 
 from .ttree_lex import TtreeShlex, split, LineLex, SplitQuotedString, \
     EscCharStrToChar, SafelyEncodeString, RemoveOuterQuotes, MaxLenStr, \
     HasWildcard, HasRE, InputError, ErrorLeader, SrcLoc, OSrcLoc, TextBlock, \
     VarRef, VarNPtr, VarBinding, SplitTemplate, SplitTemplateMulti, \
-    TableFromTemplate, ExtractCatName, DeleteLinesWithBadVars, TemplateLexer
+    TableFromTemplate, ExtractCatName, DeleteLinesWithBadVars, HasBadVars, \
+    TemplateLexer, ResolveSource
+
+from .ttree_profile import StageProfiler, MergeRecords
+
+from .ttree_log import Logger, LOG_QUIET, LOG_NORMAL, LOG_DEBUG
 
 from .nbody_graph_search import Disconnected, NotUndirected, Edge, Vertex, \
      Dgraph, Ugraph, SortVertsByDegree, DFS, GraphMatcher 
 
-from .nbody_by_type_lib import GenInteractions_int, GenInteractions_str
+from .nbody_by_type_lib import GenInteractions_int, GenInteractions_str, \
+    BuildSystemGraph, GenInteractions_graph, GenInteractions_array
 
 from .lttree import LttreeSettings, LttreeParseArgs, TransformAtomText, \
-    TransformEllipsoidText, AddAtomTypeComments, ExecCommands, WriteFiles
+    TransformEllipsoidText, AddAtomTypeComments, ExecCommands, WriteFiles, \
+    OutputFiles
 
 from .lttree_styles import AtomStyle2ColNames, ColNames2AidAtypeMolid, \
     ColNames2Coords, ColNames2Vects, ColNames2Vects, data_atoms, data_masses
@@ -32,6 +40,7 @@ from .ttree_matrix_stack import MultMat, MatToStr, LinTransform, \
 # Stand-alone executable scripts
 from .ttree import main
 from .lttree import main
+from .lttree_server import main
 from .ettree import main
 from .ttree_render import main
 from .ltemplify import main, Ltemplify
@@ -40,11 +49,12 @@ from .raw2data import main
 from .extract_lammps_data import main
 from .genpoly_lt import main, GenPoly, GPSettings
 from .genpoly_modify_lt import main, GenPolyMod, GPModSettings, DistributePeriodic, DistributeRandom
-from .interpolate_curve import main, ResampleCurve, CalcNaturalCubicSplineCoeffs, SplineEval, SplineEvalD1, SplineEvalD2, SplineInterpEval, SplineInterpEvalD1, SplineInterpEvalD2, SplineCurvature2D, SplineInterpCurvature2D
+from .interpolate_curve import main, ResampleCurve, ResampleCurveLinear, CalcNaturalCubicSplineCoeffs, SplineEval, SplineEvalD1, SplineEvalD2, SplineIntervals, SplineInterpEval, SplineInterpEvalD1, SplineInterpEvalD2, SplineCurvature2D, SplineInterpCurvature2D, SplineInterpCurvature, SplineArcLengthTable, SplineArcLengthInverse
 from .nbody_by_type import main
 
 __all__ = [# General modules for parsing and rendering text templates:
-           'ttree','ttree_lex','ttree_render',
+           'ttree','ttree_lex','ttree_render','ttree_profile',
+           'ttree_log',
            # General modules for handling force-fields:
            'nbody_graph_search','nbody_by_type_lib','nbody_by_type',
            'nbody_Angles','nbody_Bonds','nbody_Dihedrals','nbody_Impropers',
@@ -57,6 +67,7 @@ __all__ = [# General modules for parsing and rendering text templates:
            'pdbsort',
            # LAMMPS specific:
            'lttree','lttree_styles','lttree_check','lttree_postprocess',
+           'lttree_server',
            'dump2data', 'raw2data',
            'extract_lammps_data',
            'ltemplify',
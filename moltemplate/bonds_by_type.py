@@ -30,10 +30,12 @@ import sys
 try:
     from . import ttree_lex
     from .lttree_styles import AtomStyle2ColNames, ColNames2AidAtypeMolid
+    from .ttree_profile import g_profiler
 except (ImportError, SystemError, ValueError):
     # not installed as a package
     import ttree_lex
     from lttree_styles import AtomStyle2ColNames, ColNames2AidAtypeMolid
+    from ttree_profile import g_profiler
 import re
 
 
@@ -317,6 +319,13 @@ def main():
                 prefix = argv[i + 1]
                 del(argv[i:i + 2])
 
+            elif argv[i].lower() == '-profile':
+                if i + 1 >= len(argv):
+                    raise ttree_lex.InputError('Error: ' + argv[i] + ' flag should be followed by the name of a file\n'
+                                               '       where the profiling report (in JSON format) will be saved.\n')
+                g_profiler.Enable(argv[i + 1], g_program_name)
+                del(argv[i:i + 2])
+
             elif argv[i][0] == '-':
                 raise ttree_lex.InputError('Error(' + g_program_name + '):\n'
                                            'Unrecogized command line argument \"' + argv[i] + '\"\n')
@@ -347,16 +356,18 @@ def main():
         fbonds.close()
         fbondsbytype.close()
 
-        LookupBondTypes(bond_types,
-                        bond_ids,
-                        bond_pairs,
-                        lines_atoms,
-                        lines_bonds,
-                        lines_bondsbytype,
-                        atom_style,
-                        section_name,
-                        prefix='',
-                        suffix='')
+        with g_profiler.Stage('Bonds By Type'):
+            LookupBondTypes(bond_types,
+                            bond_ids,
+                            bond_pairs,
+                            lines_atoms,
+                            lines_bonds,
+                            lines_bondsbytype,
+                            atom_style,
+                            section_name,
+                            prefix='',
+                            suffix='')
+        g_profiler.Count('matches', len(bond_types))
 
         assert(len(bond_types) == len(bond_ids) == len(bond_pairs))
 
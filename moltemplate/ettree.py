@@ -46,20 +46,22 @@ try:
         StackableCommand, PopCommand, PopRightCommand, PopLeftCommand, \
         PushCommand, PushLeftCommand, PushRightCommand, ScopeCommand, \
         WriteVarBindingsFile, StaticObj, InstanceObj, \
-        BasicUI, ScopeBegin, ScopeEnd, WriteFileCommand, Render
+        BasicUI, ScopeBegin, ScopeEnd, WriteFileCommand, Render, BindTmplList
     from .ttree_lex import InputError, TextBlock, DeleteLinesWithBadVars, \
-        TemplateLexer
+        HasBadVars, TemplateLexer
     from .ettree_styles import espt_delim_atom_fields, \
         LinesWSlashes, SplitMultiDelims, SplitAtomLine, \
         iEsptAtomCoords, iEsptAtomVects, iEsptAtomType, iEsptAtomID
     from .ttree_matrix_stack import AffineTransform, MultiAffineStack, \
         LinTransform
+    from .ttree_log import g_log
 except (ImportError, SystemError, ValueError):
     # not installed as a package
     from ttree import *
     from ttree_lex import *
     from ettree_styles import *
     from ttree_matrix_stack import *
+    from ttree_log import g_log
 
 try:
     unicode
@@ -341,22 +343,23 @@ def _ExecCommands(command_list,
 
             # First: To edit the content of a template, 
             #        you need to make a deep local copy of it
-            tmpl_list = []
-            for entry in command.tmpl_list:
-                if isinstance(entry, TextBlock):
-                    tmpl_list.append(TextBlock(entry.text, 
-                                               entry.srcloc)) #, entry.srcloc_end))
-                else:
-                    tmpl_list.append(entry)
+            #        (...but only if it contains deleted variables.
+            #         Otherwise the template is left unchanged.)
+            tmpl_list = command.tmpl_list
+            bindings = command.bindings
+            if HasBadVars(tmpl_list, bindings):
+                tmpl_list = BindTmplList(command.tmpl_list, bindings)
+                bindings = None
 
 
-            # --- Now throw away lines with deleted variables ---
+                # --- Now throw away lines with deleted variables ---
 
-            DeleteLinesWithBadVars(tmpl_list)
+                DeleteLinesWithBadVars(tmpl_list)
 
             # --- Now render the text ---
             text = Render(tmpl_list, 
-                          substitute_vars)
+                          substitute_vars,
+                          bindings)
 
             # ---- Coordinates of the atoms, must be rotated 
             # and translated after rendering.
@@ -531,7 +534,7 @@ def main():
         # Now, carry out the commands
         # This involves rendering the templates and post-processing them.
 
-        sys.stderr.write(' done\nbuilding templates...')
+        g_log.Info(' done\nbuilding templates...')
 
         files_content = defaultdict(list)
 
@@ -545,7 +548,7 @@ def main():
                      False)
 
         # Erase the files that will be written to:
-        sys.stderr.write(' done\nwriting templates...')
+        g_log.Info(' done\nwriting templates...')
         EraseTemplateFiles(g_static_commands)
         EraseTemplateFiles(g_instance_commands)
 
@@ -554,19 +557,19 @@ def main():
         WriteFiles(files_content, suffix=".template", write_to_stdout=False)
 
         # Write the files with the variables substituted by values
-        sys.stderr.write(' done\nbuilding and rendering templates...')
+        g_log.Info(' done\nbuilding and rendering templates...')
         files_content = defaultdict(list)
         ExecCommands(g_static_commands, files_content, settings, True)
         ExecCommands(g_instance_commands, files_content, settings, True)
-        sys.stderr.write(' done\nwriting rendered templates...\n')
+        g_log.Info(' done\nwriting rendered templates...\n')
         WriteFiles(files_content)
 
         # Now write the variable bindings/assignments table.
-        sys.stderr.write('writing \"ttree_assignments.txt\" file...')
+        g_log.Info('writing \"ttree_assignments.txt\" file...')
         open('ttree_assignments.txt', 'w').close() # <-- erase previous version.
         WriteVarBindingsFile(g_objectdefs)
         WriteVarBindingsFile(g_objects)
-        sys.stderr.write(' done\n')
+        g_log.Info(' done\n')
 
     except (ValueError, InputError) as err:
         sys.stderr.write('\n\n'+str(err)+'\n')
@@ -51,6 +51,7 @@ Usage:
       [-polymer-directions polarities.txt \\
       [-dir-indices ia ib] \\
       [-padding paddingX,paddingY,paddingZ] \\
+      [-frames frames.npy] \\
       < coords.raw > polymer.lt
 
 """
@@ -59,6 +60,7 @@ Usage:
 import sys
 import random
 from math import *
+import numpy as np
 
 
 class InputError(Exception):
@@ -116,6 +118,7 @@ class GPSettings(object):
         self.helix_angles_file = ''
         self.orientations_file = ''
         self.orientations_use_quats = False
+        self.frames_file = ''
 
     def ParseArgs(self, argv):
         i = 1
@@ -349,6 +352,12 @@ class GPSettings(object):
             elif (argv[i].lower() in ('-helix-angle','-helix-angles')):
                 self.helix_angles_file = argv[i+1]
                 del(argv[i:i + 2])
+            elif (argv[i].lower() == '-frames'):
+                if i + 1 >= len(argv):
+                    raise InputError(
+                        'Error: The ' + argv[i] + ' flag should be followed by a file name\n')
+                self.frames_file = argv[i + 1]
+                del(argv[i:i + 2])
 
             # elif ((argv[i][0] == '-') and (__name__ == '__main__')):
             #
@@ -389,6 +398,73 @@ class GPSettings(object):
 
 
 
+def AxisAngleToMatrices(axes, angles):
+    """ Return an array of 3x3 rotation matrices, one for each row of "axes"
+        (an Nx3 array), rotating by the corresponding entry in "angles"
+        (in radians).  (Vectorized version of RotMatAXYZ())
+
+    """
+    r = np.sqrt(np.sum(axes**2, axis=1))
+    degenerate = (r == 0.0)
+    axes = np.where(degenerate[:, np.newaxis],
+                    np.array([1.0, 0.0, 0.0]),
+                    axes / np.where(degenerate, 1.0, r)[:, np.newaxis])
+    angles = np.where(degenerate, 0.0, angles)
+    X = axes[:, 0]
+    Y = axes[:, 1]
+    Z = axes[:, 2]
+    c = np.cos(angles)
+    s = np.sin(angles)
+    M = np.empty((len(axes), 3, 3))
+    M[:, 0, 0] = X * X * (1 - c) + c
+    M[:, 1, 1] = Y * Y * (1 - c) + c
+    M[:, 2, 2] = Z * Z * (1 - c) + c
+    M[:, 0, 1] = X * Y * (1 - c) - Z * s
+    M[:, 0, 2] = X * Z * (1 - c) + Y * s
+    M[:, 1, 0] = Y * X * (1 - c) + Z * s
+    M[:, 2, 0] = Z * X * (1 - c) - Y * s
+    M[:, 1, 2] = Y * Z * (1 - c) - X * s
+    M[:, 2, 1] = Z * Y * (1 - c) + X * s
+    return M
+
+
+def RotVVToMatrices(v_old, v_new):
+    """ Return an array of 3x3 rotation matrices, each of which rotates
+        a row of "v_old" to point in the direction of the row in "v_new".
+        (Vectorized version of RotMatXYZXYZ())
+
+    """
+    axes = np.cross(v_old, v_new)
+    L_old = np.sqrt(np.sum(v_old**2, axis=1))
+    L_new = np.sqrt(np.sum(v_new**2, axis=1))
+    L_axes = np.sqrt(np.sum(axes**2, axis=1))
+    angles = np.arctan2(L_axes / (L_old * L_new),
+                        np.sum(v_old * v_new, axis=1) / (L_old * L_new))
+    # (If v_old and v_new are parallel, then L_axes=0 and no rotation occurs)
+    return AxisAngleToMatrices(axes, np.where(L_axes > 0.0, angles, 0.0))
+
+
+def QuatsToMatrices(q):
+    """ Convert an Nx4 array of quaternions into an array of 3x3 matrices.
+        (Vectorized version of Quaternion2Matrix())
+
+    """
+    s = 1.0 / np.sum(q**2, axis=1)
+    s *= s  # (s = 1 if q is normalized)
+    M = np.empty((len(q), 3, 3))
+    M[:, 0, 0] = 1 - 2*s*((q[:, 2]*q[:, 2])+(q[:, 3]*q[:, 3]))
+    M[:, 1, 1] = 1 - 2*s*((q[:, 1]*q[:, 1])+(q[:, 3]*q[:, 3]))
+    M[:, 2, 2] = 1 - 2*s*((q[:, 1]*q[:, 1])+(q[:, 2]*q[:, 2]))
+    M[:, 0, 1] = 2*s*(q[:, 1]*q[:, 2] - q[:, 3]*q[:, 0])
+    M[:, 1, 0] = 2*s*(q[:, 1]*q[:, 2] + q[:, 3]*q[:, 0])
+    M[:, 1, 2] = 2*s*(q[:, 2]*q[:, 3] - q[:, 1]*q[:, 0])
+    M[:, 2, 1] = 2*s*(q[:, 2]*q[:, 3] + q[:, 1]*q[:, 0])
+    M[:, 0, 2] = 2*s*(q[:, 1]*q[:, 3] + q[:, 2]*q[:, 0])
+    M[:, 2, 0] = 2*s*(q[:, 1]*q[:, 3] - q[:, 2]*q[:, 0])
+    return M
+
+
+
 class WrapPeriodic(object):
     """ Wrap() calculates the remainder of i % N.
         It turns out to be convenient to do this multiple times and later
@@ -570,50 +646,46 @@ class GenPoly(object):
     def ChooseDirections(self, coords):
         """
         Calculate the direction each monomer subunit should be pointing at:
+        (The result is stored in self.direction_vects, a NumPy array with
+         N+1 rows.  See comment below regarding the final row.)
 
         """
 
         N = len(coords)
 
         if N == 1:
-            self.direction_vects = [[1.0, 0.0, 0.0]]
+            self.direction_vects = np.array([[1.0, 0.0, 0.0]])
             return
 
-        self.direction_vects = [[0.0, 0.0, 0.0] for i in range(0, N + 1)]
+        coords = np.asarray(coords, dtype=float)
+        self.direction_vects = np.zeros((N + 1, 3))
 
         if self.settings.is_circular:
-            for i in range(0, N):
-                # By default, the direction that monomer "i" is pointing is
-                # determined by the position of the monomers before and after it
-                # (at index i-1, and i+1).  More generally, we allow the user
-                # to choose what these offsets are ("dir_index_offsets[")
-                ia = WrapPeriodic.Wrap(i + self.settings.dir_index_offsets[0],
-                                       N)
-                ib = WrapPeriodic.Wrap(i + self.settings.dir_index_offsets[1],
-                                       N)
-                for d in range(0, 3):
-                    self.direction_vects[i][d] = coords[ib][d] - coords[ia][d]
-                        
+            # By default, the direction that monomer "i" is pointing is
+            # determined by the position of the monomers before and after it
+            # (at index i-1, and i+1).  More generally, we allow the user
+            # to choose what these offsets are ("dir_index_offsets[")
+            i = np.arange(0, N)
+            ia = (i + self.settings.dir_index_offsets[0]) % N
+            ib = (i + self.settings.dir_index_offsets[1]) % N
+            self.direction_vects[0:N] = coords[ib] - coords[ia]
         else:
-            for i in range(1, N - 1):
-                for d in range(0, 3):
-                    self.direction_vects[i][d] = (coords[i + self.settings.dir_index_offsets[1]][d]
-                                                  -
-                                                  coords[i + self.settings.dir_index_offsets[0]][d])
-
-            for d in range(0, 3):
-                self.direction_vects[0][d] = coords[1][d] - coords[0][d]
-                self.direction_vects[N-1][d] = coords[N-1][d] - coords[N-2][d]
+            i = np.arange(1, N - 1)
+            self.direction_vects[1:N-1] = (coords[i + self.settings.dir_index_offsets[1]]
+                                           -
+                                           coords[i + self.settings.dir_index_offsets[0]])
+            self.direction_vects[0] = coords[1] - coords[0]
+            self.direction_vects[N-1] = coords[N-1] - coords[N-2]
 
         # Optional: normalize the direction vectors
 
-        for i in range(0, N):
-            direction_len = 0.0
-            for d in range(0, 3):
-                direction_len += (self.direction_vects[i][d])**2
-            direction_len = sqrt(direction_len)
-            for d in range(0, 3):
-                self.direction_vects[i][d] /= direction_len
+        direction_lens = np.sqrt(np.sum(self.direction_vects[0:N]**2, axis=1))
+        if np.any(direction_lens == 0.0):
+            i = int(np.argmin(direction_lens))
+            raise InputError('Error: Unable to determine the direction of monomer ' +
+                             str(i + 1) + '.\n'
+                             '       (Are two monomers located at the same position?)\n')
+        self.direction_vects[0:N] /= direction_lens[:, np.newaxis]
 
         # Special case:  self.direction_vects[-1] is the direction that the original monomer
         # in "monomer.lt" was pointing.  (By default, 1,0,0 <--> the "x"
@@ -641,6 +713,12 @@ class GenPoly(object):
 
         outfile.write(self.settings.header + "\n\n\n")
 
+        # If the user requested a "-frames" file, then the position and
+        # orientation of every monomer (from every polymer) will be saved
+        # there, instead of in the .lt file.
+        self.frames_list = []
+        self.num_frames = 0
+
         if len(self.coords_multi) == 1:
             self.WritePolymer(outfile,
                               self.settings.name_polymer +
@@ -678,6 +756,12 @@ class GenPoly(object):
                 outfile.write('\n\n'
                               '}  # ' + self.settings.name_polymer + '\n\n')
 
+        if self.settings.frames_file != '':
+            # (Note: np.save(filename) would append ".npy" to the filename.)
+            frames_file = open(self.settings.frames_file, 'wb')
+            np.save(frames_file, np.concatenate(self.frames_list))
+            frames_file.close()
+
         if self.settings.box_padding != None:
             for i in range(0, len(self.coords_multi)):
                 # calculate the box big enough to collectively enclose
@@ -709,88 +793,18 @@ class GenPoly(object):
                           '  # The line above forces all monomer subunits to share the same molecule-ID\n'
                           '  # (Note: The molecule-ID number is optional and is usually ignored by LAMMPS.)\n\n\n\n')
 
-        outfile.write("""
-  # ----- list of monomers: -----
-  #
-  # (Note: move(), rot(), and rotvv() commands control the position
-  #  of each monomer.  (See the moltemplate manual for an explanation
-  #  of what they do.)  Commands enclosed in push() are cumulative
-  #  and remain in effect until removed by pop().)
-
-
-
-"""
-                      )
-
-        outfile.write("  push(move(0,0,0))\n")
-
-        phi = 0.0
-
-        for i in range(0, N):
-            #im1 = i-1
-            # if im1 < 0 or self.settings.connect_ends:
-            #    if im1 < 0:
-            #        im1 += N
-            outfile.write("  pop()\n")
-            if len(orientations) > 0:
-                assert(len(orientations) == N)
-                if self.settings.orientations_use_quats:
-                    assert(len(orientations[i]) == 4)
-                    outfile.write("  push(quat(" +
-                                  str(orientations[i][0]) + "," +
-                                  str(orientations[i][1]) + "," +
-                                  str(orientations[i][2]) + "," +
-                                  str(orientations[i][3]) + "))\n")
-                else:
-                    assert(len(orientations[i]) == 9)
-                    outfile.write("  push(matrix(" +
-                                  str(orientations[i][0]) + "," +
-                                  str(orientations[i][1]) + "," +
-                                  str(orientations[i][2]) + "," +
-                                  str(orientations[i][3]) + "," +
-                                  str(orientations[i][4]) + "," +
-                                  str(orientations[i][5]) + "," +
-                                  str(orientations[i][6]) + "," +
-                                  str(orientations[i][7]) + "," +
-                                  str(orientations[i][8]) + "))\n")
-            else:
-                # Otherwise, if no orientations were explicitly specified, then
-                # infer the orientation from the direction of the displacement.
-                outfile.write("  push(rotvv(" +
-                              str(self.direction_vects[i - 1][0]) + "," +
-                              str(self.direction_vects[i - 1][1]) + "," +
-                              str(self.direction_vects[i - 1][2]) + "," +
-                              str(self.direction_vects[i][0]) + "," +
-                              str(self.direction_vects[i][1]) + "," +
-                              str(self.direction_vects[i][2]) + "))\n")
-            outfile.write("  push(move(" +
-                          str(coords[i][0]) + "," +
-                          str(coords[i][1]) + "," +
-                          str(coords[i][2]) + "))\n")
-
-            outfile.write("  mon[" + str(i) + "] = new " +
-                          names_monomers[i])
-
-            # If requested, apply additional rotations about the polymer axis
-            phi = 0.0
-            if len(helix_angles) > 0:
-                phi += helix_angles[i]
-            elif self.settings.delta_phi != 0.0:
-                phi = i * self.settings.delta_phi
-            # Recall that self.direction_vects[-1] =
-            # self.settings.direction_orig  (usually 1,0,0)
-            outfile.write(".rot(" + str(phi) +
-                          "," + str(self.settings.direction_orig[0]) +
-                          "," + str(self.settings.direction_orig[1]) +
-                          "," + str(self.settings.direction_orig[2]) +
-                          ")\n")
-            if len(orientations) > 0:
-                outfile.write("  pop()\n")
-
-
-        outfile.write("  pop()\n")
-        if len(orientations) == 0:
-            outfile.write("  pop()\n"*N)
+        if self.settings.frames_file != '':
+            self.WriteMonomerArray(outfile,
+                                   coords,
+                                   names_monomers,
+                                   orientations,
+                                   helix_angles)
+        else:
+            self.WriteMonomerList(outfile,
+                                  coords,
+                                  names_monomers,
+                                  orientations,
+                                  helix_angles)
 
         assert(len(self.settings.bonds_name) ==
                len(self.settings.bonds_type) ==
@@ -923,19 +937,192 @@ class GenPoly(object):
         if name_polymer != '':
             outfile.write("}  # " + name_polymer + "\n\n\n\n")
 
-    def CalcBoxBoundaries(self, coords):
+    def HelixAngles(self, N, helix_angles=[]):
+        """ The angles (in degrees) that each of the N monomers are rotated
+            around the polymer axis (the "-helix" and "-helix-angles" args).
+
+        """
+        if len(helix_angles) > 0:
+            return 0.0 + np.asarray(helix_angles, dtype=float)
+        elif self.settings.delta_phi != 0.0:
+            return np.arange(0, N) * self.settings.delta_phi
+        else:
+            return np.zeros(N)
+
+
+
+    def WriteMonomerList(self,
+                         outfile,
+                         coords,
+                         names_monomers,
+                         orientations=[],
+                         helix_angles=[]):
+        """ Write a separate "new" command for each monomer (enclosed by
+            push() and pop() commands which move and rotate it into position).
+            This function is invoked by WritePolymer()
+
+        """
         N = len(coords)
-        for i in range(0, N):
+
+        outfile.write("""
+  # ----- list of monomers: -----
+  #
+  # (Note: move(), rot(), and rotvv() commands control the position
+  #  of each monomer.  (See the moltemplate manual for an explanation
+  #  of what they do.)  Commands enclosed in push() are cumulative
+  #  and remain in effect until removed by pop().)
+
+
+
+"""
+                      )
+
+        outfile.write("  push(move(0,0,0))\n")
+
+        # Convert everything to (python) lists of numbers beforehand.
+        # Each monomer is then written using a single format() call.
+        crds = np.asarray(coords, dtype=float).tolist()
+
+        # If requested, apply additional rotations about the polymer axis
+        # (Recall that self.direction_vects[-1] =
+        #  self.settings.direction_orig  (usually 1,0,0))
+        phis = self.HelixAngles(N, helix_angles).tolist()
+        rot_axis_str = (str(self.settings.direction_orig[0]) + "," +
+                        str(self.settings.direction_orig[1]) + "," +
+                        str(self.settings.direction_orig[2]))
+
+        if len(orientations) > 0:
+            assert(len(orientations) == N)
+            if self.settings.orientations_use_quats:
+                assert(all(len(o) == 4 for o in orientations))
+                push_fmt = "  push(quat({},{},{},{}))\n"
+            else:
+                assert(all(len(o) == 9 for o in orientations))
+                push_fmt = "  push(matrix({},{},{},{},{},{},{},{},{}))\n"
+            rots = np.asarray(orientations, dtype=float).tolist()
+            pop_str = "  pop()\n"
+        else:
+            # Otherwise, if no orientations were explicitly specified, then
+            # infer the orientation from the direction of the displacement.
+            push_fmt = "  push(rotvv({},{},{},{},{},{}))\n"
+            dirs = self.direction_vects.tolist()
+            rots = [dirs[i - 1] + dirs[i] for i in range(0, N)]
+            pop_str = ""
+
+        monomer_fmt = ("  pop()\n" +
+                       push_fmt +
+                       "  push(move({},{},{}))\n" +
+                       "  mon[{}] = new {}.rot({}," + rot_axis_str + ")\n" +
+                       pop_str)
+
+        outfile.write(''.join([monomer_fmt.format(*(rots[i] +
+                                                    crds[i] +
+                                                    [i, names_monomers[i],
+                                                     phis[i]]))
+                               for i in range(0, N)]))
+
+        outfile.write("  pop()\n")
+        if len(orientations) == 0:
+            outfile.write("  pop()\n"*N)
+
+
+
+    def CalcFrames(self,
+                   coords,
+                   orientations=[],
+                   helix_angles=[]):
+        """ Calculate the affine transformation (a 3x4 matrix) which moves
+            and rotates each monomer into position.  These are the same
+            transformations that would be applied by the push(), pop(), and
+            rot() commands written by WriteMonomerList().
+            (Note: self.ChooseDirections() must be invoked beforehand.)
+
+        """
+        N = len(coords)
+        if len(orientations) > 0:
+            assert(len(orientations) == N)
+            if self.settings.orientations_use_quats:
+                R = QuatsToMatrices(np.asarray(orientations, dtype=float))
+            else:
+                R = np.asarray(orientations, dtype=float).reshape(N, 3, 3)
+        else:
+            # R[i] = the cumulative product of all of the rotvv() commands
+            #        so far (rotvv(dir[i-1],dir[i]) * ... * rotvv(dir[-1],dir[0]))
+            dirs = self.direction_vects
+            R = RotVVToMatrices(dirs[np.arange(-1, N - 1)], dirs[0:N])
+            for i in range(1, N):
+                R[i] = np.dot(R[i], R[i - 1])
+
+        # rot() around the polymer axis
+        axis = np.asarray(self.settings.direction_orig, dtype=float)
+        Rphi = AxisAngleToMatrices(np.tile(axis, (N, 1)),
+                                   self.HelixAngles(N, helix_angles) * pi / 180.0)
+        frames = np.empty((N, 3, 4))
+        frames[:, :, 0:3] = np.matmul(R, Rphi)
+        frames[:, :, 3] = np.asarray(coords, dtype=float)  # move()
+        return frames
+
+
+
+    def WriteMonomerArray(self,
+                          outfile,
+                          coords,
+                          names_monomers,
+                          orientations=[],
+                          helix_angles=[]):
+        """ Save the position and orientation of every monomer in a NumPy
+            file (self.settings.frames_file), and instantiate all of the
+            monomers using a single "new" command (or one "new" command for
+            each run of identical monomers, if the sequence is not uniform).
+            This is much faster to parse for very long polymers.
+            This function is invoked by WritePolymer()
+
+        """
+        N = len(coords)
+        outfile.write("""
+  # ----- list of monomers: -----
+  #
+  # (Note: The position and orientation of each monomer is stored in
+  #  \"""" + self.settings.frames_file + """\" (a NumPy file containing one
+  #  3x4 affine transformation matrix per monomer).  The ".frames()" command
+  #  moves and rotates each monomer using the corresponding matrix.)
+
+
+
+""")
+        i_first = 0
+        while i_first < N:
+            i_last = i_first
+            while ((i_last + 1 < N) and
+                   (names_monomers[i_last + 1] == names_monomers[i_first])):
+                i_last += 1
+            outfile.write("  mon[" + str(i_first) + "-" + str(i_last) +
+                          "] = new " + names_monomers[i_first] +
+                          " [" + str(i_last - i_first + 1) + "]" +
+                          ".frames(" + self.settings.frames_file + "," +
+                          str(self.num_frames + i_first) + ")\n")
+            i_first = i_last + 1
+        self.frames_list.append(self.CalcFrames(coords,
+                                                orientations,
+                                                helix_angles))
+        self.num_frames += N
+
+
+
+    def CalcBoxBoundaries(self, coords):
+        if len(coords) == 0:
+            return
+        coords = np.asarray(coords, dtype=float)
+        coords_min = coords.min(axis=0).tolist()
+        coords_max = coords.max(axis=0).tolist()
+        if not self.box_bounds_min:
+            assert(not self.box_bounds_max)
+            self.box_bounds_min = coords_min
+            self.box_bounds_max = coords_max
+        else:
             for d in range(0, 3):
-                if not self.box_bounds_min:
-                    assert(not self.box_bounds_max)
-                    self.box_bounds_min = [xd for xd in coords[i]]
-                    self.box_bounds_max = [xd for xd in coords[i]]
-                else:
-                    if coords[i][d] > self.box_bounds_max[d]:
-                        self.box_bounds_max[d] = coords[i][d]
-                    if coords[i][d] < self.box_bounds_min[d]:
-                        self.box_bounds_min[d] = coords[i][d]
+                self.box_bounds_min[d] = min(self.box_bounds_min[d], coords_min[d])
+                self.box_bounds_max[d] = max(self.box_bounds_max[d], coords_max[d])
 
     def WriteBoxBoundaries(self, outfile):
         for d in range(0, 3):
@@ -1,8 +1,8 @@
 #!/usr/bin/env python
 
 g_program_name = __file__.split('/')[-1]
-g_version_str  = '0.3.6'
-g_date_str     = '2020-7-18'
+g_version_str  = '0.4.0'
+g_date_str     = '2026-10-19'
 
 g_usage_msg = """
 
@@ -40,6 +40,7 @@ Usage:
 
 import sys
 import random
+import bisect
 from math import *
 
 
@@ -111,6 +112,304 @@ def FindNearestAvailableSite(i, # target index. look for a position closest to i
 
 
 
+def FindFreeIntervals(occupancy, is_periodic=False):
+    """
+    Return a list of (start, length) pairs, one for each maximal interval of
+    consecutive unoccupied sites in the occupancy array.  If is_periodic,
+    and both the first and last sites are vacant, then the last interval
+    "wraps around" and includes the first interval.  (In that case, its
+    start + length exceeds len(occupancy).)  If no sites are occupied, and
+    is_periodic, then the result is [(0, N)].
+    Running time: O(K) (python) operations, where K is the number of intervals
+    (The search for each interval boundary is carried out by list.index()).
+    """
+    N = len(occupancy)
+    if not isinstance(occupancy, list):
+        occupancy = list(occupancy)
+    intervals = []
+    i = 0
+    while i < N:
+        try:
+            start = occupancy.index(False, i)
+        except ValueError:
+            break
+        try:
+            i = occupancy.index(True, start)
+        except ValueError:
+            i = N
+        intervals.append((start, i - start))
+    if (is_periodic and (len(intervals) > 1) and
+        (intervals[0][0] == 0) and (sum(intervals[-1]) == N)):
+        intervals[-1] = (intervals[-1][0],
+                         intervals[-1][1] + intervals[0][1])
+        del intervals[0]
+    return intervals
+
+
+
+
+class FenwickTree(object):
+    """
+    A Fenwick tree (binary indexed tree) stores a list of non-negative
+    integer weights.  It is used to select one of the entries at random
+    (with probability proportional to its weight) in O(log n) time.
+    Changing a weight also takes O(log n) time.
+    """
+
+    def __init__(self, weights):
+        n = len(weights)
+        tree = [0] + list(weights)
+        for i in range(1, n + 1):
+            j = i + (i & -i)
+            if j <= n:
+                tree[j] += tree[i]
+        self.tree = tree
+        self.total = sum(weights)
+        self.top_bit = 1
+        while 2 * self.top_bit <= n:
+            self.top_bit *= 2
+
+    def Add(self, i, delta):
+        """ Add delta to the weight of the i'th entry (starting at 0). """
+        self.total += delta
+        tree = self.tree
+        n = len(tree) - 1
+        i += 1
+        while i <= n:
+            tree[i] += delta
+            i += (i & -i)
+
+    def Find(self, x):
+        """
+        Return (i, r): "i" is the entry which contains position "x" in the
+        concatenated list of weights (where 0 <= x < self.total), and "r"
+        is the remainder (ie. x minus the sum of the weights before entry i).
+        """
+        tree = self.tree
+        n = len(tree) - 1
+        i = 0
+        step = self.top_bit
+        while step > 0:
+            j = i + step
+            if (j <= n) and (tree[j] <= x):
+                i = j
+                x -= tree[j]
+            step //= 2
+        return i, x
+
+
+
+
+class _FreeIntervalSampler(object):
+    """
+    Keep track of the intervals of vacant sites, and choose locations for
+    objects (of width w) within them at random.  Every site where an object
+    could begin is chosen with equal probability, except when there is only
+    just enough room left for the remaining objects.  In that case, only the
+    sites which do not waste any space are considered.  (The number of
+    objects of width w that fit in an interval of length L is L//w.
+    Beginning an object at position p within the interval, reduces this number
+    by 1 if p%w <= L%w, and by 2 otherwise.)
+    """
+
+    def __init__(self, intervals, max_num_intervals):
+        self.starts = [start for (start, length) in intervals]
+        self.lengths = [length for (start, length) in intervals]
+        pad = max_num_intervals - len(intervals)
+        self.starts += [0] * pad
+        self.lengths += [0] * pad
+        self.num_intervals = len(intervals)
+        self.width = None
+
+    def SetWidth(self, w):
+        """ Build the weights for choosing locations for objects of width w. """
+        self.width = w
+        self.all_starts = FenwickTree([max(0, L - w + 1)
+                                       for L in self.lengths])
+        self.good_starts = FenwickTree([(L // w) * (L % w + 1)
+                                        for L in self.lengths])
+        self.capacity = sum([L // w for L in self.lengths])
+
+    def _SetLength(self, k, L):
+        w = self.width
+        L_old = self.lengths[k]
+        self.lengths[k] = L
+        self.all_starts.Add(k, max(0, L - w + 1) - max(0, L_old - w + 1))
+        self.good_starts.Add(k, (L // w) * (L % w + 1) -
+                             (L_old // w) * (L_old % w + 1))
+        self.capacity += (L // w) - (L_old // w)
+
+    def Choose(self, num_remaining):
+        """
+        Choose a location for an object of width self.width and mark it as
+        occupied.  Returns the location (or -1 if there is no room left).
+        num_remaining is the number of objects still waiting to be placed
+        (including this one).
+        """
+        w = self.width
+        if self.capacity == num_remaining:
+            # There is just barely enough room. Don't waste any space.
+            k, x = self.good_starts.Find(random.randrange(
+                self.good_starts.total))
+            p = (x // (self.lengths[k] % w + 1)) * w + \
+                (x % (self.lengths[k] % w + 1))
+        elif self.all_starts.total > 0:
+            k, x = self.all_starts.Find(random.randrange(
+                self.all_starts.total))
+            p = x
+        else:
+            return -1
+        start = self.starts[k]
+        L = self.lengths[k]
+        # split interval k into two smaller intervals
+        self._SetLength(k, p)
+        k_new = self.num_intervals
+        self.num_intervals += 1
+        self.starts[k_new] = start + p + w
+        self._SetLength(k_new, L - p - w)
+        return start + p
+
+
+
+
+def _MarkOccupied(locations, widths, occupancy):
+    N = len(occupancy)
+    for im in range(0, len(locations)):
+        J = locations[im]
+        for d in range(0, widths[im]):
+            assert(occupancy[(J+d) % N] == False)
+            occupancy[(J+d) % N] = True
+
+
+
+
+class _FreeIntervalList(object):
+    """
+    A sorted list of intervals of vacant sites (see FindFreeIntervals()),
+    which supports finding (and occupying) the vacant location nearest to
+    some target site.  The list is split into two pieces at a "cursor":
+    self.left contains the intervals which begin at or before the most recent
+    target (in increasing order), and self.right contains the rest (in
+    decreasing order).  Since consecutive targets are usually close together,
+    the intervals which are modified are usually near the end of one of
+    these lists (which is where python lists are cheap to modify).
+    """
+
+    def __init__(self, intervals, N, is_periodic):
+        self.left = []
+        self.right = intervals[::-1]
+        self.N = N
+        self.is_periodic = is_periodic
+
+    def _MoveCursor(self, i):
+        left = self.left
+        right = self.right
+        while (len(right) > 0) and (right[-1][0] <= i):
+            left.append(right.pop())
+        while (len(left) > 0) and (left[-1][0] > i):
+            right.append(left.pop())
+
+    def Place(self, i, width):
+        """
+        Find the location J closest to i where an object of size "width" could
+        begin (without overlapping any occupied sites), and remove these sites
+        from the list.  Ties are broken in favor of the smaller J.  J lies in
+        the range [0,N).  (If there is no room within N/2 of i (or anywhere,
+        if not is_periodic), -1 is returned.)
+        """
+        N = self.N
+        if self.is_periodic:
+            j_stop = N // 2
+        else:
+            j_stop = max(-width+N-i, i)
+        self._MoveCursor(i)
+        left = self.left
+        right = self.right
+        if (len(left) > 0) and (i < N) and (j_stop > 0):
+            start, length = left[-1]
+            if i + width <= start + length:
+                # This is the usual case: The target site is available.
+                return self._Split(left, len(left)-1, i, width)
+
+        best = [-1, None, -1, j_stop]  # best J, which list, index, distance
+
+        def Consider(L, k, lo, hi):
+            if hi < lo:
+                return
+            J = min(max(i, lo), hi)
+            dist = abs(J - i)
+            if (dist < best[3]) or ((dist == best[3]) and (J < best[0])):
+                if dist < j_stop:
+                    best[:] = [J, L, k, dist]
+
+        # (If is_periodic, the last interval may wrap around to the beginning.)
+        if len(right) > 0:
+            L, k = right, 0
+        else:
+            L, k = left, len(left)-1
+        if k >= 0:
+            start, length = L[k]
+            if start + length - width >= N:
+                Consider(L, k, 0, start + length - width - N)
+        # Now scan the intervals to the left and right of i, until the remaining
+        # intervals are further away than the best location found so far.
+        k_left = len(left) - 1
+        k_right = len(right) - 1
+        while (k_left >= 0) or (k_right >= 0):
+            if k_left >= 0:
+                start, length = left[k_left]
+                last = min(start + length - width, N-1)
+                if i - last > best[3]:
+                    k_left = -1   # (the ends of the intervals decrease leftwards)
+                else:
+                    Consider(left, k_left, start, last)
+                    k_left -= 1
+            if k_right >= 0:
+                start, length = right[k_right]
+                if start - i > best[3]:
+                    k_right = -1
+                else:
+                    Consider(right, k_right, start,
+                             min(start + length - width, N-1))
+                    k_right -= 1
+
+        J, L, k = best[0], best[1], best[2]
+        if J == -1:
+            return -1
+        return self._Split(L, k, J, width)
+
+    def _Split(self, L, k, J, width):
+        """
+        Remove the sites [J, J+width) from the k'th interval in list L
+        (either self.left or self.right), splitting it into two pieces.
+        """
+        N = self.N
+        left = self.left
+        right = self.right
+        start, length = L[k]
+        p = (J - start) % N   # (J may have wrapped around)
+        pieces = []  # (omitting empty intervals)
+        if p > 0:
+            pieces.append((start, p))
+        if length - p - width > 0:
+            if start + p + width < N:
+                pieces.append((start + p + width, length - p - width))
+            else:
+                # (This piece wrapped around.  Move it to the beginning.)
+                if len(left) > 0:
+                    left.insert(0, (start + p + width - N, length - p - width))
+                    if L is left:
+                        k += 1
+                else:
+                    right.append((start + p + width - N, length - p - width))
+        if L is right:
+            pieces.reverse()
+        L[k:k+1] = pieces
+        return J
+
+
+
+
 def DistributePeriodic(widths,       # width of each object (>0)
                        occupancy,   # already occupied sites in the lattice
                        is_periodic=False, # is the lattice periodic?
@@ -128,10 +427,13 @@ def DistributePeriodic(widths,       # width of each object (>0)
        an "offset" argument (an integer >=0). It will be the first of the n
        integers generated (or the closest available site to that location).
     The function returns a list of the n chosen integers.
+    Running time: O(N/B + Nm), where B is the average length of the intervals
+    of vacant sites (assuming these intervals are not much shorter than the
+    objects we are placing).
     """
 
     Nm = len(widths)
-    max_width = 0        
+    max_width = 0
     if Nm > 0:
         max_width = max(widths)
     N = len(occupancy)
@@ -146,20 +448,38 @@ def DistributePeriodic(widths,       # width of each object (>0)
         if is_periodic:
             offset = 0
         else:
-            offset = Nreduced / (2*Nm)
+            offset = Nreduced // (2*Nm)
+    # Instead of searching the occupancy array, keep track of the intervals
+    # of vacant sites.
+    intervals = FindFreeIntervals(occupancy, is_periodic)
+    # (A vacant circular lattice has no beginning or end.  Every site is
+    #  available until the first object is placed.)
+    is_vacant_ring = is_periodic and (intervals == [(0, N)])
+    free_intervals = _FreeIntervalList(intervals, N, is_periodic)
     for im in range(0, Nm):
         i = offset + (N*im) // Nm  # next location?
-        # If we didn't have to worry about occupancy, then we would de done now.
-        # However if it is occupied, we have to find nearby unnoccupied sites:
-        J = FindNearestAvailableSite(i, widths[im], occupancy, is_periodic)
+        if is_vacant_ring:
+            J = min(max(i, 0), N-1)
+            if abs(J - i) >= N // 2:
+                J = -1
+            elif N - widths[im] > 0:
+                free_intervals = _FreeIntervalList([((J + widths[im]) % N,
+                                                     N - widths[im])],
+                                                   N, is_periodic)
+            else:
+                free_intervals = _FreeIntervalList([], N, is_periodic)
+            is_vacant_ring = False
+        else:
+            # If we didn't have to worry about occupancy, then we would de done
+            # now.  However if it is occupied, we have to find nearby
+            # unnoccupied sites:
+            J = free_intervals.Place(i, widths[im])
         if J == -1:
             raise InputError('Error('+g_program_name+
                              '): Not enough available sites.\n')
-        else:
-            locations[im] = J
-            for d in range(0, widths[im]):
-                assert(occupancy[(J+d) % N] == False)
-                occupancy[(J+d) % N] = True
+        locations[im] = J
+
+    _MarkOccupied(locations, widths, occupancy)
 
     for im in range(0, Nm):          # error check: make sure that we remembered
         assert(locations[im] != -1) # to specify all the entries in locations[]
@@ -176,14 +496,19 @@ def _DistributeRandom(widths,           # width of each object (>0)
     """
     Generate random non-overlapping integers in a 1-D lattice, taking care to
     avoid previously occupied lattice sites. Each integer has width "widths[im]",
-    meaning that it occupies "widths[im]" sites on the lattice.  (The algorithm
-    places each integer by inserting random amounts of space between them,
-    taking into consideration their widths and the total lattice size.) Overlaps
-    between integers with eachother and previously occupied sites are avoided.
-    When there are previously occupied lattice sites, the algorithm used here
-    is not smart enough to guarantee that it will place the objects in a truly
-    random way, or even succeed in placing them at all.
-    Running time: O(N), where N is the number of sites in the lattice.
+    meaning that it occupies "widths[im]" sites on the lattice.
+    If there are no previously occupied sites, the objects are placed by
+    inserting random amounts of space between them, taking into consideration
+    their widths and the total lattice size.  (Every arrangement is equally
+    likely.)  Otherwise, the objects are placed one at a time (widest first)
+    in the remaining vacant intervals.  Locations are chosen randomly, except
+    that no space is wasted when there is only just enough space left.
+    This guarantees success whenever the objects have equal widths and fit.
+    (For objects of different widths, success is not guaranteed.)
+    Returns None if unsuccessful.
+    Running time: O(N/B + Nm log(K+Nm)), where K is the number of intervals of
+    vacant sites, and B is the average length of these intervals.
+    (This does not include the time needed to update the occupancy array.)
     """
 
     Nm = len(widths)
@@ -191,71 +516,62 @@ def _DistributeRandom(widths,           # width of each object (>0)
         return []
     N = len(occupancy)
     locations = [-1 for im in range(0, Nm)]
-
-    # "Nreduced" is the number of available sites in the "reduced" lattice.
-    # Putting objects of width 1 (lattice site) in the reduced lattice
-    # gives you the same number of choices that you would have by putting
-    # objects of variable width in the original lattice.
-    # So we will place width 1 objects in the reduced lattice, randomize their
-    # position, and then figure out where they would be in the original lattice
-    # by inserting widths[im]-1 new lattice sites following each object placment.
-    # (Unfortunately, by placing objects in the reduced lattice, it's not
-    #  obvious where they end up in the original lattice.  So its difficult
-    #  to take into consideration which sites in the original lattice previously
-    #  occupied and not available.  We will have to correct for overlaps with
-    #  previously occupied sites later.  This is a limitation of this approach.)
-
-    sum_widths = 0
-    for im in range(0, Nm):
-        sum_widths += widths[im]
-
-    Nreduced = N - (sum_widths - Nm)  # size of the reduced lattice
-
-    if Nreduced < Nm:
-        raise InputError('Error('+g_program_name+'): Not enough space.\n')
-    occupancy_reduced = [ -1 for im in range(0, Nreduced)]
-    for im in range(0, Nm):
-        occupancy_reduced[im] = im
     if rand_seed != None:
         random.seed(rand_seed)
-    random.shuffle(occupancy_reduced)
-    offset = 0
-    if is_periodic:
-        # (complicated boring detail)  By definition, each modification
-        # occupies "self.widths[im]" monomers in the polymer.
-        # In principle, the modification could occupy sites on the
-        # polymer which cross the boundary between the last monomer
-        # and the first monomer.  To allow this to happen, assume this does
-        # not happen (as we have done so far), and then cyclically shift
-        # the entries.  (The shift amount should be a random integer from
-        # 0, max(widths)-1)
-        offset = random.randint(0, max(widths)-1)
-
-    # Index variables
-    # im  =  which integer are we generating (ie. which object are we locating)
-    # Ir =  which position in the reduced size lattice are we considering?
-    # I  =  which position in the full size lattice are we considering?
 
-    i = 0
-    for ir in range(0, Nreduced):
-        im = occupancy_reduced[ir]
-        if im != -1:
-            # Then "i" is the target site (in the original lattice) for
-            # the im'th object we want to place.  Figure out whether site "i"
-            # is available.  If not, find the nearest available site.
-            J = FindNearestAvailableSite(i+offset,
-                                         widths[im],
-                                         occupancy,
-                                         is_periodic)
+    intervals = FindFreeIntervals(occupancy, is_periodic)
+
+    if intervals == [(0, N)]:
+        # "Nreduced" is the number of available sites in the "reduced" lattice.
+        # Putting objects of width 1 (lattice site) in the reduced lattice
+        # gives you the same number of choices that you would have by putting
+        # objects of variable width in the original lattice.
+        # So we will place width 1 objects in the reduced lattice, randomize
+        # their position, and then figure out where they would be in the
+        # original lattice by inserting widths[im]-1 new lattice sites
+        # following each object placment.
+        sum_widths = sum(widths)
+        Nreduced = N - (sum_widths - Nm)  # size of the reduced lattice
+        if Nreduced < Nm:
+            raise InputError('Error('+g_program_name+'): Not enough space.\n')
+        sites_reduced = sorted(random.sample(range(0, Nreduced), Nm))
+        order = list(range(0, Nm))
+        random.shuffle(order)
+        offset = 0
+        if is_periodic:
+            # (complicated boring detail)  By definition, each modification
+            # occupies "self.widths[im]" monomers in the polymer.
+            # In principle, the modification could occupy sites on the
+            # polymer which cross the boundary between the last monomer
+            # and the first monomer.  To allow this to happen, assume this does
+            # not happen (as we have done so far), and then cyclically shift
+            # the entries.  (The shift amount should be a random integer from
+            # 0, max(widths)-1)
+            offset = random.randint(0, max(widths)-1)
+        extra = 0  # extra sites inserted so far (to make room for wide objects)
+        for ir in range(0, Nm):
+            im = order[ir]
+            locations[im] = (sites_reduced[ir] + extra + offset) % N
+            extra += widths[im] - 1
+
+    else:
+        # Place the widest objects first.  (For objects of the same width,
+        # the order they are placed in does not matter, but it does determine
+        # which object ends up at which location.  So randomize it.)
+        order = list(range(0, Nm))
+        random.shuffle(order)
+        order.sort(key=lambda im: -widths[im])
+        sampler = _FreeIntervalSampler(intervals, len(intervals) + Nm)
+        for n in range(0, Nm):
+            im = order[n]
+            if widths[im] != sampler.width:
+                sampler.SetWidth(widths[im])
+            J = sampler.Choose(Nm - n)
             if J == -1:
                 return None   #packing was unsuccessful during this attempt
-            locations[im] = J
-            for d in range(0, widths[im]):
-                assert(occupancy[(J+d) % N] == False)
-                occupancy[(J+d) % N] = True
-            i += widths[im]
-        else:
-            i += 1
+            locations[im] = J % N
+
+    _MarkOccupied(locations, widths, occupancy)
 
     for im in range(0, Nm):         # error check: make sure that we remembered
         assert(locations[im] != -1) # to specify all the entries in locations[]
@@ -272,30 +588,22 @@ def DistributeRandom(widths,           # the width of each object (>0)
     """
     Generate random non-overlapping integers in a 1-D lattice, taking care to
     avoid previously occupied lattice sites. Each integer has width "widths[im]",
-    meaning that it occupies "widths[im]" sites on the lattice.  (The algorithm
-    places each integer by inserting random amounts of space between them,
-    taking into consideration their widths and the total lattice size.) Overlaps
-    between integers with eachother and previously occupied sites are avoided.
-    When there are previously occupied lattice sites, the algorithm used here
-    is not smart enough to guarantee that it will place the objects in a truly
-    random way, or even succeed in placing them all.  So this function will
-    attempt random placements a certain number of times before giving up.
-    However, for sparsely occupied lattices, the number of attempts before
-    success is O(1), and each attempt requires O(N) time (N=size of lattice)
-    resulting in a running time of O(N), in that case.
+    meaning that it occupies "widths[im]" sites on the lattice.
+    (See _DistributeRandom() for details.)  If the objects have equal widths,
+    the first attempt always succeeds (if there is room).  Otherwise,
+    this function will attempt random placements a certain number of times
+    before giving up.
     """
     if rand_seed == None:
         rand_seed = random.randrange(sys.maxsize)
 
     for a in range(0, num_attempts):
-        occupancy_cpy = [i for i in occupancy] # a fresh copy of occupancy array
+        # (_DistributeRandom() only modifies occupancy if successful)
         L = _DistributeRandom(widths,
-                              occupancy_cpy,
+                              occupancy,
                               is_periodic,
                               rand_seed + a)
         if L != None:
-            for i in range(0, len(occupancy)):  # if successful, then
-                occupancy[i] = occupancy_cpy[i] # copy back into occupancy array
             break
     if L == None:
         raise InputError('Error('+g_program_name+
@@ -736,7 +1044,7 @@ class GPModSettings(object):
         if self.N == 0:
             raise InputError('Error: You must specify the length of the polymer\n'
                              '       using the "-length N" argument.\n')
-        self.occupancy = [ False for i in range(0, self.N) ]
+        self.occupancy = [False] * self.N
 
         if mod_locations_filename != '':
             self.LoadModLocations(mod_locations_filename)
@@ -789,7 +1097,7 @@ class GPModSettings(object):
         # we update the "occupancy" array. (We might have done this already.)
         for i in range(0, self.nmods):
             for j in range(0, self.widths[i]):
-                self.occupancy[self.locations[i]+j % self.N] = True
+                self.occupancy[(self.locations[i]+j) % self.N] = True
 
 
 
@@ -808,11 +1116,44 @@ class GenPolyMod(object):
         # The remaining arguments will be handled below.
         self.settings.ParseArgs(argv)
 
+    def _InteractionLines(self, kind, types, atoms, index_offsets):
+        """
+        Return a list of lines (for the "Data Bonds", "Data Angles", ...
+        sections) containing one interaction of every type in "types",
+        for every modification location.
+        """
+        N = self.settings.N
+        connect_ends = self.settings.connect_ends
+        l = []
+        for im in range(0, self.settings.nmods):
+            i = self.settings.locations[im]
+            if (not connect_ends) and ((i+1) // N != 0):
+                continue
+            for b in range(0, len(types)):
+                I = [i + offset for offset in index_offsets[b]]
+                if (not connect_ends) and any([Ii // N != 0 for Ii in I]):
+                    continue
+                if len(types) > 1:
+                    l.append('    $'+kind+':gpm_'+kind+str(b+1)+'_'+str(i+1))
+                else:
+                    l.append('    $'+kind+':gpm_'+kind+'_'+str(i+1))
+                l.append(' @'+kind+':' + types[b])
+                for n in range(0, len(I)):
+                    l.append(' $atom:mon[' + str(I[n] % N) + ']/' + atoms[b][n])
+                l.append('\n')
+        return l
+
+
     def WriteLTFile(self, outfile):
 
         if self.settings.nmods == 0:
             return
 
+        # (For speed, the text in each section is accumulated in a list of
+        #  strings "l" and written all at once.)
+        N = self.settings.N
+        connect_ends = self.settings.connect_ends
+
         if self.settings.polymer_name != '':
             outfile.write(self.settings.polymer_name + ' {\n')
             outfile.write('\n'
@@ -826,37 +1167,34 @@ class GenPolyMod(object):
                           '  ########### Modifications using the "set" command ##########\n')
 
             for b in range(0, len(self.settings.setatoms_filename)):
-                outfile.write('\n'
-                              '  write("'+self.settings.setatoms_filename[b]+
-                              '") {\n')
-                WrapPeriodic.bounds_err = False
+                l = ['\n'
+                     '  write("'+self.settings.setatoms_filename[b]+
+                     '") {\n']
+                natoms = self.settings.setatoms_natoms[b]
+                # The text following each atom's index is the same everywhere:
+                suffixes = []
+                for n in range(0, natoms):
+                    attribute=self.settings.setatoms_attributes[b][n]
+                    if ((self.settings.setatoms_attribute_name[b] == 'type') and
+                        (attribute.find('@atom:') != 0)):
+                        attribute = '@atom:' + attribute
+                    elif ((self.settings.setatoms_attribute_name[b] == 'mol') and
+                        (attribute.find('$mol:') != 0)):
+                        attribute = '$mol:' + attribute
+                    suffixes.append((self.settings.setatoms_index_offsets[b][n],
+                                     ']/' + self.settings.setatoms_atoms[b][n] +
+                                     ' ' + self.settings.setatoms_attribute_name[b] +
+                                     ' ' + attribute + '\n'))
                 for im in range(0, self.settings.nmods):
                     i = self.settings.locations[im]
-                    ip1 = WrapPeriodic.Wrap(i+1, self.settings.N)
-                    if WrapPeriodic.bounds_err:
-                        WrapPeriodic.bounds_err = False
-                        if not self.settings.connect_ends:
-                            continue
-                    natoms = self.settings.setatoms_natoms[b]
-                    for n in range(0, natoms):
-                        I = i + self.settings.setatoms_index_offsets[b][n]
-                        I = WrapPeriodic.Wrap(I, self.settings.N)
-                        outfile.write('    set atom $atom:mon[' + str(I) + ']/' + self.settings.setatoms_atoms[b][n] +
-                                      ' ' + self.settings.setatoms_attribute_name[b])
-                        attribute=self.settings.setatoms_attributes[b][n]
-                        if ((self.settings.setatoms_attribute_name[b] == 'type') and
-                            (attribute.find('@atom:') != 0)):
-                            attribute = '@atom:' + attribute
-                        elif ((self.settings.setatoms_attribute_name[b] == 'mol') and
-                            (attribute.find('$mol:') != 0)):
-                            attribute = '$mol:' + attribute
-                        outfile.write(' ' + attribute + '\n')
-                    if WrapPeriodic.bounds_err:
-                        WrapPeriodic.bounds_err = False
-                        if not self.settings.connect_ends:
-                            continue
-                outfile.write('  }  # set atom '+self.settings.setatoms_attribute_name[b]+' ...\n'
-                              '\n')
+                    if (not connect_ends) and ((i+1) // N != 0):
+                        continue
+                    for offset, suffix in suffixes:
+                        l.append('    set atom $atom:mon[' +
+                                 str((i + offset) % N) + suffix)
+                l.append('  }  # set atom '+self.settings.setatoms_attribute_name[b]+' ...\n'
+                         '\n')
+                outfile.write(''.join(l))
 
         # We can define the fixes that exert extra forces on some of the atoms
         # in the polymer, as well as where (which atoms) do they act on.
@@ -867,34 +1205,26 @@ class GenPolyMod(object):
                           '  # Add nbody interactions mediated by fixes such as "fix restraint" and\n'
                           '  # "fix twist". (These fixes add forces between specific particles).\n')
             for b in range(0, len(self.settings.fix_nbody_filename)):
-                outfile.write('\n'
-                              '  write("'+self.settings.fix_nbody_filename[b] +
-                              '") {\n'
-                              '    fix '+self.settings.fix_nbody_fixID[b] +
-                              ' ' + self.settings.fix_nbody_group[b] + 
-                              ' ' + self.settings.fix_nbody_fixname[b])
-                WrapPeriodic.bounds_err = False
+                l = ['\n'
+                     '  write("'+self.settings.fix_nbody_filename[b] +
+                     '") {\n'
+                     '    fix '+self.settings.fix_nbody_fixID[b] +
+                     ' ' + self.settings.fix_nbody_group[b] +
+                     ' ' + self.settings.fix_nbody_fixname[b]]
+                natoms = self.settings.fix_nbody_natoms[b]
                 for im in range(0, self.settings.nmods):
                     i = self.settings.locations[im]
-                    ip1 = WrapPeriodic.Wrap(i+1, self.settings.N)
-                    if WrapPeriodic.bounds_err:
-                        WrapPeriodic.bounds_err = False
-                        if not self.settings.connect_ends:
-                            continue
-                    outfile.write(' '+self.settings.fix_nbody_keyword[b])
-                    natoms = self.settings.fix_nbody_natoms[b]
+                    if (not connect_ends) and ((i+1) // N != 0):
+                        continue
+                    l.append(' '+self.settings.fix_nbody_keyword[b])
                     for n in range(0, natoms):
                         I = i + self.settings.fix_nbody_index_offsets[b][n]
-                        I = WrapPeriodic.Wrap(I, self.settings.N)
-                        outfile.write(' $atom:mon[' + str(I) + ']/' + self.settings.fix_nbody_atoms[b][n])
-                    outfile.write(' '+self.settings.fix_nbody_params[b])
-                    if WrapPeriodic.bounds_err:
-                        WrapPeriodic.bounds_err = False
-                        if not self.settings.connect_ends:
-                            continue
-                outfile.write('\n'
-                              '  }  # write("fix ...\n'
-                              '\n')
+                        l.append(' $atom:mon[' + str(I % N) + ']/' + self.settings.fix_nbody_atoms[b][n])
+                    l.append(' '+self.settings.fix_nbody_params[b])
+                l.append('\n'
+                         '  }  # write("fix ...\n'
+                         '\n')
+                outfile.write(''.join(l))
 
 
         if ((len(self.settings.bonds_type) > 0) or
@@ -921,136 +1251,37 @@ class GenPolyMod(object):
         if len(self.settings.bonds_type) > 0:
             outfile.write('\n')
             outfile.write('  write("Data Bonds") {\n')
-            WrapPeriodic.bounds_err = False
-            for im in range(0, self.settings.nmods):
-                i = self.settings.locations[im]
-                ip1 = WrapPeriodic.Wrap(i+1, self.settings.N)
-                if WrapPeriodic.bounds_err:
-                    WrapPeriodic.bounds_err = False
-                    if not self.settings.connect_ends:
-                        continue
-                for b in range(0, len(self.settings.bonds_type)):
-                    I = i + self.settings.bonds_index_offsets[b][0]
-                    J = i + self.settings.bonds_index_offsets[b][1]
-                    I = WrapPeriodic.Wrap(I, self.settings.N)
-                    J = WrapPeriodic.Wrap(J, self.settings.N)
-                    if WrapPeriodic.bounds_err:
-                        WrapPeriodic.bounds_err = False
-                        if not self.settings.connect_ends:
-                            continue
-                    if len(self.settings.bonds_type) > 1:
-                        outfile.write('    $bond:gpm_bond'+str(b+1)+'_'+str(i+1))
-                    else:
-                        outfile.write('    $bond:gpm_bond_'+str(i+1))
-                    outfile.write(' @bond:' + self.settings.bonds_type[b] +
-                                  ' $atom:mon[' + str(I) + ']/' + self.settings.bonds_atoms[b][0] +
-                                  ' $atom:mon[' + str(J) + ']/' + self.settings.bonds_atoms[b][1] +
-                                  '\n')
+            outfile.write(''.join(self._InteractionLines('bond',
+                                                 self.settings.bonds_type,
+                                                 self.settings.bonds_atoms,
+                                                 self.settings.bonds_index_offsets)))
             outfile.write('  }  # write("Data Bonds")\n')
 
         if len(self.settings.angles_type) > 0:
             outfile.write('\n')
             outfile.write('  write("Data Angles") {\n')
-            WrapPeriodic.bounds_err = False
-            for im in range(0, self.settings.nmods):
-                i = self.settings.locations[im]
-                ip1 = WrapPeriodic.Wrap(i+1, self.settings.N)
-                if WrapPeriodic.bounds_err:
-                    WrapPeriodic.bounds_err = False
-                    if not self.settings.connect_ends:
-                        continue
-                for b in range(0, len(self.settings.angles_type)):
-                    I = i + self.settings.angles_index_offsets[b][0]
-                    J = i + self.settings.angles_index_offsets[b][1]
-                    K = i + self.settings.angles_index_offsets[b][2]
-                    I = WrapPeriodic.Wrap(I, self.settings.N)
-                    J = WrapPeriodic.Wrap(J, self.settings.N)
-                    K = WrapPeriodic.Wrap(K, self.settings.N)
-                    if WrapPeriodic.bounds_err:
-                        WrapPeriodic.bounds_err = False
-                        if not self.settings.connect_ends:
-                            continue
-                    if len(self.settings.angles_type) > 1:
-                        outfile.write('    $angle:gpm_angle'+str(b+1)+'_'+str(i+1))
-                    else:
-                        outfile.write('    $angle:gpm_angle_'+str(i+1))
-                    outfile.write(' @angle:' + self.settings.angles_type[b] +
-                                  ' $atom:mon[' + str(I) + ']/' + self.settings.angles_atoms[b][0] +
-                                  ' $atom:mon[' + str(J) + ']/' + self.settings.angles_atoms[b][1] +
-                                  ' $atom:mon[' + str(K) + ']/' + self.settings.angles_atoms[b][2] +
-                                  '\n')
+            outfile.write(''.join(self._InteractionLines('angle',
+                                                 self.settings.angles_type,
+                                                 self.settings.angles_atoms,
+                                                 self.settings.angles_index_offsets)))
             outfile.write('  }  # write("Data Angles")\n')
 
         if len(self.settings.dihedrals_type) > 0:
             outfile.write('\n')
             outfile.write('  write("Data Dihedrals") {\n')
-            WrapPeriodic.bounds_err = False
-            for im in range(0, self.settings.nmods):
-                i = self.settings.locations[im]
-                ip1 = WrapPeriodic.Wrap(i+1, self.settings.N)
-                if WrapPeriodic.bounds_err:
-                    WrapPeriodic.bounds_err = False
-                    if not self.settings.connect_ends:
-                        continue
-                for b in range(0, len(self.settings.dihedrals_type)):
-                    I = i + self.settings.dihedrals_index_offsets[b][0]
-                    J = i + self.settings.dihedrals_index_offsets[b][1]
-                    K = i + self.settings.dihedrals_index_offsets[b][2]
-                    L = i + self.settings.dihedrals_index_offsets[b][3]
-                    I = WrapPeriodic.Wrap(I, self.settings.N)
-                    J = WrapPeriodic.Wrap(J, self.settings.N)
-                    K = WrapPeriodic.Wrap(K, self.settings.N)
-                    L = WrapPeriodic.Wrap(L, self.settings.N)
-                    if WrapPeriodic.bounds_err:
-                        WrapPeriodic.bounds_err = False
-                        if not self.settings.connect_ends:
-                            continue
-                    if len(self.settings.dihedrals_type) > 1:
-                        outfile.write('    $dihedral:gpm_dihedral'+str(b+1)+'_'+str(i+1))
-                    else:
-                        outfile.write('    $dihedral:gpm_dihedral_'+str(i+1))
-                    outfile.write(' @dihedral:' + self.settings.dihedrals_type[b] +
-                                  ' $atom:mon[' + str(I) + ']/' + self.settings.dihedrals_atoms[b][0] +
-                                  ' $atom:mon[' + str(J) + ']/' + self.settings.dihedrals_atoms[b][1] +
-                                  ' $atom:mon[' + str(K) + ']/' + self.settings.dihedrals_atoms[b][2] +
-                                  ' $atom:mon[' + str(L) + ']/' + self.settings.dihedrals_atoms[b][3] +
-                                  '\n')
+            outfile.write(''.join(self._InteractionLines('dihedral',
+                                                 self.settings.dihedrals_type,
+                                                 self.settings.dihedrals_atoms,
+                                                 self.settings.dihedrals_index_offsets)))
             outfile.write('  }  # write("Data Dihedrals")\n')
 
         if len(self.settings.impropers_type) > 0:
             outfile.write('\n')
             outfile.write('  write("Data Impropers") {\n')
-            WrapPeriodic.bounds_err = False
-            for im in range(0, self.settings.nmods):
-                i = self.settings.locations[im]
-                ip1 = WrapPeriodic.Wrap(i+1, self.settings.N)
-                if WrapPeriodic.bounds_err:
-                    WrapPeriodic.bounds_err = False
-                    if not self.settings.connect_ends:
-                        continue
-                for b in range(0, len(self.settings.impropers_type)):
-                    I = i + self.settings.impropers_index_offsets[b][0]
-                    J = i + self.settings.impropers_index_offsets[b][1]
-                    K = i + self.settings.impropers_index_offsets[b][2]
-                    L = i + self.settings.impropers_index_offsets[b][3]
-                    I = WrapPeriodic.Wrap(I, self.settings.N)
-                    J = WrapPeriodic.Wrap(J, self.settings.N)
-                    K = WrapPeriodic.Wrap(K, self.settings.N)
-                    L = WrapPeriodic.Wrap(L, self.settings.N)
-                    if WrapPeriodic.bounds_err:
-                        WrapPeriodic.bounds_err = False
-                        if not self.settings.connect_ends:
-                            continue
-                    if len(self.settings.impropers_type) > 1:
-                        outfile.write('    $improper:gpm_improper'+str(b+1)+'_'+str(i+1))
-                    else:
-                        outfile.write('    $improper:gpm_improper_'+str(i+1))
-                    outfile.write(' @improper:' + self.settings.impropers_type[b] +
-                                  ' $atom:mon[' + str(I) + ']/' + self.settings.impropers_atoms[b][0] +
-                                  ' $atom:mon[' + str(J) + ']/' + self.settings.impropers_atoms[b][1] +
-                                  ' $atom:mon[' + str(K) + ']/' + self.settings.impropers_atoms[b][2] +
-                                  ' $atom:mon[' + str(L) + ']/' + self.settings.impropers_atoms[b][3] +
-                                  '\n')
+            outfile.write(''.join(self._InteractionLines('improper',
+                                                 self.settings.impropers_type,
+                                                 self.settings.impropers_atoms,
+                                                 self.settings.impropers_index_offsets)))
             outfile.write('  }  # write("Data Impropers")  \n')
 
         if self.settings.polymer_name != '':
@@ -1084,15 +1315,15 @@ def main():
 
         if gen_poly_mod.settings.write_locations_file != '':
             f = open(gen_poly_mod.settings.write_locations_file, 'w')
-            for im in range(0, gen_poly_mod.settings.nmods):
-                f.write(str(gen_poly_mod.settings.locations[im])+'\n')
+            f.write(''.join([str(i)+'\n'
+                             for i in gen_poly_mod.settings.locations]))
             f.close()
 
         if gen_poly_mod.settings.write_occupancy_file != '':
             f = open(gen_poly_mod.settings.write_occupancy_file, 'w')
-            for i in range(0, gen_poly_mod.settings.N):
-                if gen_poly_mod.settings.occupancy[i]:
-                    f.write(str(i)+'\n')
+            f.write(''.join([str(i)+'\n' for i, occupied in
+                             enumerate(gen_poly_mod.settings.occupancy)
+                             if occupied]))
             f.close()
 
         # Convert all of this information to moltemplate (LT) format:
@@ -6,13 +6,14 @@
 # All rights reserved.
 
 g_program_name = __file__.split('/')[-1]  # = 'interpolate_curve.py'
-g_version_str = '0.3.1'
-g_date_str = '2020-4-11'
+g_version_str = '0.4.0'
+g_date_str = '2026-10-19'
 
 g_usage_str = """
 Usage:
 
-   """ + g_program_name + """ Ndesired [scale] [alpha] < coords_orig.raw > coords.raw
+   """ + g_program_name + """ [-uniform-arc-length] Ndesired [scale] [alpha] \\
+          < coords_orig.raw > coords.raw
 
 Example:
 
@@ -24,17 +25,13 @@ Example:
 import sys
 from math import *
 import numpy as np
-import bisect
 
 
 
-## Tri Diagonal Matrix Algorithm(a.k.a Thomas algorithm) solver stolen from:
+## Tri Diagonal Matrix Algorithm(a.k.a Thomas algorithm) solver adapted from:
 # https://gist.github.com/cbellei/8ab3ab8551b8dfc8b081c518ccd9ada9
 # (also taken from https://gist.github.com/ofan666/1875903)
 
-import numpy as np
-
-## Tri Diagonal Matrix Algorithm(a.k.a Thomas algorithm) solver
 def TDMAsolver(a, b, c, d):
     '''
     TDMA solver, a b c d can be NumPy array type or Python list type.
@@ -43,19 +40,31 @@ def TDMAsolver(a, b, c, d):
       a_i*x_{i-1} + b_i*x_i + c_i*x_{i+1} = d_i
       where a_1=0, and c_n=0
 
+    "d" can be either a 1-dimensional array (containing n numbers), or a
+    2-dimensional array (with n rows).  In the latter case, the system is
+    solved for every column of "d" simultaneously (and the result has the
+    same shape as "d").  The elimination step only depends on a, b, and c,
+    so it is only carried out once, regardless of the number of columns.
+
     refer to http://en.wikipedia.org/wiki/Tridiagonal_matrix_algorithm
     and to http://www.cfd-online.com/Wiki/Tridiagonal_matrix_algorithm_-_TDMA_(Thomas_algorithm)
     '''
     nf = len(d) # number of equations
-    ac, bc, cc, dc = map(np.array, (a, b, c, d)) # copy arrays
+    # (Using python floats for the scalar coefficients is much faster
+    #  than indexing numpy arrays one element at a time.)
+    ac = [float(x) for x in a]
+    bc = [float(x) for x in b]
+    cc = [float(x) for x in c]
+    dc = np.array(d, dtype=float) # copy array
+    mc = [0.0] * nf
+    for it in range(1, nf):
+        mc[it] = ac[it]/bc[it-1]
+        bc[it] = bc[it] - mc[it]*cc[it-1]
     for it in range(1, nf):
-        mc = ac[it-1]/bc[it-1]
-        bc[it] = bc[it] - mc*cc[it-1] 
-        dc[it] = dc[it] - mc*dc[it-1]
-        	    
-    xc = bc
-    xc[-1] = dc[-1]/bc[-1]
+        dc[it] -= mc[it]*dc[it-1]
 
+    xc = dc
+    xc[-1] /= bc[-1]
     for il in range(nf-2, -1, -1):
         xc[il] = (dc[il]-cc[il]*xc[il+1])/bc[il]
 
@@ -64,26 +73,24 @@ def TDMAsolver(a, b, c, d):
 
 
 def CalcNaturalCubicSplineCoeffs(r, spline_exponent_alpha=0.5):
+    r = np.asarray(r, dtype=float)
     N = len(r)
     assert(N >= 4)
     D = len(r[0])
-    tcontrol = np.zeros(N)
 
-    # e_d2rdt2[d][i] is the second derivative of the spline at the ith 
+    # e_d2rdt2[i][d] is the second derivative of the spline at the ith
     #               control point (and in the dth direction)
     #
-    # Once we have figured out e_d2rdt2[d][i], we can calculate the spline
+    # Once we have figured out e_d2rdt2[i][d], we can calculate the spline
     # anywhere using:
-    #   SplineEval(t, h_i, 
-    #              e_{i+1} / (6*h_i), 
+    #   SplineEval(t, h_i,
+    #              e_{i+1} / (6*h_i),
     #              e_i / (6*h_{i+1}),
     #              r_{i+1}/h_i - e_{i+1}*h_i,
     #              r_i/h_i - e_i*h_i)
-
-    e_d2rdt2 = np.zeros((D,N))
-
+    #
     # We want to solve this system of equations for e_1, e_2, ..., e_{n-2}:
-    #    (note: e_i is shorthand for e_d2rdt2[d][i])
+    #    (note: e_i is shorthand for e_d2rdt2[i][d])
     #
     # h_{i-1}*e_{i-1} + u_i*e_i + h_{i+1} * e_{i+1}  =  v_i
     #   where h_i, u_i and v_i are shorthand for:
@@ -99,78 +106,48 @@ def CalcNaturalCubicSplineCoeffs(r, spline_exponent_alpha=0.5):
     # e_0 = 0       <-- first control point  (indexing begins at 0)
     # e_{n-1} = 0   <-- this is the last control point  (indexing begins at 0)
 
-    h_dt = np.zeros(N-1)   # h_dt[i] is the i'th time interval 
-                         # in the parameterization
-    b_drdt = np.zeros((N-1,D))  # b_drdt is a discrete version of the derivative
-
-    t_total=0.0
-    for i in range(0, N-1):
-        tcontrol[i] = t_total
-        sqr_distance_i_ip1 = 0.0
-        for d in range(0, D):
-            sqr_distance_i_ip1 += (r[i+1][d] - r[i][d])**2
-        h_dt[i] = sqr_distance_i_ip1**(0.5*spline_exponent_alpha)
-        for d in range(0, D):
-            b_drdt[i][d] = (r[i+1][d] - r[i][d]) / h_dt[i]
-        t_total += h_dt[i]
-    tcontrol[N-1] = t_total
+    dr = r[1:] - r[:-1]
+    # h_dt[i] is the i'th time interval in the parameterization
+    h_dt = np.sum(dr*dr, axis=1)**(0.5*spline_exponent_alpha)
+    # b_drdt is a discrete version of the derivative
+    b_drdt = dr / h_dt[:, np.newaxis]
+    tcontrol = np.zeros(N)
+    tcontrol[1:] = np.cumsum(h_dt)
 
+    # h_dt[i] is the difference in "time" in the parametric curve
+    # between pairs of control points.  If spline_exponenent_alpha is 0
+    # then the time interval between control points is uniform.
+    # ("spline_exponent_alpha" is 0.5 for centripital Catmull-Rom splines.)
     a_coeff = np.zeros(N)
-    b_coeff = np.zeros(N)
+    b_coeff = np.ones(N)
     c_coeff = np.zeros(N)
-    d_coeff = np.zeros((D,N))
-
-    for i in range(1, N-1):
-        # h_dt[i] is the difference in "time" in the parametric curve 
-        # between pairs of control points.  If spline_exponenent_alpha is 0
-        # then the time interval between control points is uniform.
-        # ("spline_exponent_alpha" is 0.5 for centripital Catmull-Rom splines.)
-        a_coeff[i]    =      h_dt[i-1]
-        b_coeff[i]    = 2.0*(h_dt[i-1] + h_dt[i])
-        c_coeff[i]    =      h_dt[i]
-        for d in range(0, D):
-            d_coeff[d][i] = 6.0*(b_drdt[i][d] - b_drdt[i-1][d])
-
-    a_coeff[0] = 0.0
-    b_coeff[0] = 1.0
-    c_coeff[0] = 0.0
-    for d in range(0, D):
-        d_coeff[d][0] = 0.0
-    a_coeff[N-1] = 0.0
-    b_coeff[N-1] = 1.0
-    c_coeff[N-1] = 0.0
-    for d in range(0, D):
-        d_coeff[d][N-1] = 0.0
-
-    for d in range(0, D):
-        e_d2rdt2[d] = TDMAsolver(a_coeff, b_coeff, c_coeff, d_coeff[d])
+    d_coeff = np.zeros((N, D))
+    a_coeff[1:N-1] = h_dt[:-1]
+    b_coeff[1:N-1] = 2.0*(h_dt[:-1] + h_dt[1:])
+    c_coeff[1:N-1] = h_dt[1:]
+    d_coeff[1:N-1] = 6.0*(b_drdt[1:] - b_drdt[:-1])
+
+    # Solve for all D directions at once.
+    e_d2rdt2 = TDMAsolver(a_coeff, b_coeff, c_coeff, d_coeff)
 
     # alternately, if that fails, try the matrix inverter that comes with numpy:
-    #M = np.zeros((N,N))
-    #for i in range(0,N):
-    #    if i-1>=0:
-    #        M[i][i-1] = a_coeff[i]
-    #    M[i][i]   = b_coeff[i]
-    #    if i+1 < N:
-    #        M[i][i+1] = c_coeff[i]
-    #for d in range(0, D):
-    #    e_d2rdt2[d] = np.linalg.solve(M, d_coeff[d])
-
-    e_d2rdt2 = e_d2rdt2.transpose()
+    #M = np.diag(b_coeff) + np.diag(a_coeff[1:], -1) + np.diag(c_coeff[:-1], 1)
+    #e_d2rdt2 = np.linalg.solve(M, d_coeff)
+
     c3a = np.zeros((N, D))
     c3b = np.zeros((N, D))
     c1a = np.zeros((N, D))
     c1b = np.zeros((N, D))
     # faster to precompute these coefficients in advance:
-    for i in range(0, N-1):
-        # c3a = e_{i+1} / (6*h_i)
-        # c3b =     e_i / (6*h_{i+1})
-        # c1a = r_{i+1}/h_i - e_{i+1}*h_i
-        # c1b =  r_i / h_i - e_i*h_i)
-        c3a[i] = e_d2rdt2[i+1] / (6*h_dt[i])
-        c3b[i] = e_d2rdt2[i]   / (6*h_dt[i])
-        c1a[i] = r[i+1]/h_dt[i]  -  e_d2rdt2[i+1]*h_dt[i]/6.0
-        c1b[i] = r[i]/h_dt[i]    -  e_d2rdt2[i]*h_dt[i]/6.0
+    # c3a = e_{i+1} / (6*h_i)
+    # c3b =     e_i / (6*h_{i+1})
+    # c1a = r_{i+1}/h_i - e_{i+1}*h_i
+    # c1b =  r_i / h_i - e_i*h_i)
+    h = h_dt[:, np.newaxis]
+    c3a[:N-1] = e_d2rdt2[1:] / (6*h)
+    c3b[:N-1] = e_d2rdt2[:-1] / (6*h)
+    c1a[:N-1] = r[1:]/h  -  e_d2rdt2[1:]*h/6.0
+    c1b[:N-1] = r[:-1]/h  -  e_d2rdt2[:-1]*h/6.0
 
     # Return these spline coefficients to the caller.
     # We can use these to quickly evaluate the spline repetatively later on
@@ -202,53 +179,166 @@ def SplineEvalD2(t, t_interval, c3a, c3b, c1a, c1b):
 
 
 
+def SplineIntervals(t, tcontrol):
+    """
+    Return the index of the interval (between successive control points)
+    containing each "time" in t.  (t can be a number or an array.)
+    Values of t which lie outside the range of tcontrol are assigned to the
+    first or last interval.
+    """
+    i = np.searchsorted(tcontrol, t, side='right') - 1
+    return np.clip(i, 0, len(tcontrol)-2)
+
+
+
+def _SplineLocate(t, tcontrol):
+    """
+    Return the interval index (i) for each t, as well as the time elapsed
+    since the start of that interval, and the interval's duration.
+    If t is an array, the last two are returned as column vectors so that
+    they can be multiplied by the (per-interval) coefficient arrays.
+    """
+    t = np.asarray(t, dtype=float)
+    i = SplineIntervals(t, tcontrol)
+    ta = t - tcontrol[i]
+    h = tcontrol[i+1] - tcontrol[i]
+    if t.ndim > 0:
+        ta = ta[..., np.newaxis]
+        h = h[..., np.newaxis]
+    return i, ta, h
+
+
+
 def SplineInterpEval(t, c3a, c3b, c1a, c1b, tcontrol):
-    i = bisect.bisect(tcontrol, t) - 1
-    if i < 0: i = 0
-    if i >= len(tcontrol)-1: i = len(tcontrol)-2
-    return SplineEval(t-tcontrol[i], tcontrol[i+1]-tcontrol[i],
-                      c3a[i], c3b[i], c1a[i], c1b[i])
+    """
+    Evaluate the spline at "time" t.  If t is an array of length M,
+    an array of M points (with shape (M, D)) is returned.
+    """
+    i, ta, h = _SplineLocate(t, tcontrol)
+    return SplineEval(ta, h, c3a[i], c3b[i], c1a[i], c1b[i])
+
 
 
 def SplineInterpEvalD1(t, c3a, c3b, c1a, c1b, tcontrol):
-    i = bisect.bisect(tcontrol, t) - 1
-    if i < 0: i = 0
-    if i >= len(tcontrol)-1: i = len(tcontrol)-2
-    return SplineEvalD1(t-tcontrol[i], tcontrol[i+1]-tcontrol[i],
-                        c3a[i], c3b[i], c1a[i], c1b[i])
+    i, ta, h = _SplineLocate(t, tcontrol)
+    return SplineEvalD1(ta, h, c3a[i], c3b[i], c1a[i], c1b[i])
 
 
 
 def SplineInterpEvalD2(t, c3a, c3b, c1a, c1b, tcontrol):
-    i = bisect.bisect(tcontrol, t) - 1
-    if i < 0: i = 0
-    if i >= len(tcontrol)-1: i = len(tcontrol)-2
-    return SplineEvalD2(t-tcontrol[i], tcontrol[i+1]-tcontrol[i],
-                        c3a[i], c3b[i], c1a[i], c1b[i])
+    i, ta, h = _SplineLocate(t, tcontrol)
+    return SplineEvalD2(ta, h, c3a[i], c3b[i], c1a[i], c1b[i])
 
 
 
 def SplineCurvature2D(t, t_interval, c3a, c3b, c1a, c1b):
     # first derivatives
-    x1,y1 = SplineEvalD1(t, t_interval, c3a, c3b, c1a, c1b)
+    d1 = SplineEvalD1(t, t_interval, c3a, c3b, c1a, c1b)
     # second derivatives
-    x2,y2 = SplineEvalD2(t, t_interval, c3a, c3b, c1a, c1b)
-    denom = pow((x1*x1 + y1*y1), 1.5)
+    d2 = SplineEvalD2(t, t_interval, c3a, c3b, c1a, c1b)
+    x1 = d1[..., 0]
+    y1 = d1[..., 1]
+    x2 = d2[..., 0]
+    y2 = d2[..., 1]
+    denom = (x1*x1 + y1*y1)**1.5
     curvature = (x1*y2 - x2*y1) / denom
     return curvature
 
 
 
 def SplineInterpCurvature2D(t, c3a, c3b, c1a, c1b, tcontrol):
-    i = bisect.bisect(tcontrol, t) - 1
-    if i < 0: i = 0
-    if i >= len(tcontrol)-1: i = len(tcontrol)-2
-    return SplineCurvature2D(t-tcontrol[i], tcontrol[i+1]-tcontrol[i],
-                             c3a[i], c3b[i], c1a[i], c1b[i])
+    i, ta, h = _SplineLocate(t, tcontrol)
+    return SplineCurvature2D(ta, h, c3a[i], c3b[i], c1a[i], c1b[i])
 
 
 
-def ResampleCurve(x_orig, num_points, alpha=0.5):
+def SplineInterpCurvature(t, c3a, c3b, c1a, c1b, tcontrol):
+    """
+    Return the (unsigned) curvature of the spline at "time" t,
+    in any number of dimensions.  (t can be a number or an array.)
+    """
+    i, ta, h = _SplineLocate(t, tcontrol)
+    d1 = SplineEvalD1(ta, h, c3a[i], c3b[i], c1a[i], c1b[i])
+    d2 = SplineEvalD2(ta, h, c3a[i], c3b[i], c1a[i], c1b[i])
+    d1d1 = np.sum(d1*d1, axis=-1)
+    d2d2 = np.sum(d2*d2, axis=-1)
+    d1d2 = np.sum(d1*d2, axis=-1)
+    # |r' x r''| = sqrt(|r'|^2 |r''|^2 - (r'.r'')^2)   (in any dimension)
+    cross = np.sqrt(np.maximum(d1d1*d2d2 - d1d2*d1d2, 0.0))
+    return cross / d1d1**1.5
+
+
+
+# Gauss-Legendre quadrature points and weights (on the interval [-1,1]),
+# used for integrating the speed of the spline to obtain its length.
+_gauss_x, _gauss_w = np.polynomial.legendre.leggauss(5)
+
+
+
+def _SplineLengths(t_start, t_stop, c3a, c3b, c1a, c1b, tcontrol):
+    """
+    Return the length of the curve between t_start and t_stop (which are
+    arrays).  Each pair of times must lie within the same interval.
+    """
+    half = 0.5*(t_stop - t_start)
+    mid = 0.5*(t_stop + t_start)
+    length = np.zeros(len(t_start))
+    for x, w in zip(_gauss_x, _gauss_w):
+        v = SplineInterpEvalD1(mid + half*x, c3a, c3b, c1a, c1b, tcontrol)
+        length += w * np.sqrt(np.sum(v*v, axis=1))
+    return length * half
+
+
+
+def SplineArcLengthTable(c3a, c3b, c1a, c1b, tcontrol, num_subdivisions=8):
+    """
+    Divide each interval of the spline into "num_subdivisions" equal
+    pieces, and return two arrays: the "time" at the boundary between each
+    piece (t_table), and the distance along the curve to that point (s_table).
+    """
+    h = tcontrol[1:] - tcontrol[:-1]
+    frac = np.arange(num_subdivisions) / float(num_subdivisions)
+    t_table = (tcontrol[:-1, np.newaxis] + h[:, np.newaxis]*frac).ravel()
+    t_table = np.append(t_table, tcontrol[-1])
+    s_table = np.zeros(len(t_table))
+    s_table[1:] = np.cumsum(_SplineLengths(t_table[:-1], t_table[1:],
+                                           c3a, c3b, c1a, c1b, tcontrol))
+    return t_table, s_table
+
+
+
+def SplineArcLengthInverse(s, t_table, s_table,
+                           c3a, c3b, c1a, c1b, tcontrol,
+                           num_iters=3):
+    """
+    Return the "time" at which the curve has traveled distance s.
+    (s is an array.  t_table and s_table are created by SplineArcLengthTable().)
+    The initial guess (by linear interpolation in the table) is improved
+    using Newton's method.
+    """
+    s = np.asarray(s, dtype=float)
+    j = np.clip(np.searchsorted(s_table, s, side='right') - 1,
+                0, len(s_table)-2)
+    t_lo = t_table[j]
+    t_hi = t_table[j+1]
+    s_lo = s_table[j]
+    ds = s_table[j+1] - s_lo
+    ds[ds == 0.0] = 1.0   # (avoid division by zero for degenerate pieces)
+    t = t_lo + (t_hi - t_lo) * np.clip((s - s_lo) / ds, 0.0, 1.0)
+    for iter in range(0, num_iters):
+        err = s_lo + _SplineLengths(t_lo, t,
+                                    c3a, c3b, c1a, c1b, tcontrol) - s
+        v = SplineInterpEvalD1(t, c3a, c3b, c1a, c1b, tcontrol)
+        speed = np.sqrt(np.sum(v*v, axis=1))
+        speed[speed == 0.0] = 1.0
+        t = np.clip(t - err / speed, t_lo, t_hi)
+    return t
+
+
+
+def ResampleCurve(x_orig, num_points, alpha=0.5,
+                  uniform_arc_length=False,
+                  chunk_size=65536):
     """
        Given a list (or numpy array) of points in n-dimensional space that lie
     along some curve, this function returns a new list of "num_points" points
@@ -257,11 +347,14 @@ def ResampleCurve(x_orig, num_points, alpha=0.5):
 
     https://en.wikipedia.org/wiki/Cubic_Hermite_spline#Catmull%E2%80%93Rom_spline
 
-       Here "uniformly" means distributed at even intervals in the spline-
+       By default "uniformly" means distributed at even intervals in the spline-
     parameter-space, not in physical distance. (If the original points were
     not uniformly distributed along the curve, then new points won't be either.)
+    If "uniform_arc_length" is True, the new points are instead distributed
+    at even intervals of distance along the (interpolated) curve.
 
-       This function has not been optimized for speed.
+       The points are computed "chunk_size" at a time (to limit the memory
+    needed for temporary arrays when num_points is large).
     """
 
     assert(len(x_orig) >= 4)
@@ -272,10 +365,45 @@ def ResampleCurve(x_orig, num_points, alpha=0.5):
         CalcNaturalCubicSplineCoeffs(x_orig, alpha)
     tmin = 0.0
     tmax = tcontrol[-1]
-    for i in range(0, num_points):
-        t = tmin + i*((tmax - tmin) / (num_points-1))
-        x_new[i] = SplineInterpEval(t, c3a, c3b, c1a, c1b, tcontrol)
+    if uniform_arc_length:
+        t_table, s_table = SplineArcLengthTable(c3a, c3b, c1a, c1b, tcontrol)
+        smax = s_table[-1]
+    for i_start in range(0, num_points, chunk_size):
+        i_stop = min(i_start + chunk_size, num_points)
+        frac = np.arange(i_start, i_stop) / float(max(num_points-1, 1))
+        if uniform_arc_length:
+            t = SplineArcLengthInverse(smax*frac, t_table, s_table,
+                                       c3a, c3b, c1a, c1b, tcontrol)
+        else:
+            t = tmin + (tmax - tmin)*frac
+        x_new[i_start:i_stop] = SplineInterpEval(t, c3a, c3b, c1a, c1b,
+                                                 tcontrol)
+    return x_new
+
 
+
+def ResampleCurveLinear(x_orig, num_points, uniform_arc_length=False):
+    """
+    Similar to ResampleCurve(), however this function uses linear
+    interpolation between successive points.  (It only requires 2 points.)
+    """
+    x_orig = np.asarray(x_orig, dtype=float)
+    n_orig = len(x_orig)
+    assert(n_orig >= 2)
+    if uniform_arc_length:
+        dr = x_orig[1:] - x_orig[:-1]
+        s_control = np.zeros(n_orig)
+        s_control[1:] = np.cumsum(np.sqrt(np.sum(dr*dr, axis=1)))
+        I_orig = np.interp(np.linspace(0.0, s_control[-1], num_points),
+                           s_control, np.arange(n_orig, dtype=float))
+    else:
+        I_orig = np.arange(num_points) * (float(n_orig-1) /
+                                          float(num_points-1))
+    i_orig = np.clip(np.floor(I_orig).astype(int), 0, n_orig-2)
+    i_remainder = (I_orig - i_orig)[:, np.newaxis]
+    x_new = (x_orig[i_orig] +
+             i_remainder*(x_orig[i_orig+1] - x_orig[i_orig]))
+    x_new[-1] = x_orig[-1]
     return x_new
 
 
@@ -305,21 +433,26 @@ def main():
 
         spline_exponent_alpha = 0.5
         use_linear_interpolation = False
+        uniform_arc_length = False
 
         # Parse the argument list:
-        if len(sys.argv) <= 1:
+        argv = sys.argv[1:]
+        if '-uniform-arc-length' in argv:
+            argv.remove('-uniform-arc-length')
+            uniform_arc_length = True
+
+        if len(argv) == 0:
             raise InputError("Missing arguments\n"+g_usage_str+"\n")
-                             
 
-        n_new = int(sys.argv[1])
+        n_new = int(argv[0])
 
-        if len(sys.argv) > 2:
-            scale = float(sys.argv[2])
+        if len(argv) > 1:
+            scale = float(argv[1])
         else:
             scale = 1.0
 
-        if len(sys.argv) > 3:
-            spline_exponent_alpha = float(sys.argv[3])            
+        if len(argv) > 2:
+            spline_exponent_alpha = float(argv[2])
 
         coords_orig = []
 
@@ -344,33 +477,16 @@ def main():
         if n_new < 2:
             raise InputError("Output file will contain less than two lines of coordinates.")
 
-        #coords_new = [[0.0 for d in range(0, g_dim)] for i in range(0, n_new)]
-        x_new = np.zeros((n_new, g_dim))
-
         if use_linear_interpolation:
-            for i_new in range(0, n_new):
-                I_orig = (i_new) * (float(n_orig-1) / float(n_new-1))
-                i_orig = int(floor(I_orig))
-                i_remainder = I_orig - i_orig
-
-                if (i_new < n_new-1):
-                    for d in range(0, g_dim):
-                        x_new[i_new][d] = (x_orig[i_orig][d]
-                                           +
-                                           i_remainder*(x_orig[i_orig+1][d]-
-                                                        x_orig[i_orig][d]))
-                else:
-                    for d in range(0, g_dim):
-                        x_new[i_new][d] = x_orig[n_orig-1][d]
-
+            x_new = ResampleCurveLinear(x_orig, n_new, uniform_arc_length)
         else:
-            x_new = ResampleCurve(x_orig, n_new, spline_exponent_alpha)
+            x_new = ResampleCurve(x_orig, n_new, spline_exponent_alpha,
+                                  uniform_arc_length)
 
         # print the coordates
-        for i in range(0, n_new):
-            for d in range(0, g_dim-1):
-                sys.stdout.write(str(x_new[i][d]*scale) + ' ')
-            sys.stdout.write(str(x_new[i][g_dim-1]*scale) + "\n")
+        x_new *= scale
+        sys.stdout.write(''.join([' '.join(map(str, x)) + '\n'
+                                  for x in x_new.tolist()]))
 
     except (ValueError, InputError) as err:
         sys.stderr.write('\n' + 'Error:\n\n' + str(err) + '\n')
@@ -26,15 +26,15 @@ define large systems containing this molecule.
 """
 
 import sys
+import os
+from bisect import bisect_right
 from collections import defaultdict
+from shutil import copyfileobj
+from tempfile import TemporaryFile
 
 if sys.version < '2.6':
     raise InputError('Error: Using python ' + sys.version + '\n'
                      '       Alas, you must upgrade to a newer version of python (2.7 or later).')
-elif sys.version > '3':
-    from io import StringIO
-else:
-    from StringIO import StringIO
 
 try:
     from .ttree_lex import *
@@ -189,13 +189,98 @@ def MergeIntervals(interval_list):
     while i < len(interval_list):
         if ((interval_list[i - 1][1] == None) or
                 (interval_list[i - 1][1] + 1 >= interval_list[i][0])):
-            interval_list[i - 1] = (interval_list[i - 1]
-                                    [0], interval_list[i][1])
+            if ((interval_list[i - 1][1] == None) or
+                (interval_list[i][1] == None)):
+                b = None
+            else:
+                b = max(interval_list[i - 1][1], interval_list[i][1])
+            interval_list[i - 1] = (interval_list[i - 1][0], b)
             del interval_list[i]
         else:
             i += 1
 
 
+class SelectionIndex(object):
+    """
+    A compiled version of a selection (a list of (a,b) intervals generated
+    by LammpsSelectToIntervals()) which can be searched quickly.
+    Membership is tested using "i in sel", and the result is the same as
+    the result of testing every interval in the original list, one by one:
+    For each interval (a,b), if a is None (or 0), then all numbers <= b
+    belong to the interval.  If b is None, then all numbers >= a belong.
+    If both are None, all numbers belong.  Otherwise, the interval is [a,b].
+
+    Internally, the closed intervals are sorted and merged (using
+    MergeIntervals()) so that the interval containing i can be found with
+    a binary search.  If there are many intervals spanning a modest range
+    of integers (at most max_mask_size), a lookup table (a "mask") is
+    used instead.
+    """
+
+    max_mask_size = 1 << 16       # maximum number of bytes in the mask
+    min_mask_intervals = 16       # fewer intervals are searched with bisect
+
+    def __init__(self, interval_list):
+        # The original list is kept so that len() and iteration still work:
+        self.interval_list = list(interval_list)
+        self.accept_all = False
+        self.below = None  # every i <= self.below belongs to the selection
+        self.above = None  # every i >= self.above belongs to the selection
+        closed = []
+        for interval in self.interval_list:
+            assert(len(interval) == 2)
+            a, b = interval
+            if a:
+                if b == None:
+                    if (self.above == None) or (a < self.above):
+                        self.above = a
+                elif a <= b:
+                    closed.append((a, b))
+            elif b:
+                if (self.below == None) or (b > self.below):
+                    self.below = b
+            else:
+                # The user entered something like "*"
+                self.accept_all = True
+        closed.sort()
+        MergeIntervals(closed)
+        self.starts = [a for (a, b) in closed]
+        self.ends = [b for (a, b) in closed]
+
+        # If there are many intervals packed into a small range of integers,
+        # use a lookup table instead.  (The size of the table is capped, so
+        # that a single wide interval like "1*400000000" never allocates it.)
+        self.mask = None
+        self.mask_offset = 0
+        if len(closed) >= self.min_mask_intervals:
+            span = self.ends[-1] - self.starts[0] + 1
+            if span <= self.max_mask_size:
+                self.mask_offset = self.starts[0]
+                self.mask = bytearray(span)
+                for (a, b) in closed:
+                    self.mask[a - self.mask_offset:
+                              b - self.mask_offset + 1] = b'\x01' * (b - a + 1)
+
+    def __len__(self):
+        return len(self.interval_list)
+
+    def __iter__(self):
+        return iter(self.interval_list)
+
+    def __contains__(self, i):
+        if self.accept_all:
+            return True
+        if (self.below != None) and (i <= self.below):
+            return True
+        if (self.above != None) and (i >= self.above):
+            return True
+        if self.mask != None:
+            k = i - self.mask_offset
+            return (0 <= k < len(self.mask)) and (self.mask[k] != 0)
+        k = bisect_right(self.starts, i) - 1
+        return (k >= 0) and (i <= self.ends[k])
+
+
 def BelongsToSel(i, sel):
     if (i == None) or (sel == None) or (len(sel) == 0):
         # If the user has not specified a selection for this category,
@@ -208,6 +293,9 @@ def BelongsToSel(i, sel):
         else:
             return True
 
+    if isinstance(sel, SelectionIndex):
+        return i in sel
+
     belongs = False
     for interval in sel:
         assert(len(interval) == 2)
@@ -249,6 +337,97 @@ def Stringify(i, int2name, prefix1, prefix2, default_name = ''):
 
 
 
+def AtomTypeStrToInt(atomtypestr):
+    # remove the "@atom:" prefix (if present) and convert to an integer
+    if atomtypestr.find('@atom:') == 0:
+        atomtypestr = atomtypestr[6:]
+    return Intify(atomtypestr)
+
+
+
+def FilterTypeLines(l_lines, needed_types, int2name, prefix2, indent):
+    """
+    Return a new list containing only the lines from "l_lines" whose first
+    column is a type which belongs to the "needed_types" set.  The type
+    (which can be an integer or a string like "@atom:type5") is replaced
+    by its (@prefix2:) variable name.  This is used for the "Masses",
+    "Pair Coeffs", "Bond Coeffs", "Angle Coeffs",... sections.
+    (Note: Building a new list in a single pass is much faster than
+     deleting the unwanted lines from "l_lines" one at a time.)
+    """
+    prefix = '@' + prefix2 + ':'
+    l_kept = []
+    for line in l_lines:
+        tokens = line.strip().split()
+        typestr = tokens[0]
+        if typestr.find(prefix) == 0:
+            typestr = typestr[len(prefix):]
+        itype = Intify(typestr)
+        if itype in needed_types:
+            tokens[0] = Stringify(itype, int2name, '@', prefix2, 'type')
+            l_kept.append((' ' * indent) + (' '.join(tokens)))
+    return l_kept
+
+
+
+def FilterCoeffCommands(l_in_coeffs,
+                        needed_types,
+                        min_needed_type,
+                        max_needed_type,
+                        int2name,
+                        prefix2,
+                        indent):
+    """
+    Return a new list containing only the "bond_coeff", "angle_coeff",
+    "dihedral_coeff", or "improper_coeff" commands from "l_in_coeffs"
+    which refer to types in the "needed_types" set.  Commands containing
+    wildcard characters ("*") are expanded into multiple commands
+    (one for each needed type in that range).
+    """
+    l_kept = []
+    for line in l_in_coeffs:
+        tokens = line.strip().split()
+        type_str = tokens[1]
+
+        if ('*' in type_str):
+            type_tokens = type_str.split('*')
+
+            if type_tokens[0] == '':
+                i_a = min_needed_type
+            else:
+                i_a = Intify(type_tokens[0])
+
+            if type_tokens[1] == '':
+                i_b = max_needed_type
+            else:
+                i_b = Intify(type_tokens[1])
+
+        else:
+            i_a = i_b = Intify(type_str)
+
+        assert((type(i_a) is int) and (type(i_b) is int))
+
+        if i_a < min_needed_type:
+            i_a = min_needed_type
+        if i_b > max_needed_type:
+            i_b = max_needed_type
+
+        if ('*' in type_str):
+            for i in range(i_a, i_b + 1):
+                if (i in needed_types):
+                    tokens[1] = Stringify(i, int2name, '@', prefix2, 'type')
+                    l_kept.append((' ' * indent) + (' '.join(tokens)))
+        else:
+            if i_a < i_b:
+                raise InputError('Error: number of ' + prefix2 + ' types in data file is not consistent with the\n'
+                                 '       number of ' + prefix2 + ' types you have define ' + prefix2 + '_coeffs for.\n')
+            if (i_a == i_b) and (i_a in needed_types):
+                tokens[1] = Stringify(i_a, int2name, '@', prefix2, 'type')
+                l_kept.append((' ' * indent) + (' '.join(tokens)))
+    return l_kept
+
+
+
 
 def ProcessShakeRattle(sf_l_in_fix_shake_rattle,  # lines containing fix shake or rattle commands
                        sf_needed_atomtypes,       # atom types selected by user
@@ -809,6 +988,12 @@ class Ltemplify(object):
             self.input_data_file = argv[-1]  #the last argument is the data file
             self.input_script_files = argv[:-1] # optional input script files
 
+        # BelongsToSel() is invoked once for every atom (and every atom in
+        # every bond, angle, ...), so compile the selections in advance.
+        self.atomid_selection = SelectionIndex(self.atomid_selection)
+        self.atomtype_selection = SelectionIndex(self.atomtype_selection)
+        self.molid_selection = SelectionIndex(self.molid_selection)
+
 
 
 
@@ -844,59 +1029,59 @@ class Ltemplify(object):
         # (Note: The "data" file is assumed to be the last entry in the list.)
         input_files = input_script_files + [input_data_file]
         assert(len(input_files) > 0)
-        input_files_txt = ['' for f in input_files]
-        input_files_sio = [None for f in input_files]
 
-        #### READ ALL OF THE INPUT FILES AND SAVE THEIR TEXT FOR LATER
+        # The files are NOT loaded into memory.  Instead Pass1() and Pass2()
+        # read them directly from the disk, one line at a time, and only
+        # keep the information they need (for example, the lines from the
+        # "Atoms" and "Bonds" sections which belong to the selected atoms).
+        # Consequently, memory usage is proportional to the size of the
+        # selection (and the atomid->atomtype lookup tables), not the size
+        # of the files.  Since every file is read twice, streams must be
+        # rewound between passes.  Streams (and named pipes) which cannot be
+        # rewound are first copied to a temporary file on the disk.
+        start_positions = [None for f in input_files]
+        spooled_files = []
         for i_f in range(0, len(input_files)):
-            fname = input_files[i_f]
-            if isinstance(fname, str):
-                try:
-                    input_file = open(fname, 'r')
-                except IOError:
-                    raise InputError('Error: unrecognized argument (\"' + fname + '\"),\n'
-                                     '       OR unable to open file:\n'
-                                     '\n'
-                                     '       \"' + fname + '\"\n'
-                                     '       for reading.\n'
-                                     '\n'
-                                     '       (If you were not trying to open a file with this name,\n'
-                                     '        then there is a problem in your argument list.)\n')
-
-                sys.stderr.write('reading file \"' + fname + '\"\n')
+            f = input_files[i_f]
+            if isinstance(f, str):
+                if (not os.path.exists(f)) or os.path.isfile(f):
+                    continue  # (Pass1() will complain if f does not exist)
+                sys.stderr.write('reading file \"' + f + '\"\n')
+                input_stream = open(f, 'r')
             else:
-                input_file = fname #then "fname" is a file stream, not a string
-
-            input_files_txt[i_f] = input_file.read()
-        #### FINISHED READING THE FILES
-
-        # Now create StringIO versions of these files
-        for i_f in range(0, len(input_files)):
-            input_files_sio[i_f] = StringIO(input_files_txt[i_f])
-
-        # Split this list of files into a LAMMPS data files and input scripts:
-        # (Note: The "data" file is assumed to be the last entry in the list.)
-        assert(len(input_files_sio) > 0)
-        input_data_file_sio = input_files_sio[-1]
-        input_script_files_sio = input_files_sio[:-1]
-
+                input_stream = f
+                try:
+                    start_positions[i_f] = f.tell()
+                    f.seek(start_positions[i_f])
+                    continue
+                except (AttributeError, IOError, OSError, ValueError):
+                    pass  # "f" is a stream which does not support seek()
+            spool = TemporaryFile(mode='w+')
+            copyfileobj(input_stream, spool)
+            if input_stream is not f:
+                input_stream.close()
+            spool.seek(0)
+            spooled_files.append(spool)
+            input_files[i_f] = spool
+            start_positions[i_f] = 0
 
         # PASS 1
         # Determine the atom_style, as well as the atom type names
-        self.Pass1(input_data_file_sio, input_script_files_sio)
-
+        self.Pass1(input_files[-1], input_files[:-1])
 
         # PASS 2
         # Parse all other sections of the LAMMPS files,
         # including Atoms, Bonds, Angles, Dihedrals, Impropers and Masses
 
-        # Again, create StringIO versions of these files for reading again.
+        # Rewind the streams before reading them again.
         for i_f in range(0, len(input_files)):
-            input_files_sio[i_f] = StringIO(input_files_txt[i_f])
-        input_data_file_sio = input_files_sio[-1]
-        input_script_files_sio = input_files_sio[:-1]
+            if start_positions[i_f] != None:
+                input_files[i_f].seek(start_positions[i_f])
+
+        self.Pass2(input_files[-1], input_files[:-1])
 
-        self.Pass2(input_data_file_sio, input_script_files_sio)
+        for spool in spooled_files:
+            spool.close()  # (temporary files are deleted when closed)
 
 
 
@@ -1096,8 +1281,10 @@ class Ltemplify(object):
                                             self.atomtypes_int2name[ilist[I]] = name_attempt
                                             I += 1
 
-            # We are finished reading that file.  close it.
-            lammps_file.close()
+            # We are finished reading that file.  Close it (unless the
+            # caller opened it, in which case it is not ours to close).
+            if isinstance(fname, str):
+                lammps_file.close()
 
             # (As a C++ programmer, this is why I don't like the fact
             #  that python  uses indentation exclusively to indicate scope.
@@ -2925,6 +3112,11 @@ class Ltemplify(object):
                         sys.stderr.write('  Ignoring line \"' +
                                          line.strip() + '\"\n')
 
+            # We are finished reading that file.  Close it (unless the
+            # caller opened it).
+            if isinstance(fname, str):
+                lammps_file.close()
+
 
     def PostProcess1(self):
         """
@@ -3149,92 +3341,64 @@ class Ltemplify(object):
 
         # --- MASSES ---
 
+        # Figure out which atom types we want to keep.  These include the
+        # atom types of the atoms we selected ("self.needed_atomtypes"), as
+        # well as any atom types explicitly selected by the user ("-atomtype").
+        # (Computing this set in advance is much faster than invoking
+        #  BelongsToSel() on every line of every section.)
+        keep_atomtypes = set(self.needed_atomtypes)
+        if len(self.atomtype_selection) > 0:
+            candidate_atomtypes = set([])
+            for line in self.l_data_masses:
+                candidate_atomtypes.add(AtomTypeStrToInt(line.split()[0]))
+            for line in self.l_data_pair_coeffs:
+                candidate_atomtypes.add(AtomTypeStrToInt(line.split()[0]))
+            for line in self.l_data_pairij_coeffs:
+                tokens = line.split()
+                candidate_atomtypes.add(AtomTypeStrToInt(tokens[0]))
+                candidate_atomtypes.add(AtomTypeStrToInt(tokens[1]))
+            for atomtype in candidate_atomtypes:
+                if BelongsToSel(atomtype, self.atomtype_selection):
+                    keep_atomtypes.add(atomtype)
+
         # delete masses for atom types we no longer care about:
         # also substitute the correct atom type name
-        i_line = 0
-        while i_line < len(self.l_data_masses):
-            line = self.l_data_masses[i_line]
-            tokens = line.strip().split()
-            atomtypestr = tokens[0]
-            if atomtypestr.find('@atom:') == 0:
-                atomtypestr = atomtypestr[6:]
-            atomtype = Intify(atomtypestr)
-            if ((not (atomtype in self.needed_atomtypes)) and
-                (not ((len(self.atomtype_selection) > 0) and
-                      BelongsToSel(atomtype, self.atomtype_selection)))):
-                del self.l_data_masses[i_line]
-            else:
-                tokens[0]=Stringify(atomtype,
-                                    self.atomtypes_int2name,
-                                    '@','atom','type')
-                self.l_data_masses[i_line] = ((' ' * self.indent) +
-                                              (' '.join(tokens)))
-                i_line += 1
+        self.l_data_masses = FilterTypeLines(self.l_data_masses,
+                                             keep_atomtypes,
+                                             self.atomtypes_int2name,
+                                             'atom',
+                                             self.indent)
 
         # --- PAIR COEFFS ---
 
         # delete data_pair_coeffs for atom types we no longer care about:
-        i_line = 0
-        while i_line < len(self.l_data_pair_coeffs):
-            line = self.l_data_pair_coeffs[i_line]
-            tokens = line.strip().split()
-            assert(len(tokens) > 0)
-            atomtypestr = tokens[0]
-            if atomtypestr.find('@atom:') == 0:
-                atomtypestr = atomtypestr[6:]
-            atomtype = Intify(atomtypestr)
-            if ((not (atomtype in self.needed_atomtypes)) and
-                (not ((len(self.atomtype_selection) > 0) and
-                      BelongsToSel(atomtype, self.atomtype_selection)))):
-                del self.l_data_pair_coeffs[i_line]
-            else:
-                tokens[0] = Stringify(atomtype,
-                                      self.atomtypes_int2name,
-                                      '@','atom','type')
-                self.l_data_pair_coeffs[i_line] = ((' ' * self.indent) +
-                                                   (' '.join(tokens)))
-                i_line += 1
+        self.l_data_pair_coeffs = FilterTypeLines(self.l_data_pair_coeffs,
+                                                  keep_atomtypes,
+                                                  self.atomtypes_int2name,
+                                                  'atom',
+                                                  self.indent)
 
         # delete data_pairij_coeffs for atom types we no longer care about:
-        i_line = 0
-        while i_line < len(self.l_data_pairij_coeffs):
-            line = self.l_data_pairij_coeffs[i_line]
+        l_kept = []
+        for line in self.l_data_pairij_coeffs:
             tokens = line.strip().split()
             assert(len(tokens) > 0)
-
-            atomtypestr_I = tokens[0]
-            if atomtypestr_I.find('@atom:') == 0:
-                atomtypestr_I = atomtypestr[6:]
-            atomtype_I = Intify(atomtypestr_I)
-
-            atomtypestr_J = tokens[1]
-            if atomtypestr_J.find('@atom:') == 0:
-                atomtypestr_J = atomtypestr[6:]
-            atomtype_J = Intify(atomtypestr_J)
-
-            if (((not (atomtype_I in self.needed_atomtypes)) and
-                 (not ((len(self.atomtype_selection) > 0) and
-                       BelongsToSel(atomtype_I, self.atomtype_selection))))
-                or
-                ((not (atomtype_J in self.needed_atomtypes)) and
-                 (not ((len(self.atomtype_selection) > 0) and
-                       BelongsToSel(atomtype_J, self.atomtype_selection))))):
-                del self.l_data_pairij_coeffs[i_line]
-            else:
+            atomtype_I = AtomTypeStrToInt(tokens[0])
+            atomtype_J = AtomTypeStrToInt(tokens[1])
+            if ((atomtype_I in keep_atomtypes) and
+                (atomtype_J in keep_atomtypes)):
                 tokens[0] = Stringify(atomtype_I,
                                       self.atomtypes_int2name,
                                       '@','atom','type')
                 tokens[1] = Stringify(atomtype_J,
                                       self.atomtypes_int2name,
                                       '@','atom','type')
-                self.l_data_pairij_coeffs[i_line] = ((' ' * self.indent) +
-                                                     (' '.join(tokens)))
-                i_line += 1
+                l_kept.append((' ' * self.indent) + (' '.join(tokens)))
+        self.l_data_pairij_coeffs = l_kept
 
         # delete in_pair_coeffs for atom we no longer care about:
-        i_line = 0
-        while i_line < len(self.l_in_pair_coeffs):
-            line = self.l_in_pair_coeffs[i_line]
+        l_kept = []
+        for line in self.l_in_pair_coeffs:
             tokens = line.strip().split()
             atomtype_i_str = tokens[1]
             atomtype_j_str = tokens[2]
@@ -3347,9 +3511,8 @@ class Ltemplify(object):
             #        j_str = '@{atom:type'+str(j_a_final)+'}*@{atom:type'+str(j_b_final)+'}'
 
             if not (i_a_final and i_b_final and j_a_final and j_b_final):
-                del self.l_in_pair_coeffs[i_line]
+                pass  # discard this pair_coeff command
             elif (('*' in atomtype_i_str) or ('*' in atomtype_j_str)):
-                del self.l_in_pair_coeffs[i_line]
                 for i in range(i_a_final, i_b_final + 1):
                     for j in range(j_a_final, j_b_final + 1):
                         if j >= i:
@@ -3359,9 +3522,8 @@ class Ltemplify(object):
                             tokens[2] = Stringify(j,
                                                   self.atomtypes_int2name,
                                                   '@','atom','type')
-                            self.l_in_pair_coeffs.insert(i_line,
-                                                         (' ' * self.indent) + (' '.join(tokens)))
-                            i_line += 1
+                            l_kept.append((' ' * self.indent) +
+                                          (' '.join(tokens)))
             else:
                 tokens[1] = Stringify(int(tokens[1]),
                                       self.atomtypes_int2name,
@@ -3369,31 +3531,14 @@ class Ltemplify(object):
                 tokens[2] = Stringify(int(tokens[2]),
                                       self.atomtypes_int2name,
                                       '@','atom','type')
-                self.l_in_pair_coeffs[i_line] = (
-                    ' ' * self.indent) + (' '.join(tokens))
-                i_line += 1
+                l_kept.append((' ' * self.indent) + (' '.join(tokens)))
+        self.l_in_pair_coeffs = l_kept
 
         # delete mass commands for atom types we no longer care about:
-        i_line = 0
-        while i_line < len(self.l_in_masses):
-            line = self.l_in_masses[i_line]
+        l_kept = []
+        for line in self.l_in_masses:
             tokens = line.strip().split()
             atomtype_i_str = tokens[1]
-            # if (('*' in atomtype_i_str) or
-            #    ('*' in atomtype_j_str)):
-            #    sys.stderr.write('WARNING: near or before '+ErrorLeader(lex.infile, lex.lineno)+'\n'
-            #                     '         pair_coeff command contains a \"*\" character.\n'
-            #                     '         Keep in mind that using moltemplate.sh you can manually change the\n'
-            #                     '         numbers assigned to each atom type (when using -a or -b).  Make sure\n'
-            #                     '         nor to accidentally change the order of atom types in one of these\n'
-            #                     '         pair_coeff commands.  For example, commands like\n'
-            #                     '            pair_coeff 10*4 20*10 0.15 3.6\n'
-            #                     '         can be generated by moltemplate.sh, however\n'
-            #                     '         they may be rejected by LAMMPS (because LAMMPS prefers this\n'
-            #                     '            pair_coeff 4*10 10*20 0.15 3.6)\n'
-            #                     '         Later on, you may want to check to make sure moltemplate.sh\n'
-            #                     '         is not doing this.  (Fortunately you never have to worry unless\n'
-            #                     '         you are using the -a or -b arguments with moltemplate.sh)\n')
 
             if ('*' in atomtype_i_str):
                 atomtype_i_tokens = atomtype_i_str.split('*')
@@ -3436,24 +3581,21 @@ class Ltemplify(object):
                     i_b_final = i
                     break
 
-            if not (i_a_final and i_b_final and j_a_final and j_b_final):
-                del self.l_in_masses[i_line]
+            if not (i_a_final and i_b_final):
+                pass  # discard this mass command
             elif ('*' in atomtype_i_str):
-                del self.l_in_masses[i_line]
                 for i in range(i_a_final, i_b_final + 1):
                     tokens[1] = Stringify(i,
                                           self.atomtypes_int2name,
                                           '@','atom','type')
-                    self.l_in_masses.insert(i_line, (' ' * self.indent) +
-                                            (' '.join(tokens)))
-                    i_line += 1
+                    l_kept.append((' ' * self.indent) + (' '.join(tokens)))
             else:
                 assert(i_a == i_b)
                 tokens[1] = Stringify(i_a,
                                       self.atomtypes_int2name,
                                       '@','atom','type')
-                self.l_in_masses[i_line] = (' ' * self.indent) + (' '.join(tokens))
-                i_line += 1
+                l_kept.append((' ' * self.indent) + (' '.join(tokens)))
+        self.l_in_masses = l_kept
 
         # --- BONDS AND BOND COEFFS ---
 
@@ -3492,20 +3634,11 @@ class Ltemplify(object):
             #    del self.l_data_bonds[i_line]
 
         # delete data_bond_coeffs for bondtypes we no longer care about
-        i_line = 0
-        while i_line < len(self.l_data_bond_coeffs):
-            line = self.l_data_bond_coeffs[i_line]
-            tokens = line.strip().split()
-            bondtype = Intify(tokens[0])
-            if (not (bondtype in self.needed_bondtypes)):
-                del self.l_data_bond_coeffs[i_line]
-            else:
-                tokens[0] = Stringify(bondtype,
-                                      self.bondtypes_int2name,
-                                      '@','bond','type')
-                self.l_data_bond_coeffs[i_line] = (
-                    ' ' * self.indent) + (' '.join(tokens))
-                i_line += 1
+        self.l_data_bond_coeffs = FilterTypeLines(self.l_data_bond_coeffs,
+                                                  self.needed_bondtypes,
+                                                  self.bondtypes_int2name,
+                                                  'bond',
+                                                  self.indent)
 
         # delete in_bond_coeffs for bondtypes we no longer care about:
         if len(self.needed_bondtypes) > 0:
@@ -3534,57 +3667,13 @@ class Ltemplify(object):
         assert(self.min_needed_bondtype != None)
         assert(self.max_needed_bondtype != None)
 
-        i_line = 0
-        while i_line < len(self.l_in_bond_coeffs):
-            line = self.l_in_bond_coeffs[i_line]
-            tokens = line.strip().split()
-            bondtype_str = tokens[1]
-
-            if ('*' in bondtype_str):
-                bondtype_tokens = bondtype_str.split('*')
-
-                if bondtype_tokens[0] == '':
-                    i_a = self.min_needed_bondtype
-                else:
-                    i_a = Intify(bondtype_tokens[0])
-
-                if bondtype_tokens[1] == '':
-                    i_b = self.max_needed_bondtype
-                else:
-                    i_b = Intify(bondtype_tokens[1])
-
-            else:
-                i_a = Intify(bondtype_str)
-                i_b = i_a
-
-            if i_a < self.min_needed_bondtype:
-                i_a = self.min_needed_bondtype
-            if i_b > self.max_needed_bondtype:
-                i_b = self.max_needed_bondtype
-
-            if ('*' in bondtype_str):
-                del self.l_in_bond_coeffs[i_line]
-                for i in range(i_a, i_b + 1):
-                    if (i in self.needed_bondtypes):
-                        tokens[1] = Stringify(i,
-                                              self.bondtypes_int2name,
-                                              '@','bond','type')
-                        self.l_in_bond_coeffs.insert(i_line,
-                                                     (' ' * self.indent) + (' '.join(tokens)))
-                        i_line += 1
-            else:
-                if i_a < i_b:
-                    raise InputError('Error: number of bond types in data file is not consistent with the\n'
-                                     '       number of bond types you have define bond_coeffs for.\n')
-                if (i_a == i_b) and (i_a in self.needed_bondtypes):
-                    tokens[1] = Stringify(i_a,
-                                          self.bondtypes_int2name,
-                                          '@','bond','type')
-                    self.l_in_bond_coeffs[i_line] = (
-                        ' ' * self.indent) + (' '.join(tokens))
-                    i_line += 1
-                else:
-                    del self.l_in_bond_coeffs[i_line]
+        self.l_in_bond_coeffs = FilterCoeffCommands(self.l_in_bond_coeffs,
+                                                    self.needed_bondtypes,
+                                                    self.min_needed_bondtype,
+                                                    self.max_needed_bondtype,
+                                                    self.bondtypes_int2name,
+                                                    'bond',
+                                                    self.indent)
 
         # --- ANGLES AND ANGLE COEFFS ---
 
@@ -3625,20 +3714,11 @@ class Ltemplify(object):
             #    del self.l_data_angles[i_line]
 
         # delete data_angle_coeffs for angletypes we no longer care about:
-        i_line = 0
-        while i_line < len(self.l_data_angle_coeffs):
-            line = self.l_data_angle_coeffs[i_line]
-            tokens = line.strip().split()
-            angletype = Intify(tokens[0])
-            if (not (angletype in self.needed_angletypes)):
-                del self.l_data_angle_coeffs[i_line]
-            else:
-                tokens[0] = Stringify(angletype,
-                                      self.angletypes_int2name,
-                                      '@','angle','type')
-                self.l_data_angle_coeffs[i_line] = (
-                    ' ' * self.indent) + (' '.join(tokens))
-                i_line += 1
+        self.l_data_angle_coeffs = FilterTypeLines(self.l_data_angle_coeffs,
+                                                   self.needed_angletypes,
+                                                   self.angletypes_int2name,
+                                                   'angle',
+                                                   self.indent)
 
         # --- class2specific ----
         # Do the same for BondBond and BondAngle Coeffs:
@@ -3647,35 +3727,17 @@ class Ltemplify(object):
         #       THERE ARE NO bondbond_coeff commands, or bondangle_coeff commands,
         #       etc..., so we dont have to worry about l_in_bondbond_coeffs,...
         # Delete data_bondbond_coeffs for angletypes we no longer care about:
-        i_line = 0
-        while i_line < len(self.l_data_bondbond_coeffs):
-            line = self.l_data_bondbond_coeffs[i_line]
-            tokens = line.strip().split()
-            angletype = Intify(tokens[0])
-            if (not (angletype in self.needed_angletypes)):
-                del self.l_data_bondbond_coeffs[i_line]
-            else:
-                tokens[0] = Stringify(angletype,
-                                      self.angletypes_int2name,
-                                      '@','angle','type')
-                self.l_data_bondbond_coeffs[i_line] = (
-                    ' ' * self.indent) + (' '.join(tokens))
-                i_line += 1
+        self.l_data_bondbond_coeffs = FilterTypeLines(self.l_data_bondbond_coeffs,
+                                                      self.needed_angletypes,
+                                                      self.angletypes_int2name,
+                                                      'angle',
+                                                      self.indent)
         # Delete data_bondangle_coeffs for angletypes we no longer care about:
-        i_line = 0
-        while i_line < len(self.l_data_bondangle_coeffs):
-            line = self.l_data_bondangle_coeffs[i_line]
-            tokens = line.strip().split()
-            angletype = Intify(tokens[0])
-            if (not (angletype in self.needed_angletypes)):
-                del self.l_data_bondangle_coeffs[i_line]
-            else:
-                tokens[0] = Stringify(angletype,
-                                      self.angletypes_int2name,
-                                      '@','angle','type')
-                self.l_data_bondangle_coeffs[i_line] = (
-                    ' ' * self.indent) + (' '.join(tokens))
-                i_line += 1
+        self.l_data_bondangle_coeffs = FilterTypeLines(self.l_data_bondangle_coeffs,
+                                                       self.needed_angletypes,
+                                                       self.angletypes_int2name,
+                                                       'angle',
+                                                       self.indent)
         # --- end of class2specific ----
 
         # Delete in_angle_coeffs for angletypes we no longer care about:
@@ -3705,56 +3767,13 @@ class Ltemplify(object):
         assert(self.min_needed_angletype != None)
         assert(self.max_needed_angletype != None)
 
-        i_line = 0
-        while i_line < len(self.l_in_angle_coeffs):
-            line = self.l_in_angle_coeffs[i_line]
-            tokens = line.strip().split()
-            angletype_str = tokens[1]
-
-            if ('*' in angletype_str):
-                angletype_tokens = angletype_str.split('*')
-
-                if angletype_tokens[0] == '':
-                    i_a = self.min_needed_angletype
-                else:
-                    i_a = Intify(angletype_tokens[0])
-
-                if angletype_tokens[1] == '':
-                    i_b = self.max_needed_angletype
-                else:
-                    i_b = Intify(angletype_tokens[1])
-
-            else:
-                i_a = i_b = Intify(angletype_str)
-
-            if i_a < self.min_needed_angletype:
-                i_a = self.min_needed_angletype
-            if i_b > self.max_needed_angletype:
-                i_b = self.max_needed_angletype
-
-            if ('*' in angletype_str):
-                del self.l_in_angle_coeffs[i_line]
-                for i in range(i_a, i_b + 1):
-                    if (i in self.needed_angletypes):
-                        tokens[1] = Stringify(i,
-                                              self.angletypes_int2name,
-                                              '@','angle','type')
-                        self.l_in_angle_coeffs.insert(i_line,
-                                                      (' ' * self.indent) + (' '.join(tokens)))
-                        i_line += 1
-            else:
-                if i_a < i_b:
-                    raise InputError('Error: number of angle types in data file is not consistent with the\n'
-                                     '       number of angle types you have define angle_coeffs for.\n')
-                if (i_a == i_b) and (i_a in self.needed_angletypes):
-                    tokens[1] = Stringify(i_a,
-                                          self.angletypes_int2name,
-                                          '@','angle','type')
-                    self.l_in_angle_coeffs[i_line] = (
-                        ' ' * self.indent) + (' '.join(tokens))
-                    i_line += 1
-                else:
-                    del self.l_in_angle_coeffs[i_line]
+        self.l_in_angle_coeffs = FilterCoeffCommands(self.l_in_angle_coeffs,
+                                                     self.needed_angletypes,
+                                                     self.min_needed_angletype,
+                                                     self.max_needed_angletype,
+                                                     self.angletypes_int2name,
+                                                     'angle',
+                                                     self.indent)
 
         # --- DIHEDRALS AND DIHEDRAL COEFFS ---
 
@@ -3802,20 +3821,11 @@ class Ltemplify(object):
             #    del self.l_data_dihedrals[i_line]
 
         # delete data_dihedral_coeffs for dihedraltypes we no longer care about:
-        i_line = 0
-        while i_line < len(self.l_data_dihedral_coeffs):
-            line = self.l_data_dihedral_coeffs[i_line]
-            tokens = line.strip().split()
-            dihedraltype = Intify(tokens[0])
-            if (not (dihedraltype in self.needed_dihedraltypes)):
-                del self.l_data_dihedral_coeffs[i_line]
-            else:
-                tokens[0] = Stringify(dihedraltype,
-                                      self.dihtypes_int2name,
-                                      '@','dihedral','type')
-                self.l_data_dihedral_coeffs[i_line] = (
-                    ' ' * self.indent) + (' '.join(tokens))
-                i_line += 1
+        self.l_data_dihedral_coeffs = FilterTypeLines(self.l_data_dihedral_coeffs,
+                                                      self.needed_dihedraltypes,
+                                                      self.dihtypes_int2name,
+                                                      'dihedral',
+                                                      self.indent)
 
         # --- class2specific ----
         # Do the same for MiddleBondTorsion, EndBondTorsion, AngleTorsion,
@@ -3826,84 +3836,39 @@ class Ltemplify(object):
         #       have to worry about dealing with "self.l_in_middlebondtorsion_coeffs",...
         # delete data_middlebondtorsion_coeffs for dihedraltypes
         # we no longer care about:
-        i_line = 0
-        while i_line < len(self.l_data_middlebondtorsion_coeffs):
-            line = self.l_data_middlebondtorsion_coeffs[i_line]
-            tokens = line.strip().split()
-            dihedraltype = Intify(tokens[0])
-            if (not (dihedraltype in self.needed_dihedraltypes)):
-                del self.l_data_middlebondtorsion_coeffs[i_line]
-            else:
-                tokens[0] = Stringify(dihedraltype,
-                                      self.dihtypes_int2name,
-                                      '@','dihedral','type')
-                self.l_data_middlebondtorsion_coeffs[i_line] = (
-                    ' ' * self.indent) + (' '.join(tokens))
-                i_line += 1
+        self.l_data_middlebondtorsion_coeffs = FilterTypeLines(self.l_data_middlebondtorsion_coeffs,
+                                                               self.needed_dihedraltypes,
+                                                               self.dihtypes_int2name,
+                                                               'dihedral',
+                                                               self.indent)
         # delete data_endbondtorsion_coeffs for dihedraltypes we 
         # no longer care about:
-        i_line = 0
-        while i_line < len(self.l_data_endbondtorsion_coeffs):
-            line = self.l_data_endbondtorsion_coeffs[i_line]
-            tokens = line.strip().split()
-            dihedraltype = Intify(tokens[0])
-            if (not (dihedraltype in self.needed_dihedraltypes)):
-                del self.l_data_endbondtorsion_coeffs[i_line]
-            else:
-                tokens[0] = Stringify(dihedraltype,
-                                      self.dihtypes_int2name,
-                                      '@','dihedral','type')
-                self.l_data_endbondtorsion_coeffs[i_line] = (
-                    ' ' * self.indent) + (' '.join(tokens))
-                i_line += 1
+        self.l_data_endbondtorsion_coeffs = FilterTypeLines(self.l_data_endbondtorsion_coeffs,
+                                                            self.needed_dihedraltypes,
+                                                            self.dihtypes_int2name,
+                                                            'dihedral',
+                                                            self.indent)
         # delete data_angletorsion_coeffs for dihedraltypes we 
         # no longer care about:
-        i_line = 0
-        while i_line < len(self.l_data_angletorsion_coeffs):
-            line = self.l_data_angletorsion_coeffs[i_line]
-            tokens = line.strip().split()
-            dihedraltype = Intify(tokens[0])
-            if (not (dihedraltype in self.needed_dihedraltypes)):
-                del self.l_data_angletorsion_coeffs[i_line]
-            else:
-                tokens[0] = Stringify(dihedraltype,
-                                      self.dihtypes_int2name,
-                                      '@','dihedral','type')
-                self.l_data_angletorsion_coeffs[i_line] = (
-                    ' ' * self.indent) + (' '.join(tokens))
-                i_line += 1
+        self.l_data_angletorsion_coeffs = FilterTypeLines(self.l_data_angletorsion_coeffs,
+                                                          self.needed_dihedraltypes,
+                                                          self.dihtypes_int2name,
+                                                          'dihedral',
+                                                          self.indent)
         # delete data_angleangletorsion_coeffs for dihedraltypes we 
         # no longer care about:
-        i_line = 0
-        while i_line < len(self.l_data_angleangletorsion_coeffs):
-            line = self.l_data_angleangletorsion_coeffs[i_line]
-            tokens = line.strip().split()
-            dihedraltype = Intify(tokens[0])
-            if (not (dihedraltype in self.needed_dihedraltypes)):
-                del self.l_data_angleangletorsion_coeffs[i_line]
-            else:
-                tokens[0] = Stringify(dihedraltype,
-                                      self.dihtypes_int2name,
-                                      '@','dihedral','type')
-                self.l_data_angleangletorsion_coeffs[i_line] = (
-                    ' ' * self.indent) + (' '.join(tokens))
-                i_line += 1
+        self.l_data_angleangletorsion_coeffs = FilterTypeLines(self.l_data_angleangletorsion_coeffs,
+                                                               self.needed_dihedraltypes,
+                                                               self.dihtypes_int2name,
+                                                               'dihedral',
+                                                               self.indent)
         # delete data_bondbond13_coeffs for dihedraltypes we 
         # no longer care about:
-        i_line = 0
-        while i_line < len(self.l_data_bondbond13_coeffs):
-            line = self.l_data_bondbond13_coeffs[i_line]
-            tokens = line.strip().split()
-            dihedraltype = Intify(tokens[0])
-            if (not (dihedraltype in self.needed_dihedraltypes)):
-                del self.l_data_bondbond13_coeffs[i_line]
-            else:
-                tokens[0] = Stringify(dihedraltype,
-                                      self.dihtypes_int2name,
-                                      '@','dihedral','type')
-                self.l_data_bondbond13_coeffs[i_line] = (
-                    ' ' * self.indent) + (' '.join(tokens))
-                i_line += 1
+        self.l_data_bondbond13_coeffs = FilterTypeLines(self.l_data_bondbond13_coeffs,
+                                                        self.needed_dihedraltypes,
+                                                        self.dihtypes_int2name,
+                                                        'dihedral',
+                                                        self.indent)
         # --- end of class2specific ----
 
 
@@ -3934,56 +3899,13 @@ class Ltemplify(object):
         assert(self.min_needed_dihedraltype != None)
         assert(self.max_needed_dihedraltype != None)
 
-        i_line = 0
-        while i_line < len(self.l_in_dihedral_coeffs):
-            line = self.l_in_dihedral_coeffs[i_line]
-            tokens = line.strip().split()
-            dihedraltype_str = tokens[1]
-
-            if ('*' in dihedraltype_str):
-                dihedraltype_tokens = dihedraltype_str.split('*')
-
-                if dihedraltype_tokens[0] == '':
-                    i_a = self.min_needed_dihedraltype
-                else:
-                    i_a = Intify(dihedraltype_tokens[0])
-
-                if dihedraltype_tokens[1] == '':
-                    i_b = self.max_needed_dihedraltype
-                else:
-                    i_b = Intify(dihedraltype_tokens[1])
-
-            else:
-                i_a = i_b = Intify(dihedraltype_str)
-
-            if i_a < self.min_needed_dihedraltype:
-                i_a = self.min_needed_dihedraltype
-            if i_b > self.max_needed_dihedraltype:
-                i_b = self.max_needed_dihedraltype
-
-            if ('*' in dihedraltype_str):
-                del self.l_in_dihedral_coeffs[i_line]
-                for i in range(i_a, i_b + 1):
-                    if (i in self.needed_dihedraltypes):
-                        tokens[1] = Stringify(i,
-                                              self.dihtypes_int2name,
-                                              '@','dihedral','type')
-                        self.l_in_dihedral_coeffs.insert(i_line,
-                                                         (' ' * self.indent) + (' '.join(tokens)))
-                        i_line += 1
-            else:
-                if i_a < i_b:
-                    raise InputError('Error: number of dihedral types in data file is not consistent with the\n'
-                                     '       number of dihedral types you have define dihedral_coeffs for.\n')
-                if (i_a == i_b) and (i_a in self.needed_dihedraltypes):
-                    tokens[1] = Stringify(i_a,
-                                          self.dihtypes_int2name,
-                                          '@','dihedral','type')
-                    self.l_in_dihedral_coeffs[i_line] = (
-                        ' ' * self.indent) + (' '.join(tokens))
-                    i_line += 1
-                else:
-                    del self.l_in_dihedral_coeffs[i_line]
+        self.l_in_dihedral_coeffs = FilterCoeffCommands(self.l_in_dihedral_coeffs,
+                                                        self.needed_dihedraltypes,
+                                                        self.min_needed_dihedraltype,
+                                                        self.max_needed_dihedraltype,
+                                                        self.dihtypes_int2name,
+                                                        'dihedral',
+                                                        self.indent)
 
         # --- IMPROPERS AND IMPROPER COEFFS ---
 
@@ -4029,20 +3951,11 @@ class Ltemplify(object):
 
 
         # delete data_improper_coeffs for impropertypes we no longer care about:
-        i_line = 0
-        while i_line < len(self.l_data_improper_coeffs):
-            line = self.l_data_improper_coeffs[i_line]
-            tokens = line.strip().split()
-            impropertype = Intify(tokens[0])
-            if (not (impropertype in self.needed_impropertypes)):
-                del self.l_data_improper_coeffs[i_line]
-            else:
-                tokens[0] = Stringify(impropertype,
-                                      self.imptypes_int2name,
-                                      '@','improper','type')
-                self.l_data_improper_coeffs[i_line] = (
-                    ' ' * self.indent) + (' '.join(tokens))
-                i_line += 1
+        self.l_data_improper_coeffs = FilterTypeLines(self.l_data_improper_coeffs,
+                                                      self.needed_impropertypes,
+                                                      self.imptypes_int2name,
+                                                      'improper',
+                                                      self.indent)
 
         # --- class2specific ----
         # Do the same for AngleAngle Coeffs
@@ -4052,20 +3965,11 @@ class Ltemplify(object):
         #       have to worry about dealing with "l_in_angleangle_coeffs",...
         # delete entries in l_data_angleangle_coeffs for impropertypes we
         # no longer care about:
-        i_line = 0
-        while i_line < len(self.l_data_angleangle_coeffs):
-            line = self.l_data_angleangle_coeffs[i_line]
-            tokens = line.strip().split()
-            impropertype = Intify(tokens[0])
-            if (not (impropertype in self.needed_impropertypes)):
-                del self.l_data_angleangle_coeffs[i_line]
-            else:
-                tokens[0] = Stringify(impropertype,
-                                      self.imptypes_int2name,
-                                      '@','improper','type')
-                self.l_data_angleangle_coeffs[i_line] = (
-                    ' ' * self.indent) + (' '.join(tokens))
-                i_line += 1
+        self.l_data_angleangle_coeffs = FilterTypeLines(self.l_data_angleangle_coeffs,
+                                                        self.needed_impropertypes,
+                                                        self.imptypes_int2name,
+                                                        'improper',
+                                                        self.indent)
         # --- end of class2specific ----
 
         # delete in_improper_coeffs for impropertypes we no longer care about:
@@ -4095,58 +3999,13 @@ class Ltemplify(object):
         assert(self.min_needed_impropertype != None)
         assert(self.max_needed_impropertype != None)
 
-        i_line = 0
-        while i_line < len(self.l_in_improper_coeffs):
-            line = self.l_in_improper_coeffs[i_line]
-            tokens = line.strip().split()
-            impropertype_str = tokens[1]
-
-            if ('*' in impropertype_str):
-                impropertype_tokens = impropertype_str.split('*')
-
-                if impropertype_tokens[0] == '':
-                    i_a = self.min_needed_impropertype
-                else:
-                    i_a = Intify(impropertype_tokens[0])
-
-                if impropertype_tokens[1] == '':
-                    i_b = self.max_needed_impropertype
-                else:
-                    i_b = Intify(impropertype_tokens[1])
-
-            else:
-                i_a = i_b = Intify(impropertype_str)
-
-            assert((type(i_a) is int) and (type(i_b) is int))
-
-            if (i_a < self.min_needed_impropertype):
-                i_a = self.min_needed_impropertype
-            if (i_b > self.max_needed_impropertype):
-                i_b = self.max_needed_impropertype
-
-            if ('*' in impropertype_str):
-                del self.l_in_improper_coeffs[i_line]
-                for i in range(i_a, i_b + 1):
-                    if (i in self.needed_impropertypes):
-                        tokens[1] = Stringify(i,
-                                              self.imptypes_int2name,
-                                              '@','improper','type')
-                        self.l_in_improper_coeffs.insert(i_line,
-                                                         (' ' * self.indent) + (' '.join(tokens)))
-                        i_line += 1
-            else:
-                if i_a < i_b:
-                    raise InputError('Error: number of improper types in data file is not consistent with the\n'
-                                     '       number of improper types you have define improper_coeffs for.\n')
-                if (i_a == i_b) and (i_a in self.needed_impropertypes):
-                    tokens[1] = Stringify(i_a,
-                                          self.imptypes_int2name,
-                                          '@','improper','type')
-                    self.l_in_improper_coeffs[i_line] = (
-                        ' ' * self.indent) + (' '.join(tokens))
-                    i_line += 1
-                else:
-                    del self.l_in_improper_coeffs[i_line]
+        self.l_in_improper_coeffs = FilterCoeffCommands(self.l_in_improper_coeffs,
+                                                        self.needed_impropertypes,
+                                                        self.min_needed_impropertype,
+                                                        self.max_needed_impropertype,
+                                                        self.imptypes_int2name,
+                                                        'improper',
+                                                        self.indent)
 
 
 
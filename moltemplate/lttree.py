@@ -34,17 +34,24 @@ g_version_str = '0.80.2'
 
 
 import sys
+import os
+import gc
+import pickle
+import hashlib
+import shutil
 from collections import defaultdict
 import pkg_resources
 
 try:
-    from .ttree import BasicUISettings, BasicUIParseArgs, EraseTemplateFiles, \
+    from .ttree import BasicUISettings, BasicUIParseArgs, \
         StackableCommand, PopCommand, PopRightCommand, PopLeftCommand, \
-        PushCommand, PushLeftCommand, PushRightCommand, ScopeCommand, \
-        WriteVarBindingsFile, StaticObj, InstanceObj, \
-        BasicUI, ScopeBegin, ScopeEnd, WriteFileCommand, Render
+        PushCommand, PushLeftCommand, PushRightCommand, PushArrayCommand, \
+        PushFramesCommand, \
+        ScopeCommand, WriteVarBindingsFile, StaticObj, InstanceObj, \
+        BasicUI, ScopeBegin, ScopeEnd, WriteFileCommand, Render, BindTmplList
     from .ttree_lex import InputError, TextBlock, DeleteLinesWithBadVars, \
-        TemplateLexer, TableFromTemplate, VarRef, TextBlock, ErrorLeader
+        HasBadVars, TemplateLexer, TableFromTemplate, VarRef, TextBlock, \
+        ErrorLeader, ResolveSource
     from .lttree_styles import AtomStyle2ColNames, ColNames2AidAtypeMolid, \
         ColNames2Coords, ColNames2Vects, \
         data_atoms, data_prefix, data_masses, \
@@ -59,14 +66,19 @@ try:
         data_bonds, data_bond_list, data_angles, data_dihedrals, data_impropers, \
         data_boundary, data_pbc, data_prefix_no_space, in_init, in_settings, \
         in_prefix
-    from .ttree_matrix_stack import AffineTransform, MultiAffineStack, \
-        LinTransform, Matrix2Quaternion, MultQuat
+    from .ttree_matrix_stack import AffineTransform, AffineStack, \
+        MultiAffineStack, LinTransform, Matrix2Quaternion, MultQuat, \
+        LoadFrames, CloseFrames, FramesFileStamp
+    from .ttree_profile import g_profiler
+    from .ttree_log import g_log
 except (ImportError, SystemError, ValueError):
     # not installed as a package
     from ttree import *
     from ttree_lex import *
     from lttree_styles import *
     from ttree_matrix_stack import *
+    from ttree_profile import g_profiler
+    from ttree_log import g_log
 
 
 
@@ -101,6 +113,9 @@ class LttreeSettings(BasicUISettings):
         self.i_atomtype = None  # <--An integer indicating which column has the atomtype
         self.i_molid = None  # <--An integer indicating which column has the molid, if applicable
         self.print_full_atom_type_name_in_masses = False # <--how to print atom type names in the "Masses" section of a DATA file?
+        self.checkpoint_file = None # <--save the state after BasicUI() here
+        self.resume = False # <--load this state (if the input files are unchanged)?
+        self.incremental_file = None # <--reuse the output sections saved here
 
 
 
@@ -126,9 +141,8 @@ def LttreeParseArgs(argv, settings, main=False, show_warnings=True):
                                  '       atom_style name (or single quoted string containing a space-separated\n'
                                  '       list of column names such as: atom-ID atom-type q x y z molecule-ID.)\n')
             settings.column_names = AtomStyle2ColNames(argv[i + 1])
-            sys.stderr.write('\n    \"' + data_atoms + '\" column format:\n')
-            sys.stderr.write(
-                '    ' + (' '.join(settings.column_names)) + '\n\n')
+            g_log.Info('\n    \"%s\" column format:\n    %s\n\n',
+                       data_atoms, ' '.join(settings.column_names))
             settings.ii_coords = ColNames2Coords(settings.column_names)
             settings.ii_vects = ColNames2Vects(settings.column_names)
             settings.i_atomid, settings.i_atomtype, settings.i_molid = ColNames2AidAtypeMolid(
@@ -214,6 +228,22 @@ def LttreeParseArgs(argv, settings, main=False, show_warnings=True):
             settings.print_full_atom_type_name_in_masses = False
             del(argv[i:i + 1])
 
+        elif ((argv[i].lower() == '-checkpoint') or
+              (argv[i].lower() == '-resume')):
+            if i + 1 >= len(argv):
+                raise InputError('Error: ' + argv[i] + ' flag should be followed by the name of a file\n'
+                                 '       where the parsed and instantiated objects will be saved.\n')
+            settings.checkpoint_file = argv[i + 1]
+            settings.resume = (argv[i].lower() == '-resume')
+            del(argv[i:i + 2])
+
+        elif (argv[i].lower() == '-incremental'):
+            if i + 1 >= len(argv):
+                raise InputError('Error: ' + argv[i] + ' flag should be followed by the name of a file\n'
+                                 '       where the rendered output of the previous build is stored.\n')
+            settings.incremental_file = argv[i + 1]
+            del(argv[i:i + 2])
+
         elif (argv[i].find('-') == 0) and main:
             # elif (__name__ == "__main__"):
             raise InputError('Error(' + g_program_name + '):\n'
@@ -365,10 +395,15 @@ def TransformEllipsoidText(text, matrix, settings):
     must be converted to a quaternion.
 
     """
+    import numpy as np
 
     #sys.stderr.write('matrix_stack.M = \n'+ MatToStr(matrix) + '\n')
 
     lines = text.split('\n')
+    i_lines = []
+    line_columns = []
+    line_comments = []
+    q_strs = []
 
     for i in range(0, len(lines)):
         line_orig = lines[i]
@@ -390,93 +425,188 @@ def TransformEllipsoidText(text, matrix, settings):
                                  + '\nline:\n'
                                  + line
                                  + ' in each line of the ellipsoids\" section.\n"')
-            q_orig = [float(columns[-4]),
-                      float(columns[-3]),
-                      float(columns[-2]),
-                      float(columns[-1])]
-
-            qRot = [0.0, 0.0, 0.0, 0.0]
-            Matrix2Quaternion(matrix, qRot)
-
-            q_new = [0.0, 0.0, 0.0, 0.0]
-            MultQuat(q_new, qRot, q_orig)
-
-            columns[-4] = str(q_new[0])
-            columns[-3] = str(q_new[1])
-            columns[-2] = str(q_new[2])
-            columns[-1] = str(q_new[3])
-            lines[i] = ' '.join(columns) + comment
+            i_lines.append(i)
+            line_columns.append(columns)
+            line_comments.append(comment)
+            q_strs += columns[4:8]
+
+    if len(line_columns) == 0:
+        return text
+
+    # The rotation is the same for every line, so convert it only once.
+    qRot = [0.0, 0.0, 0.0, 0.0]
+    Matrix2Quaternion(matrix, qRot)
+
+    # Multiply all of the quaternions at once.  (This is the same
+    # arithmetic as MultQuat(q_new, qRot, q_orig), one column at a time.)
+    q_orig = np.array(list(map(float, q_strs))).reshape(-1, 4)
+    q_new = np.empty_like(q_orig)
+    q_new[:, 0] = (qRot[0]*q_orig[:, 0] - qRot[1]*q_orig[:, 1] -
+                   qRot[2]*q_orig[:, 2] - qRot[3]*q_orig[:, 3])
+    q_new[:, 1] = (qRot[0]*q_orig[:, 1] + qRot[1]*q_orig[:, 0] +
+                   qRot[2]*q_orig[:, 3] - qRot[3]*q_orig[:, 2])
+    q_new[:, 2] = (qRot[0]*q_orig[:, 2] - qRot[1]*q_orig[:, 3] +
+                   qRot[2]*q_orig[:, 0] + qRot[3]*q_orig[:, 1])
+    q_new[:, 3] = (qRot[0]*q_orig[:, 3] + qRot[1]*q_orig[:, 2] -
+                   qRot[2]*q_orig[:, 1] + qRot[3]*q_orig[:, 0])
+
+    q_strs = list(map(str, q_new.ravel().tolist()))
+    for n in range(0, len(line_columns)):
+        columns = line_columns[n]
+        columns[4:8] = q_strs[4*n:4*n+4]
+        lines[i_lines[n]] = ' '.join(columns) + line_comments[n]
     return '\n'.join(lines)
 
 
 
-def CalcCM(text_Atoms,
-           text_Masses=None,
-           settings=None):
-    types2masses = None
-    # Loop through the "Masses" section: what is the mass of each atom type?
-    if text_Masses != None:
-        types2masses = {}
-        lines = text_Masses.split('\n')
-        for i in range(0, len(lines)):
-            line = lines[i]
-            columns = line.split()
-        if len(columns) == 2:
-            atomtype = columns[0]
-            m = float(columns[1])
-            types2masses[atomtype] = m
-
-    lines = text_Atoms.split('\n')
-    # Pass 1 through the "Data Atoms" section: Determine each atom's mass
-    if text_Masses != None:
-        assert(settings != None)
-        for i in range(0, len(lines)):
-            line = lines[i]
-            columns = line.split()
-            atomid = columns[settings.i_atomid]
-            atomtype = columns[settings.i_atomtype]
-            if atomtype not in types2masses[atomtype]:
-                raise InputError('Error(lttree): You have neglected to define the mass of atom type: \"' + atomtype + '\"\n'
-                                 'Did you specify the mass of every atom type using write(\"Masses\"){}?')
-            atomid2mass[atomid] = atomtype2mass[atomtype]
+class AtomTypeMasses(object):
+    """
+    AtomTypeMasses keeps track of the mass of each atom type, (as it is
+    written to the "Data Masses" section).  The text is not parsed until
+    the masses are needed (by movecm(), rotcm(), or scalecm()).
+    """
+
+    def __init__(self):
+        self.text_list = []
+        self.n_parsed = 0
+        self.types2masses = {}
+
+    def Add(self, text):
+        self.text_list.append(text)
+
+    def Lookup(self):
+        """ Return a dictionary containing the mass of each atom type. """
+        while self.n_parsed < len(self.text_list):
+            for line in self.text_list[self.n_parsed].split('\n'):
+                ic = line.find('#')
+                if ic != -1:
+                    line = line[:ic]
+                columns = line.split()
+                if len(columns) >= 2:
+                    self.types2masses[columns[0]] = float(columns[1])
+            self.n_parsed += 1
+        return self.types2masses
+
+
+def CalcCM(coords, masses=None):
+    """
+    Return the center of mass of an (N,3) numpy array of coordinates.
+    If "masses" (an array of N numbers) is None, all atoms are assumed
+    to have the same mass.
+    """
+    if masses is None:
+        return coords.mean(axis=0)
+    return masses.dot(coords) / masses.sum()
+
+
+def TransformAtomTextCM(text,
+                        transform_blocks,
+                        frame,
+                        atom_masses,
+                        settings,
+                        src_loc):
+    """
+    Apply a series of transformations which depend on the center of mass
+    of the atoms in the \"Data Atoms\" section (the \"text\" argument).
+    Each entry in \"transform_blocks\" is a string beginning with movecm(),
+    rotcm(), or scalecm() (for example \".movecm(0,0,0).rot(45,1,0,0)\").
+    The blocks are carried out in order.  The center of mass is calculated
+    once, and then the combined transformation is applied to all of the
+    coordinates at once.  These transformations are expressed in the frame
+    (3x4 matrix) \"frame\".  (The coordinates in \"text\" have already been
+    transformed into the global frame.)  The atoms are weighted by the masses
+    in \"atom_masses\" (an AtomTypeMasses object) if any masses are known.
+    Returns the new text and the (3x4) matrix that was applied.
+
+    """
+    import numpy as np
+
+    lines = text.split('\n')
+    i_lines = []
+    line_columns = []
+    line_comments = []
 
-    # Pass 2 through the "Data Atoms" section: Find the center of mass.
     for i in range(0, len(lines)):
-        line = lines[i]
+        line_orig = lines[i]
+        ic = line_orig.find('#')
+        if ic != -1:
+            line = line_orig[:ic]
+            comment = ' ' + line_orig[ic:].rstrip('\n')
+        else:
+            line = line_orig.rstrip('\n')
+            comment = ''
         columns = line.split()
         if len(columns) > 0:
-            if len(columns) == len(settings.column_names) + 3:
-                raise InputError('Error: lttree.py does not yet support integer unit-cell counters (ix, iy, iz)\n'
-                                 '   within the \"' + data_atoms + '\" section of a LAMMPS data file.\n'
-                                 '   Instead please add the appropriate offsets (these offsets\n'
-                                 '   should be multiples of the cell size) to the atom coordinates\n'
-                                 '   in the data file, and eliminate the extra columns. Then try again.\n'
-                                 '   (If you get this message often, email me and I\'ll fix this limitation.)')
-            if len(columns) != len(settings.column_names):
+            if len(columns) < len(settings.column_names):
                 raise InputError('Error: The number of columns in your data file does not\n'
                                  '       match the LAMMPS atom_style you selected.\n'
                                  '       Use the -atomstyle <style> command line argument.\n')
-            x = [0.0, 0.0, 0.0]
-            if atomids2masses != None:
-                m = atomids2masses[atomid]
-            else:
-                m = 1.0
-            tot_m += m
-            for cxcycz in settings.ii_coords:
-                for d in range(0, 3):
-                    x[d] = float(columns[cxcycz[d]])
-                    tot_x[d] += x[d]
-            # Note: dipole moments and other direction vectors don't effect
-            #       the center of mass. So I commented out the loop below.
-            # for cxcycz in settings.ii_vects:
-            #    for d in range(0,3):
-            #        v[d] = float(columns[cxcycz[d]])
-        lines[i] = ' '.join(columns)
+            i_lines.append(i)
+            line_columns.append(columns)
+            line_comments.append(comment)
+
+    M = np.identity(4)
+    if len(line_columns) == 0:
+        return text, M[0:3].tolist()
+
+    ii_coords = [i for cxcycz in settings.ii_coords for i in cxcycz]
+    ii_vects = [i for cxcycz in settings.ii_vects for i in cxcycz]
+    X = np.array([[columns[i] for i in ii_coords] for columns in line_columns],
+                 dtype=float).reshape(len(line_columns), -1, 3)
+    V = np.array([[columns[i] for i in ii_vects] for columns in line_columns],
+                 dtype=float).reshape(len(line_columns), -1, 3)
+
+    masses = None
+    types2masses = atom_masses.Lookup()
+    if len(types2masses) > 0:
+        masses = np.empty(len(line_columns))
+        for n in range(0, len(line_columns)):
+            atomtype = line_columns[n][settings.i_atomtype]
+            if atomtype not in types2masses:
+                raise InputError('Error(lttree): You have neglected to define the mass of atom type: \"' + atomtype + '\"\n'
+                                 'Did you specify the mass of every atom type using write_once(\"Data Masses\"){}?')
+            masses[n] = types2masses[atomtype]
 
-    xcm = [0.0, 0.0, 0.0]
-    for d in range(0, 3):
-        xcm[d] = tot_x[d] / tot_m
-    return xcm
+    F = np.identity(4)
+    F[0:3] = frame
+    try:
+        F_inv = np.linalg.inv(F)
+    except np.linalg.LinAlgError:
+        raise InputError('Error near ' + ErrorLeader(src_loc.infile, src_loc.lineno) + ':\n'
+                         '       movecm(), rotcm(), and scalecm() can not be used here because the\n'
+                         '       coordinates were transformed by a matrix which is not invertible.\n')
+
+    # The center of mass (in the frame of the transformations)
+    xcm = F_inv.dot(np.append(CalcCM(X[:, 0, :], masses), 1.0))
+    P = np.identity(4)
+    for transform_block in transform_blocks:
+        P_block = np.identity(4)
+        P_block[0:3] = AffineStack.CommandsToMatrix(transform_block.strip('.'),
+                                                    src_loc,
+                                                    xcm[0:3].tolist())
+        P = P_block.dot(P)
+        xcm = P_block.dot(xcm)
+    M = F.dot(P).dot(F_inv)
+
+    # Atomic coordinates transform using "affine" transformations
+    # (translations plus rotations [or other linear transformations])
+    X = X.dot(M[0:3, 0:3].T) + M[0:3, 3]
+    # Dipole moments and other direction-vectors
+    # are not effected by translational movement
+    V = V.dot(M[0:3, 0:3].T)
+
+    X = X.reshape(len(line_columns), -1).tolist()
+    V = V.reshape(len(line_columns), -1).tolist()
+    for n in range(0, len(line_columns)):
+        columns = line_columns[n]
+        x = X[n]
+        for k in range(0, len(ii_coords)):
+            columns[ii_coords[k]] = str(x[k])
+        v = V[n]
+        for k in range(0, len(ii_vects)):
+            columns[ii_vects[k]] = str(v[k])
+        lines[i_lines[n]] = ' '.join(columns) + line_comments[n]
+    return '\n'.join(lines), M[0:3].tolist()
 
 
 
@@ -587,11 +717,14 @@ def AddAtomTypeComments(tmpl_list, substitute_vars, print_full_atom_type_names):
 
 def _ExecCommands(command_list,
                   index,
-                  global_files_content,
+                  output,
                   settings,
                   matrix_stack,
                   current_scope_id=None,
-                  substitute_vars=True):
+                  substitute_vars=True,
+                  skip_files=None,
+                  cm_scopes=None,
+                  atom_masses=None):
     """
     _ExecCommands():
     The argument "commands" is a nested list of lists of
@@ -599,25 +732,55 @@ def _ExecCommands(command_list,
 
     Carry out the write() and write_once() commands (which
     write out the contents of the templates contain inside them).
-    Instead of writing the files, save their contents in a string.
+    The rendered text is passed to "output" (usually an OutputFiles object)
+    as soon as it is generated, by invoking output.Write(filename, text).
 
-    The argument "global_files_content" should be of type defaultdict(list)
-    It is an associative array whose key is a string (a filename)
-    and whose value is a lists of strings (of rendered templates).
+    The optional "skip_files" argument is a set of file names whose
+    write() and write_once() commands should be ignored.
+
+    The optional "cm_scopes" argument is the set of indices (into
+    command_list) where the scopes which contain movecm(), rotcm(),
+    or scalecm() commands begin.  (See CMScopes().)  The coordinates
+    written within these scopes are held back until the end of the scope.
+    (If "cm_scopes" is None, this is done for every scope.)
+
+    The optional "atom_masses" argument is an AtomTypeMasses object which
+    keeps track of the text written to the "Data Masses" section.
 
     """
-    files_content = defaultdict(list)
+    if atom_masses is None:
+        atom_masses = AtomTypeMasses()
+    if (cm_scopes is None) or (index in cm_scopes):
+        files_content = CoordBuffer(output)
+    else:
+        files_content = output
+    # For each PushCommand in this scope (which has not been popped yet),
+    # store the commands (if any) which must wait for the center of mass:
     postprocessing_commands = []
+    # ...and the matrix which was pushed, (and for PushFramesCommands,
+    # the matrices which will be used for each element of the array):
+    pushed = []
+    n_frames_pushed = 0
+    # The amount of text written before each child scope began
+    # (if the coordinates are held back in this scope):
+    scope_marks = []
+
+    # If the coordinates are not rendered, then there is no need to keep
+    # track of the coordinate transformations (the matrix stack).
+    transform_coords = (skip_files is None) or (data_atoms not in skip_files)
 
     while index < len(command_list):
         command = command_list[index]
         index += 1
 
+        if isinstance(command, StackableCommand) and (not transform_coords):
+            continue
+
         # For debugging only
         if ((not isinstance(command, StackableCommand)) and
                 (not isinstance(command, ScopeCommand)) and
                 (not isinstance(command, WriteFileCommand))):
-            sys.stderr.write(str(command) + '\n')
+            g_log.Debug('%s\n', command)
 
         if isinstance(command, PopCommand):
             assert(current_scope_id != None)
@@ -630,6 +793,39 @@ def _ExecCommands(command_list,
             else:
                 assert(False)
 
+            if len(pushed) > 0:
+                if pushed.pop()[3] is not None:
+                    n_frames_pushed -= 1
+
+            # Were some of the transformations in the corresponding
+            # PushCommand postponed (because they contained "movecm",
+            # "rotcm", or "scalecm")?  If so, apply them now to the
+            # coordinates which were written since then.
+            if len(postprocessing_commands) > 0:
+                postprocessing = postprocessing_commands.pop()
+                if postprocessing is not None:
+                    (transform_blocks, frame, mark, srcloc,
+                     i_scope) = postprocessing
+                    if i_scope is None:
+                        marks = [mark]
+                    else:
+                        # (Transform each element of the array separately.
+                        #  Each child scope begun since then is an element.)
+                        marks = scope_marks[i_scope:]
+                    end_mark = None
+                    for mark in reversed(marks):
+                        files_content.TransformCM(mark,
+                                                  transform_blocks,
+                                                  frame,
+                                                  atom_masses,
+                                                  settings,
+                                                  srcloc,
+                                                  end_mark)
+                        end_mark = mark
+                    if all([p is None for p in postprocessing_commands]):
+                        files_content.Flush()
+                        scope_marks = []
+
         elif isinstance(command, PushCommand):
             assert(current_scope_id != None)
             if command.context_node == None:
@@ -642,91 +838,86 @@ def _ExecCommands(command_list,
             # We need to figure out which of these commands need to be
             # postponed, and which commands can be carried out now.
             # ("now"=pushing transformation matrices onto the matrix stack).
-            # UNFORTUNATELY POSTPONING SOME COMMANDS MAKES THE CODE UGLY
-            transform_list = command.contents.split('.')
-            transform_blocks = []
-            i_post_process = -1
             #  Example:  Suppose:
             #command.contents = '.rot(30,0,0,1).movecm(0,0,0).rot(45,1,0,0).scalecm(2.0).move(-2,1,0)'
             #  then
-            #transform_list = ['rot(30,0,0,1)', 'movecm(0,0,0)', 'rot(45,1,0,0)', 'scalecm(2.0)', 'move(-2,1,0)']
-            # Note: the first command 'rot(30,0,0,1)' is carried out now.
-            # The remaining commands are carried out during post-processing,
-            # (when processing the "ScopeEnd" command.
-            #
-            # We break up the commands into "blocks" separated by center-
-            # of-mass transformations ('movecm', 'rotcm', or 'scalecm')
-            #
             # transform_blocks = ['.rot(30,0,0,1)',
             #                     '.movecm(0,0,0).rot(45,1,0,0)',
             #                     '.scalecm(2.0).move(-2,1,0)']
+            # Note: the first block '.rot(30,0,0,1)' is carried out now.
+            # The remaining blocks are carried out when the corresponding
+            # PopCommand is reached, (after the object has been written).
+            right_not_left = isinstance(command, PushRightCommand)
+            if isinstance(command, PushFramesCommand):
+                # The matrix for each element of the array is pushed later
+                # (see ScopeBegin below).  Until then, push a placeholder.
+                transform_blocks = ['']
+                frames = (command,
+                          LoadFrames(command.file_name, command.srcloc))
+                n_frames_pushed += 1
+            else:
+                transform_blocks = SplitCMTransforms(command.contents)
+                frames = None
 
-            i = 0
-            while i < len(transform_list):
-                transform_block = ''
-                while i < len(transform_list):
-                    transform = transform_list[i]
-                    i += 1
-                    if transform != '':
-                        transform_block += '.' + transform
-                        transform = transform.split('(')[0]
-                        if ((transform == 'movecm') or
-                            (transform == 'rotcm') or
-                            (transform == 'scalecm')):
-                            break
-                transform_blocks.append(transform_block)
-
-            if len(postprocessing_commands) == 0:
-                # The first block (before movecm, rotcm, or scalecm)
-                # can be executed now by modifying the matrix stack.
-                if isinstance(command, PushRightCommand):
-                    matrix_stack.PushCommandsRight(transform_blocks[0].strip('.'),
-                                                   command.srcloc,
-                                                   which_stack=command.context_node)
-                elif isinstance(command, PushLeftCommand):
-                    matrix_stack.PushCommandsLeft(transform_blocks[0].strip('.'),
-                                                  command.srcloc,
-                                                  which_stack=command.context_node)
-                # Everything else must be saved for later.
-                postprocessing_blocks = transform_blocks[1:]
+            if len(transform_blocks) > 1:
+                assert(files_content is not output)  # (see CMScopes())
+                if isinstance(command, PushArrayCommand):
+                    i_scope = len(scope_marks)
+                else:
+                    i_scope = None
+                postprocessing_commands.append(
+                    (transform_blocks[1:],
+                     matrix_stack.FrameMatrix(command.context_node,
+                                              right_not_left),
+                     files_content.Mark(),
+                     command.srcloc,
+                     i_scope))
             else:
-                # If we already encountered a "movecm" "rotcm" or "scalecm"
-                # then all of the command blocks must be handled during
-                # postprocessing.
-                postprocessing_blocks = transform_blocks
-
-            for transform_block in postprocessing_blocks:
-                assert(isinstance(block, basestring))
-                if isinstance(command, PushRightCommand):
-                    postprocessing_commands.append(PushRightCommand(transform_block,
-                                                                    command.srcloc,
-                                                                    command.context_node))
-                elif isinstance(command, PushLeftCommand):
-                    postprocessing_commands.append(PushLeftCommand(transform_block,
-                                                                   command.srcloc,
-                                                                   command.context_node))
+                postprocessing_commands.append(None)
+
+            # The first block (before movecm, rotcm, or scalecm)
+            # can be executed now by modifying the matrix stack.
+            if transform_blocks[0] == '':
+                M = [[1.0, 0.0, 0.0, 0.0],
+                     [0.0, 1.0, 0.0, 0.0],
+                     [0.0, 0.0, 1.0, 0.0]]
+            else:
+                M = AffineStack.CommandsToMatrix(transform_blocks[0].strip('.'),
+                                                 command.srcloc)
+            matrix_stack.Push(M,
+                              which_stack=command.context_node,
+                              right_not_left=right_not_left)
+            pushed.append((M, command.context_node, right_not_left, frames))
 
         elif isinstance(command, WriteFileCommand):
 
+            if (skip_files is not None) and (command.filename in skip_files):
+                continue
+
             # --- Throw away lines containin references to deleted variables:---
 
-            # First: To edit the content of a template,
-            #        you need to make a deep local copy of it
-            tmpl_list = []
-            for entry in command.tmpl_list:
-                if isinstance(entry, TextBlock):
-                    tmpl_list.append(TextBlock(entry.text,
-                                               entry.srcloc))  # , entry.srcloc_end))
-                else:
-                    tmpl_list.append(entry)
+            # The TextBlocks in a template are shared by every instance of
+            # the class that contains it.  To edit the content of a template,
+            # you need to make a deep local copy of it.  But most templates
+            # never need to be edited, so only make a copy when we have to.
+            tmpl_list = command.tmpl_list
+            bindings = command.bindings
+            if (HasBadVars(tmpl_list, bindings) or
+                (command.filename == data_masses)):
+                # (AddAtomTypeComments() also edits the template. See below.)
+                # (BindTmplList() also copies the instance's '$' variables
+                #  into the template, since they are stored separately.)
+                tmpl_list = BindTmplList(command.tmpl_list, bindings)
+                bindings = None
 
-            #     Now throw away lines with deleted variables
+                #     Now throw away lines with deleted variables
 
-            DeleteLinesWithBadVars(tmpl_list)
+                DeleteLinesWithBadVars(tmpl_list)
 
             # --- Now render the text ---
             text = Render(tmpl_list,
-                          substitute_vars)
+                          substitute_vars,
+                          bindings)
 
             # ---- Coordinates of the atoms, must be rotated
             # and translated after rendering.
@@ -743,15 +934,26 @@ def _ExecCommands(command_list,
                 text = AddAtomTypeComments(tmpl_list,
                                            substitute_vars,
                                            settings.print_full_atom_type_name_in_masses)
-            files_content[command.filename].append(text)
+                atom_masses.Add(text)
+            files_content.Write(command.filename, text)
 
         elif isinstance(command, ScopeBegin):
 
-            if isinstance(command.node, InstanceObj):
+            if ((n_frames_pushed > 0) and transform_coords and
+                    isinstance(command.node, InstanceObj)):
+                SwapFrame(command.node,
+                          pushed,
+                          postprocessing_commands,
+                          matrix_stack)
+
+            if transform_coords and isinstance(command.node, InstanceObj):
                 if ((command.node.children != None) and
                         (len(command.node.children) > 0)):
                     matrix_stack.PushStack(command.node)
 
+            if files_content is not output:
+                scope_marks.append(files_content.Mark())
+
             # "command_list" is a long list of commands.
             # ScopeBegin and ScopeEnd are (usually) used to demarcate/enclose
             # the commands which are issued for a single class or
@@ -764,39 +966,13 @@ def _ExecCommands(command_list,
                                   settings,
                                   matrix_stack,
                                   command.node,
-                                  substitute_vars)
+                                  substitute_vars,
+                                  skip_files,
+                                  cm_scopes,
+                                  atom_masses)
 
         elif isinstance(command, ScopeEnd):
-            if data_atoms in files_content:
-                for ppcommand in postprocessing_commands:
-                    if data_masses in files_content:
-                        xcm = CalcCM(files_content[data_atoms],
-                                     files_content[data_masses],
-                                     settings)
-                    else:
-                        xcm = CalcCM(files_content[data_atoms])
-                    if isinstance(ppcommand, PushRightCommand):
-                        matrix_stack.PushCommandsRight(ppcommand.contents,
-                                                       ppcommand.srcloc,
-                                                       xcm,
-                                                       which_stack=command.context_node)
-                    elif isinstance(ppcommand, PushLeftCommand):
-                        matrix_stack.PushCommandsLeft(ppcommand.contents,
-                                                      ppcommand.srcloc,
-                                                      xcm,
-                                                      which_stack=command.context_node)
-                    files_content[data_atoms] = \
-                        TransformAtomText(files_content[data_atoms],
-                                          matrix_stack.M, settings)
-                    files_content[data_ellipsoids] = \
-                        TransformEllipsoidText(files_content[data_ellipsoids],
-                                               matrix_stack.M, settings)
-
-                for ppcommand in postprocessing_commands:
-                    matrix_stack.Pop(which_stack=command.context_node)
-                    #(same as PopRight())
-
-            if isinstance(command.node, InstanceObj):
+            if transform_coords and isinstance(command.node, InstanceObj):
                 if ((command.node.children != None) and
                         (len(command.node.children) > 0)):
                     matrix_stack.PopStack()
@@ -808,50 +984,674 @@ def _ExecCommands(command_list,
             assert(False)
             # no other command types allowed at this point
 
-    # After processing the commands in this list,
-    # merge the templates with the callers template list
-    for filename, tmpl_list in files_content.items():
-        global_files_content[filename] += \
-            files_content[filename]
+    # After processing the commands in this scope, pass on the
+    # coordinates which were held back to the caller's output.
+    if files_content is not output:
+        files_content.Flush()
 
     return index
 
 
+def SwapFrame(node, pushed, postprocessing_commands, matrix_stack):
+    """
+    If "node" is an element of an array created using ".frames(FILE)",
+    replace the matrix pushed onto the matrix stack by the (most recent)
+    PushFramesCommand with the matrix for this element (read from FILE).
+    (The arguments "pushed" and "postprocessing_commands" describe the
+     PushCommands in the current scope.  See _ExecCommands().)
+    """
+    j = len(pushed) - 1
+    while pushed[j][3] is None:
+        j -= 1
+    command, frames = pushed[j][3]
+    i_frame = command.FrameIndex(node.name)
+    if i_frame is None:
+        return
+    if i_frame >= len(frames):
+        raise InputError('Error near ' + ErrorLeader(command.srcloc.infile,
+                                                     command.srcloc.lineno) + ':\n'
+                         '       File \"' + command.file_name + '\" contains only ' +
+                         str(len(frames)) + ' matrices.\n'
+                         '       (Object \"' + node.name + '\" requires matrix ' +
+                         str(i_frame) + '.)\n')
+    # Temporarily remove the matrices which were pushed after it
+    for k in range(len(pushed) - 1, j - 1, -1):
+        M, which_stack, right_not_left, tmp = pushed[k]
+        matrix_stack.Pop(which_stack, right_not_left)
+    M = frames[i_frame].tolist()
+    pushed[j] = (M,) + pushed[j][1:]
+    for k in range(j, len(pushed)):
+        M, which_stack, right_not_left, tmp = pushed[k]
+        postprocessing = postprocessing_commands[k]
+        if postprocessing is not None:
+            # (The frame of the movecm(),rotcm(),scalecm() commands changed.)
+            postprocessing_commands[k] = \
+                (postprocessing[0],
+                 matrix_stack.FrameMatrix(which_stack, right_not_left),
+                 postprocessing[2],
+                 postprocessing[3],
+                 postprocessing[4])
+        matrix_stack.Push(M, which_stack, right_not_left)
+
+
+def CMScopes(commands):
+    """
+    Return the set of indices (into the "commands" list) where the scopes
+    containing movecm(), rotcm(), or scalecm() commands begin.  (Only the
+    coordinates written within these scopes need to be held in memory
+    before they are written.)
+    """
+    cm_scopes = set([])
+    scope_starts = []
+    for i in range(0, len(commands)):
+        command = commands[i]
+        if isinstance(command, ScopeBegin):
+            scope_starts.append(i + 1)
+        elif isinstance(command, ScopeEnd):
+            scope_starts.pop()
+        elif isinstance(command, PushCommand):
+            if len(SplitCMTransforms(command.contents)) > 1:
+                cm_scopes.add(scope_starts[-1])
+    return cm_scopes
+
+
+def SplitCMTransforms(contents):
+    """
+    Split a chain of transformations (eg. the "contents" of a PushCommand)
+    into blocks.  Every block after the first one begins with a command
+    which refers to the center of mass ("movecm", "rotcm", or "scalecm").
+    (The first block is '' if the chain begins with one of these commands.)
+    """
+    transform_blocks = ['']
+    # (Note: Splitting on '.' also splits numbers like "1.5" in two, but
+    #  the pieces are joined together again.)
+    for transform in contents.split('.'):
+        if transform != '':
+            if transform.split('(')[0].strip() in ('movecm',
+                                                   'rotcm',
+                                                   'scalecm'):
+                transform_blocks.append('')
+            transform_blocks[-1] += '.' + transform
+    return transform_blocks
+
+
 def ExecCommands(commands,
-                 files_content,
+                 output,
                  settings,
-                 substitute_vars=True):
+                 substitute_vars=True,
+                 skip_files=None,
+                 atom_masses=None):
 
     matrix_stack = MultiAffineStack()
 
     index = _ExecCommands(commands,
                           0,
-                          files_content,
+                          output,
                           settings,
                           matrix_stack,
                           None,
-                          substitute_vars)
+                          substitute_vars,
+                          skip_files,
+                          CMScopes(commands),
+                          atom_masses)
     assert(index == len(commands))
 
 
+class OutputFiles(object):
+    """
+    OutputFiles writes the rendered text to the files as soon as it is
+    generated, instead of keeping the contents of every file in memory.
+    There is one (buffered) file handle for each file.  (If there are too
+    many files, the handles are closed and later reopened in append mode.)
+    Text sent to the file named '' is written to the standard output
+    (if write_to_stdout is True), and it is also kept in "stdout_content".
+
+    The text is written to temporary files (ending in ".tmp").  They replace
+    the original files when Close() is invoked.  If rendering fails, invoke
+    Discard() instead, and the files from the previous run are left intact.
+    If keep_digests is True, the SHA-256 digest of the text written to each
+    file is computed as the text is written.  (See Digest().)
+    """
+
+    max_open_files = 256
+    tmp_suffix = '.tmp'
+    chunk_size = 1 << 20
+
+    def __init__(self, suffix='', write_to_stdout=True, keep_digests=False):
+        self.suffix = suffix
+        self.write_to_stdout = write_to_stdout
+        self.out_files = {}
+        self.tmp_names = {}
+        self.stdout_content = []
+        self.hashers = None
+        if keep_digests:
+            self.hashers = {}
+
+    def Open(self, filename):
+        """ Create (or reopen) the temporary file for "filename". """
+        if len(self.out_files) >= self.max_open_files:
+            self.CloseHandles()
+        tmp_name = self.tmp_names.get(filename)
+        if tmp_name is None:
+            tmp_name = filename + self.suffix + self.tmp_suffix
+            out_file = open(tmp_name, 'w')
+            self.tmp_names[filename] = tmp_name
+        else:
+            out_file = open(tmp_name, 'a')
+        self.out_files[filename] = out_file
+        return out_file
+
+    def Erase(self, command_list):
+        """
+        Erase the files written to by the write() commands in command_list.
+        (They are replaced by empty files when Close() is invoked, even if
+         no text is written to them.)
+        """
+        for command in command_list:
+            if (isinstance(command, WriteFileCommand) and
+                (command.filename is not None) and
+                (command.filename != '') and
+                (command.filename not in self.tmp_names)):
+                self.Open(command.filename)
+
+    def Write(self, filename, text):
+        if filename is None:
+            return
+        if self.hashers is not None:
+            hasher = self.hashers.get(filename)
+            if hasher is None:
+                hasher = hashlib.sha256()
+                self.hashers[filename] = hasher
+            hasher.update(text.encode('utf-8'))
+        if filename == '':
+            if self.write_to_stdout:
+                sys.stdout.write(text)
+                self.stdout_content.append(text)
+        else:
+            out_file = self.out_files.get(filename)
+            if out_file is None:
+                out_file = self.Open(filename)
+            out_file.write(text)
+        if g_profiler.IsEnabled():
+            g_profiler.Count('lines written', text.count('\n'))
+
+    def WriteFile(self, filename, path):
+        """ Write the contents of the file named "path" (a little at a time) """
+        with open(path, 'r') as f:
+            while True:
+                text = f.read(self.chunk_size)
+                if len(text) == 0:
+                    break
+                self.Write(filename, text)
+
+    def Digest(self, filename):
+        """ Return the digest of the text written to "filename" so far. """
+        hasher = self.hashers.get(filename)
+        if hasher is None:
+            hasher = hashlib.sha256()
+        return hasher.hexdigest()
+
+    def CloseHandles(self):
+        for out_file in self.out_files.values():
+            out_file.close()
+        self.out_files = {}
+
+    def Close(self):
+        """ Replace the original files with the files written so far. """
+        self.CloseHandles()
+        for filename, tmp_name in self.tmp_names.items():
+            os.replace(tmp_name, filename + self.suffix)
+        self.tmp_names = {}
+
+    def Discard(self):
+        """ Delete the temporary files.  (The original files are unchanged.) """
+        self.CloseHandles()
+        for tmp_name in self.tmp_names.values():
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+        self.tmp_names = {}
+
+
+class CoordBuffer(object):
+    """
+    CoordBuffer holds back the text written to the "Data Atoms" and
+    "Data Ellipsoids" sections within a scope which contains movecm(),
+    rotcm(), or scalecm() commands.  (The coordinates can not be written
+    until the center of mass is known.)  Everything else is passed on to
+    the "output" immediately.
+    """
+
+    coord_files = (data_atoms, data_ellipsoids)
+
+    def __init__(self, output):
+        self.output = output
+        self.files_content = {}
+
+    def Write(self, filename, text):
+        if filename in self.coord_files:
+            if filename not in self.files_content:
+                self.files_content[filename] = []
+            self.files_content[filename].append(text)
+        else:
+            self.output.Write(filename, text)
+
+    def Mark(self):
+        """ Return the amount of text written so far (see TransformCM()) """
+        return tuple([len(self.files_content.get(filename, []))
+                      for filename in self.coord_files])
+
+    def TransformCM(self,
+                    mark,
+                    transform_blocks,
+                    frame,
+                    atom_masses,
+                    settings,
+                    src_loc,
+                    end_mark=None):
+        """
+        Apply transformations which depend on the center of mass to the
+        coordinates written since Mark() was invoked, (or, if "end_mark"
+        is not None, to the coordinates written between the two marks).
+        (See TransformAtomTextCM() for a description of the other arguments.)
+        """
+        n_atoms, n_ellipsoids = mark
+        if end_mark is None:
+            end_atoms = end_ellipsoids = None
+        else:
+            end_atoms, end_ellipsoids = end_mark
+        atoms = self.files_content.get(data_atoms, [])
+        if len(atoms[n_atoms:end_atoms]) == 0:
+            return
+        text, M = TransformAtomTextCM(''.join(atoms[n_atoms:end_atoms]),
+                                      transform_blocks,
+                                      frame,
+                                      atom_masses,
+                                      settings,
+                                      src_loc)
+        # (The number of entries is unchanged, so that other marks are valid.)
+        atoms[n_atoms:end_atoms] = \
+            [text] + [''] * (len(atoms[n_atoms:end_atoms]) - 1)
+        ellipsoids = self.files_content.get(data_ellipsoids, [])
+        if len(ellipsoids[n_ellipsoids:end_ellipsoids]) > 0:
+            n = len(ellipsoids[n_ellipsoids:end_ellipsoids])
+            ellipsoids[n_ellipsoids:end_ellipsoids] = \
+                [TransformEllipsoidText(
+                    ''.join(ellipsoids[n_ellipsoids:end_ellipsoids]),
+                    M, settings)] + [''] * (n - 1)
+
+    def Flush(self):
+        for filename in self.coord_files:
+            if filename in self.files_content:
+                self.output.Write(filename,
+                                  ''.join(self.files_content[filename]))
+        self.files_content = {}
+
+
 def WriteFiles(files_content, suffix='', write_to_stdout=True):
+    output = OutputFiles(suffix, write_to_stdout)
     for filename, str_list in files_content.items():
-        if filename != None:
-            out_file = None
-            if filename == '':
-                if write_to_stdout:
-                    out_file = sys.stdout
-            else:
-                out_file = open(filename + suffix, 'a')
-            if out_file != None:
-                out_file.write(''.join(str_list))
-                if filename != '':
-                    out_file.close()
+        output.Write(filename, ''.join(str_list))
+    output.Close()
 
     return
 
 
-def main():
+def CheckpointArgs(argv):
+    """
+    Return the arguments which determine the contents of a checkpoint file
+    (or build record).  (This excludes the arguments which only control where
+    files are saved.)
+    """
+    args = []
+    i = 1
+    while i < len(argv):
+        if ((argv[i].lower() in ('-checkpoint', '-resume', '-incremental',
+                                 '-profile')) and
+            (i + 1 < len(argv))):
+            i += 2
+        elif argv[i].lower() == '-profile-memory':
+            i += 1
+        else:
+            args.append(argv[i])
+            i += 1
+    return args
+
+
+def InputFingerprint(args, sources):
+    """
+    Return a summary of the input to lttree.py:  the arguments (args),
+    and the SHA-256 digest of every file that was read.  The "sources"
+    argument is a list of (infile, newfile, path) tuples, one for each file
+    (see TtreeShlex.source_log).  "infile" is None for files named in the
+    argument list.
+    """
+    files = []
+    for (infile, newfile, path) in sources:
+        with open(path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        files.append((infile, newfile, path, digest))
+    return {'version': g_version_str,
+            'python': sys.version,
+            'args': args,
+            'files': files}
+
+
+def ArgFileSources(args):
+    """ The files named in the argument list (eg. the .lt file, -a files) """
+    return [(None, arg, os.path.realpath(arg))
+            for arg in args if os.path.isfile(arg)]
+
+
+def IsFingerprintCurrent(fingerprint, args, include_path):
+    """
+    Would lttree.py read the same files (with the same contents) if it
+    was invoked with these arguments?
+    """
+    if ((fingerprint['version'] != g_version_str) or
+        (fingerprint['python'] != sys.version) or
+        (fingerprint['args'] != args)):
+        return False
+    sources = []
+    for (infile, newfile, path, digest) in fingerprint['files']:
+        if infile is None:
+            found = (os.path.isfile(newfile) and os.path.realpath(newfile))
+        else:
+            found = ResolveSource(newfile, infile, include_path)
+        if found != path:
+            return False
+        sources.append((infile, newfile, path))
+    return InputFingerprint(args, sources) == fingerprint
+
+
+def SaveCheckpoint(filename, fingerprint, state):
+    """
+    Save the "state" (the static and instance trees and the command lists
+    created by BasicUI()) to a file, preceeded by the fingerprint of the
+    input files.
+    """
+    # (Pickling a deep tree requires a deep recursion.)
+    recursion_limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(recursion_limit, 100000))
+    gc_enabled = gc.isenabled()
+    gc.disable()   # (no garbage is created, and this saves a lot of time)
+    try:
+        with open(filename, 'wb') as f:
+            pickle.dump(fingerprint, f, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+    except (RuntimeError, pickle.PicklingError, IOError, OSError) as err:
+        sys.stderr.write('WARNING(' + g_program_name + '): unable to save \"' +
+                         filename + '\"\n'
+                         '        (' + str(err) + ')\n')
+        if os.path.exists(filename):
+            os.unlink(filename)
+    finally:
+        sys.setrecursionlimit(recursion_limit)
+        if gc_enabled:
+            gc.enable()
+
+
+def LoadCheckpoint(filename, args, include_path):
+    """
+    Return the fingerprint and the state saved by SaveCheckpoint(), or None
+    if the file does not exist, or if the input files (or arguments) have
+    changed since then.
+    """
+    if not os.path.exists(filename):
+        return None
+    recursion_limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(recursion_limit, 100000))
+    gc_enabled = gc.isenabled()
+    gc.disable()   # (no garbage is created, and this saves a lot of time)
+    try:
+        with open(filename, 'rb') as f:
+            fingerprint = pickle.load(f)
+            if not IsFingerprintCurrent(fingerprint, args, include_path):
+                g_log.Info('(the input has changed since \"%s\" was saved)\n',
+                           filename)
+                return None
+            return (fingerprint, pickle.load(f))
+    except (RuntimeError, pickle.UnpicklingError, EOFError, IOError, OSError,
+            ImportError, AttributeError, KeyError, TypeError,
+            ValueError) as err:
+        sys.stderr.write('WARNING(' + g_program_name + '): unable to read \"' +
+                         filename + '\"\n'
+                         '        (' + str(err) + ')\n')
+        return None
+    finally:
+        sys.setrecursionlimit(recursion_limit)
+        if gc_enabled:
+            gc.enable()
+
+
+def _Digest(hasher, *strings):
+    for s in strings:
+        if not isinstance(s, bytes):
+            s = s.encode('utf-8')
+        hasher.update(s)
+        hasher.update(b'\0')
+
+
+def SectionKeys(command_lists, args):
+    """
+    Return a dictionary containing a digest (key) for each of the files
+    (sections) written by the commands in "command_lists".  The key of each
+    file depends on the text of every template written to it, and the names
+    and values of the variables those templates refer to.  If a file's key
+    has not changed, then neither has its content.
+    The "Data Atoms", "Data Ellipsoids" and "Data Masses" sections share the
+    same key, which also depends on the coordinate transformations (and the
+    order in which the molecules which use them are written).
+    """
+    coord_files = (data_atoms, data_ellipsoids, data_masses)
+    coord_hasher = hashlib.sha256()
+    hashers = {}
+    node_labels = {}
+
+    def NodeLabel(node):
+        # Nodes are labelled in the order they are encountered, so that the
+        # labels do not depend on where the objects happen to be in memory.
+        if node is None:
+            return 'None'
+        label = node_labels.get(node)
+        if label is None:
+            label = str(len(node_labels))
+            node_labels[node] = label
+        return label
+
+    for command_list in command_lists:
+        for command in command_list:
+            if isinstance(command, WriteFileCommand):
+                if command.filename is None:
+                    continue
+                if command.filename in coord_files:
+                    hasher = coord_hasher
+                    _Digest(hasher, command.filename)
+                else:
+                    hasher = hashers.get(command.filename)
+                    if hasher is None:
+                        hasher = hashlib.sha256()
+                        hashers[command.filename] = hasher
+                bindings = command.bindings
+                for i, entry in enumerate(command.tmpl_list):
+                    if isinstance(entry, TextBlock):
+                        _Digest(hasher, entry.text)
+                        continue
+                    if (bindings is not None) and (bindings[i] is not None):
+                        nptr = bindings[i].nptr
+                    else:
+                        nptr = entry.nptr
+                    if nptr.leaf_node.IsDeleted():
+                        _Digest(hasher, '\1deleted')
+                    else:
+                        binding = nptr.cat_node.categories[
+                            nptr.cat_name].bindings[nptr.leaf_node]
+                        _Digest(hasher,
+                                entry.prefix,
+                                entry.suffix,
+                                binding.full_name,
+                                str(binding.value))
+            elif isinstance(command, PushCommand):
+                _Digest(coord_hasher,
+                        command.__class__.__name__,
+                        command.contents,
+                        NodeLabel(command.context_node))
+                if isinstance(command, PushFramesCommand):
+                    # (The matrices are read from a file which may change.)
+                    try:
+                        _Digest(coord_hasher,
+                                repr(FramesFileStamp(command.file_name)))
+                    except OSError:
+                        pass  # (LoadFrames() will report the error later.)
+            elif isinstance(command, PopCommand):
+                _Digest(coord_hasher,
+                        command.__class__.__name__,
+                        NodeLabel(command.context_node))
+            elif isinstance(command, ScopeCommand):
+                _Digest(coord_hasher,
+                        command.__class__.__name__,
+                        NodeLabel(command.node))
+                if isinstance(command.node, InstanceObj):
+                    _Digest(coord_hasher, str(bool(command.node.children)))
+
+    prefix = repr((g_version_str, args))
+    keys = {}
+    for filename, hasher in hashers.items():
+        keys[filename] = hashlib.sha256((prefix + hasher.hexdigest()).encode('utf-8')).hexdigest()
+    if coord_hasher.digest() != hashlib.sha256().digest():
+        coord_key = hashlib.sha256((prefix + coord_hasher.hexdigest()).encode('utf-8')).hexdigest()
+        for command_list in command_lists:
+            for command in command_list:
+                if (isinstance(command, WriteFileCommand) and
+                    (command.filename in coord_files)):
+                    keys[command.filename] = coord_key
+    return keys
+
+
+def BuildRecordDir(filename):
+    """
+    The sections saved by SaveBuildRecord() are stored in this directory,
+    next to the record.  Each file is named after the digest of its content.
+    """
+    return filename + '.sections'
+
+
+def FileDigest(path):
+    """
+    Return the digest of a text file.  (This is the same digest that
+    OutputFiles.Digest() would return, if the text had been written using
+    OutputFiles.)
+    """
+    hasher = hashlib.sha256()
+    with open(path, 'r') as f:
+        while True:
+            text = f.read(OutputFiles.chunk_size)
+            if len(text) == 0:
+                break
+            hasher.update(text.encode('utf-8'))
+    return hasher.hexdigest()
+
+
+def SaveBuildRecord(filename, record, copies, texts):
+    """
+    Save the output of this build (see main()), so that the sections which
+    do not change can be reused the next time lttree.py is run.
+    The record only contains the digests of the sections.  The sections
+    themselves are stored in BuildRecordDir(filename).  "copies" is a list
+    of (digest, path) pairs (the files written by this build), and "texts" is
+    a list of (digest, text) pairs (text which was not written to a file).
+    Sections which have not changed since the last build are already there,
+    so they are not copied again.
+    """
+    dirname = BuildRecordDir(filename)
+    try:
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        needed = set()
+        for digest, path in copies:
+            needed.add(digest)
+            stored = os.path.join(dirname, digest)
+            if not os.path.exists(stored):
+                shutil.copyfile(path, stored + OutputFiles.tmp_suffix)
+                os.replace(stored + OutputFiles.tmp_suffix, stored)
+        for digest, text in texts:
+            needed.add(digest)
+            stored = os.path.join(dirname, digest)
+            if not os.path.exists(stored):
+                with open(stored + OutputFiles.tmp_suffix, 'w') as f:
+                    f.write(text)
+                os.replace(stored + OutputFiles.tmp_suffix, stored)
+        with open(filename, 'wb') as f:
+            pickle.dump(record, f, pickle.HIGHEST_PROTOCOL)
+        # Delete the sections which are no longer needed.
+        for name in os.listdir(dirname):
+            if name not in needed:
+                os.unlink(os.path.join(dirname, name))
+    except (pickle.PicklingError, IOError, OSError) as err:
+        sys.stderr.write('WARNING(' + g_program_name + '): unable to save \"' +
+                         filename + '\"\n'
+                         '        (' + str(err) + ')\n')
+        if os.path.exists(filename):
+            os.unlink(filename)
+
+
+def LoadBuildRecord(filename):
+    """
+    Return the record saved by SaveBuildRecord(), (or None if the file does
+    not exist or can not be read).
+    """
+    if not os.path.exists(filename):
+        return None
+    try:
+        with open(filename, 'rb') as f:
+            record = pickle.load(f)
+        if ((record.get('version') == g_version_str) and
+            os.path.isdir(BuildRecordDir(filename))):
+            return record
+    except (pickle.UnpicklingError, EOFError, IOError, OSError,
+            ImportError, AttributeError, KeyError, TypeError,
+            ValueError) as err:
+        sys.stderr.write('WARNING(' + g_program_name + '): unable to read \"' +
+                         filename + '\"\n'
+                         '        (' + str(err) + ')\n')
+    return None
+
+
+def IsSectionStored(filename, section):
+    """ Are the files for this section (see main()) in the record's directory? """
+    dirname = BuildRecordDir(filename)
+    return (os.path.isfile(os.path.join(dirname, section[1])) and
+            os.path.isfile(os.path.join(dirname, section[2])))
+
+
+def RestoreBuildRecord(filename, record):
+    """
+    Write the files from a previous build (saved by SaveBuildRecord()),
+    exactly as they were written when it was saved.
+    Returns False (and writes nothing) if some of the files are missing.
+    """
+    dirname = BuildRecordDir(filename)
+    if ((not all([IsSectionStored(filename, section)
+                  for section in record['sections'].values()])) or
+        (not os.path.isfile(os.path.join(dirname, record['assignments'])))):
+        return False
+    for out_filename in record['erase']:
+        open(out_filename, 'w').close()
+        open(out_filename + '.template', 'w').close()
+    for suffix, i in (('.template', 1), ('', 2)):
+        output = OutputFiles(suffix=suffix, write_to_stdout=(suffix == ''))
+        try:
+            for out_filename, section in record['sections'].items():
+                output.WriteFile(out_filename,
+                                 os.path.join(dirname, section[i]))
+            output.Close()
+        finally:
+            output.Discard()
+    shutil.copyfile(os.path.join(dirname, record['assignments']),
+                    'ttree_assignments.txt')
+    return True
+
+
+def main(static_tree_loader=None):
     """
     This is is a "main module" wrapper for invoking lttree.py
     as a stand alone program.  This program:
@@ -862,6 +1662,12 @@ def main():
     4)automatically assigns values to the variables,
     5)and carries out the "write" commands to write the templates a file(s).
 
+    The optional "static_tree_loader" argument is a function which accepts
+    the settings (after the arguments have been parsed) and returns the root
+    of the static tree which the file will be parsed into.  (lttree_server.py
+    uses it to supply a tree which already contains the class definitions
+    from the force-field files it has read in advance.)
+
     """
 
     #######  Main Code Below: #######
@@ -880,21 +1686,91 @@ def main():
         LttreeParseArgs([arg for arg in sys.argv],  #(deep copy of sys.argv)
                         settings, main=True, show_warnings=True)
 
-        # Data structures to store the class definitionss and instances
-        g_objectdefs = StaticObj('', None)  # The root of the static tree
-        # has name '' (equivalent to '/')
-        g_objects = InstanceObj('', None)  # The root of the instance tree
-        # has name '' (equivalent to '/')
-
-        # A list of commands to carry out
-        g_static_commands = []
-        g_instance_commands = []
-
-        BasicUI(settings,
-                g_objectdefs,
-                g_objects,
-                g_static_commands,
-                g_instance_commands)
+        if static_tree_loader is not None:
+            # (The files read in advance are not included in the fingerprint.)
+            for filename in (settings.checkpoint_file,
+                             settings.incremental_file):
+                if filename is not None:
+                    sys.stderr.write('WARNING(' + g_program_name + '): ignoring \"' +
+                                     filename + '\"\n'
+                                     '        (checkpoints and build records are not used with lttree_server.py)\n')
+            settings.checkpoint_file = None
+            settings.incremental_file = None
+
+        checkpoint_args = CheckpointArgs(sys.argv)
+
+        record = None
+        if settings.incremental_file is not None:
+            with g_profiler.Stage('LoadBuildRecord'):
+                record = LoadBuildRecord(settings.incremental_file)
+            if ((record is not None) and
+                IsFingerprintCurrent(record['fingerprint'],
+                                     checkpoint_args,
+                                     settings.lex.include_path)):
+                # None of the input files have changed since the last build.
+                with g_profiler.Stage('RestoreBuildRecord'):
+                    restored = RestoreBuildRecord(settings.incremental_file,
+                                                  record)
+                if restored:
+                    g_log.Info('the files in \"%s\" are up to date\n',
+                               settings.incremental_file)
+                    return
+
+        fingerprint = None
+        state = None
+        if settings.resume:
+            with g_profiler.Stage('LoadCheckpoint'):
+                loaded = LoadCheckpoint(settings.checkpoint_file,
+                                        checkpoint_args,
+                                        settings.lex.include_path)
+            if loaded is not None:
+                fingerprint, state = loaded
+
+        if state is not None:
+            g_log.Info('resuming from \"%s\"...', settings.checkpoint_file)
+            (g_objectdefs,
+             g_objects,
+             g_static_commands,
+             g_instance_commands) = state
+        else:
+            # Data structures to store the class definitionss and instances
+            if static_tree_loader is None:
+                g_objectdefs = StaticObj('', None)  # The root of the static tree
+                # has name '' (equivalent to '/')
+            else:
+                g_objectdefs = static_tree_loader(settings)
+            g_objects = InstanceObj('', None)  # The root of the instance tree
+            # has name '' (equivalent to '/')
+
+            # A list of commands to carry out
+            g_static_commands = []
+            g_instance_commands = []
+
+            if ((settings.checkpoint_file is not None) or
+                (settings.incremental_file is not None)):
+                # Keep track of the files we read:
+                settings.lex.source_log = []
+
+            BasicUI(settings,
+                    g_objectdefs,
+                    g_objects,
+                    g_static_commands,
+                    g_instance_commands)
+
+            if settings.lex.source_log is not None:
+                fingerprint = InputFingerprint(checkpoint_args,
+                                               ArgFileSources(checkpoint_args) +
+                                               settings.lex.source_log)
+
+            if settings.checkpoint_file is not None:
+                g_log.Info('saving \"%s\"...', settings.checkpoint_file)
+                with g_profiler.Stage('SaveCheckpoint'):
+                    SaveCheckpoint(settings.checkpoint_file,
+                                   fingerprint,
+                                   (g_objectdefs,
+                                    g_objects,
+                                    g_static_commands,
+                                    g_instance_commands))
 
         # Interpret the the commands.  (These are typically write() or
         # write_once() commands, rendering templates into text.
@@ -902,46 +1778,139 @@ def main():
         # Coordinate transformations can be applied to the rendered text
         # as a post-processing step.
 
-        sys.stderr.write(' done\nbuilding templates...')
-
-        files_content = defaultdict(list)
-
-        ExecCommands(g_static_commands,
-                     files_content,
-                     settings,
-                     False)
-        ExecCommands(g_instance_commands,
-                     files_content,
-                     settings,
-                     False)
-
-        # Finally: write the rendered text to actual files.
-
-        # Erase the files that will be written to:
-        sys.stderr.write(' done\nwriting templates...')
-        EraseTemplateFiles(g_static_commands)
-        EraseTemplateFiles(g_instance_commands)
-
-        # Write the files as templates
-        # (with the original variable names present)
-        WriteFiles(files_content, suffix=".template", write_to_stdout=False)
-
-        # Write the files with the variables substituted by values
-        sys.stderr.write(' done\nbuilding and rendering templates...')
-        files_content = defaultdict(list)
-        ExecCommands(g_static_commands, files_content, settings, True)
-        ExecCommands(g_instance_commands, files_content, settings, True)
-        sys.stderr.write(' done\nwriting rendered templates...\n')
-        WriteFiles(files_content)
-        sys.stderr.write(' done\n')
+        g_log.Info(' done\n')
+
+        # If the output of a previous build was saved, then find the
+        # sections (files) whose content can not have changed since then.
+        # (Their write() commands can be skipped.)
+        section_keys = None
+        reused = {}
+        skip_files = None
+        if settings.incremental_file is not None:
+            with g_profiler.Stage('SectionKeys'):
+                section_keys = SectionKeys([g_static_commands,
+                                            g_instance_commands],
+                                           checkpoint_args)
+            if record is not None:
+                for filename, key in section_keys.items():
+                    section = record['sections'].get(filename)
+                    if ((section is not None) and (section[0] == key) and
+                        IsSectionStored(settings.incremental_file, section)):
+                        reused[filename] = section
+                skip_files = set(reused)
+            g_log.Info('reusing %d of %d sections from \"%s\"\n',
+                       len(reused), len(section_keys),
+                       settings.incremental_file)
+
+        # The rendered text is written to the files as soon as it is
+        # generated.  (Only the coordinates of molecules which are moved
+        # using movecm(), rotcm(), or scalecm() are held in memory until
+        # their center of mass is known.)  The text is written to temporary
+        # files, which replace the original files only if both the templates
+        # and the rendered files are written successfully.
+        # (The digest of each section is computed as it is written,
+        #  in case it needs to be saved in the build record.)
+        keep_digests = (settings.incremental_file is not None)
+        template_output = OutputFiles(suffix='.template',
+                                      write_to_stdout=False,
+                                      keep_digests=keep_digests)
+        output = OutputFiles(keep_digests=keep_digests)
+        try:
+            # Erase the files that will be written to:
+            for out in (template_output, output):
+                out.Erase(g_static_commands)
+                out.Erase(g_instance_commands)
+
+            # Write the files as templates
+            # (with the original variable names present)
+            g_log.Info('building and writing templates...')
+            # (The "Data Masses" written by either list of commands are used
+            #  to find the center of mass of molecules moved using movecm().)
+            atom_masses = AtomTypeMasses()
+            with g_profiler.Stage('ExecCommands (templates)'):
+                ExecCommands(g_static_commands,
+                             template_output,
+                             settings,
+                             False,
+                             skip_files,
+                             atom_masses)
+                ExecCommands(g_instance_commands,
+                             template_output,
+                             settings,
+                             False,
+                             skip_files,
+                             atom_masses)
+                for filename, section in reused.items():
+                    template_output.WriteFile(filename, os.path.join(
+                        BuildRecordDir(settings.incremental_file), section[1]))
+            template_output.CloseHandles()
+
+            # Write the files with the variables substituted by values
+            g_log.Info(' done\nbuilding and writing rendered templates...')
+            atom_masses = AtomTypeMasses()
+            with g_profiler.Stage('ExecCommands (rendered)'):
+                ExecCommands(g_static_commands, output, settings, True,
+                             skip_files, atom_masses)
+                ExecCommands(g_instance_commands, output, settings, True,
+                             skip_files, atom_masses)
+                for filename, section in reused.items():
+                    output.WriteFile(filename, os.path.join(
+                        BuildRecordDir(settings.incremental_file), section[2]))
+            template_output.Close()
+            output.Close()
+        finally:
+            # (If rendering failed, leave the files from the last run intact.)
+            template_output.Discard()
+            output.Discard()
+        g_log.Info(' done\n')
 
         # Now write the variable bindings/assignments table.
-        sys.stderr.write('writing \"ttree_assignments.txt\" file...')
+        g_log.Info('writing \"ttree_assignments.txt\" file...')
         # <-- erase previous version.
         open('ttree_assignments.txt', 'w').close()
-        WriteVarBindingsFile(g_objectdefs)
-        WriteVarBindingsFile(g_objects)
-        sys.stderr.write(' done\n')
+        with g_profiler.Stage('WriteVarBindingsFile'):
+            WriteVarBindingsFile(g_objectdefs)
+            WriteVarBindingsFile(g_objects)
+        g_log.Info(' done\n')
+
+        if settings.incremental_file is not None:
+            g_log.Info('saving \"%s\"...', settings.incremental_file)
+            # Each section is stored as a (key, template_digest,
+            # rendered_digest) tuple.  The files themselves are copied to
+            # the directory next to the record (unless they are already there).
+            sections = {}
+            copies = []
+            empty_digest = hashlib.sha256().hexdigest()
+            texts = [(empty_digest, '')]
+            for filename, key in section_keys.items():
+                if filename == '':
+                    # (The text written to the standard output is not saved
+                    #  as a template.)
+                    sections[filename] = (key,
+                                          empty_digest,
+                                          output.Digest(filename))
+                    texts.append((sections[filename][2],
+                                  ''.join(output.stdout_content)))
+                else:
+                    sections[filename] = (key,
+                                          template_output.Digest(filename),
+                                          output.Digest(filename))
+                    copies.append((sections[filename][1],
+                                   filename + '.template'))
+                    copies.append((sections[filename][2], filename))
+            with g_profiler.Stage('SaveBuildRecord'):
+                assignments = FileDigest('ttree_assignments.txt')
+                copies.append((assignments, 'ttree_assignments.txt'))
+                SaveBuildRecord(settings.incremental_file,
+                                {'version': g_version_str,
+                                 'fingerprint': fingerprint,
+                                 'erase': [filename for filename in section_keys
+                                           if filename != ''],
+                                 'sections': sections,
+                                 'assignments': assignments},
+                                copies,
+                                texts)
+            g_log.Info(' done\n')
 
     except (ValueError, InputError) as err:
         if isinstance(err, ValueError):
@@ -956,6 +1925,10 @@ def main():
             sys.stderr.write('\n\n' + str(err) + '\n')
             sys.exit(-1)
 
+    finally:
+        # (Release the files opened by ".frames()" commands, if any.)
+        CloseFrames()
+
     return
 
 
@@ -2106,12 +2106,10 @@ def main():
                             search_instance_commands=False)
         replace_var_pairs = {}
         FindReplacementVarPairs(static_tree_root, replace_var_pairs)
-        ReplaceVars(static_tree_root, replace_var_pairs,
-                    search_instance_commands=False)
+        ReplaceVars(static_tree_root, replace_var_pairs)
         AssignStaticVarPtrs(static_tree_root,
                             search_instance_commands=True)
-        ReplaceVars(static_tree_root, replace_var_pairs,
-                    search_instance_commands=True)
+        ReplaceVars(static_tree_root, replace_var_pairs)
         sys.stderr.write(' done\n')
         #sys.stderr.write(' done\n\nclass_def_tree = ' + str(static_tree_root) + '\n\n')
 
@@ -0,0 +1,463 @@
+#!/usr/bin/env python
+
+# License: MIT License  (See LICENSE.md)
+# Copyright (c) 2026, the moltemplate contributors
+
+
+man_page_text = """
+Usage (example):
+
+   lttree_server.py -listen /tmp/moltemplate.sock oplsaa.lt
+
+   (in another terminal, for each system you want to build:)
+
+   moltemplate.sh -server /tmp/moltemplate.sock -nocheck system.lt
+
+lttree_server.py is a long-running process which reads one or more
+force-field files (or other .lt files) in advance, and then waits for
+requests to run lttree.py on a local (UNIX) socket.  This saves time when
+you build thousands of small systems which all import the same (large)
+force-field file.  Usually, most of the time is spent starting python and
+parsing the force field.  The server only does this once.
+
+Each request is handled by a forked copy of the server.  The copy
+inherits the parsed class definitions (the "static tree") without copying
+them, changes to the client's working directory and environment, and
+writes to the client's standard input, output and error.  The output files
+(and the exit status) are the same as if lttree.py had been run by the
+client.  Requests never modify the server's copy of the static tree.
+
+The preloaded class definitions are only used if the first statements in
+the client's .lt file are "import" statements for the same files (in the
+same order) listed on the server's command line, and if these files (and
+the files they import) are found in the same places on the client's
+import path.  (Later statements can import other files.)  Otherwise the
+file is parsed from scratch (which is correct, but slower).  If any of
+these files are modified, the server reads them again.
+
+Arguments:
+
+   -listen SOCKET     The name of the socket file to create.
+   -importpath PATH   Directories to search when importing files.
+                      (This is also used by lttree.py.  See "ttree.py")
+   FILE1.lt ...       The names of the files to read in advance, as they
+                      appear in the "import" statements of the .lt files
+                      which will be sent to the server.
+
+Client usage:
+
+   lttree_server.py -connect SOCKET [lttree.py arguments...]
+
+This runs lttree.py using the server listening on SOCKET.  (This is what
+"moltemplate.sh -server SOCKET" does.)
+
+Note: Because moltemplate.sh also runs lttree_check.py (which parses the
+      force field again), use "-nocheck" to get the full benefit.
+
+Note: The benefit is small for large systems.  For the hexadecane example
+      (using "oplsaa.lt"), the server only saves about 0.6 seconds of
+      parsing.  moltemplate.sh takes 58 seconds instead of 61 seconds.
+      Most of the time is spent after parsing.
+
+Note: The socket file can only be used by the user who started the server.
+      (Requests run with the server's permissions.)
+
+"""
+
+
+import sys
+import os
+import stat
+import json
+import socket
+import signal
+import struct
+import traceback
+from array import array
+from io import StringIO
+
+try:
+    from .ttree import StaticObj, PushLeftCommand, PushRightCommand, \
+        g_lookup_cache
+    from .ttree_lex import InputError, TemplateLexer, RemoveOuterQuotes, \
+        ResolveSource
+    from .ttree_log import g_log, LOG_NORMAL
+    from .ttree_profile import g_profiler
+    from .lttree import LttreeSettings, LttreeParseArgs
+    from .lttree import main as lttree_main
+except (ImportError, SystemError, ValueError):
+    # not installed as a package
+    from ttree import StaticObj, PushLeftCommand, PushRightCommand, \
+        g_lookup_cache
+    from ttree_lex import InputError, TemplateLexer, RemoveOuterQuotes, \
+        ResolveSource
+    from ttree_log import g_log, LOG_NORMAL
+    from ttree_profile import g_profiler
+    from lttree import LttreeSettings, LttreeParseArgs
+    from lttree import main as lttree_main
+
+
+g_filename = __file__.split('/')[-1]
+g_module_name = g_filename
+if g_filename.rfind('.py') != -1:
+    g_module_name = g_filename[:g_filename.rfind('.py')]
+g_date_str = '2026-10-19'
+g_version_str = '0.1.0'
+g_program_name = g_filename
+
+# The name given to the (imaginary) file containing the "import" statements
+# for the preloaded files.  (It appears in place of the name of the client's
+# .lt file when those files are imported.)
+g_preload_infile = '__preloaded_files__'
+
+# Each message begins with its length (in bytes), packed in this format:
+g_header_format = '!I'
+# The exit status (sent back to the client) is packed in this format:
+g_status_format = '!i'
+
+
+
+def LeadingImports(fname):
+    """
+    Return a list of the names of the files imported by the "import"
+    statements at the beginning of file "fname" (before any other statements).
+    Comments and blank lines are skipped.  (The scan stops at the first line
+    it does not understand, so unusual formatting only makes the list shorter.)
+    """
+    fnames = []
+    with open(fname, 'r') as f:
+        for line in f:
+            ic = line.find('#')
+            if ic != -1:
+                line = line[:ic]
+            tokens = line.split()
+            if len(tokens) == 0:
+                continue
+            if (len(tokens) != 2) or (tokens[0] != 'import'):
+                break
+            fnames.append(RemoveOuterQuotes(tokens[1]))
+    return fnames
+
+
+
+class PreloadedTree(object):
+    """
+    The static tree (StaticObj) containing the class definitions from the
+    files that were read in advance, and the information needed to decide
+    whether it can be used in place of reading these files again.
+
+    fnames            the names of the preloaded files (as they appear in the
+                      "import" statements)
+    include_path      the directories searched when importing files
+    root              the root of the static tree (or None if reading the
+                      files failed)
+    files_restricted  the names of the imported files.  (These files are
+                      skipped if they are imported again.)
+    imported          a list of (infile, newfile, path, mtime, size) tuples
+                      for every file opened while reading.  "infile" is the
+                      name of the file containing the "import" statement.
+                      "path" is the (real) path of the file that was opened.
+
+    """
+
+    def __init__(self, fnames, include_path):
+        self.fnames = fnames
+        self.include_path = include_path
+        self.root = None
+        self.files_restricted = set([])
+        self.imported = []
+        self.Load()
+
+    def Load(self):
+        # The cached results of searches refer to the nodes of the old tree:
+        g_lookup_cache.Clear()
+        self.root = None
+        self.files_restricted = set([])
+        self.imported = []
+        text = ''.join(['import \"' + fname + '\"\n' for fname in self.fnames])
+        lex = TemplateLexer(StringIO(text), g_preload_infile)
+        lex.include_path = list(self.include_path)
+        lex.source_log = []
+
+        g_log.Info('%s: reading %s...', g_program_name, ' '.join(self.fnames))
+        root = StaticObj('', None)
+        root.Parse(lex)
+        for command in root.instance_commands:
+            if isinstance(command, (PushLeftCommand, PushRightCommand)):
+                raise InputError('Error(' + g_program_name + '): The preloaded files contain\n'
+                                 '       a push() command outside of any class definition.\n'
+                                 '       (This is not supported.  Import these files normally.)\n')
+        for (infile, newfile, path) in lex.source_log:
+            st = os.stat(path)
+            self.imported.append((infile, newfile, path,
+                                  st.st_mtime, st.st_size))
+        self.root = root
+        self.files_restricted = set(lex.source_files_restricted)
+        g_log.Info(' done\n')
+
+    def IsStale(self):
+        """ Have any of the files been modified (or deleted) since Load()? """
+        for (infile, newfile, path, mtime, size) in self.imported:
+            try:
+                st = os.stat(path)
+            except OSError:
+                return True
+            if (st.st_mtime != mtime) or (st.st_size != size):
+                return True
+        return False
+
+    def IsUsableBy(self, lex):
+        """
+        Can this tree be used instead of parsing the file read by "lex"?
+        (This requires that the file begins by importing the same files,
+         and that these files (and the files they import) would be found
+         in the same places.)
+        """
+        if self.root is None:
+            return False
+        fnames = LeadingImports(lex.infile)
+        if fnames[:len(self.fnames)] != self.fnames:
+            return False
+        for (infile, newfile, path, mtime, size) in self.imported:
+            if infile == g_preload_infile:
+                infile = lex.infile
+            if ResolveSource(newfile, infile, lex.include_path) != path:
+                return False
+        return True
+
+    def Checkout(self, settings):
+        """
+        Return the static tree that lttree.py should parse the file into.
+        (This is invoked by lttree.main() after parsing the arguments.
+         It modifies the tree, so it should only be invoked by the forked
+         process handling the request, never by the server.)
+        """
+        lex = settings.lex
+        if not self.IsUsableBy(lex):
+            g_log.Info('%s: (not using the preloaded files for \"%s\")\n',
+                       g_program_name, lex.infile)
+            return StaticObj('', None)
+        # Pretend the preloaded files were imported by the client's file:
+        lex.source_files_restricted.update(self.files_restricted)
+        self.root.srcloc_begin.infile = lex.infile
+        self.root.srcloc_begin.lineno = 1
+        return self.root
+
+
+
+def RecvExactly(conn, num_bytes):
+    chunks = []
+    while num_bytes > 0:
+        chunk = conn.recv(num_bytes)
+        if len(chunk) == 0:
+            raise EOFError
+        chunks.append(chunk)
+        num_bytes -= len(chunk)
+    return b''.join(chunks)
+
+
+
+def RecvRequest(conn):
+    """
+    Read the request sent by SendRequest().  Return the request (a dict),
+    and the client's stdin, stdout, and stderr file descriptors.
+    """
+    fds = array('i')
+    header_size = struct.calcsize(g_header_format)
+    msg, ancdata, flags, addr = conn.recvmsg(header_size,
+                                             socket.CMSG_LEN(3 * fds.itemsize))
+    for (cmsg_level, cmsg_type, cmsg_data) in ancdata:
+        if (cmsg_level == socket.SOL_SOCKET) and (cmsg_type == socket.SCM_RIGHTS):
+            n = len(cmsg_data) - (len(cmsg_data) % fds.itemsize)
+            fds.frombytes(cmsg_data[:n])
+    if len(msg) < header_size:
+        msg += RecvExactly(conn, header_size - len(msg))
+    payload_size = struct.unpack(g_header_format, msg)[0]
+    request = json.loads(RecvExactly(conn, payload_size).decode('utf-8'))
+    if len(fds) != 3:
+        for fd in fds:
+            os.close(fd)
+        raise EOFError
+    return request, list(fds)
+
+
+
+def SendRequest(socket_name, lttree_argv):
+    """
+    Ask the server listening on "socket_name" to run lttree.py with
+    arguments "lttree_argv" (in the current directory, using the current
+    stdin, stdout and stderr).  Return lttree.py's exit status.
+    """
+    request = {'cwd': os.getcwd(),
+               'argv': lttree_argv,
+               'env': dict(os.environ)}
+    payload = json.dumps(request).encode('utf-8')
+    sys.stdout.flush()
+    sys.stderr.flush()
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(socket_name)
+    except socket.error as err:
+        raise InputError('Error(' + g_program_name + '): unable to connect to \"' +
+                         socket_name + '\"\n'
+                         '       (' + str(err) + ')\n'
+                         '       Is lttree_server.py running?\n')
+    fds = array('i', [0, 1, 2])
+    conn.sendmsg([struct.pack(g_header_format, len(payload))],
+                 [(socket.SOL_SOCKET, socket.SCM_RIGHTS, fds.tobytes())])
+    conn.sendall(payload)
+    try:
+        status = struct.unpack(g_status_format,
+                               RecvExactly(conn, struct.calcsize(g_status_format)))[0]
+    except EOFError:
+        sys.stderr.write('Error(' + g_program_name + '): the server (\"' +
+                         socket_name + '\") did not finish the request.\n')
+        status = 1
+    conn.close()
+    return status
+
+
+
+def ServeRequest(conn, request, fds, preloaded):
+    """
+    Run lttree.py (in a forked process) as requested by the client,
+    send the exit status back to the client and exit.
+    """
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    for i in range(0, 3):
+        os.dup2(fds[i], i)
+        os.close(fds[i])
+    status = 0
+    try:
+        os.chdir(request['cwd'])
+        os.environ.clear()
+        os.environ.update(request['env'])
+        sys.argv = ['lttree.py'] + request['argv']
+        g_log.SetLevel(LOG_NORMAL)
+        lttree_main(static_tree_loader=preloaded.Checkout)
+    except SystemExit as err:
+        if err.code is None:
+            status = 0
+        elif isinstance(err.code, int):
+            status = err.code
+        else:
+            sys.stderr.write(str(err.code) + '\n')
+            status = 1
+    except BaseException:
+        traceback.print_exc()
+        status = 1
+    try:
+        g_profiler.WriteReport()   # (atexit functions are not invoked here)
+        sys.stdout.flush()
+        sys.stderr.flush()
+        conn.sendall(struct.pack(g_status_format, status))
+    finally:
+        os._exit(0)
+
+
+
+def Serve(socket_name, preloaded):
+    """ Wait for requests and handle each of them in a forked process. """
+    if os.path.exists(socket_name):
+        if not stat.S_ISSOCK(os.stat(socket_name).st_mode):
+            raise InputError('Error(' + g_program_name + '): \"' + socket_name + '\"\n'
+                             '       exists and is not a socket.\n')
+        os.unlink(socket_name)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_name)
+    # Requests run with the server's permissions (in the client's directory),
+    # so only the owner may connect.  (The socket file was created using the
+    # default umask.  Nobody can connect to it until listen() is invoked.)
+    os.chmod(socket_name, stat.S_IRUSR | stat.S_IWUSR)
+    listener.listen(16)
+    # (Remove the socket file when the server is killed.)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    g_log.Info('%s: listening on \"%s\"\n', g_program_name, socket_name)
+    try:
+        while True:
+            conn, addr = listener.accept()
+            # Collect the processes which have finished their requests:
+            try:
+                while os.waitpid(-1, os.WNOHANG)[0] != 0:
+                    pass
+            except ChildProcessError:
+                pass
+            try:
+                request, fds = RecvRequest(conn)
+            except (EOFError, ValueError, socket.error):
+                conn.close()
+                continue
+            if preloaded.IsStale():
+                g_log.Info('%s: (the preloaded files have changed)\n', g_program_name)
+                try:
+                    preloaded.Load()
+                except InputError as err:
+                    # (The forked processes will parse everything normally.)
+                    sys.stderr.write('\n' + str(err) + '\n')
+            sys.stdout.flush()
+            sys.stderr.flush()
+            pid = os.fork()
+            if pid == 0:
+                listener.close()
+                ServeRequest(conn, request, fds, preloaded)
+            for fd in fds:
+                os.close(fd)
+            conn.close()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+        if os.path.exists(socket_name):
+            os.unlink(socket_name)
+
+
+
+def main():
+    try:
+        argv = [arg for arg in sys.argv]
+
+        if (len(argv) >= 3) and (argv[1] == '-connect'):
+            sys.exit(SendRequest(argv[2], argv[3:]))
+
+        sys.stderr.write(g_program_name + ' v' +
+                         g_version_str + ' ' + g_date_str + '\n')
+        socket_name = None
+        i = 1
+        while i < len(argv):
+            if argv[i] == '-listen':
+                if i + 1 >= len(argv):
+                    raise InputError('Error(' + g_program_name + '): The ' + argv[i] +
+                                     ' argument should be followed by the name of a socket file.\n')
+                socket_name = argv[i + 1]
+                del(argv[i:i + 2])
+            else:
+                i += 1
+
+        # Parse the remaining arguments the same way lttree.py does.
+        # (This way the server searches the same directories for files.)
+        settings = LttreeSettings()
+        LttreeParseArgs(argv, settings, main=False, show_warnings=False)
+        fnames = [RemoveOuterQuotes(arg) for arg in argv[1:]]
+
+        if (socket_name is None) or (len(fnames) == 0):
+            raise InputError('Error(' + g_program_name + '): Expected arguments:\n'
+                             '       -listen SOCKET FILE1.lt [FILE2.lt ...]\n'
+                             '       (or -connect SOCKET [lttree.py arguments])\n\n' +
+                             man_page_text)
+        for fname in fnames:
+            if fname[:1] == '-':
+                raise InputError('Error(' + g_program_name + '):\n'
+                                 '       Unrecogized command line argument \"' + fname + '\"\n')
+
+        preloaded = PreloadedTree(fnames, settings.lex.include_path)
+        Serve(socket_name, preloaded)
+
+    except (ValueError, InputError) as err:
+        sys.stderr.write('\n' + str(err) + '\n')
+        sys.exit(1)
+
+    return
+
+
+if __name__ == '__main__':
+    main()
@@ -115,7 +115,36 @@ man_page_text = """
     "Angles" is a 3-body interaction style.  So when run this way,
     nbody_by_type.py will create a 5 (=3+2) column file (new_Angles.data).
 
+    -------- Example 3 -------
+
+    nbody_by_type.py -atoms atoms.data \\
+                     -bonds bonds.data \\
+                     -section Angles -nbodybytype angles_by_type.data \\
+                     -out new_Angles.data \\
+                     -section Dihedrals -nbodybytype dihedrals_by_type.data \\
+                     -out new_Dihedrals.data \\
+                     -section Impropers -nbodybytype impropers_by_type.data \\
+                     -subgraph cenJsortIKL.py \\
+                     -out new_Impropers.data \\
+                     -jobs 3
+
+    Several kinds of interactions can be generated at once this way.  The
+    atoms and bonds are read (and the graph of bonded atoms is built) only
+    once.  The "-section", "-sectionbytype", "-subgraph", "-nbody",
+    "-nbodybytype", "-prefix", "-suffix", and "-checkff" arguments which
+    precede each "-out FILE" argument apply only to that kind of interaction.
+    The interactions are written to FILE (instead of the standard out).
+    The results are identical to running nbody_by_type.py separately
+    for each kind of interaction (as in Example 2).  The optional "-jobs N"
+    argument allows up to N of these searches to run simultaneously
+    (in separate processes).
+
 Note: the atom, bond and other IDs/types in need not be integers.
+      When the atom IDs are ttree variables (eg. "$atom:/water[3]/H1", as in
+      the ".template" files created by moltemplate), the optional
+      "-assignments ttree_assignments.txt" argument causes the numbers
+      assigned to these atoms (in "ttree_assignments.txt") to be printed
+      instead of the (much longer) variable names.
 
 Note: This program must be distributed with several python modules, including:
         nbody_Angles.py, nbody_Dihedrals.py, and nbody_Impropers.py.  These
@@ -138,8 +167,8 @@ Note: Optional "-prefix" and "-suffix" arguments can be included to decorate
 """
 
 g_program_name = __file__.split('/')[-1]  # = 'nbody_by_type.py'
-g_date_str = '2020-11-04'
-g_version_str = '0.21.0'
+g_date_str = '2026-10-19'
+g_version_str = '0.22.0'
 
 bond_pattern_module_name = ""
 
@@ -148,6 +177,7 @@ import sys
 sys.path.append(os.getcwd())
 import importlib
 import re
+import multiprocessing
 
 if sys.version < '2.6':
     raise InputError('Error: Using python ' + sys.version + '\n'
@@ -167,29 +197,25 @@ else:
 
 try:
     from .extract_lammps_data import *
-    from .nbody_by_type_lib import GenInteractions_str
+    from .nbody_by_type_lib import BuildSystemGraph, GenInteractions_array
     from .ttree_lex import *
     from .lttree_styles import AtomStyle2ColNames, ColNames2AidAtypeMolid
+    from .ttree_profile import g_profiler
 except (ImportError, SystemError, ValueError):
     from extract_lammps_data import *
-    from nbody_by_type_lib import GenInteractions_str
+    from nbody_by_type_lib import BuildSystemGraph, GenInteractions_array
     from ttree_lex import *
     from lttree_styles import AtomStyle2ColNames, ColNames2AidAtypeMolid
+    from ttree_profile import g_profiler
 
 
 
-def GenInteractions_lines(lines_atoms,
-                          lines_bonds,
-                          lines_nbody,
-                          lines_nbodybytype,
-                          atom_style,
-                          g_bond_pattern,
-                          canonical_order,  # function to sort atoms and bonds
-                          prefix='',
-                          suffix='',
-                          report_progress=False,
-                          check_undefined=False):
-
+def ParseAtoms(lines_atoms, atom_style):
+    """
+    Read the atom ids and atom types from lines of text in the "Atoms"
+    section of a LAMMPS data file (or a .template file).
+    Returns a 2-tuple of lists: (atomids_str, atomtypes_str)
+    """
     column_names = AtomStyle2ColNames(atom_style)
     i_atomid, i_atomtype, i_molid = ColNames2AidAtypeMolid(column_names)
 
@@ -206,10 +232,18 @@ def GenInteractions_lines(lines_atoms,
             if ((len(tokens) <= i_atomid) or (len(tokens) <= i_atomtype)):
                 raise(InputError('Error not enough columns on line ' +
                                  str(iv + 1) + ' of \"Atoms\" section.'))
-            tokens = SplitQuotedString(line)
             atomids_str.append(EscCharStrToChar(tokens[i_atomid]))
             atomtypes_str.append(EscCharStrToChar(tokens[i_atomtype]))
 
+    return atomids_str, atomtypes_str
+
+
+def ParseBonds(lines_bonds):
+    """
+    Read the bond ids, bond types, and the pair of atoms in each bond,
+    from lines of text in the "Bonds" section of a LAMMPS data file.
+    Returns a 3-tuple of lists: (bondids_str, bondtypes_str, bond_pairs)
+    """
     bondids_str = []
     bondtypes_str = []
     bond_pairs = []
@@ -228,6 +262,14 @@ def GenInteractions_lines(lines_atoms,
             bond_pairs.append((EscCharStrToChar(tokens[2]),
                                EscCharStrToChar(tokens[3])))
 
+    return bondids_str, bondtypes_str, bond_pairs
+
+
+def ParseNbodyByType(lines_nbodybytype, g_bond_pattern):
+    """
+    Read the lines of text in a "By Type" section (eg "Angles By Type")
+    and return a list of [typepattern, coefftype] pairs.
+    """
     typepattern_to_coefftypes = []
 
     for i in range(0, len(lines_nbodybytype)):
@@ -266,98 +308,140 @@ def GenInteractions_lines(lines_atoms,
 
             typepattern_to_coefftypes.append([typepattern, coefftype])
 
-    coefftype_to_atomids_str = GenInteractions_str(bond_pairs,
-                                                   g_bond_pattern,
-                                                   typepattern_to_coefftypes,
-                                                   canonical_order,
-                                                   atomids_str,
-                                                   atomtypes_str,
-                                                   bondids_str,
-                                                   bondtypes_str,
-                                                   report_progress,
-                                                   check_undefined)
-    lines_nbody_new = []
-    for coefftype, atomids_list in coefftype_to_atomids_str.items():
-        for atomids_found in atomids_list:
-            n = len(lines_nbody) + len(lines_nbody_new) + 1
-            line = prefix + str(n) + suffix + ' ' + \
-                coefftype + ' ' + (' '.join(atomids_found)) + '\n'
-            lines_nbody_new.append(line)
-
-    return lines_nbody_new
+    return typepattern_to_coefftypes
+
+
+def FormatInteractions(coefftype_to_atomids,
+                       num_verts,
+                       atomid_names,
+                       lines_nbody,
+                       prefix='',
+                       suffix=''):
+    """
+    Generate one line of text for each interaction that was found.
+    The atoms in each interaction are stored as integers (in the flat arrays
+    returned by GenInteractions_array(), num_verts integers per interaction).
+    They are translated into strings (using atomid_names[]) only here.
+    (This is a generator.  The lines are not stored in a list.)
+    """
+    n = len(lines_nbody)
+    for coefftype, atomids in coefftype_to_atomids.items():
+        for i in range(0, len(atomids), num_verts):
+            n += 1
+            yield (prefix + str(n) + suffix + ' ' + coefftype + ' ' +
+                   ' '.join([atomid_names[iv]
+                             for iv in atomids[i:i + num_verts]]) + '\n')
+
+
+def ReadAtomIdValues(fname_assignments, atomids_str):
+    """
+    Lookup the (numeric) value assigned to each atom id (eg. "$atom:/w[3]/H1")
+    in a file with the format of "ttree_assignments.txt" (created by ttree.py).
+    Only the entries for the atoms in atomids_str[] are kept in memory.
+    Returns a list of strings (one per atom).
+    """
+    atomid_to_iv = {}
+    for iv in range(0, len(atomids_str)):
+        atomid_to_iv[atomids_str[iv]] = iv
+    atomid_values = [None for iv in range(0, len(atomids_str))]
+    try:
+        f = open(fname_assignments, 'r')
+    except IOError:
+        raise InputError('Error: Unable to open file \"' +
+                         fname_assignments + '\" for reading.\n')
+    for line in f:
+        tokens = line.split(None, 2)  # (The atom ids never contain spaces.)
+        if len(tokens) < 2:
+            continue
+        iv = atomid_to_iv.get(tokens[0])
+        if iv is not None:
+            atomid_values[iv] = tokens[1]
+    f.close()
+    for iv in range(0, len(atomids_str)):
+        if atomid_values[iv] is None:
+            raise InputError('Error: The atom \"' + atomids_str[iv] + '\"\n'
+                             '       is not defined in file \"' +
+                             fname_assignments + '\"\n')
+    return atomid_values
 
 
-def GenInteractions_files(lines_data,
-                          src_bond_pattern,
-                          fname_atoms,
-                          fname_bonds,
-                          fname_nbody,
-                          fname_nbodybytype,
-                          section_name,
-                          section_name_bytype,
+def GenInteractions_lines(lines_atoms,
+                          lines_bonds,
+                          lines_nbody,
+                          lines_nbodybytype,
                           atom_style,
+                          g_bond_pattern,
+                          canonical_order,  # function to sort atoms and bonds
                           prefix='',
                           suffix='',
                           report_progress=False,
-                          check_undefined=False):
-
-    if fname_atoms == None:
-        lines_atoms = [
-            line for line in ExtractDataSection(lines_data, 'Atoms')]
-    else:
-        try:
-            f = open(fname_atoms, 'r')
-        except:
-            sys.stderr.write('Error: Unable to open file \"' +
-                             fname_atoms + '\" for reading.\n')
-            sys.exit(-1)
-        lines_atoms = [line for line in f.readlines()
-                       if ((len(line.strip()) > 0) and (line.strip()[0] != '#'))]
-        f.close()
-
-    if fname_bonds == None:
-        lines_bonds = [
-            line for line in ExtractDataSection(lines_data, 'Bonds')]
-    else:
-        try:
-            f = open(fname_bonds, 'r')
-        except IOError:
-            sys.stderr.write('Error: Unable to open file \"' +
-                             fname_bonds + '\" for reading.\n')
-            sys.exit(-1)
-        lines_bonds = [line for line in f.readlines()
-                       if ((len(line.strip()) > 0) and (line.strip()[0] != '#'))]
-        f.close()
-
-    if fname_nbody == None:
-        lines_nbody = [line for line in ExtractDataSection(
-            lines_data, section_name)]
-    else:
-        try:
-            f = open(fname_nbody, 'r')
-            lines_nbody = [line for line in f.readlines()
-                           if ((len(line.strip()) > 0) and (line.strip()[0] != '#'))]
-            f.close()
-        except IOError:
-            #sys.stderr.write('    (omitting optional file \"'+fname_nbody+'\")\n')
-            lines_nbody = []
-
-    if fname_nbodybytype == None:
-        lines_nbodybytype = [line for
-                             line in ExtractDataSection(lines_data,
-                                                        section_name_bytype)]
+                          check_undefined=False,
+                          fname_assignments=None):
+
+    atomids_str, atomtypes_str = ParseAtoms(lines_atoms, atom_style)
+    bondids_str, bondtypes_str, bond_pairs = ParseBonds(lines_bonds)
+    typepattern_to_coefftypes = ParseNbodyByType(lines_nbodybytype,
+                                                 g_bond_pattern)
+
+    G_system, atomtypes_int2str, bondtypes_int2str = \
+        BuildSystemGraph(bond_pairs,
+                         atomids_str,
+                         atomtypes_str,
+                         bondids_str,
+                         bondtypes_str)
+    del bond_pairs, bondids_str, bondtypes_str, atomtypes_str
+
+    coefftype_to_atomids = \
+        GenInteractions_array(G_system,
+                              g_bond_pattern,
+                              typepattern_to_coefftypes,
+                              canonical_order,
+                              atomtypes_int2str,
+                              bondtypes_int2str,
+                              report_progress,
+                              (atomids_str if check_undefined else None))
+
+    atomid_names = atomids_str
+    if fname_assignments:
+        atomid_names = ReadAtomIdValues(fname_assignments, atomids_str)
+
+    return list(FormatInteractions(coefftype_to_atomids,
+                                   g_bond_pattern.GetNumVerts(),
+                                   atomid_names,
+                                   lines_nbody,
+                                   prefix,
+                                   suffix))
+
+
+def ReadDataLines(lines_data, fname, section_name, optional=False):
+    """
+    Return the non-blank, non-comment lines from file "fname".
+    If fname is None, return the lines from the section of the LAMMPS data
+    file (lines_data) named "section_name" instead.
+    A missing file is an error unless "optional" is True.
+    """
+    if fname == None:
+        return [line for line in ExtractDataSection(lines_data, section_name)]
+    try:
+        f = open(fname, 'r')
+    except IOError:
+        if optional:
+            #sys.stderr.write('    (omitting optional file \"'+fname+'\")\n')
+            return []
+        sys.stderr.write('Error: Unable to open file \"' +
+                         fname + '\" for reading.\n')
+        sys.exit(-1)
+    lines = [line for line in f.readlines()
+             if ((len(line.strip()) > 0) and (line.strip()[0] != '#'))]
+    f.close()
+    return lines
 
-    else:
-        try:
-            f = open(fname_nbodybytype, 'r')
-        except:
-            sys.stderr.write('Error: Unable to open file \"' +
-                             fname_nbodybytype + '\" for reading.\n')
-            sys.exit(-1)
-        lines_nbodybytype = [line for line in f.readlines()
-                             if((len(line.strip()) > 0)and(line.strip()[0] != '#'))]
-        f.close()
 
+def ImportBondPattern(src_bond_pattern):
+    """
+    Import the python module (eg "nbody_Angles.py") which defines
+    the bond_pattern and canonical_order() for this type of interaction.
+    """
     # search locations
     package_opts = [[src_bond_pattern, __package__],
                     ['nbody_alt_symmetry.'+src_bond_pattern, __package__]]
@@ -383,6 +467,33 @@ def GenInteractions_files(lines_data,
                          '        Check the \"nbody_alt_symmetry/\" directory.)\n')
         sys.exit(-1)
 
+    return g
+
+
+def GenInteractions_files(lines_data,
+                          src_bond_pattern,
+                          fname_atoms,
+                          fname_bonds,
+                          fname_nbody,
+                          fname_nbodybytype,
+                          section_name,
+                          section_name_bytype,
+                          atom_style,
+                          prefix='',
+                          suffix='',
+                          report_progress=False,
+                          check_undefined=False,
+                          fname_assignments=None):
+
+    lines_atoms = ReadDataLines(lines_data, fname_atoms, 'Atoms')
+    lines_bonds = ReadDataLines(lines_data, fname_bonds, 'Bonds')
+    lines_nbody = ReadDataLines(lines_data, fname_nbody, section_name,
+                                optional=True)
+    lines_nbodybytype = ReadDataLines(lines_data, fname_nbodybytype,
+                                      section_name_bytype)
+
+    g = ImportBondPattern(src_bond_pattern)
+
     return GenInteractions_lines(lines_atoms,
                                  lines_bonds,
                                  lines_nbody,
@@ -393,7 +504,163 @@ def GenInteractions_files(lines_data,
                                  prefix,
                                  suffix,
                                  report_progress,
-                                 check_undefined)
+                                 check_undefined,
+                                 fname_assignments)
+
+
+
+class NbodyFamily(object):
+    """
+    The settings needed to generate one kind of interaction (for example
+    "Angles" using the rules in "Data Angles By Type") when several kinds
+    of interactions are generated at once by GenInteractions_multi().
+    """
+
+    def __init__(self):
+        self.section_name = ''
+        self.section_name_bytype = ''
+        self.bond_pattern_module_name = ''
+        self.fname_nbody = None
+        self.fname_nbodybytype = None
+        self.prefix = ''
+        self.suffix = ''
+        self.check_undefined = False
+        self.fname_out = None
+
+
+# The graph and the list of families are stored in a global variable so that
+# the worker processes created by GenInteractions_multi() can access them
+# (after fork()) without pickling them.
+_g_multi_data = None
+
+
+def _GenFamily(i):
+    G_system, atomids_str, atomid_names, atomtypes_int2str, \
+        bondtypes_int2str, jobs, report_progress = _g_multi_data
+    family, g, typepattern_to_coefftypes, lines_nbody = jobs[i]
+
+    coefftype_to_atomids = \
+        GenInteractions_array(G_system,
+                              g.bond_pattern,
+                              typepattern_to_coefftypes,
+                              g.canonical_order,
+                              atomtypes_int2str,
+                              bondtypes_int2str,
+                              report_progress,
+                              (atomids_str if family.check_undefined else None))
+    num_verts = g.bond_pattern.GetNumVerts()
+    try:
+        f = open(family.fname_out, 'w')
+    except IOError:
+        raise InputError('Error: Unable to open file \"' +
+                         family.fname_out + '\" for writing.\n')
+    f.writelines(FormatInteractions(coefftype_to_atomids,
+                                    num_verts,
+                                    atomid_names,
+                                    lines_nbody,
+                                    family.prefix,
+                                    family.suffix))
+    f.close()
+    return sum([len(atomids) for atomids in coefftype_to_atomids.values()]) \
+        // num_verts
+
+
+def GenInteractions_multi(lines_data,
+                          fname_atoms,
+                          fname_bonds,
+                          atom_style,
+                          families,
+                          report_progress=False,
+                          num_jobs=1,
+                          fname_assignments=None):
+    """
+    Generate several kinds of interactions (eg. Angles, Dihedrals, Impropers)
+    in the same system.  The "Atoms" and "Bonds" are read (and the graph
+    is built) only once, and then searched once for every entry in the
+    "families" list (a list of NbodyFamily objects).  The interactions
+    generated for each family are written to a separate file
+    (family.fname_out).  If num_jobs > 1, up to num_jobs families are
+    processed simultaneously (in separate processes).
+    If fname_assignments is not None, the atom ids are replaced by the
+    numbers assigned to them in that file (eg. "ttree_assignments.txt").
+    Returns a list containing the number of interactions in each family.
+    """
+    global _g_multi_data
+
+    with g_profiler.Stage('read atoms and bonds'):
+        lines_atoms = ReadDataLines(lines_data, fname_atoms, 'Atoms')
+        lines_bonds = ReadDataLines(lines_data, fname_bonds, 'Bonds')
+        atomids_str, atomtypes_str = ParseAtoms(lines_atoms, atom_style)
+        del lines_atoms
+        bondids_str, bondtypes_str, bond_pairs = ParseBonds(lines_bonds)
+        del lines_bonds
+        G_system, atomtypes_int2str, bondtypes_int2str = \
+            BuildSystemGraph(bond_pairs,
+                             atomids_str,
+                             atomtypes_str,
+                             bondids_str,
+                             bondtypes_str)
+        del bond_pairs, bondids_str, bondtypes_str, atomtypes_str
+        atomid_names = atomids_str
+        if fname_assignments:
+            atomid_names = ReadAtomIdValues(fname_assignments, atomids_str)
+
+    # Read all of the rules before searching (so that mistakes in
+    # any of these files are reported before the lengthy search begins).
+    jobs = []
+    for family in families:
+        g = ImportBondPattern(family.bond_pattern_module_name)
+        lines_nbody = ReadDataLines(lines_data, family.fname_nbody,
+                                    family.section_name, optional=True)
+        lines_nbodybytype = ReadDataLines(lines_data,
+                                          family.fname_nbodybytype,
+                                          family.section_name_bytype)
+        typepattern_to_coefftypes = ParseNbodyByType(lines_nbodybytype,
+                                                     g.bond_pattern)
+        jobs.append((family, g, typepattern_to_coefftypes, lines_nbody))
+
+    pool_context = None
+    if (num_jobs > 1) and (len(jobs) > 1):
+        try:
+            pool_context = multiprocessing.get_context('fork')
+        except (AttributeError, ValueError):
+            sys.stderr.write('Warning: ' + g_program_name + ' can not run '
+                             'several searches simultaneously on this\n'
+                             '         platform.  Running them one at a time.\n')
+
+    counts = []
+    if pool_context is None:
+        _g_multi_data = (G_system, atomids_str, atomid_names,
+                         atomtypes_int2str, bondtypes_int2str, jobs,
+                         report_progress)
+        for i in range(0, len(jobs)):
+            family = jobs[i][0]
+            if report_progress:
+                sys.stderr.write(family.section_name_bytype + ' (\"' +
+                                 str(family.fname_nbodybytype) + '\"):\n')
+            with g_profiler.Stage(family.section_name_bytype):
+                counts.append(_GenFamily(i))
+            g_profiler.Count('matches', counts[-1])
+    else:
+        # (Progress messages from simultaneous searches would be interleaved.)
+        _g_multi_data = (G_system, atomids_str, atomid_names,
+                         atomtypes_int2str, bondtypes_int2str, jobs, False)
+        with g_profiler.Stage('all families (' + str(num_jobs) + ' jobs)'):
+            pool = pool_context.Pool(min(num_jobs, len(jobs)))
+            try:
+                counts = pool.map(_GenFamily, range(0, len(jobs)), 1)
+            finally:
+                pool.close()
+                pool.join()
+        for i in range(0, len(jobs)):
+            g_profiler.Count('matches', counts[i])
+            if report_progress:
+                sys.stderr.write(jobs[i][0].section_name_bytype + ' (\"' +
+                                 str(jobs[i][0].fname_nbodybytype) + '\"): ' +
+                                 str(counts[i]) + ' interactions\n')
+    _g_multi_data = None
+
+    return counts
 
 
 def main():
@@ -414,6 +681,10 @@ def main():
         prefix = ''
         suffix = ''
         check_undefined = False
+        bond_pattern_module_name = ''
+        families = []     # (used only if the "-out" argument is present)
+        num_jobs = 1
+        fname_assignments = None
 
         argv = [arg for arg in sys.argv]
 
@@ -546,6 +817,67 @@ def main():
                 check_undefined = True
                 del(argv[i:i + 1])
 
+            elif argv[i].lower() == '-out':
+                # Multi-section mode:  "-out" ends the list of arguments
+                # describing one kind of interaction (eg "Angles").
+                # The arguments which follow describe the next one.
+                if i + 1 >= len(argv):
+                    raise InputError('Error: ' + argv[i] + ' flag should be followed by the name of the file where\n'
+                                     '       the interactions described by the preceeding arguments will be written.\n')
+                if section_name == '':
+                    raise InputError('Error: Each ' + argv[i] + ' argument must be preceeded by a -section argument.\n')
+                family = NbodyFamily()
+                family.section_name = section_name
+                family.section_name_bytype = section_name_bytype
+                if family.section_name_bytype == '':
+                    family.section_name_bytype = section_name + ' By Type'
+                family.bond_pattern_module_name = bond_pattern_module_name
+                if family.bond_pattern_module_name == '':
+                    family.bond_pattern_module_name = 'nbody_' + section_name
+                family.fname_nbody = fname_nbody
+                family.fname_nbodybytype = fname_nbodybytype
+                family.prefix = prefix
+                family.suffix = suffix
+                family.check_undefined = check_undefined
+                family.fname_out = argv[i + 1]
+                families.append(family)
+                section_name = ''
+                section_name_bytype = ''
+                bond_pattern_module_name = ''
+                fname_nbody = None
+                fname_nbodybytype = None
+                prefix = ''
+                suffix = ''
+                check_undefined = False
+                del(argv[i:i + 2])
+
+            elif argv[i].lower() == '-jobs':
+                if i + 1 >= len(argv):
+                    raise InputError('Error: ' + argv[i] + ' flag should be followed by the number of\n'
+                                     '       interaction types to generate simultaneously.\n')
+                try:
+                    num_jobs = int(argv[i + 1])
+                except ValueError:
+                    num_jobs = 0
+                if num_jobs < 1:
+                    raise InputError('Error: ' + argv[i] + ' flag should be followed by a positive integer.\n')
+                del(argv[i:i + 2])
+
+            elif argv[i].lower() == '-assignments':
+                if i + 1 >= len(argv):
+                    raise InputError('Error: ' + argv[i] + ' flag should be followed by the name of a file\n'
+                                     '       containing the number assigned to each atom id\n'
+                                     '       (for example "ttree_assignments.txt").\n')
+                fname_assignments = argv[i + 1]
+                del(argv[i:i + 2])
+
+            elif argv[i].lower() == '-profile':
+                if i + 1 >= len(argv):
+                    raise InputError('Error: ' + argv[i] + ' flag should be followed by the name of a file\n'
+                                     '       where the profiling report (in JSON format) will be saved.\n')
+                g_profiler.Enable(argv[i + 1], g_program_name)
+                del(argv[i:i + 2])
+
             elif argv[i][0] == '-':
                 raise InputError('Error(' + g_program_name + '):\n'
                                  'Unrecogized command line argument \"' + argv[i] + '\"\n')
@@ -559,6 +891,28 @@ def main():
         #                     '       (For example: "Angles", "Dihedrals", or "Impropers".)\n')
         #                     #'        Note: The first letter of each section is usually capitalized.)\n'
 
+        if len(families) > 0:
+            if ((len(argv) > 1) or (section_name != '') or
+                (section_name_bytype != '') or
+                (bond_pattern_module_name != '') or
+                (fname_nbodybytype != None) or (fname_nbody != None)):
+                raise InputError('Syntax Error(' + g_program_name + '):\n\n'
+                                 '       When the -out argument is used, the arguments describing\n'
+                                 '       each type of interaction must be followed by "-out FILENAME".\n')
+            if fname_atoms and fname_bonds:
+                lines_data = []
+            else:
+                lines_data = sys.stdin.readlines()
+            GenInteractions_multi(lines_data,
+                                  fname_atoms,
+                                  fname_bonds,
+                                  atom_style,
+                                  families,
+                                  True,
+                                  num_jobs,
+                                  fname_assignments)
+            return
+
         if len(argv) == 1:
             pass
         elif len(argv) == 2:
@@ -597,20 +951,23 @@ def main():
 
         # Calculate the interactions and generate a list of lines of text
 
-        lines_new_interactions = \
-            GenInteractions_files(lines_data,
-                                  bond_pattern_module_name,
-                                  fname_atoms,
-                                  fname_bonds,
-                                  fname_nbody,
-                                  fname_nbodybytype,
-                                  section_name,
-                                  section_name_bytype,
-                                  atom_style,
-                                  prefix,
-                                  suffix,
-                                  True,
-                                  check_undefined)
+        with g_profiler.Stage(section_name_bytype):
+            lines_new_interactions = \
+                GenInteractions_files(lines_data,
+                                      bond_pattern_module_name,
+                                      fname_atoms,
+                                      fname_bonds,
+                                      fname_nbody,
+                                      fname_nbodybytype,
+                                      section_name,
+                                      section_name_bytype,
+                                      atom_style,
+                                      prefix,
+                                      suffix,
+                                      True,
+                                      check_undefined,
+                                      fname_assignments)
+        g_profiler.Count('matches', len(lines_new_interactions))
 
         # Print this text to the standard out.
 
@@ -9,6 +9,7 @@
 
 import sys
 from collections import defaultdict
+from array import array
 
 
 #from collections import namedtuple
@@ -380,17 +381,20 @@ def GenInteractions_int(G_system,
 
 
 
-def GenInteractions_str(bond_pairs,
-                        g_bond_pattern,
-                        typepattern_to_coefftypes,
-                        canonical_order,  # function to sort atoms and bonds
-                        atomids_str,
-                        atomtypes_str,
-                        bondids_str,
-                        bondtypes_str,
-                        report_progress=False,  # print messages to sys.stderr?
-                        check_undefined=False):
+def BuildSystemGraph(bond_pairs,
+                     atomids_str,
+                     atomtypes_str,
+                     bondids_str,
+                     bondtypes_str):
+    """
+    Convert the atoms and bonds in the system (whose ids and types are
+    strings) into a Ugraph whose vertex and edge attributes are integers.
+    Returns a 3-tuple: (G_system, atomtypes_int2str, bondtypes_int2str)
+    The graph is not modified by GenInteractions_int(), so the same
+    graph can be searched many times for different bond patterns
+    (for example angles, dihedrals, and impropers).
 
+    """
     assert(len(atomids_str) == len(atomtypes_str))
     assert(len(bondids_str) == len(bondtypes_str))
     # The atomids and atomtypes and bondtypes are strings.
@@ -445,6 +449,25 @@ def GenInteractions_str(bond_pairs,
                          atomids_str2int[atomid2_str],
                          bondtypes_str2int[bondtypes_str[ie]])
 
+    return G_system, atomtypes_int2str, bondtypes_int2str
+
+
+
+def GenInteractions_graph(G_system,
+                          atomids_str,
+                          atomtypes_int2str,
+                          bondtypes_int2str,
+                          g_bond_pattern,
+                          typepattern_to_coefftypes,
+                          canonical_order,  # function to sort atoms and bonds
+                          report_progress=False,  # print messages to sys.stderr?
+                          check_undefined=False):
+    """
+    Search a graph created by BuildSystemGraph() for interactions,
+    and return the atom ids (strings) of the atoms in each interaction,
+    organized by coefftype.
+
+    """
     coefftype_to_atomids_int = GenInteractions_int(G_system,
                                                    g_bond_pattern,
                                                    typepattern_to_coefftypes,
@@ -469,3 +492,70 @@ def GenInteractions_str(bond_pairs,
         # gc.collect()
 
     return coefftype_to_atomids_str
+
+
+
+def GenInteractions_array(G_system,
+                          g_bond_pattern,
+                          typepattern_to_coefftypes,
+                          canonical_order,  # function to sort atoms and bonds
+                          atomtypes_int2str,
+                          bondtypes_int2str,
+                          report_progress=False,  # print messages to sys.stderr?
+                          check_undefined_atomids_str=None):
+    """
+    Same as GenInteractions_int(), except that the atoms in each interaction
+    are stored in a flat array of (32-bit) integers for each coefftype.
+    (Each interaction occupies g_bond_pattern.GetNumVerts() consecutive
+     entries in this array.  The integers are indices into G_system.verts[].)
+    The caller can translate these integers into atom names when the
+    interactions are written to a file, without ever storing a separate
+    list of strings for every interaction.
+
+    """
+    coefftype_to_atomids_int = GenInteractions_int(G_system,
+                                                   g_bond_pattern,
+                                                   typepattern_to_coefftypes,
+                                                   canonical_order,
+                                                   atomtypes_int2str,
+                                                   bondtypes_int2str,
+                                                   report_progress,
+                                                   check_undefined_atomids_str)
+    coefftype_to_atomids_array = OrderedDict()
+    for coefftype in list(coefftype_to_atomids_int.keys()):
+        a = array('i')
+        for atomids_int in coefftype_to_atomids_int.pop(coefftype):
+            a.extend(atomids_int)
+        coefftype_to_atomids_array[coefftype] = a
+
+    return coefftype_to_atomids_array
+
+
+
+def GenInteractions_str(bond_pairs,
+                        g_bond_pattern,
+                        typepattern_to_coefftypes,
+                        canonical_order,  # function to sort atoms and bonds
+                        atomids_str,
+                        atomtypes_str,
+                        bondids_str,
+                        bondtypes_str,
+                        report_progress=False,  # print messages to sys.stderr?
+                        check_undefined=False):
+
+    G_system, atomtypes_int2str, bondtypes_int2str = \
+        BuildSystemGraph(bond_pairs,
+                         atomids_str,
+                         atomtypes_str,
+                         bondids_str,
+                         bondtypes_str)
+
+    return GenInteractions_graph(G_system,
+                                 atomids_str,
+                                 atomtypes_int2str,
+                                 bondtypes_int2str,
+                                 g_bond_pattern,
+                                 typepattern_to_coefftypes,
+                                 canonical_order,
+                                 report_progress,
+                                 check_undefined)
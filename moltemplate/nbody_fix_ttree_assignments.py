@@ -44,9 +44,40 @@ awk 'BEGIN{found=0;passed=0} {if(substr($0,0,8)=="$/angle") found=1;
 I wrote this python script (instead of using awk) just to handle quoted stings
 (and strings with other fancy characters and escape sequences).
 
+
+   Append mode
+
+nbody_fix_ttree_assignments.py -append ttree_assignments.txt "angles" \
+  new_Angles.template
+
+Rewriting the entire ttree_assignments.txt file every time a few interactions
+are added is slow when the file is large.  In this mode, the new 2-column
+text (described above) is appended to the end of ttree_assignments.txt
+instead.  The original lines are not removed.  (Every program which reads
+ttree_assignments.txt uses the last value assigned to each variable, so the
+renumbered variables override the original ones.)  The location of the most
+recently appended lines for each category is stored in a small index file
+(ttree_assignments.txt.index), so that they can be found later without
+reading the rest of the file.  Hence the cost is proportional to the number
+of variables in the category, not the size of the file.
+
+
+   Compact mode
+
+nbody_fix_ttree_assignments.py -compact ttree_assignments.txt
+
+After all of the interactions have been added (using "-append"), this
+rewrites ttree_assignments.txt once, keeping only the last value assigned to
+each variable.  The most recently appended lines for each category (listed
+in the index file) replace the original lines for that category, in the same
+place.  (If there were none, they are moved to the end of the file.)  The
+result is the same file that the original (stdin/stdout) mode would have
+created.  The index file is deleted afterwards.
+
 """
 
 import sys
+import os
 
 try:
     from .ttree_lex import SplitQuotedString, InputError
@@ -57,8 +88,214 @@ except (ImportError, SystemError, ValueError):
 g_program_name = __file__.split('/')[-1]
 
 
+
+def FindCategorySegment(f, possible_cat_names):
+    """
+    Find the block of lines in the ttree_assignments file (f, opened in
+    binary mode) containing the variables in a category (eg. "$/angle").
+    The rules are the same as those used by main():  The block begins at the
+    first 2-column line whose variable belongs to the category, and ends
+    at the next 2-column line whose variable does not.
+    Returns the byte offsets (begin, end), or (-1, -1) if not found.
+    """
+    prefixes = tuple([(cat_name + ':').encode('utf-8')
+                      for cat_name in possible_cat_names])
+    begin = -1
+    offset = 0
+    for line in f:
+        if begin == -1:
+            # Only tokenize the lines which might belong to this category.
+            if line.lstrip().startswith(prefixes):
+                tokens = SplitQuotedString(line.decode('utf-8').strip())
+                if ((len(tokens) == 2) and
+                    (tokens[0].split(':')[0] in possible_cat_names)):
+                    begin = offset
+        else:
+            tokens = SplitQuotedString(line.decode('utf-8').strip())
+            if ((len(tokens) == 2) and
+                (tokens[0].split(':')[0] not in possible_cat_names)):
+                return begin, offset
+        offset += len(line)
+    if begin == -1:
+        return -1, -1
+    return begin, offset
+
+
+
+def ReadIndex(fname_index, file_size):
+    """
+    Read the byte offsets of the most recently appended block of
+    variables in each category.  The index is discarded if the size of the
+    ttree_assignments file has changed since the index was written.
+    """
+    index = {}
+    try:
+        f = open(fname_index, 'r')
+    except IOError:
+        return index
+    lines = f.readlines()
+    f.close()
+    if ((len(lines) == 0) or (lines[0].split() != ['size', str(file_size)])):
+        return index
+    for line in lines[1:]:
+        tokens = line.rsplit(None, 2)
+        if len(tokens) == 3:
+            index[tokens[0]] = (int(tokens[1]), int(tokens[2]))
+    return index
+
+
+
+def WriteIndex(fname_index, file_size, index):
+    f = open(fname_index, 'w')
+    f.write('size ' + str(file_size) + '\n')
+    for cat_name, (begin, end) in sorted(index.items()):
+        f.write(cat_name + ' ' + str(begin) + ' ' + str(end) + '\n')
+    f.close()
+
+
+
+def AppendAssignments(fname_bindings, cat_name, lines_generated):
+    """
+    Append the variables generated for this category to the end of
+    ttree_assignments.txt (followed by the pre-existing variables
+    in this category, renumbered).  See "Append mode" above.
+    """
+    possible_cat_names = set(
+        ['$' + cat_name, '$/' + cat_name, '${' + cat_name, '${/' + cat_name])
+
+    fname_index = fname_bindings + '.index'
+    file_size = os.path.getsize(fname_bindings)
+    index = ReadIndex(fname_index, file_size)
+
+    f = open(fname_bindings, 'rb')
+    if cat_name in index:
+        begin, end = index[cat_name]
+    else:
+        begin, end = FindCategorySegment(f, possible_cat_names)
+
+    var_names = []
+    for line in lines_generated:
+        line = line.strip()
+        if len(line) > 0:
+            tokens = SplitQuotedString(line)  # strip comments, handle quotes
+            var_names.append(tokens[0])
+
+    if begin != -1:
+        f.seek(begin)
+        for line in f.read(end - begin).decode('utf-8').splitlines():
+            tokens = SplitQuotedString(line.strip())
+            if len(tokens) == 2:
+                var_names.append(tokens[0])
+
+    ends_with_newline = True
+    if file_size > 0:
+        f.seek(file_size - 1)
+        ends_with_newline = (f.read(1) == b'\n')
+    f.close()
+
+    text = ''.join([var_names[i] + '  ' + str(i + 1) + '\n'
+                    for i in range(0, len(var_names))])
+    if not ends_with_newline:
+        text = '\n' + text
+    data = text.encode('utf-8')
+
+    f = open(fname_bindings, 'ab')
+    f.write(data)
+    f.close()
+
+    new_size = file_size + len(data)
+    index[cat_name] = (new_size - len(data) + (0 if ends_with_newline else 1),
+                       new_size)
+    WriteIndex(fname_index, new_size, index)
+
+
+def CompactAssignments(fname_bindings):
+    """
+    Rewrite ttree_assignments.txt after AppendAssignments() has been invoked
+    (for one or more categories), keeping only the last value assigned to each
+    variable.  See "Compact mode" above.
+    """
+    fname_index = fname_bindings + '.index'
+    file_size = os.path.getsize(fname_bindings)
+    index = ReadIndex(fname_index, file_size)
+    if len(index) == 0:
+        # (Nothing was appended, or the file was modified afterwards.)
+        if os.path.exists(fname_index):
+            os.remove(fname_index)
+        return
+
+    f = open(fname_bindings, 'rb')
+    data = f.read()
+    f.close()
+
+    # The lines appended most recently for each category, and their variables:
+    blocks = {}
+    cat_names_of = {}
+    cat_name_of_prefix = {}
+    appended_vars = set()
+    for cat_name, (begin, end) in index.items():
+        blocks[cat_name] = data[begin:end]
+        cat_names_of[cat_name] = set(['$' + cat_name, '$/' + cat_name,
+                                      '${' + cat_name, '${/' + cat_name])
+        for possible_cat_name in cat_names_of[cat_name]:
+            cat_name_of_prefix[possible_cat_name] = cat_name
+        for line in blocks[cat_name].decode('utf-8').splitlines():
+            tokens = SplitQuotedString(line.strip())
+            if len(tokens) == 2:
+                appended_vars.add(tokens[0])
+    prefixes = tuple([(possible_cat_name + ':').encode('utf-8')
+                      for possible_cat_name in cat_name_of_prefix])
+
+    # Everything before these lines is rewritten.  (Earlier lines appended
+    # for the same category are redundant.  The latest lines include them.)
+    # The rules for finding the original lines for each category are the same
+    # as those used by FindCategorySegment() and main().
+    ordered_cat_names = sorted(index, key=lambda cat_name: index[cat_name][0])
+    out_file = open(fname_bindings + '.tmp', 'wb')
+    in_segment = None
+    for line in data[:index[ordered_cat_names[0]][0]].splitlines(True):
+        if in_segment is not None:
+            # Skip the original lines of this category (until a 2-column line
+            # containing a variable from another category is encountered).
+            tokens = SplitQuotedString(line.decode('utf-8').strip())
+            if ((len(tokens) != 2) or
+                (tokens[0].split(':')[0] in cat_names_of[in_segment])):
+                continue
+            in_segment = None
+        if line.lstrip().startswith(prefixes):
+            # Only tokenize the lines which might belong to these categories.
+            tokens = SplitQuotedString(line.decode('utf-8').strip())
+            if len(tokens) == 2:
+                cat_name = cat_name_of_prefix.get(tokens[0].split(':')[0])
+                if cat_name in blocks:
+                    out_file.write(blocks.pop(cat_name))
+                    in_segment = cat_name
+                    continue
+                if tokens[0] in appended_vars:
+                    continue  # (This variable was assigned a new value later.)
+        out_file.write(line)
+    for cat_name in ordered_cat_names:
+        if cat_name in blocks:
+            out_file.write(blocks[cat_name])
+    out_file.close()
+
+    os.rename(fname_bindings + '.tmp', fname_bindings)
+    os.remove(fname_index)
+
+
 def main():
     try:
+        if ((len(sys.argv) == 5) and (sys.argv[1] == '-append')):
+            f = open(sys.argv[4])
+            lines_generated = f.readlines()
+            f.close()
+            AppendAssignments(sys.argv[2], sys.argv[3], lines_generated)
+            sys.exit(0)
+
+        if ((len(sys.argv) == 3) and (sys.argv[1] == '-compact')):
+            CompactAssignments(sys.argv[2])
+            sys.exit(0)
+
         if (len(sys.argv) != 3):
             raise InputError('Error running  \"' + g_program_name + '\"\n'
                              '   Wrong number of arguments.\n'
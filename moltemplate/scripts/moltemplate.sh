@@ -134,6 +134,126 @@ LTTREE_CHECK_COMMAND="$PYTHON_COMMAND \"${PY_SCR_DIR}/lttree_check.py\""
 LTTREE_POSTPROCESS_COMMAND="$PYTHON_COMMAND \"${PY_SCR_DIR}/lttree_postprocess.py\""
 
 
+
+# -----------------------------------------------------------
+# Batch mode ("-batch manifest.txt"):
+# Build many systems which import the same files (eg. "oplsaa.lt").
+# Each line of the manifest file contains the name of a directory followed
+# by the moltemplate.sh arguments for the system in that directory, eg.:
+#   ligand001  -pdb ligand001.pdb system.lt
+# Lines beginning with "import" (eg. 'import "oplsaa.lt"') list the files
+# which every system imports at the beginning of its .lt file.  These files
+# are only parsed once, by an "lttree_server.py" process shared by all of
+# the systems.  (The remaining arguments to moltemplate.sh are used for
+# every system.)  The output of each system is written to its directory.
+
+BATCH_FILE=""
+BATCH_JOBS="1"
+BATCH_ARGS=""
+BATCH_SERVER_ARGS=""
+PREV_A=""
+for A in "$@"; do
+    if [ "$PREV_A" = "-batch" ]; then
+        BATCH_FILE="$A"
+    elif [ "$PREV_A" = "-batch-jobs" ]; then
+        BATCH_JOBS="$A"
+    elif [ "$A" != "-batch" ] && [ "$A" != "-batch-jobs" ]; then
+        A_FIRSTCHAR="$(echo $A| cut -c 1)"
+        if [ "$A_FIRSTCHAR" = "\$" ]; then
+            A="\\$A" # put an extra slash in front to prevent expansion later
+        fi
+        BATCH_ARGS="${BATCH_ARGS} \"$A\""
+        # (The server must search the same directories for imported files.)
+        if [ "$PREV_A" = "-importpath" ] || [ "$PREV_A" = "-import-path" ] || [ "$PREV_A" = "-import_path" ]; then
+            BATCH_SERVER_ARGS="${BATCH_SERVER_ARGS} -importpath \"$A\""
+        fi
+    fi
+    PREV_A="$A"
+done
+if [ "$PREV_A" = "-batch" ] || [ "$PREV_A" = "-batch-jobs" ]; then
+    echo "Error: The \"$PREV_A\" argument should be followed by another argument." >&2
+    exit 7
+fi
+
+if [ -n "$BATCH_FILE" ]; then
+    if [ ! -s "$BATCH_FILE" ]; then
+        echo "Error: Unable to open batch file \"$BATCH_FILE\"." >&2
+        echo "       (File is empty or does not exist.)" >&2
+        exit 8
+    fi
+    # (The systems are built in other directories, so use absolute paths.)
+    BATCH_SCRIPT="$(cd "$(dirname "$0")" && pwd)/$(basename "$0")"
+    BATCH_PY_SCR_DIR="$(cd "$PY_SCR_DIR" && pwd)"
+    BATCH_IMPORTS=""
+    BATCH_FIRST_DIR=""
+    while read -r BATCH_DIR BATCH_DIR_ARGS; do
+        case "$BATCH_DIR" in
+            ""|\#*) ;;
+            import) BATCH_IMPORTS="${BATCH_IMPORTS} $BATCH_DIR_ARGS" ;;
+            *) if [ -z "$BATCH_FIRST_DIR" ]; then BATCH_FIRST_DIR="$BATCH_DIR"; fi ;;
+        esac
+    done < "$BATCH_FILE"
+
+    BATCH_TMP_PREFIX="${TMPDIR:-/tmp}/moltemplate_batch.$$"
+    BATCH_SERVER_PID=""
+    if [ -n "$BATCH_IMPORTS" ] && [ -n "$BATCH_FIRST_DIR" ]; then
+        # Start the server in the directory of the first system.  (The other
+        # systems share its parsed files if they find the same files.)
+        BATCH_SOCKET="${BATCH_TMP_PREFIX}.sock"
+        (cd "$BATCH_FIRST_DIR" && eval exec $PYTHON_COMMAND "\"${BATCH_PY_SCR_DIR}/lttree_server.py\"" -listen "\"$BATCH_SOCKET\"" $BATCH_SERVER_ARGS $BATCH_IMPORTS) < /dev/null &
+        BATCH_SERVER_PID=$!
+        # (Wait for the server to remove the socket file before exiting.)
+        trap 'kill $BATCH_SERVER_PID 2> /dev/null; wait $BATCH_SERVER_PID 2> /dev/null' EXIT
+        while [ ! -S "$BATCH_SOCKET" ]; do
+            if ! kill -0 $BATCH_SERVER_PID 2> /dev/null; then
+                echo "Error: lttree_server.py failed.  (See the messages above.)" >&2
+                exit 2
+            fi
+            sleep 0.2
+        done
+        BATCH_ARGS="-server \"$BATCH_SOCKET\" $BATCH_ARGS"
+    fi
+
+    # Build up to $BATCH_JOBS systems at the same time:
+    BATCH_FAILED="${BATCH_TMP_PREFIX}.failed"
+    : > "$BATCH_FAILED"
+    NBATCH=0
+    NRUNNING=0
+    while read -r BATCH_DIR BATCH_DIR_ARGS; do
+        case "$BATCH_DIR" in
+            ""|\#*|import) continue ;;
+        esac
+        if [ "$NRUNNING" -ge "$BATCH_JOBS" ]; then
+            wait -n
+            NRUNNING=$((NRUNNING-1))
+        fi
+        echo "building \"$BATCH_DIR\"  (messages: \"$BATCH_DIR/moltemplate.log\")" >&2
+        (
+            if ! (cd "$BATCH_DIR" && eval "\"$BATCH_SCRIPT\"" $BATCH_ARGS $BATCH_DIR_ARGS > moltemplate.log 2>&1); then
+                echo "$BATCH_DIR" >> "$BATCH_FAILED"
+            fi
+        ) < /dev/null &
+        NBATCH=$((NBATCH+1))
+        NRUNNING=$((NRUNNING+1))
+    done < "$BATCH_FILE"
+    while [ "$NRUNNING" -gt 0 ]; do
+        wait -n
+        NRUNNING=$((NRUNNING-1))
+    done
+
+    NFAILED=`wc -l < "$BATCH_FAILED"`
+    if [ "$NFAILED" -gt 0 ]; then
+        echo "Error: $NFAILED of $NBATCH systems failed:" >&2
+        cat "$BATCH_FAILED" >&2
+        rm -f "$BATCH_FAILED"
+        exit 1
+    fi
+    rm -f "$BATCH_FAILED"
+    echo "done: $NBATCH systems built." >&2
+    exit 0
+fi
+
+
 # -----------------------------------------------------------
 # If everything worked, then running ttree usually
 # generates the following files:
@@ -365,6 +485,62 @@ Optional arguments:
 -molc              Additional post-processing for the file "In Settings". This
                    options implicitly set -overlay-bonds.
 
+-quiet             Only print errors and warnings while building the system.
+-debug             Print a message for every command (eg. "new" or "delete").
+                   (Normally, only a running count of the number of objects
+                    created so far is printed, at most once every 2 seconds.)
+
+-profile file.json Record the time and memory used by each stage of the
+                   calculation (parsing, building the instance tree, assigning
+                   variables, generating each "By Type" section, rendering...)
+                   along with counters (number of nodes, variables, lines
+                   written, ...).  The measurements from every program
+                   invoked by moltemplate.sh are merged into "file.json".
+                   (The "peak RSS" recorded for each stage is the peak memory
+                    of the whole process up to the end of that stage.)
+
+-profile-memory    When used together with "-profile", also record the source
+                   lines which allocated the most memory during each stage
+                   (using python's "tracemalloc" module).  This is slow
+                   (it can increase the running time by a factor of 8),
+                   so it is disabled by default.
+
+-nbody-jobs N      Generate up to N kinds of interactions (Angles, Dihedrals,
+                   Impropers "By Type") simultaneously, in separate processes.
+
+-server SOCKET     Run lttree.py using the server listening on SOCKET, which
+                   has already read the force-field files imported at the
+                   beginning of your .lt file.  (Start the server using
+                   "lttree_server.py -listen SOCKET oplsaa.lt", for example.)
+                   Use "-nocheck" as well, to avoid parsing them again.
+                   (This only saves the time needed to parse these files,
+                    eg. about 0.6 seconds for "oplsaa.lt".  It helps when
+                    building many small systems, but not large ones.  The
+                    hexadecane example takes 58 seconds instead of 61.)
+
+-batch FILE        Build many systems (one per line of FILE, each in its own
+                   directory).  Each line contains a directory name followed
+                   by the arguments for the system in that directory.  Lines
+                   such as 'import "oplsaa.lt"' list the files which every
+                   system imports first.  These are only parsed once.
+                   (The other arguments are passed to every system.)
+
+-batch-jobs N      Build up to N systems (from the -batch FILE) at once.
+
+-checkpoint FILE   Save the objects created by lttree.py in FILE.  If FILE
+                   already exists (and none of the .lt files or arguments
+                   have changed since then), load them from FILE instead of
+                   reading the .lt files again.  (This saves time when
+                   moltemplate.sh is rerun after fixing a problem that was
+                   discovered in a later stage.)
+
+-incremental FILE  Save the files written by lttree.py in FILE (and in the
+                   directory FILE.sections).  The next time, if the .lt
+                   files have not changed, the files are copied from
+                   there.  Otherwise, only the sections whose
+                   content depends on something that changed (eg. "Data
+                   Bonds" or "In Settings") are generated again.
+
 EOF
 )
 
@@ -414,6 +590,10 @@ REMOVE_DUPLICATE_IMPROPERS="true"
 SETTINGS_MOLC=""
 CHECKFF=""
 RUN_VMD_AT_END=""
+PROFILE_FILE=""
+NBODY_JOBS=""
+LTTREE_CHECKPOINT_ARGS=""
+LTTREE_INCREMENTAL_ARGS=""
 
 
 ARGC=0
@@ -468,6 +648,64 @@ while [ "$i" -lt "$ARGC" ]; do
         unset REMOVE_DUPLICATE_IMPROPERS
     elif [ "$A" = "-vmd" ]; then
         RUN_VMD_AT_END="true"
+    elif [ "$A" = "-profile" ]; then
+        if [ "$i" -eq "$ARGC" ]; then
+            echo "$SYNTAX_MSG" >&2
+            exit 7
+        fi
+        i=$((i+1))
+        eval A=\${ARGV${i}}
+        # Use an absolute path (in case the working directory changes later).
+        case "$A" in
+            /*) PROFILE_FILE="$A" ;;
+            *)  PROFILE_FILE="$(pwd)/$A" ;;
+        esac
+        # Each program appends its measurements to this file.  Start fresh:
+        rm -f "$PROFILE_FILE"
+    elif [ "$A" = "-profile-memory" ]; then
+        # Every program invoked with "-profile" will also record the source
+        # lines which allocated the most memory (using python's tracemalloc).
+        # (This is slow.  See "ttree_profile.py".)
+        MOLTEMPLATE_PROFILE_NTOP="${MOLTEMPLATE_PROFILE_NTOP:-10}"
+        export MOLTEMPLATE_PROFILE_NTOP
+    elif [ "$A" = "-nbody-jobs" ]; then
+        if [ "$i" -eq "$ARGC" ]; then
+            echo "$SYNTAX_MSG" >&2
+            exit 7
+        fi
+        i=$((i+1))
+        eval NBODY_JOBS=\${ARGV${i}}
+    elif [ "$A" = "-checkpoint" ]; then
+        if [ "$i" -eq "$ARGC" ]; then
+            echo "$SYNTAX_MSG" >&2
+            exit 7
+        fi
+        i=$((i+1))
+        eval A=\${ARGV${i}}
+        case "$A" in
+            /*) LTTREE_CHECKPOINT_ARGS="-resume \"$A\"" ;;
+            *)  LTTREE_CHECKPOINT_ARGS="-resume \"$(pwd)/$A\"" ;;
+        esac
+    elif [ "$A" = "-incremental" ]; then
+        if [ "$i" -eq "$ARGC" ]; then
+            echo "$SYNTAX_MSG" >&2
+            exit 7
+        fi
+        i=$((i+1))
+        eval A=\${ARGV${i}}
+        case "$A" in
+            /*) LTTREE_INCREMENTAL_ARGS="-incremental \"$A\"" ;;
+            *)  LTTREE_INCREMENTAL_ARGS="-incremental \"$(pwd)/$A\"" ;;
+        esac
+    elif [ "$A" = "-server" ]; then
+        if [ "$i" -eq "$ARGC" ]; then
+            echo "$SYNTAX_MSG" >&2
+            exit 7
+        fi
+        i=$((i+1))
+        eval A=\${ARGV${i}}
+        # Send the lttree.py arguments to lttree_server.py instead.
+        LTTREE_COMMAND="$PYTHON_COMMAND \"${PY_SCR_DIR}/lttree_server.py\" -connect \"$A\""
     elif [ "$A" = "-molc" ]; then
         # Set the -overlay-bonds, if not specified otherwise.
         unset REMOVE_DUPLICATE_BONDS
@@ -884,7 +1122,11 @@ fi
 #
 # 3, 2, 1, ...
 
-if ! eval $LTTREE_COMMAND $TTREE_ARGS; then
+if [ -n "$PROFILE_FILE" ]; then
+    LTTREE_PROFILE_ARGS="-profile \"$PROFILE_FILE\""
+fi
+
+if ! eval $LTTREE_COMMAND $TTREE_ARGS $LTTREE_PROFILE_ARGS $LTTREE_CHECKPOINT_ARGS $LTTREE_INCREMENTAL_ARGS; then
     exit 2
 fi
 
@@ -1017,6 +1259,7 @@ if [ -s "${data_bond_list}.template" ]; then
     echo "Looking up bond types according to atom type" >&2
     #-- Generate a file containing bondid bondtype atomid1 atomid2 --
     if ! $PYTHON_COMMAND "${PY_SCR_DIR}/bonds_by_type.py" \
+            ${PROFILE_FILE:+-profile} ${PROFILE_FILE:+"$PROFILE_FILE"} \
             -atom-style "$ATOM_STYLE" \
             -atoms "${data_atoms}.template" \
             -bond-list "${data_bond_list}.template" \
@@ -1070,6 +1313,7 @@ if [ -s "${data_bond_list}.template" ]; then
     # a .template format into an ordinary (numeric) LAMMPS data-section format.)
 
     if ! $PYTHON_COMMAND "${PY_SCR_DIR}/ttree_render.py" \
+           ${PROFILE_FILE:+-profile} ${PROFILE_FILE:+"$PROFILE_FILE"} \
            ttree_assignments.txt \
            < "${data_bonds}.template" \
            > "$data_bonds"; then
@@ -1089,10 +1333,13 @@ fi
 
 
 
+NBODY_ARGS=()
+
 FILE_angles_by_type1=""
 FILE_angles_by_type2=""
 #for FILE in "$data_angles_by_type"*.template; do
 
+NBODY_ANGLES_COUNT=0
 IFS=$(echo -en "\n\b")
 for FILE in `ls -v "$data_angles_by_type"*.template 2> /dev/null`; do
 
@@ -1131,62 +1378,14 @@ for FILE in `ls -v "$data_angles_by_type"*.template 2> /dev/null`; do
     FILE_angles_by_type2="$FILE_angles_by_type1"
     FILE_angles_by_type1="$FILE"
 
-    #-- Generate a file containing the list of interactions on separate lines --
-    if ! $PYTHON_COMMAND "${PY_SCR_DIR}/nbody_by_type.py" \
-            -subgraph "${SUBGRAPH_SCRIPT}" \
-            -section "Angles" \
-            -sectionbytype "Angles By Type" \
-            -atom-style "$ATOM_STYLE" \
-            -atoms "${data_atoms}.template" \
-            -bonds "${data_bonds}.template" \
-            -nbodybytype "${FILE}" \
-            $CHECKFF \
-            -prefix '$/angle:bytype' > gen_angles.template.tmp; then
-        exit 4
-    fi
-
-    # ---- cleanup: ----
-    # ---- Re-build the "${data_angles}.template" file ----
-    # Instert these lines into the "${data_angles}.template" file which includes
-    # the newly generated interactions. (Note: these are in .template format)
-
-    cp gen_angles.template.tmp new_angles.template.tmp
-    if [ -s "${data_angles}.template" ]; then
-        # Then append existing "Angles" to the end of the generated interactions
-        # (Hopefully this way they will override those interactions.)
-        cat "${data_angles}.template" >> new_angles.template.tmp
-    fi
-    mv -f new_angles.template.tmp "${data_angles}.template"
-
-    echo "(Repairing ttree_assignments.txt file after angles added.)" >&2
-
-    # ---- Repair the ttree_assignments.txt file ----
-    # The next 2 lines extract the variable names from data_new.template.tmp
-    # and instert them into the appropriate place in ttree_assignments.txt
-    # (renumbering the relevant variable-assignments to avoid clashes).
-    if ! $PYTHON_COMMAND "${PY_SCR_DIR}/nbody_fix_ttree_assignments.py" \
-          '/angle' gen_angles.template.tmp \
-          < ttree_assignments.txt \
-          > ttree_assignments.tmp; then
-        exit 5
-    fi
-
-    echo "(Rendering ttree_assignments.tmp file after angles added.)" >&2
-
-    # ---- Re-build (render) the "$data_angles" file ----
-    # Now substitute these variable values (assignments) into the variable
-    # names present in the .template file.  (We want to convert the file from
-    # a .template format into an ordinary (numeric) LAMMPS data-section format.)
-    if ! $PYTHON_COMMAND "${PY_SCR_DIR}/ttree_render.py" \
-           ttree_assignments.tmp \
-           < "${data_angles}.template" \
-           > "$data_angles"; then
-        exit 6
-    fi
-    echo "" >&2
-
-    mv -f ttree_assignments.tmp ttree_assignments.txt
-    rm -f gen_angles.template.tmp new_angles.template.tmp
+    NBODY_ANGLES_COUNT=$((NBODY_ANGLES_COUNT+1))
+    NBODY_ARGS+=(-subgraph "${SUBGRAPH_SCRIPT}"
+                -section "Angles"
+                -sectionbytype "Angles By Type"
+                -nbodybytype "${FILE}"
+                $CHECKFF
+                -prefix '$/angle:bytype'
+                -out "gen_angles${NBODY_ANGLES_COUNT}.template.tmp")
 done
 IFS=$OIFS
 
@@ -1195,6 +1394,7 @@ IFS=$OIFS
 FILE_dihedrals_by_type1=""
 FILE_dihedrals_by_type2=""
 #for FILE in "$data_dihedrals_by_type"*.template; do
+NBODY_DIHEDRALS_COUNT=0
 IFS=$(echo -en "\n\b")
 for FILE in `ls -v "$data_dihedrals_by_type"*.template 2> /dev/null`; do
 
@@ -1233,72 +1433,23 @@ for FILE in `ls -v "$data_dihedrals_by_type"*.template 2> /dev/null`; do
     FILE_dihedrals_by_type2="$FILE_dihedrals_by_type1"
     FILE_dihedrals_by_type1="$FILE"
 
-    #-- Generate a file containing the list of interactions on separate lines --
-    if ! $PYTHON_COMMAND "${PY_SCR_DIR}/nbody_by_type.py" \
-            -subgraph "${SUBGRAPH_SCRIPT}" \
-            -section "Dihedrals" \
-            -sectionbytype "Dihedrals By Type" \
-            -atom-style "$ATOM_STYLE" \
-            -atoms "${data_atoms}.template" \
-            -bonds "${data_bonds}.template" \
-            -nbodybytype "${FILE}" \
-            $CHECKFF \
-            -prefix '$/dihedral:bytype' > gen_dihedrals.template.tmp; then
-        exit 4
-    fi
-
-    # ---- cleanup: ----
-    # ---- Re-build the "${data_dihedrals}.template" file ----
-    # Instert these lines into the "${data_dihedrals}.template" file which includes
-    # the newly generated interactions. (Note: these are in .template format)
-
-    cp gen_dihedrals.template.tmp new_dihedrals.template.tmp
-    if [ -s "${data_dihedrals}.template" ]; then
-        # Then append existing "Dihedrals" to the end of the generated interactions
-        # (Hopefully this way they will override those interactions.)
-        cat "${data_dihedrals}.template" >> new_dihedrals.template.tmp
-    fi
-    mv -f new_dihedrals.template.tmp "${data_dihedrals}.template"
-
-    echo "(Repairing ttree_assignments.txt file after dihedrals added.)" >&2
-
-    # ---- Repair the ttree_assignments.txt file ----
-    # The next 2 lines extract the variable names from data_new.template.tmp
-    # and instert them into the appropriate place in ttree_assignments.txt
-    # (renumbering the relevant variable-assignments to avoid clashes).
-    if ! $PYTHON_COMMAND "${PY_SCR_DIR}/nbody_fix_ttree_assignments.py" \
-          '/dihedral' gen_dihedrals.template.tmp \
-          < ttree_assignments.txt \
-          > ttree_assignments.tmp; then
-        exit 5
-    fi
-
-    echo "(Rendering ttree_assignments.tmp file after dihedrals added.)" >&2
-
-    # ---- Re-build (render) the "$data_dihedrals" file ----
-    # Now substitute these variable values (assignments) into the variable
-    # names present in the .template file.  (We want to convert the file from
-    # a .template format into an ordinary (numeric) LAMMPS data-section format.)
-    if ! $PYTHON_COMMAND "${PY_SCR_DIR}/ttree_render.py" \
-           ttree_assignments.tmp \
-           < "${data_dihedrals}.template" \
-           > "$data_dihedrals"; then
-        exit 6
-    fi
-    echo "" >&2
-
-    mv -f ttree_assignments.tmp ttree_assignments.txt
-    rm -f gen_dihedrals.template.tmp new_dihedrals.template.tmp
+    NBODY_DIHEDRALS_COUNT=$((NBODY_DIHEDRALS_COUNT+1))
+    NBODY_ARGS+=(-subgraph "${SUBGRAPH_SCRIPT}"
+                -section "Dihedrals"
+                -sectionbytype "Dihedrals By Type"
+                -nbodybytype "${FILE}"
+                $CHECKFF
+                -prefix '$/dihedral:bytype'
+                -out "gen_dihedrals${NBODY_DIHEDRALS_COUNT}.template.tmp")
 done
 IFS=$OIFS
 
 
 
-
-
 FILE_impropers_by_type1=""
 FILE_impropers_by_type2=""
 #for FILE in "$data_impropers_by_type"*.template; do
+NBODY_IMPROPERS_COUNT=0
 IFS=$(echo -en "\n\b")
 for FILE in `ls -v "$data_impropers_by_type"*.template 2> /dev/null`; do
 
@@ -1337,18 +1488,144 @@ for FILE in `ls -v "$data_impropers_by_type"*.template 2> /dev/null`; do
     FILE_impropers_by_type2="$FILE_impropers_by_type1"
     FILE_impropers_by_type1="$FILE"
 
-    #-- Generate a file containing the list of interactions on separate lines --
+    NBODY_IMPROPERS_COUNT=$((NBODY_IMPROPERS_COUNT+1))
+    NBODY_ARGS+=(-subgraph "${SUBGRAPH_SCRIPT}"
+                -section "Impropers"
+                -sectionbytype "Impropers By Type"
+                -nbodybytype "${FILE}"
+                -prefix '$/improper:bytype'
+                -out "gen_impropers${NBODY_IMPROPERS_COUNT}.template.tmp")
+done
+IFS=$OIFS
+
+# Generate all of the angles, dihedrals, and impropers (by type) at once.
+# (The atoms and bonds are read only once.  Each kind of interaction
+#  is written to a separate file: gen_angles1.template.tmp, ...)
+if [ ${#NBODY_ARGS[@]} -gt 0 ]; then
+    #-- Generate files containing the list of interactions on separate lines --
     if ! $PYTHON_COMMAND "${PY_SCR_DIR}/nbody_by_type.py" \
-            -subgraph "${SUBGRAPH_SCRIPT}" \
-            -section "Impropers" \
-            -sectionbytype "Impropers By Type" \
+            ${PROFILE_FILE:+-profile} ${PROFILE_FILE:+"$PROFILE_FILE"} \
+            ${NBODY_JOBS:+-jobs} ${NBODY_JOBS:+"$NBODY_JOBS"} \
             -atom-style "$ATOM_STYLE" \
             -atoms "${data_atoms}.template" \
             -bonds "${data_bonds}.template" \
-            -nbodybytype "${FILE}" \
-            -prefix '$/improper:bytype' > gen_impropers.template.tmp; then
+            "${NBODY_ARGS[@]}"; then
         exit 4
     fi
+fi
+
+
+
+# (nbody_fix_ttree_assignments.py keeps track of the lines it appends to
+#  ttree_assignments.txt in this file.  Discard any left over from earlier.)
+rm -f ttree_assignments.txt.index
+
+I=1
+while [ "$I" -le "$NBODY_ANGLES_COUNT" ]; do
+
+    mv -f "gen_angles${I}.template.tmp" gen_angles.template.tmp
+
+    # ---- cleanup: ----
+    # ---- Re-build the "${data_angles}.template" file ----
+    # Instert these lines into the "${data_angles}.template" file which includes
+    # the newly generated interactions. (Note: these are in .template format)
+
+    cp gen_angles.template.tmp new_angles.template.tmp
+    if [ -s "${data_angles}.template" ]; then
+        # Then append existing "Angles" to the end of the generated interactions
+        # (Hopefully this way they will override those interactions.)
+        cat "${data_angles}.template" >> new_angles.template.tmp
+    fi
+    mv -f new_angles.template.tmp "${data_angles}.template"
+
+    echo "(Repairing ttree_assignments.txt file after angles added.)" >&2
+
+    # ---- Repair the ttree_assignments.txt file ----
+    # The next 2 lines extract the variable names from data_new.template.tmp
+    # and append them to the end of ttree_assignments.txt (followed by
+    # the relevant variable-assignments, renumbered to avoid clashes).
+    if ! $PYTHON_COMMAND "${PY_SCR_DIR}/nbody_fix_ttree_assignments.py" \
+          -append ttree_assignments.txt \
+          '/angle' gen_angles.template.tmp; then
+        exit 5
+    fi
+
+    echo "(Rendering ttree_assignments.txt file after angles added.)" >&2
+
+    # ---- Re-build (render) the "$data_angles" file ----
+    # Now substitute these variable values (assignments) into the variable
+    # names present in the .template file.  (We want to convert the file from
+    # a .template format into an ordinary (numeric) LAMMPS data-section format.)
+    if ! $PYTHON_COMMAND "${PY_SCR_DIR}/ttree_render.py" \
+           ${PROFILE_FILE:+-profile} ${PROFILE_FILE:+"$PROFILE_FILE"} \
+           ttree_assignments.txt \
+           < "${data_angles}.template" \
+           > "$data_angles"; then
+        exit 6
+    fi
+    echo "" >&2
+
+    rm -f gen_angles.template.tmp new_angles.template.tmp
+    I=$((I+1))
+done
+
+
+
+I=1
+while [ "$I" -le "$NBODY_DIHEDRALS_COUNT" ]; do
+
+    mv -f "gen_dihedrals${I}.template.tmp" gen_dihedrals.template.tmp
+
+    # ---- cleanup: ----
+    # ---- Re-build the "${data_dihedrals}.template" file ----
+    # Instert these lines into the "${data_dihedrals}.template" file which includes
+    # the newly generated interactions. (Note: these are in .template format)
+
+    cp gen_dihedrals.template.tmp new_dihedrals.template.tmp
+    if [ -s "${data_dihedrals}.template" ]; then
+        # Then append existing "Dihedrals" to the end of the generated interactions
+        # (Hopefully this way they will override those interactions.)
+        cat "${data_dihedrals}.template" >> new_dihedrals.template.tmp
+    fi
+    mv -f new_dihedrals.template.tmp "${data_dihedrals}.template"
+
+    echo "(Repairing ttree_assignments.txt file after dihedrals added.)" >&2
+
+    # ---- Repair the ttree_assignments.txt file ----
+    # The next 2 lines extract the variable names from data_new.template.tmp
+    # and append them to the end of ttree_assignments.txt (followed by
+    # the relevant variable-assignments, renumbered to avoid clashes).
+    if ! $PYTHON_COMMAND "${PY_SCR_DIR}/nbody_fix_ttree_assignments.py" \
+          -append ttree_assignments.txt \
+          '/dihedral' gen_dihedrals.template.tmp; then
+        exit 5
+    fi
+
+    echo "(Rendering ttree_assignments.txt file after dihedrals added.)" >&2
+
+    # ---- Re-build (render) the "$data_dihedrals" file ----
+    # Now substitute these variable values (assignments) into the variable
+    # names present in the .template file.  (We want to convert the file from
+    # a .template format into an ordinary (numeric) LAMMPS data-section format.)
+    if ! $PYTHON_COMMAND "${PY_SCR_DIR}/ttree_render.py" \
+           ${PROFILE_FILE:+-profile} ${PROFILE_FILE:+"$PROFILE_FILE"} \
+           ttree_assignments.txt \
+           < "${data_dihedrals}.template" \
+           > "$data_dihedrals"; then
+        exit 6
+    fi
+    echo "" >&2
+
+    rm -f gen_dihedrals.template.tmp new_dihedrals.template.tmp
+    I=$((I+1))
+done
+
+
+
+I=1
+while [ "$I" -le "$NBODY_IMPROPERS_COUNT" ]; do
+
+    mv -f "gen_impropers${I}.template.tmp" gen_impropers.template.tmp
 
     # ---- cleanup: ----
     # ---- Re-build the "${data_impropers}.template" file ----
@@ -1367,33 +1644,43 @@ for FILE in `ls -v "$data_impropers_by_type"*.template 2> /dev/null`; do
 
     # ---- Repair the ttree_assignments.txt file ----
     # The next 2 lines extract the variable names from data_new.template.tmp
-    # and instert them into the appropriate place in ttree_assignments.txt
-    # (renumbering the relevant variable-assignments to avoid clashes).
+    # and append them to the end of ttree_assignments.txt (followed by
+    # the relevant variable-assignments, renumbered to avoid clashes).
     if ! $PYTHON_COMMAND "${PY_SCR_DIR}/nbody_fix_ttree_assignments.py" \
-          '/improper' gen_impropers.template.tmp \
-          < ttree_assignments.txt \
-          > ttree_assignments.tmp; then
+          -append ttree_assignments.txt \
+          '/improper' gen_impropers.template.tmp; then
         exit 5
     fi
 
-    echo "(Rendering ttree_assignments.tmp file after impropers added.)" >&2
+    echo "(Rendering ttree_assignments.txt file after impropers added.)" >&2
 
     # ---- Re-build (render) the "$data_impropers" file ----
     # Now substitute these variable values (assignments) into the variable
     # names present in the .template file.  (We want to convert the file from
     # a .template format into an ordinary (numeric) LAMMPS data-section format.)
     if ! $PYTHON_COMMAND "${PY_SCR_DIR}/ttree_render.py" \
-           ttree_assignments.tmp \
+           ${PROFILE_FILE:+-profile} ${PROFILE_FILE:+"$PROFILE_FILE"} \
+           ttree_assignments.txt \
            < "${data_impropers}.template" \
            > "$data_impropers"; then
         exit 6
     fi
     echo "" >&2
 
-    mv -f ttree_assignments.tmp ttree_assignments.txt
     rm -f gen_impropers.template.tmp new_impropers.template.tmp
+    I=$((I+1))
 done
-IFS=$OIFS
+
+# Now that all of the interactions have been added, rewrite
+# ttree_assignments.txt once, keeping only the last value assigned to each
+# variable.  (This also deletes ttree_assignments.txt.index.)
+if [ -s ttree_assignments.txt.index ]; then
+    if ! $PYTHON_COMMAND "${PY_SCR_DIR}/nbody_fix_ttree_assignments.py" \
+          -compact ttree_assignments.txt; then
+        exit 5
+    fi
+fi
+rm -f ttree_assignments.txt.index
 
 
 
@@ -1436,6 +1723,7 @@ for file_name in $OUT_FILES_WITH_COEFF_COMMANDS; do
         # Now reassign integers to these variables
         bn=`basename "$file_name" .template`
         if ! $PYTHON_COMMAND "${PY_SCR_DIR}/ttree_render.py" \
+             ${PROFILE_FILE:+-profile} ${PROFILE_FILE:+"$PROFILE_FILE"} \
              ttree_assignments.txt \
              < "$file_name" \
              > "$bn"; then
@@ -1727,6 +2015,7 @@ if [ -s "$data_charge_by_bond" ]; then
     # names present in the .template file.  (We want to convert the file from
     # a .template format into an ordinary (numeric) LAMMPS data-section format.)
     if ! $PYTHON_COMMAND "${PY_SCR_DIR}/ttree_render.py" \
+         ${PROFILE_FILE:+-profile} ${PROFILE_FILE:+"$PROFILE_FILE"} \
          ttree_assignments.txt \
          < "${in_charges}.template" \
          >> "${in_charges}"; then
@@ -65,12 +65,20 @@ except NameError:
 try:
     from .ttree_lex import TtreeShlex, SplitQuotedString, EscCharStrToChar, \
         SafelyEncodeString, RemoveOuterQuotes, MaxLenStr, HasWildcard, HasRE, \
-        InputError, ErrorLeader, OSrcLoc, TextBlock, VarRef, VarBinding, \
-        TemplateLexer
+        InputError, ErrorLeader, OSrcLoc, TextBlock, VarRef, VarNPtr, \
+        VarBinding, TemplateLexer, ResolveSource
 except (ImportError, SystemError, ValueError):
     # not installed as a package
     from ttree_lex import *
 
+try:
+    from .ttree_profile import g_profiler
+    from .ttree_log import g_log, LOG_QUIET, LOG_NORMAL, LOG_DEBUG
+except (ImportError, SystemError, ValueError):
+    # not installed as a package
+    from ttree_profile import g_profiler
+    from ttree_log import g_log, LOG_QUIET, LOG_NORMAL, LOG_DEBUG
+
 
 if sys.version < '2.6':
     raise InputError('Error: Using python ' + sys.version + '\n'
@@ -184,15 +192,24 @@ class WriteFileCommand(Command):
                (ie templates).  In general, templates are lists of alternating
                TextBlocks and VarRefs, (with additional tags and data to
                identify where they occur in in the original user's files).
+    bindings  This is None for the commands stored in the static tree.
+               The commands belonging to instances share the tmpl_list
+               of the static command they were created from.  Instead of
+               copying it, they store a list (the same length as tmpl_list)
+               containing the InstanceVarBinding for every '$' variable
+               in the template (and None everywhere else).
+               (See BindTmplList() and Render().)
 
     """
-    __slots__ = ["filename", "tmpl_list"]
+    __slots__ = ["filename", "tmpl_list", "bindings"]
 
     def __init__(self,
                  filename=None,
                  tmpl_list=None,
-                 srcloc=None):
+                 srcloc=None,
+                 bindings=None):
         self.filename = filename
+        self.bindings = bindings
         if tmpl_list is None:
             self.tmpl_list = []
         else:
@@ -206,6 +223,11 @@ class WriteFileCommand(Command):
             return 'WriteFileCommand(NULL)'
 
     def __copy__(self):
+        if self.bindings is not None:
+            return WriteFileCommand(self.filename,
+                                    BindTmplList(self.tmpl_list,
+                                                 self.bindings),
+                                    self.srcloc)
         tmpl_list = []
         CopyTmplList(self.tmpl_list, tmpl_list)  # CHECK:IS_MEMORY_WASTED_HERE?
         return WriteFileCommand(self.filename, tmpl_list, self.srcloc)
@@ -322,6 +344,109 @@ class PushRightCommand(PushCommand):
         return 'PushRightCommand(' + str(self.contents) + ')'
 
 
+class PushArrayCommand(PushRightCommand):
+    """
+    PushArrayCommand is generated by the transformations which follow the
+    array brackets in "new" statements, for example:
+        wat = new SPCE [10].move(4,0,0).rotcm(30,0,0,1)
+    These transformations are cumulative.  (One command is pushed before
+    each element of the array except the first, and they are all popped
+    after the last element.)  Transformations which depend on the center
+    of mass (movecm, rotcm, scalecm) are applied to each element of the
+    array separately, using the center of mass of that element.
+
+    """
+    __slots__ = []
+
+    def __init__(self,
+                 contents,
+                 srcloc,
+                 context_node=None):
+        PushRightCommand.__init__(self, contents, srcloc, context_node)
+
+    def __copy__(self):
+        return PushArrayCommand(self.contents, self.srcloc, self.context_node)
+
+    def __str__(self):
+        return 'PushArrayCommand(' + str(self.contents) + ')'
+
+
+class PushFramesCommand(PushRightCommand):
+    """
+    PushFramesCommand is generated by "new" statements containing
+    ".frames(FILE,offset)", for example:
+        mon[0-999] = new Monomer [1000].frames(frames.npy,0)
+    It is pushed once (before the first element of the array is created),
+    and popped once (after the last one).  Each element of the array is
+    transformed by a different 3x4 affine transformation matrix stored in
+    FILE (a NumPy file).  FrameIndex() returns the index of the matrix for
+    each element.  (The array elements are identified by their names, so
+    that this still works if some of the elements were later deleted.)
+
+    """
+    __slots__ = ["file_name",
+                 "offset",
+                 "array_name_tkns",
+                 "array_name_offsets",
+                 "array_size"]
+
+    def __init__(self,
+                 file_name,
+                 offset,
+                 array_name_tkns,
+                 array_name_offsets,
+                 array_size,
+                 srcloc,
+                 context_node=None):
+        PushRightCommand.__init__(self,
+                                  'frames(' + file_name + ',' +
+                                  str(offset) + ')',
+                                  srcloc,
+                                  context_node)
+        self.file_name = file_name
+        self.offset = offset
+        self.array_name_tkns = array_name_tkns
+        self.array_name_offsets = array_name_offsets
+        self.array_size = array_size
+
+    def __copy__(self):
+        return PushFramesCommand(self.file_name,
+                                 self.offset,
+                                 self.array_name_tkns,
+                                 self.array_name_offsets,
+                                 self.array_size,
+                                 self.srcloc,
+                                 self.context_node)
+
+    def __str__(self):
+        return 'PushFramesCommand(' + str(self.contents) + ')'
+
+    def FrameIndex(self, instance_name):
+        """
+        Return the index (into FILE) of the matrix for the array element
+        named "instance_name", (or None if it is not part of this array).
+        """
+        if not instance_name.startswith(self.array_name_tkns[0]):
+            return None
+        pos = len(self.array_name_tkns[0])
+        i_elem = 0
+        for d in range(0, len(self.array_size)):
+            end = instance_name.find(self.array_name_tkns[d + 1], pos)
+            if end == -1:
+                return None
+            digits = instance_name[pos:end]
+            if not digits.isdigit():
+                return None
+            i = int(digits) - self.array_name_offsets[d]
+            if (i < 0) or (i >= self.array_size[d]):
+                return None
+            i_elem = i_elem * self.array_size[d] + i
+            pos = end + len(self.array_name_tkns[d + 1])
+        if pos != len(instance_name):
+            return None
+        return self.offset + i_elem
+
+
 class PushLeftCommand(PushCommand):
     __slots__ = []
 
@@ -516,7 +641,9 @@ def CopyTmplList(source_tmpl_list, dest_cpy):
                 var_ref = VarRef(entry.prefix,
                                  entry.descr_str,
                                  entry.suffix,
-                                 entry.srcloc)
+                                 entry.srcloc,
+                                 plan=entry.plan)
+                # (The descriptor "plan" is shared. It does not change.)
                 # Note: for instance variables ('$' vars)
                 #       "entry.nptr" should not contain
                 #       any data yet, so we just ignore it.
@@ -531,6 +658,34 @@ def CopyTmplList(source_tmpl_list, dest_cpy):
             assert(False)  # type(entry) should be either TextBlock or VarRef
 
 
+def BindTmplList(tmpl_list, bindings):
+    """
+    The WriteFileCommands belonging to instances share the template
+    (tmpl_list) of the static command they were created from, and keep
+    the bindings of their own '$' variables in a separate list ("bindings").
+    BindTmplList() returns a private copy of the template in which the
+    TextBlocks are copied, (so that the caller can edit them, for example
+    using DeleteLinesWithBadVars()), and the '$' VarRefs point to
+    the corresponding entries in "bindings".
+
+    """
+    dest_cpy = []
+    for i, entry in enumerate(tmpl_list):
+        if isinstance(entry, TextBlock):
+            dest_cpy.append(TextBlock(entry.text, entry.srcloc))
+        elif (bindings is not None) and (bindings[i] is not None):
+            dest_cpy.append(VarRef(entry.prefix,
+                                   entry.descr_str,
+                                   entry.suffix,
+                                   entry.srcloc,
+                                   binding=bindings[i],
+                                   nptr=bindings[i].nptr,
+                                   plan=entry.plan))
+        else:
+            dest_cpy.append(entry)
+    return dest_cpy
+
+
 def RecursiveJoin(tokens_expr, delimiter=''):
     """ RecursiveJoin() converts a tree-like list/tuple of tokens, for example:
     ['a ', ('tree', '-', ['like', 'container']), [[' '], 'of'], ' strings']
@@ -586,6 +741,63 @@ def StrToPtkns(path_string):
 
 
 
+class LookupCache(object):
+    """
+    FindChild() and FindCatNode() are invoked over and over again with the
+    same arguments.  (For example, thousands of "@atom:" variables in a big
+    force field are all looked up from within the same class.)  Searching
+    for a child of a StaticObj requires searching its class_parents and
+    namespaces recursively, so the results of these searches are stored here.
+    (Only searches starting from StaticObjs are cached.  The static tree is
+     small, and it does not change once it has been parsed.  InstanceObjs are
+     looked up using simple dictionary lookups, so there is no need.)
+
+    child_lookups  child_lookups[name][node] stores FindChild(name, node)
+    cat_lookups    cat_lookups[cat_name][node] stores FindCatNode(cat_name, node)
+
+    The entries are indexed by name first.  Whenever a StaticObj acquires a
+    new child (or category) with that name, only the entries for that name
+    are discarded (see ForgetChild(), ForgetCategory()).  If a StaticObj's
+    class_parents or namespaces change, the entire cache is discarded.
+
+    hits, misses   The number of times the cached result was (or was not)
+                   available.
+
+    """
+
+    __slots__ = ["child_lookups", "cat_lookups", "hits", "misses"]
+
+    def __init__(self):
+        self.child_lookups = {}
+        self.cat_lookups = {}
+        self.hits = 0
+        self.misses = 0
+
+    def Clear(self):
+        self.child_lookups.clear()
+        self.cat_lookups.clear()
+
+    def ForgetChild(self, name):
+        self.child_lookups.pop(name, None)
+
+    def ForgetCategory(self, cat_name):
+        self.cat_lookups.pop(cat_name, None)
+
+    def __str__(self):
+        num_lookups = self.hits + self.misses
+        if num_lookups > 0:
+            hit_rate = 100.0 * self.hits / num_lookups
+        else:
+            hit_rate = 0.0
+        return ('lookup cache: ' + str(self.hits) + ' hits, ' +
+                str(self.misses) + ' misses (' +
+                ('%.1f' % hit_rate) + '% hit rate)')
+
+
+g_lookup_cache = LookupCache()
+
+
+
 def FindChild(name, node, dbg_loc):
     """ FindChild looks over the list of node.children to find a child
     which matches the name given in the first argument.
@@ -620,6 +832,16 @@ def FindChild(name, node, dbg_loc):
 
     if isinstance(node, StaticObj):
 
+        # Have we searched for this name here before?
+        lookups = g_lookup_cache.child_lookups.get(name)
+        if lookups is None:
+            lookups = {}
+            g_lookup_cache.child_lookups[name] = lookups
+        elif node in lookups:
+            g_lookup_cache.hits += 1
+            return lookups[node]
+        g_lookup_cache.misses += 1
+
         # The object-oriented inheritance stuff appears here.
         # If you don't care about OOP or inheritance,
         # then comment out the loop that follows:
@@ -629,11 +851,14 @@ def FindChild(name, node, dbg_loc):
         for class_parent in node.class_parents:
             child = FindChild(name, class_parent, dbg_loc)
             if child != None:
-                return child
-        for namespace_node in node.namespaces:
-            child = FindChild(name, namespace_node, dbg_loc)
-            if child != None:
-                return child
+                break
+        if child is None:
+            for namespace_node in node.namespaces:
+                child = FindChild(name, namespace_node, dbg_loc)
+                if child != None:
+                    break
+        lookups[node] = child
+        return child
     else:
         assert(isinstance(node, InstanceObjBasic))
 
@@ -1168,6 +1393,17 @@ def FindCatNode(category_name, current_node, srcloc):
     Note: there is no gaurantee that the category node returned by this function
           contains an entry in it's "categories" list corresponding to this
           category name.  You must check for this condition and handle it."""
+    is_static_node = isinstance(current_node, StaticObj)
+    if is_static_node:
+        lookups = g_lookup_cache.cat_lookups.get(category_name)
+        if lookups is None:
+            lookups = {}
+            g_lookup_cache.cat_lookups[category_name] = lookups
+        elif current_node in lookups:
+            g_lookup_cache.hits += 1
+            return lookups[current_node]
+        g_lookup_cache.misses += 1
+
     cat_node = None
     node = current_node
     while True:
@@ -1192,6 +1428,9 @@ def FindCatNode(category_name, current_node, srcloc):
 
     assert(cat_node != None)
 
+    if is_static_node:
+        lookups[current_node] = cat_node
+
     return cat_node
 
 
@@ -1307,10 +1546,132 @@ def DescrToCatLeafPtkns(descr_str, dbg_loc):
 
 
 
+class DescrPlan(object):
+    """
+    DescrPlan stores the result of parsing a variable descriptor string
+    (such as "atom:CA" or "mol:../").  Parsing the same descriptor over and
+    over again is expensive.  (Every time a class is instantiated, each of
+    the "$" variables in its templates must be looked up again.)  Instead,
+    the descriptor is parsed once (the first time the class is instantiated),
+    and the resulting DescrPlan is shared by all copies of that VarRef.
+    DescrToCatLeafNodes() then only needs to replay the plan.
+
+    cat_name     the name of the category
+    cat_ptkns    the (suggested) path to the category node
+    leaf_ptkns   the path to the leaf node (a tuple, after the "..." hack)
+    leaf_name    If the leaf node is the context node itself, this is ''.
+                 If the leaf node is an immediate child of the context node,
+                 this is the name of that child.  Otherwise it is None.
+                 (In that case, the leaf_ptkns must be followed the slow way.)
+    """
+
+    __slots__ = ["cat_name", "cat_ptkns", "leaf_ptkns", "leaf_name"]
+
+    def __init__(self, descr_str, dbg_loc):
+
+        cat_name, cat_ptkns, leaf_ptkns = DescrToCatLeafPtkns(descr_str, dbg_loc)
+
+        if len(leaf_ptkns) == 0:
+            raise InputError('Error(' + g_module_name + '.DescrToCatLeafNodes()):\n'
+                             '       Error near ' +
+                             ErrorLeader(dbg_loc.infile, dbg_loc.lineno) + '\n'
+                             '       Illegal counter variable \"' + descr_str + '\"\n')
+
+        # ---- ellipsis hack ----
+        #
+        # Search for class:
+        # Most users expect ttree.py to behave like a
+        # standard programming language: If the class they are
+        # instantiating was not defined in this specific
+        # location, they expect ttree.py to search for
+        # it outwards, first in the parent's environment,
+        # and then in the parent's parent's environment,
+        # and so on, until the object is found.
+        # For example, most users expect this to work:
+        # class Res{
+        #   write("Atoms") {
+        #     $atom:CA @atom:CA 0.123 1.234 2.345
+        #     $atom:CB @atom:CB 1.234 2.345 3.456
+        #   }
+        # }
+        # class Protein{
+        #   write_once("AnglesByType") {
+        #     @angle:backbone @atom:Res/CA @atom:Res/CA @atom:Res/CA
+        # }
+        # Notice that in class Protein, we did not have to specify
+        # where "Res" was defined because it is defined in the parent
+        # environment (ie. immediately outside Proteins's environment).
+        #    The general way to do this in ttree.py, is to
+        # use ellipsis syntax "@atom:.../Res/CA" symbol.  The
+        # ellipsis ".../" tells ttree.py to search upwards
+        # for the object to the right of it ("Res")
+        #    In order to make ttree.py behave the way
+        # most users are expecting, we artificially insert a
+        # ".../" before the class name here.  (Later on, the
+        # code that processes the ".../" symbol will take
+        # care of finding A.  We don't have to worry about
+        # about doing that now.)
+        #
+        #   I think we only want to do this for variables with path information
+        # such as "@atom:Res/CA" (which means that leaf_ptkns = ['Res', 'CA']).
+        # For simple variables like "@atom:CA", we don't automatically look upwards
+        # unless the user eplicitly requests it.
+        #    (That's why we check to make sure that len(leaf_ptkns) > 1 below
+        #     before we insert '...' into the leaf_ptkns.)
+        # In other words, the two variables "@atom:CA" below are treated differently
+        #
+        # A {
+        #   write("Atoms") {
+        #     @atom:CA
+        #   }
+        #   class B {
+        #     write("Atoms") {
+        #       @atom:CA
+        #     }
+        #   }
+        # }
+        #
+        if ((descr_str.find(':') != -1) and
+                #(not ((len(leaf_ptkns) == 1) and
+                #      (leaf_ptkns[0] == context_node.name))) and
+                #(len(leaf_ptkns) > 0) and
+                (len(leaf_ptkns) > 1) and
+                (len(leaf_ptkns[0]) > 0) and
+                (leaf_ptkns[0][0] not in ('.', '*', '?'))):
+
+            leaf_ptkns.insert(0, '...')
+        # ---- Done with "ellipsis hack" -----
+
+        if (len(leaf_ptkns) > 0) and (leaf_ptkns[-1] == 'query()'):
+            #   Special case: "query()"
+            # Variables named "query()" are not really variables.
+            # (They are a way for users to query a category's counter.)
+            # But we treat them as such internally. Consequently we
+            # give them unique names to avoid clashes (just in case
+            # "query()" appears multiple times in the same context).
+            #leaf_ptkns[-1] = '__query__'+dbg_loc.infile+'_'+str(dbg_loc.lineno)
+            leaf_ptkns[-1] = '__query__' + str(dbg_loc.order)
+
+        self.cat_name = cat_name
+        self.cat_ptkns = cat_ptkns
+        self.leaf_ptkns = tuple(leaf_ptkns)
+        self.leaf_name = None
+        if len(cat_ptkns) == 0:
+            if all(ptkn == '.' for ptkn in leaf_ptkns):
+                self.leaf_name = ''
+            elif ((len(leaf_ptkns) == 1) and
+                  (leaf_ptkns[0] not in ('', '..', '...')) and
+                  (not HasWildcard(leaf_ptkns[0])) and
+                  (not HasRE(leaf_ptkns[0]))):
+                self.leaf_name = leaf_ptkns[0]
+
+
+
 def DescrToCatLeafNodes(descr_str,
                         context_node,
                         dbg_loc,
-                        create_missing_nodes=False):
+                        create_missing_nodes=False,
+                        plan=None):
     """
     Variables in ttree correspond to nodes in a tree
     (and also categories to which they belong).
@@ -1341,6 +1702,9 @@ def DescrToCatLeafNodes(descr_str,
                  us to augment the tree to add nodes
                  corresponding to variables.
 
+    plan         (optional) a DescrPlan storing the result of parsing
+                 descr_str previously.  (If omitted, descr_str is parsed.)
+
 
 
     -- Here is a greatly simplified version of DescrToCatLeafNodes(): --
@@ -1434,78 +1798,12 @@ def DescrToCatLeafNodes(descr_str,
 
     """
 
-    cat_name, cat_ptkns, leaf_ptkns = DescrToCatLeafPtkns(descr_str, dbg_loc)
-
-    if len(leaf_ptkns) == 0:
-        raise InputError('Error(' + g_module_name + '.DescrToCatLeafNodes()):\n'
-                         '       Error near ' +
-                         ErrorLeader(dbg_loc.infile, dbg_loc.lineno) + '\n'
-                         '       Illegal counter variable \"' + descr_str + '\"\n')
-
-    # ---- ellipsis hack ----
-    #
-    # Search for class:
-    # Most users expect ttree.py to behave like a
-    # standard programming language: If the class they are
-    # instantiating was not defined in this specific
-    # location, they expect ttree.py to search for
-    # it outwards, first in the parent's environment,
-    # and then in the parent's parent's environment,
-    # and so on, until the object is found.
-    # For example, most users expect this to work:
-    # class Res{
-    #   write("Atoms") {
-    #     $atom:CA @atom:CA 0.123 1.234 2.345
-    #     $atom:CB @atom:CB 1.234 2.345 3.456
-    #   }
-    # }
-    # class Protein{
-    #   write_once("AnglesByType") {
-    #     @angle:backbone @atom:Res/CA @atom:Res/CA @atom:Res/CA
-    # }
-    # Notice that in class Protein, we did not have to specify
-    # where "Res" was defined because it is defined in the parent
-    # environment (ie. immediately outside Proteins's environment).
-    #    The general way to do this in ttree.py, is to
-    # use ellipsis syntax "@atom:.../Res/CA" symbol.  The
-    # ellipsis ".../" tells ttree.py to search upwards
-    # for the object to the right of it ("Res")
-    #    In order to make ttree.py behave the way
-    # most users are expecting, we artificially insert a
-    # ".../" before the class name here.  (Later on, the
-    # code that processes the ".../" symbol will take
-    # care of finding A.  We don't have to worry about
-    # about doing that now.)
-    #
-    #   I think we only want to do this for variables with path information
-    # such as "@atom:Res/CA" (which means that leaf_ptkns = ['Res', 'CA']).
-    # For simple variables like "@atom:CA", we don't automatically look upwards
-    # unless the user eplicitly requests it.
-    #    (That's why we check to make sure that len(leaf_ptkns) > 1 below
-    #     before we insert '...' into the leaf_ptkns.)
-    # In other words, the two variables "@atom:CA" below are treated differently
-    #
-    # A {
-    #   write("Atoms") {
-    #     @atom:CA
-    #   }
-    #   class B {
-    #     write("Atoms") {
-    #       @atom:CA
-    #     }
-    #   }
-    # }
-    #
-    if ((descr_str.find(':') != -1) and
-            #(not ((len(leaf_ptkns) == 1) and
-            #      (leaf_ptkns[0] == context_node.name))) and
-            #(len(leaf_ptkns) > 0) and
-            (len(leaf_ptkns) > 1) and
-            (len(leaf_ptkns[0]) > 0) and
-            (leaf_ptkns[0][0] not in ('.', '*', '?'))):
+    if plan is None:
+        plan = DescrPlan(descr_str, dbg_loc)
+    cat_name = plan.cat_name
+    cat_ptkns = plan.cat_ptkns
+    leaf_ptkns = list(plan.leaf_ptkns)
 
-        leaf_ptkns.insert(0, '...')
-    # ---- Done with "ellipsis hack" -----
 
     # sys.stderr.write(' DescrToCatLeafNodes(): (cat_ptkns, cat_name, lptkns) = ('+
     # str(cat_ptkns)+', \"'+cat_name+'\", '+str(leaf_ptkns)+')\n')
@@ -1550,6 +1848,7 @@ def DescrToCatLeafNodes(descr_str,
             # new entry in the cat_node.categories associative container
             # (using cat_name as the dictionary key).
             cat_node.categories[cat_name] = Category(cat_name)
+            g_lookup_cache.ForgetCategory(cat_name)
         else:
             raise InputError('Error(' + g_module_name + '.DescrToCatLeafNodes()):\n'
                              '       Error near ' +
@@ -1559,15 +1858,20 @@ def DescrToCatLeafNodes(descr_str,
 
     # ---------- Now look up the leaf node -----------
 
-    if (len(leaf_ptkns) > 0) and (leaf_ptkns[-1] == 'query()'):
-        #   Special case: "query()"
-        # Variables named "query()" are not really variables.
-        # (They are a way for users to query a category's counter.)
-        # But we treat them as such internally. Consequently we
-        # give them unique names to avoid clashes (just in case
-        # "query()" appears multiple times in the same context).
-        #leaf_ptkns[-1] = '__query__'+dbg_loc.infile+'_'+str(dbg_loc.lineno)
-        leaf_ptkns[-1] = '__query__' + str(dbg_loc.order)
+    # Most variables refer either to the context node itself (eg. "$mol")
+    # or to one of its immediate children (eg. "$atom:CA").  For instance
+    # nodes these can be looked up directly, without calling FollowPath().
+    if plan.leaf_name is not None:
+        if plan.leaf_name == '':
+            return cat_name, cat_node, context_node
+        if isinstance(context_node, InstanceObj):
+            leaf_node = context_node.children.get(plan.leaf_name)
+            if leaf_node:
+                return cat_name, cat_node, leaf_node
+            elif create_missing_nodes:
+                leaf_node = InstanceObjBasic(plan.leaf_name, context_node)
+                context_node.children[plan.leaf_name] = leaf_node
+                return cat_name, cat_node, leaf_node
 
     # Lookup the path for the leaf:
     #
@@ -1626,6 +1930,7 @@ def DescrToCatLeafNodes(descr_str,
                     if isinstance(parent_node, StaticObj):
                         parent_node.children[new_leaf_name] = StaticObj(
                             new_leaf_name, parent_node)
+                        g_lookup_cache.ForgetChild(new_leaf_name)
                     elif isinstance(parent_node, InstanceObj):
                         parent_node.children[new_leaf_name] = InstanceObjBasic(
                             new_leaf_name, parent_node)
@@ -1710,6 +2015,7 @@ def DescrToCatLeafNodes(descr_str,
             if isinstance(parent_node, StaticObj):
                 parent_node.children[new_leaf_name] = StaticObj(
                     new_leaf_name, parent_node)
+                g_lookup_cache.ForgetChild(new_leaf_name)
             elif isinstance(parent_node, InstanceObj):
                 parent_node.children[new_leaf_name] = InstanceObjBasic(
                     new_leaf_name, parent_node)
@@ -1900,6 +2206,99 @@ class Category(object):
 
 
 
+class InstanceVarBinding(VarBinding):
+    """
+    InstanceVarBinding is the VarBinding used for instance ("$") variables.
+    There is one of these for every atom, bond, angle, (etc...) in the
+    system, so to save memory, the "full_name" string is not stored.
+    Instead it is generated from the category and leaf nodes (".nptr")
+    whenever somebody asks for it.  (Assigning a string to ".full_name"
+    overrides this, just like it does for ordinary VarBindings.)
+
+    Generating these names using CanonicalDescrStr() is slow, and the same
+    name is usually needed several times (when assigning values, rendering
+    the templates, and writing "ttree_assignments.txt").  But the variables
+    belonging to the same instance are usually visited one after another.
+    So we remember the part of the name which they share (the category,
+    and the path of their parent node) for the most recently visited
+    instances.  (Only a few hundred of these strings are kept at a time.)
+
+    """
+
+    __slots__ = []
+
+    # "_prefixes" maps (cat_name, cat_node, parent_node) to the beginning
+    # of the full_name of every variable whose leaf_node is a child of
+    # parent_node, such as '$/atom:water[1423]/'.  Deleted nodes are
+    # never stored here.  (See InstanceObj.DeleteSelf().)
+    _prefixes = {}
+    _max_prefixes = 256
+    # "_cat_prefixes" maps (cat_name, cat_node) to strings like '$/atom:'
+    _cat_prefixes = {}
+
+    def _get_full_name(self):
+        full_name = VarBinding.full_name.__get__(self)
+        if full_name != '':
+            return full_name
+        nptr = self.nptr
+        leaf_node = nptr.leaf_node
+        prefix = InstanceVarBinding._prefixes.get((nptr.cat_name,
+                                                   nptr.cat_node,
+                                                   leaf_node.parent))
+        if prefix is None:
+            prefix = InstanceVarBinding._FindPrefix(nptr.cat_name,
+                                                    nptr.cat_node,
+                                                    leaf_node.parent)
+            if prefix is None:
+                # (This is rare. CanonicalDescrStr() handles these cases.)
+                if len(self.refs) > 0:
+                    srcloc = self.refs[0].srcloc
+                else:
+                    srcloc = None
+                return '$' + CanonicalDescrStr(nptr.cat_name,
+                                               nptr.cat_node,
+                                               leaf_node,
+                                               srcloc)
+        return prefix + leaf_node.name
+
+    @staticmethod
+    def _FindPrefix(cat_name, cat_node, parent):
+        """
+        Return the beginning of the full_name of the variables whose leaf
+        nodes are children of "parent" (and store it in "_prefixes").
+        Return None if "parent" was deleted, or if it does not lie within
+        the scope of cat_node.  (In that case, the caller should invoke
+        CanonicalDescrStr() which prints the appropriate message.)
+
+        """
+        if ((parent is None) or (parent is cat_node) or parent.IsDeleted()):
+            return None
+        ptkns = []
+        node = parent
+        while node is not cat_node:
+            if node is None:
+                return None
+            ptkns.append(node.name)
+            node = node.parent
+        ptkns.reverse()
+        cat_prefix = InstanceVarBinding._cat_prefixes.get((cat_name, cat_node))
+        if cat_prefix is None:
+            cat_ptkns = NodeToPtkns(cat_node)
+            cat_prefix = '$' + '/'.join(cat_ptkns) + '/' + cat_name + ':'
+            InstanceVarBinding._cat_prefixes[(cat_name, cat_node)] = cat_prefix
+        prefix = cat_prefix + '/'.join(ptkns) + '/'
+        if len(InstanceVarBinding._prefixes) >= InstanceVarBinding._max_prefixes:
+            InstanceVarBinding._prefixes.clear()
+        InstanceVarBinding._prefixes[(cat_name, cat_node, parent)] = prefix
+        return prefix
+
+    def _set_full_name(self, full_name):
+        VarBinding.full_name.__set__(self, full_name)
+
+    full_name = property(_get_full_name, _set_full_name)
+
+
+
 class StaticObj(object):
     """  StaticObjs and InstanceObjs:
 
@@ -2253,6 +2652,7 @@ class StaticObj(object):
                                    lex.GetSrcLoc())
 
                 self.namespaces.append(stnode)
+                g_lookup_cache.Clear()
 
             elif cmd_token == 'category':
                 cat_name = lex.get_token()
@@ -2329,6 +2729,7 @@ class StaticObj(object):
                 # Add this category to the list.
                 if prefix == '@':
                     self.categories[cat_name] = Category(cat_name)
+                    g_lookup_cache.ForgetCategory(cat_name)
                     self.categories[cat_name].counter = SimpleCounter(cat_count_start,
                                                                       cat_count_incr)
                 elif prefix == '$':
@@ -2470,12 +2871,15 @@ class StaticObj(object):
                     if child is None:
                         child = StaticObj(child_name, self)
                         self.children[child_name] = child
+                        g_lookup_cache.ForgetChild(child_name)
                     assert(child.name == child_name)
 
                     # Either way we invoke child.Parse(), to
                     # add contents (class commands) to child.
                     child.Parse(lex)
-                    child.class_parents += class_parents
+                    if len(class_parents) > 0:
+                        child.class_parents += class_parents
+                        g_lookup_cache.Clear()
 
                 elif next_symbol == '=':
                     next_symbol = lex.get_token()
@@ -2669,6 +3073,9 @@ class StaticObj(object):
                         array_size = []
                         array_suffixes = []
                         array_srclocs = []
+                        frames_file = None
+                        frames_offset = 0
+                        frames_srcloc = None
 
                         # A general "new" statement could look like this:
                         # "m = new Mol.scale(3) [2].trans(0,4.5,0).rotate(30,0,0,1)
@@ -2698,6 +3105,42 @@ class StaticObj(object):
                                 if suffix[0] == '.':
                                     lex.push_token(suffix[1:])
                                     suffix_func = lex.GetParenExpr()
+                                    if suffix_func.find('frames(') == 0:
+                                        # "[N].frames(FILE,offset)" means
+                                        # each instance is transformed by a
+                                        # different matrix read from FILE.
+                                        # (See PushFramesCommand)
+                                        frames_srcloc = lex.GetSrcLoc()
+                                        frames_args = suffix_func[
+                                            len('frames('):-1].split(',')
+                                        frames_name = RemoveOuterQuotes(
+                                            frames_args[0].strip())
+                                        if ((len(frames_args) > 2) or
+                                            (frames_name == '') or
+                                            ((len(frames_args) == 2) and
+                                             (not frames_args[1].strip().isdigit()))):
+                                            raise InputError('Error(' + g_module_name + '.StaticObj.Parse()):\n'
+                                                             '     Error in \"new\" statement near ' + lex.error_leader() + '\n'
+                                                             '     Expected \"frames(FILE)\" or \"frames(FILE,offset)\"\n')
+                                        if len(frames_args) == 2:
+                                            frames_offset = int(frames_args[1])
+                                        # Look for FILE the same way we look
+                                        # for files which are imported.
+                                        frames_file = ResolveSource(
+                                            frames_name,
+                                            lex.infile,
+                                            lex.include_path)
+                                        if frames_file is None:
+                                            raise InputError('Error(' + g_module_name + '.StaticObj.Parse()):\n'
+                                                             '     Error in \"new\" statement near ' + lex.error_leader() + '\n'
+                                                             '     Unable to find file \"' + frames_name + '\"\n')
+                                        if lex.source_log is not None:
+                                            lex.source_log.append(
+                                                (lex.infile, frames_name,
+                                                 frames_file))
+                                        array_suffixes.append('')
+                                        array_srclocs.append(frames_srcloc)
+                                        continue
                                     suffix = '.' + suffix_func
                                     array_suffixes.append(suffix)
                                     array_srclocs.append(lex.GetSrcLoc())
@@ -2764,6 +3207,25 @@ class StaticObj(object):
                         #     classes can attempt to process them.
 
                         D = len(array_size)
+
+                        if frames_file != None:
+                            for suffix in array_suffixes:
+                                if suffix != '':
+                                    raise InputError('Error(' + g_module_name + '.StaticObj.Parse()):\n'
+                                                     '      Error near or before ' + lex.error_leader() + '\n'
+                                                     '      \"frames()\" can not be combined with other transformations\n'
+                                                     '      following the array brackets (such as \"' + suffix + '\").\n')
+                            # One command transforms every element of the
+                            # array.  (Each element uses a different matrix.)
+                            frames_command = \
+                                PushFramesCommand(frames_file,
+                                                  frames_offset,
+                                                  list(array_name_tkns),
+                                                  list(array_name_offsets),
+                                                  list(array_size),
+                                                  frames_srcloc)
+                            self.instance_commands.append(frames_command)
+
                         if D > 0:
 
                             i_elem = 0  # (used to look up selection_list[])
@@ -2849,7 +3311,7 @@ class StaticObj(object):
                                         d_carry -= 1
                                     else:
                                         if array_suffixes[d_carry] != '':
-                                            command = PushRightCommand(array_suffixes[d_carry].lstrip('.'),
+                                            command = PushArrayCommand(array_suffixes[d_carry].lstrip('.'),
                                                                        array_srclocs[d_carry])
                                             pushed_commands.append(command)
                                             self.instance_commands.append(
@@ -2861,7 +3323,11 @@ class StaticObj(object):
 
                                 # (used to look up selection_list[])
                                 i_elem += 1
-                            pass
+
+                            if frames_file != None:
+                                command = PopRightCommand(frames_command,
+                                                          srcloc_final)
+                                self.instance_commands.append(command)
 
                         else:
                             if len(class_names) > 0:
@@ -2944,6 +3410,7 @@ class StaticObj(object):
                                                  '      The name \"' + child_name + '\" is already in use.')
 
                         self.children[child_name] = child
+                        g_lookup_cache.ForgetChild(child_name)
 
                 else:
 
@@ -3840,6 +4307,9 @@ class InstanceObj(InstanceObjBasic):
 
     def DeleteSelf(self):
         self.deleted = True
+        # The names of the variables belonging to this instance
+        # have changed.  (See InstanceVarBinding._FindPrefix().)
+        InstanceVarBinding._prefixes.clear()
 
     #  COMMENT1:       Don't get rid of pointers to yourself.  Knowing which
     #                 objects you instantiated and destroyed might be useful
@@ -3940,7 +4410,8 @@ class InstanceObj(InstanceObjBasic):
 
         if isinstance(command, ModCommand):
 
-            sys.stderr.write('  processing command \"' + str(command) + '\"\n')
+            g_log.Debug('  processing command \"%s\"\n', command)
+            g_log.Progress('commands processed')
             mod_command = command
             instobj_list = self.LookupMultiDescrStr(mod_command.multi_descr_str,
                                                     mod_command.command.srcloc)
@@ -3976,16 +4447,25 @@ class InstanceObj(InstanceObjBasic):
                         # I don't know if any other types commands will ever
                         # occur but I handle them below, just in case...
                         assert(not isinstance(command, InstantiateCommand))
-                        instobj.commands.append(command.__copy__())
+                        instobj.commands.append(command)
 
             return  # ends "if isinstance(command, ModCommand):"
 
         # Otherwise:
-        command = command.__copy__()
+        if isinstance(command, WriteFileCommand):
+            # Instances share the template (tmpl_list) of the static command.
+            # The bindings of their '$' variables are stored separately
+            # (in command.bindings, see below), so there is nothing to copy.
+            command = WriteFileCommand(command.filename,
+                                       command.tmpl_list,
+                                       command.srcloc)
+        else:
+            command = command.__copy__()
         self.ProcessContextNodes(command)
 
         if isinstance(command, InstantiateCommand):
-            sys.stderr.write('  processing command \"' + str(command) + '\"\n')
+            g_log.Debug('  processing command \"%s\"\n', command)
+            g_log.Progress('objects instantiated')
             # <- useful later to keep track of the
             self.commands.append(command)
             #   order that children were created
@@ -4030,23 +4510,31 @@ class InstanceObj(InstanceObjBasic):
 
             self.commands.append(command)
 
-            for var_ref in command.tmpl_list:
+            bindings = None
+
+            for i, var_ref in enumerate(command.tmpl_list):
                 # Process the VarRef entries in the tmpl_list,
                 #   (and check they have the correct prefix: either '$' or '@')
                 # Ignore other entries (for example, ignore TextBlocks).
 
                 if (isinstance(var_ref, VarRef) and (var_ref.prefix[0] == '$')):
 
-                    if (var_ref.descr_str[:4] == 'mol:'):
-                        pass
+                    # Note: "var_ref" belongs to the (shared) template of
+                    # the StaticObj.  It is never modified here, except to
+                    # parse its descriptor string (only once per template),
+                    # so that future instances of this class can reuse it.
+                    if var_ref.plan is None:
+                        var_ref.plan = DescrPlan(var_ref.descr_str,
+                                                 var_ref.srcloc)
 
-                    var_ref.nptr.cat_name, var_ref.nptr.cat_node, var_ref.nptr.leaf_node = \
+                    cat_name, cat_node, leaf_node = \
                         DescrToCatLeafNodes(var_ref.descr_str,
                                             self,
                                             var_ref.srcloc,
-                                            True)
+                                            True,
+                                            var_ref.plan)
 
-                    categories = var_ref.nptr.cat_node.categories
+                    categories = cat_node.categories
 
                     # "categories" is a dictionary storing "Category" objects
                     # indexed by category names.
@@ -4057,7 +4545,7 @@ class InstanceObj(InstanceObjBasic):
                     # we instantiate, ie. before we build the tree of
                     # InstanceObjs.)
 
-                    category = categories[var_ref.nptr.cat_name]
+                    category = categories[cat_name]
                     # "category" is a Category object containing a
                     # dictionary of VarBinding objects, and an internal
                     # counter.
@@ -4073,8 +4561,8 @@ class InstanceObj(InstanceObjBasic):
                     # corresponds to this leaf node.
                     # If not found, then create one.
 
-                    if var_ref.nptr.leaf_node in var_bindings:
-                        var_binding = var_bindings[var_ref.nptr.leaf_node]
+                    if leaf_node in var_bindings:
+                        var_binding = var_bindings[leaf_node]
                         # "var_binding" stores the information for a variable,
                         # including pointers to all of the places the variable
                         # is rerefenced, the variable's (full) name, and value.
@@ -4084,45 +4572,48 @@ class InstanceObj(InstanceObjBasic):
                         var_binding.refs.append(var_ref)
                     else:
                         # Not found, so we create a new binding.
-                        var_binding = VarBinding()
+                        var_binding = InstanceVarBinding()
 
                         # var_binding.refs contains a list of all the places
                         # this variable is referenced. Start with this var_ref:
                         var_binding.refs = [var_ref]
 
                         # keep track of the cat_node, cat_name, leaf_node:
-                        var_binding.nptr = var_ref.nptr
+                        var_binding.nptr = VarNPtr(cat_name,
+                                                   cat_node,
+                                                   leaf_node)
 
-                        # "var_binding.full_name" stores a unique string like
-                        #   '@/atom:Water/H' or '$/atom:water[1423]/H2',
+                        # "var_binding.full_name" is a unique string like
+                        #   '$/atom:water[1423]/H2',
                         # which contains the full path for the category and leaf
                         # nodes, and uniquely identifies this variable globally.
                         # Thus these strings correspond uniquely (ie. in a
                         # one-to-one fashion) with the nodes they represent.
-
-                        var_binding.full_name = var_ref.prefix[0] + \
-                            CanonicalDescrStr(var_ref.nptr.cat_name,
-                                              var_ref.nptr.cat_node,
-                                              var_ref.nptr.leaf_node,
-                                              var_ref.srcloc)
-                        # (These names can always be generated later when needed
-                        #  but it doesn't hurt to keep track of it here too.)
+                        # (There can be millions of instance variables, so
+                        #  these names are generated later, only when needed.
+                        #  See "class InstanceVarBinding".)
 
                         # Now add this binding to the other
                         # bindings in this category:
-                        var_bindings[var_ref.nptr.leaf_node] = var_binding
+                        var_bindings[leaf_node] = var_binding
 
                         # vb##
-                        # var_ref.nptr.leaf_node.AddVarBinding(var_binding)
+                        # leaf_node.AddVarBinding(var_binding)
 
                         var_binding.category = category
 
                     # It's convenient to add a pointer in the opposite direction
                     # so that later if we find the var_ref, we can find its
                     # binding and visa-versa. (Ie. two-way pointers)
-                    var_ref.binding = var_binding
+                    # The var_ref is shared by every instance, so this pointer
+                    # is stored in the command instead. (See BindTmplList().)
+                    if bindings is None:
+                        bindings = [None] * len(command.tmpl_list)
+                    bindings[i] = var_binding
 
-                    assert(var_ref.nptr.leaf_node in var_bindings)
+                    assert(leaf_node in var_bindings)
+
+            command.bindings = bindings
 
         else:
             # Otherwise, we don't know what this command is yet.
@@ -4346,13 +4837,18 @@ def AssignVarOrderByCommand(command_list, prefix_filter):
     for command in command_list:
         if isinstance(command, WriteFileCommand):
             tmpl_list = command.tmpl_list
-            for var_ref in tmpl_list:
+            bindings = command.bindings
+            for i, var_ref in enumerate(tmpl_list):
                 if isinstance(var_ref, VarRef):
                     if var_ref.prefix in prefix_filter:
                         count += 1
-                        if ((var_ref.binding.order is None) or
-                                (var_ref.binding.order > count)):
-                            var_ref.binding.order = count
+                        if (bindings is not None) and (bindings[i] is not None):
+                            var_binding = bindings[i]
+                        else:
+                            var_binding = var_ref.binding
+                        if ((var_binding.order is None) or
+                                (var_binding.order > count)):
+                            var_binding.order = count
 
 
 # def AssignVarOrderByFile(command_list, prefix_filter):
@@ -4442,8 +4938,9 @@ def AutoAssignVals(cat_node,
             # Is this parent_node an StaticObj? (..or inherit from StaticObj?)
             if isinstance(cat_node, StaticObj):
                 prefix = '@'
-            sys.stderr.write('  sorting variables in category: ' + prefix +
-                             CanonicalCatName(cat_name, cat_node) + ':\n')
+            if g_log.IsEnabled(LOG_DEBUG):
+                g_log.Debug('  sorting variables in category: %s%s:\n',
+                            prefix, CanonicalCatName(cat_name, cat_node))
 
             var_bind_iter = iter(sorted(cat.bindings.items(),
                                         key=operator.itemgetter(1)))
@@ -4457,6 +4954,7 @@ def AutoAssignVals(cat_node,
 
             if ((var_binding.value is None) or ignore_prior_values):
 
+                full_name = var_binding.full_name
                 if var_binding.nptr.leaf_node.name[:9] == '__query__':
                     #   -- THE "COUNT" HACK --
                     # '__query__...' variables are not really variables.
@@ -4464,15 +4962,15 @@ def AutoAssignVals(cat_node,
                     # category counter without incrementing it.
                     var_binding.value = str(cat.counter.query())
 
-                elif (HasWildcard(var_binding.full_name) or
-                      HasRE(var_binding.full_name)):
+                elif (HasWildcard(full_name) or
+                      HasRE(full_name)):
                     #   -- The wildcard hack ---
                     # Variables containing * or ? characters in their names
                     # are not allowed.  This is also true of regular
                     # expressions.  These are not variables, but patterns to
                     # match with other variables.  Represent them by the (full-
                     # path-expanded) string containing the * or ? or regex.
-                    var_binding.value = var_binding.full_name
+                    var_binding.value = full_name
 
                 else:
 
@@ -4522,11 +5020,14 @@ def ExtractFormattingCommands(suffix):
         return format_fname, args
 
 
-def Render(tmpl_list, substitute_vars=True):
+def Render(tmpl_list, substitute_vars=True, bindings=None):
     """
     This function converts a TextBlock,VarRef list into a string.
     It is invoked by WriteTemplatesValue() in order to print
     out the templates stored at each node of the tree.
+    (If the template belongs to an instance, "bindings" is the
+     WriteFileCommand.bindings list which says where the '$'
+     variables in the (shared) template point to.)
 
     """
 
@@ -4536,11 +5037,15 @@ def Render(tmpl_list, substitute_vars=True):
         entry = tmpl_list[i]
         if isinstance(entry, VarRef):
             var_ref = entry
-            var_bindings = var_ref.nptr.cat_node.categories[
-                var_ref.nptr.cat_name].bindings
-            # if var_ref.nptr.leaf_node not in var_bindings:
-            #assert(var_ref.nptr.leaf_node in var_bindings)
-            if var_ref.nptr.leaf_node.IsDeleted():
+            if (bindings is not None) and (bindings[i] is not None):
+                nptr = bindings[i].nptr
+            else:
+                nptr = var_ref.nptr
+            var_bindings = nptr.cat_node.categories[
+                nptr.cat_name].bindings
+            # if nptr.leaf_node not in var_bindings:
+            #assert(nptr.leaf_node in var_bindings)
+            if nptr.leaf_node.IsDeleted():
                 raise InputError('Error near ' +
                                  ErrorLeader(var_ref.srcloc.infile,
                                              var_ref.srcloc.lineno) + '\n'
@@ -4549,7 +5054,7 @@ def Render(tmpl_list, substitute_vars=True):
                                  '   (You probably deleted it or something it belonged to earlier.)\n')
             else:
                 if substitute_vars:
-                    value = var_bindings[var_ref.nptr.leaf_node].value
+                    value = var_bindings[nptr.leaf_node].value
                     format_fname, args = ExtractFormattingCommands(
                         var_ref.suffix)
                     if format_fname == 'ljust':
@@ -4566,8 +5071,8 @@ def Render(tmpl_list, substitute_vars=True):
 
                 else:
                     out_str_list.append(var_ref.prefix +
-                                        #SafelyEncodeString(var_bindings[var_ref.nptr.leaf_node].full_name[1:]) +
-                                        var_bindings[var_ref.nptr.leaf_node].full_name[1:] +
+                                        #SafelyEncodeString(var_bindings[nptr.leaf_node].full_name[1:]) +
+                                        var_bindings[nptr.leaf_node].full_name[1:] +
                                         var_ref.suffix)
 
         else:
@@ -4636,35 +5141,36 @@ def FindReplacementVarPairs(context_node,
 
 
 def ReplaceVars(context_node,
-                replace_var_pairs,
-                search_instance_commands=False):
+                replace_var_pairs):
+    """
+    Replace any references to the variables in replace_var_pairs
+    (which were defined using "replace{}") with references to the
+    variables they are equivalent to.
+       Every VarBinding keeps a list (".refs") of all the places (VarRefs)
+    where that variable is referenced (in this case, in the templates
+    belonging to context_node or its descendants, which have been assigned
+    so far).  So there is no need to search through all of the templates
+    in the tree.  We only need to visit the VarRefs which refer to the
+    variables we are replacing.
+
+    """
 
     if len(replace_var_pairs) == 0:
         return
 
-    #sys.stdout.write('AssignVarPtrs() invoked on node: \"'+NodeToStr(context_node)+'\"\n')
-
-    if search_instance_commands:
-        assert(isinstance(context_node, StaticObj))
-        commands = context_node.instance_commands
-    else:
-        # Note: Leaf nodes contain no commands, so skip them
-        if (not hasattr(context_node, 'commands')):
-            return
-        # Otherwise process their commands
-        commands = context_node.commands
-
-    if len(replace_var_pairs) > 0:
-        for command in commands:
-            if isinstance(command, WriteFileCommand):
-                ReplaceVarsInTmpl(command.tmpl_list,
-                                  replace_var_pairs)
+    # Make a list of the references to each of the variables we are
+    # replacing, before we begin modifying them.  (Each VarRef
+    # should be replaced at most once.)
+    var_refs = []
+    for (cat_name, cat_node, leaf_node) in replace_var_pairs:
+        if cat_node is None:
+            continue  # (variable not assigned yet.  Nothing refers to it.)
+        var_binding = cat_node.categories[cat_name].bindings.get(leaf_node)
+        if var_binding is not None:
+            var_refs += var_binding.refs
 
-    # Recursively invoke ReplaceVars() on all (non-leaf) child nodes:
-    for child in context_node.children.values():
-        ReplaceVars(child,
-                    replace_var_pairs,
-                    search_instance_commands)
+    for var_ref in var_refs:
+        ReplaceVarRef(var_ref, replace_var_pairs)
 
 
 def ReplaceVarsInTmpl(tmpl_list, replace_var_pairs):
@@ -4673,65 +5179,67 @@ def ReplaceVarsInTmpl(tmpl_list, replace_var_pairs):
     if len(replace_var_pairs) == 0:
         return
 
-    i = 0
-    while i < len(tmpl_list):
-        entry = tmpl_list[i]
+    for entry in tmpl_list:
         if isinstance(entry, VarRef):
-            var_ref = entry
-            #full_name = var_bindings[var_ref.nptr.leaf_node].full_name
-            if (var_ref.nptr.cat_name,
-                var_ref.nptr.cat_node,
-                var_ref.nptr.leaf_node) in replace_var_pairs:
-                # optional: (since we will eventually delete the variable)
-                # delete the reference to this variable from "bindings"
-
-                nptr_old = var_ref.nptr
-
-                # swap the old variable with the new one
-                (nptr_new_cat_name, nptr_new_cat_node, nptr_new_leaf_node) = \
-                    replace_var_pairs[(nptr_old.cat_name,
-                                       nptr_old.cat_node,
-                                       nptr_old.leaf_node)]
-
-                var_bindings = var_ref.nptr.cat_node.categories[
-                    nptr_old.cat_name].bindings
-
-                assert(nptr_new_leaf_node in var_bindings)
-
-                # Copy the things we need from the old variable.
-                # References to the old variable should be added to the new one
-                # (since they are the same variable)
-                # for ref in var_bindings[nptr_old.leaf_node].refs:
-                #    ref.nptr.cat_name = nptr_new_cat_name
-                #    ref.nptr.cat_node = nptr_new_cat_node
-                #    ref.nptr.leaf_node = nptr_new_leaf_node
-                if nptr_old.leaf_node in var_bindings:
-                    var_bindings[nptr_new_leaf_node].refs += \
-                        var_bindings[nptr_old.leaf_node].refs
-                    del var_bindings[nptr_old.leaf_node]
-
-                var_ref.nptr.cat_name = nptr_new_cat_name
-                var_ref.nptr.cat_node = nptr_new_cat_node
-                var_ref.nptr.leaf_node = nptr_new_leaf_node  # <-- this will...
-                # ... update all places where that nptr is used, including
-                #     all of the varrefs from the old variable.  In other words,
-                #     there is no need to manually update the leaf_nodes in
-                #     the var_bindings[nptr_new_leaf_node].refs
-                #     (It's better to do it this way instead.)
-
-                # var_ref.prefix = (...no need to modify)
-                # var_ref.suffix = (...no need to modify)
-
-                var_ref.descr_str = \
-                    CanonicalDescrStr(var_ref.nptr.cat_name,
-                                      var_ref.nptr.cat_node,
-                                      var_ref.nptr.leaf_node,
-                                      var_ref.srcloc)
-
-                var_bindings[nptr_new_leaf_node].full_name = \
-                    var_ref.prefix[0] + var_ref.descr_str
-
-        i += 1
+            ReplaceVarRef(entry, replace_var_pairs)
+
+
+def ReplaceVarRef(var_ref, replace_var_pairs):
+    """ If var_ref refers to one of the variables in replace_var_pairs,
+    then replace it with the variable it is equivalent to. """
+
+    #full_name = var_bindings[var_ref.nptr.leaf_node].full_name
+    if (var_ref.nptr.cat_name,
+        var_ref.nptr.cat_node,
+        var_ref.nptr.leaf_node) in replace_var_pairs:
+        # optional: (since we will eventually delete the variable)
+        # delete the reference to this variable from "bindings"
+
+        nptr_old = var_ref.nptr
+
+        # swap the old variable with the new one
+        (nptr_new_cat_name, nptr_new_cat_node, nptr_new_leaf_node) = \
+            replace_var_pairs[(nptr_old.cat_name,
+                               nptr_old.cat_node,
+                               nptr_old.leaf_node)]
+
+        var_bindings = var_ref.nptr.cat_node.categories[
+            nptr_old.cat_name].bindings
+
+        assert(nptr_new_leaf_node in var_bindings)
+
+        # Copy the things we need from the old variable.
+        # References to the old variable should be added to the new one
+        # (since they are the same variable)
+        # for ref in var_bindings[nptr_old.leaf_node].refs:
+        #    ref.nptr.cat_name = nptr_new_cat_name
+        #    ref.nptr.cat_node = nptr_new_cat_node
+        #    ref.nptr.leaf_node = nptr_new_leaf_node
+        if nptr_old.leaf_node in var_bindings:
+            var_bindings[nptr_new_leaf_node].refs += \
+                var_bindings[nptr_old.leaf_node].refs
+            del var_bindings[nptr_old.leaf_node]
+
+        var_ref.nptr.cat_name = nptr_new_cat_name
+        var_ref.nptr.cat_node = nptr_new_cat_node
+        var_ref.nptr.leaf_node = nptr_new_leaf_node  # <-- this will...
+        # ... update all places where that nptr is used, including
+        #     all of the varrefs from the old variable.  In other words,
+        #     there is no need to manually update the leaf_nodes in
+        #     the var_bindings[nptr_new_leaf_node].refs
+        #     (It's better to do it this way instead.)
+
+        # var_ref.prefix = (...no need to modify)
+        # var_ref.suffix = (...no need to modify)
+
+        var_ref.descr_str = \
+            CanonicalDescrStr(var_ref.nptr.cat_name,
+                              var_ref.nptr.cat_node,
+                              var_ref.nptr.leaf_node,
+                              var_ref.srcloc)
+
+        var_bindings[nptr_new_leaf_node].full_name = \
+            var_ref.prefix[0] + var_ref.descr_str
 
 
 def MergeWriteCommands(command_list):
@@ -4745,8 +5253,12 @@ def MergeWriteCommands(command_list):
     for command in command_list:
         if isinstance(command, WriteFileCommand):
             if command.filename != None:
-                file_templates[command.filename] += \
-                    command.tmpl_list
+                if command.bindings is None:
+                    file_templates[command.filename] += \
+                        command.tmpl_list
+                else:
+                    file_templates[command.filename] += \
+                        BindTmplList(command.tmpl_list, command.bindings)
 
     return file_templates
 
@@ -4847,16 +5359,17 @@ def WriteVarBindingsFile(node):
 
                 # Now omit variables whos names contain "*" or "?" or regex
                 # (these are not variables, but pattern matching strings)
-                if not (HasWildcard(var_binding.full_name) or
-                        HasRE(var_binding.full_name)):
+                full_name = var_binding.full_name
+                if not (HasWildcard(full_name) or
+                        HasRE(full_name)):
                     if len(var_binding.refs) > 0:
                         usage_example = '       #' +\
                             ErrorLeader(var_binding.refs[0].srcloc.infile,
                                         var_binding.refs[0].srcloc.lineno)
                     else:
                         usage_example = ''
-                    out.write(#SafelyEncodeString(var_binding.full_name) + '   ' +
-                              var_binding.full_name + '   ' +
+                    out.write(#SafelyEncodeString(full_name) + '   ' +
+                              full_name + '   ' +
                               #SafelyEncodeString(var_binding.value)
                               var_binding.value
                               + usage_example + '\n')
@@ -4865,6 +5378,31 @@ def WriteVarBindingsFile(node):
         WriteVarBindingsFile(child)
 
 
+def CountTreeStats(root, label):
+    """ Report the number of nodes, variables and variable references
+    in the tree beginning at "root" to the profiler (see ttree_profile.py).
+    (Each counter name begins with "label", eg. "static" or "instance".)
+
+    """
+    num_nodes = 0
+    num_vars = 0
+    num_refs = 0
+    stack = [root]
+    while len(stack) > 0:
+        node = stack.pop()
+        num_nodes += 1
+        if hasattr(node, 'categories'):
+            for cat in node.categories.values():
+                num_vars += len(cat.bindings)
+                for var_binding in cat.bindings.values():
+                    num_refs += len(var_binding.refs)
+        if hasattr(node, 'children'):
+            stack.extend(node.children.values())
+    g_profiler.Count(label + ' nodes', num_nodes)
+    g_profiler.Count(label + ' variables', num_vars)
+    g_profiler.Count(label + ' VarRefs', num_refs)
+
+
 def CustomizeBindings(bindings,
                       objectdefs,
                       objects):
@@ -5188,6 +5726,32 @@ def BasicUIParseArgs(argv, settings, main=False):
                     settings.lex.include_path.append(d)
             del(argv[i:i + 2])
 
+        elif argv[i] == '-quiet':
+            # Only print errors and warnings
+            g_log.SetLevel(LOG_QUIET)
+            del(argv[i:i + 1])
+
+        elif argv[i] == '-debug':
+            # Print a message for every command (this can be slow)
+            g_log.SetLevel(LOG_DEBUG)
+            del(argv[i:i + 1])
+
+        elif argv[i] == '-profile':
+            if ((i + 1 >= len(argv)) or (argv[i + 1][:1] == '-')):
+                raise InputError('Error(' + g_filename + '):\n'
+                                 '     Error in \"' + argv[i] + '\" argument.\n'
+                                 '     The \"' + argv[i] + '\" argument should be followed by the name of\n'
+                                 '     a file where the profiling report (in JSON format) will be saved.\n')
+            # Record the time and memory used by each stage in this file.
+            g_profiler.Enable(argv[i + 1], sys.argv[0].split('/')[-1])
+            del(argv[i:i + 2])
+
+        elif argv[i] == '-profile-memory':
+            # Also record the source lines which allocated the most memory
+            # during each stage (using tracemalloc).  This is slow.
+            g_profiler.TraceMemory()
+            del(argv[i:i + 1])
+
         elif (argv[i][0] == '-') and main:
             # elif (__name__ == '__main__'):
             raise InputError('Error(' + g_filename + '):\n'
@@ -5254,8 +5818,9 @@ def BasicUI(settings,
 
     # Step 1: Read in the StaticObj (class) definitions, without checking
     # whether or not the instance_children refer to valid StaticObj types.
-    sys.stderr.write('parsing the class definitions...')
-    static_tree_root.Parse(settings.lex)
+    g_log.Info('parsing the class definitions...')
+    with g_profiler.Stage('parse'):
+        static_tree_root.Parse(settings.lex)
     # gc.collect()
 
     #sys.stderr.write('static = ' + str(static_tree_root) + '\n')
@@ -5269,45 +5834,48 @@ def BasicUI(settings,
     #                and write_once() statements may also refer to StaticObjs in
     #                the tree, but we leave these references alone.  We handle
     #                these assignments later using "AssignVarPtrs()" below.)
-    sys.stderr.write(' done\nlooking up classes...')
-    static_tree_root.LookupStaticRefs()
+    g_log.Info(' done\nlooking up classes...')
+    with g_profiler.Stage('LookupStaticRefs'):
+        static_tree_root.LookupStaticRefs()
     # gc.collect()
 
     # Step 3: Now scan through all the (static) variables within the templates
     #         and replace the (static) variable references to pointers
     #         to nodes in the StaticObj tree:
-    sys.stderr.write(' done\nlooking up @variables...')
-
-    # Step 3a)
-    # Here we assign pointers for @variables in "write_once(){text}" templates:
-    AssignStaticVarPtrs(static_tree_root, search_instance_commands=False)
-
-    # Step 3b) Replace any @variables with their equivalents (if applicable)
-    replace_var_pairs = {}
-    FindReplacementVarPairs(static_tree_root, replace_var_pairs)
-    ReplaceVars(static_tree_root, replace_var_pairs,
-                search_instance_commands=False)
-
-    # Step 3c)
-    # Here we assign pointers for @variables in "write(){text}" templates:
-    AssignStaticVarPtrs(static_tree_root, search_instance_commands=True)
-    ReplaceVars(static_tree_root, replace_var_pairs,
-                search_instance_commands=True)
-
-    sys.stderr.write(' done\nconstructing the tree of class definitions...')
-    sys.stderr.write(' done\n\nclass_def_tree = ' +
-                     str(static_tree_root) + '\n\n')
+    g_log.Info(' done\nlooking up @variables...')
+
+    with g_profiler.Stage('AssignStaticVarPtrs'):
+        # Step 3a)
+        # Here we assign pointers for @variables in "write_once(){text}" templates:
+        AssignStaticVarPtrs(static_tree_root, search_instance_commands=False)
+
+        # Step 3b) Replace any @variables with their equivalents (if applicable)
+        replace_var_pairs = {}
+        FindReplacementVarPairs(static_tree_root, replace_var_pairs)
+        ReplaceVars(static_tree_root, replace_var_pairs)
+
+        # Step 3c)
+        # Here we assign pointers for @variables in "write(){text}" templates:
+        AssignStaticVarPtrs(static_tree_root, search_instance_commands=True)
+        ReplaceVars(static_tree_root, replace_var_pairs)
+
+    g_log.Info(' done\nconstructing the tree of class definitions...')
+    g_log.Info(' done\n\n')
+    g_log.Debug('class_def_tree = %s\n\n', static_tree_root)
     # gc.collect()
 
     # Step 4: Construct the instance tree (the tree of instantiated
     #         classes) from the static tree of type definitions.
-    sys.stderr.write('constructing the instance tree...\n')
+    g_log.Info('constructing the instance tree...\n')
     class_parents_in_use = set([])
-    instance_tree_root.BuildInstanceTree(
-        static_tree_root, class_parents_in_use)
+    with g_profiler.Stage('BuildInstanceTree'):
+        instance_tree_root.BuildInstanceTree(
+            static_tree_root, class_parents_in_use)
+    g_log.EndProgress('objects instantiated')
+    g_log.EndProgress('commands processed')
     #sys.stderr.write('done\n  garbage collection...')
     # gc.collect()
-    sys.stderr.write(' done\n')
+    g_log.Info(' done\n')
     #sys.stderr.write('instance_tree = ' + str(instance_tree_root) + '\n')
 
     # Step 5: The commands must be carried out in a specific order.
@@ -5317,13 +5885,15 @@ def BasicUI(settings,
     #         been executed in.  (We don't carry out the commands yet,
     #         we just store them and sort them.)
     class_parents_in_use = set([])
-    static_tree_root.BuildCommandList(static_commands)
-    instance_tree_root.BuildCommandList(instance_commands)
+    with g_profiler.Stage('BuildCommandList'):
+        static_tree_root.BuildCommandList(static_commands)
+        instance_tree_root.BuildCommandList(instance_commands)
     #sys.stderr.write('static_commands = '+str(static_commands)+'\n')
     #sys.stderr.write('instance_commands = '+str(instance_commands)+'\n')
 
     # Step 6: Replace any $variables with their equivalents (if applicable)
-    ReplaceVars(instance_tree_root, replace_var_pairs)
+    with g_profiler.Stage('ReplaceVars'):
+        ReplaceVars(instance_tree_root, replace_var_pairs)
 
     # Step 7: We are about to assign numbers to the variables.
     #         We need to decide the order in which to assign them.
@@ -5350,14 +5920,15 @@ def BasicUI(settings,
     else:
         reserved_values = None
 
-    sys.stderr.write('sorting variables...\n')
-    AutoAssignVals(static_tree_root,
-                   (settings.order_method != 'by_tree'),
-                   reserved_values)
+    g_log.Info('sorting variables...\n')
+    with g_profiler.Stage('AutoAssignVals'):
+        AutoAssignVals(static_tree_root,
+                       (settings.order_method != 'by_tree'),
+                       reserved_values)
 
-    AutoAssignVals(instance_tree_root,
-                   (settings.order_method != 'by_tree'),
-                   reserved_values)
+        AutoAssignVals(instance_tree_root,
+                       (settings.order_method != 'by_tree'),
+                       reserved_values)
 
     if len(settings.user_bindings) > 0:
         if len(replace_var_pairs) > 0:
@@ -5369,7 +5940,13 @@ def BasicUI(settings,
                           static_tree_root,
                           instance_tree_root)
 
-    sys.stderr.write(' done\n')
+    if g_profiler.IsEnabled():
+        CountTreeStats(static_tree_root, 'static')
+        CountTreeStats(instance_tree_root, 'instance')
+        g_profiler.Count('lookup cache hits', g_lookup_cache.hits)
+        g_profiler.Count('lookup cache misses', g_lookup_cache.misses)
+
+    g_log.Info(' done\n')
 
     return
 
@@ -5418,7 +5995,7 @@ def main():
 
         # Optional: Multiple commands to write to the same file can be merged to
         #           reduce the number of times the file is openned and closed.
-        sys.stderr.write('writing templates...\n')
+        g_log.Info('writing templates...\n')
         # Erase the files that will be written to:
         EraseTemplateFiles(g_static_commands)
         EraseTemplateFiles(g_instance_commands)
@@ -5433,16 +6010,16 @@ def main():
         WriteTemplatesValue(g_static_commands)
         WriteTemplatesValue(g_instance_commands)
 
-        sys.stderr.write(' done\n')
+        g_log.Info(' done\n')
 
         # Step 11: Now write the variable bindings/assignments table.
-        sys.stderr.write('writing \"ttree_assignments.txt\" file...')
+        g_log.Info('writing \"ttree_assignments.txt\" file...')
         # <-- erase previous version.
         open('ttree_assignments.txt', 'w').close()
         WriteVarBindingsFile(g_objectdefs)
         WriteVarBindingsFile(g_objects)
 
-        sys.stderr.write(' done\n')
+        g_log.Info(' done\n')
 
     except (ValueError, InputError) as err:
         sys.stderr.write('\n\n' + str(err) + '\n')
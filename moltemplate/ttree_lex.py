@@ -70,7 +70,9 @@ __all__ = ["TtreeShlex",
            #"_TableFromTemplate",
            #"_DeleteLineFromTemplate",
            "DeleteLinesWithBadVars",
-           "TemplateLexer"]
+           "HasBadVars",
+           "TemplateLexer",
+           "ResolveSource"]
 
 
 class TtreeShlex(object):
@@ -136,6 +138,11 @@ class TtreeShlex(object):
         # if it has not been included already.  It does this
         # by checking if one of these tokens has been encountered.
         self.source_files_restricted = set([])
+        # If self.source_log is a list, then sourcehook() appends a tuple,
+        # (infile, newfile, path), for every file it opens.  ("infile" is the
+        # file containing the request, "newfile" is the name requested, and
+        # "path" is the real path of the file which was opened.)
+        self.source_log = None
         self.include_path = []
         if 'TTREE_PATH' in os.environ:
             include_path_list = os.environ['TTREE_PATH'].split(':')
@@ -425,6 +432,9 @@ class TtreeShlex(object):
                 raise InputError('Error at ' + self.error_leader() + '\n'
                                  '       unable to open file \"' + newfile + '\"\n'
                                  '       for reading.\n')
+        if self.source_log is not None:
+            self.source_log.append((self.infile, newfile,
+                                    os.path.realpath(newfile_full)))
         return (newfile, f)
 
     def error_leader(self, infile=None, lineno=None):
@@ -452,6 +462,23 @@ class TtreeShlex(object):
         return self.__bool__()
 
 
+def ResolveSource(newfile, infile, include_path):
+    """
+    Return the (real) path of the file that TtreeShlex.sourcehook() would open
+    if file "infile" requested file "newfile" (or None if it can not be found).
+    """
+    newfile_full = newfile
+    if isinstance(infile, str) and not os.path.isabs(newfile):
+        newfile_full = os.path.join(os.path.dirname(infile), newfile)
+    if os.path.isfile(newfile_full):
+        return os.path.realpath(newfile_full)
+    for d in include_path:
+        newfile_full = os.path.join(d, newfile)
+        if os.path.isfile(newfile_full):
+            return os.path.realpath(newfile_full)
+    return None
+
+
 # The split() function was originally from shlex
 # It is included for backwards compatibility.
 def split(s, comments=False, posix=True):
@@ -1136,7 +1163,8 @@ class VarRef(object):
     """VarRef stores variable names, and paths, and other attribute information,
     as well as a "OSrcLoc" to keep track of the file it was defined in."""
 
-    __slots__ = ["prefix", "descr_str", "suffix", "srcloc", "binding", "nptr"]
+    __slots__ = ["prefix", "descr_str", "suffix", "srcloc", "binding", "nptr",
+                 "plan"]
 
     def __init__(self,
                  prefix='',  # '$' or '${'
@@ -1144,7 +1172,8 @@ class VarRef(object):
                  suffix='',  # '}'
                  srcloc=None,  # location in file where defined
                  binding=None,  # a pointer to a tuple storing the value
-                 nptr=None):  # <- see class VarNPtr
+                 nptr=None,  # <- see class VarNPtr
+                 plan=None):  # <- the parsed descr_str (see ttree.DescrPlan)
 
         self.prefix = prefix  # Any text before the descriptor string goes here
         self.suffix = suffix  # Any text after the descriptor string goes here
@@ -1161,6 +1190,8 @@ class VarRef(object):
         else:
             self.nptr = nptr
 
+        self.plan = plan
+
     def __lt__(self, x):
         return self.order < x.order
 
@@ -1358,6 +1389,27 @@ def DeleteLinesWithBadVars(tmpl_list,
             i += 1
 
 
+def HasBadVars(tmpl_list, bindings=None):
+    """
+    Return True if any of the VarRefs in a template (tmpl_list)
+    point to a leaf_node which has been deleted.  (In that case,
+    DeleteLinesWithBadVars() would modify the template, so the caller
+    should make a local copy of the template before invoking it.)
+    If the template is shared by many instances, "bindings" contains the
+    bindings of the '$' variables for one of them (see ttree.BindTmplList()).
+
+    """
+    for i, entry in enumerate(tmpl_list):
+        if isinstance(entry, VarRef):
+            if (bindings is not None) and (bindings[i] is not None):
+                nptr = bindings[i].nptr
+            else:
+                nptr = entry.nptr
+            if nptr.leaf_node.IsDeleted():
+                return True
+    return False
+
+
 def SplitTemplate(ltmpl, delim, delete_blanks=False):
     """
     Split a template "ltmpl" into a list of "tokens" (sub-templates)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+
+# License: MIT License  (See LICENSE.md)
+# Copyright (c) 2026, the moltemplate contributors
+
+"""
+ttree_log.py
+
+Progress messages printed (to the standard error) by ttree.py, lttree.py,
+and the other programs which use them.
+
+There are 3 levels of verbosity:
+    LOG_QUIET    Only errors and warnings are printed.
+    LOG_NORMAL   A short message is printed at the beginning and end of each
+                 stage.  Lengthy stages (such as instantiating millions of
+                 objects) print a running count, at most once every few
+                 seconds, instead of a line for every object.
+    LOG_DEBUG    Also print a line for every command that is processed.
+
+Messages are passed as a format string followed by its arguments.
+The message is only formatted (and its arguments converted to strings)
+if it will actually be printed.  For example:
+
+    g_log.Debug('  processing command \"%s\"\\n', command)
+
+does not invoke str(command) unless the verbosity is LOG_DEBUG.
+
+"""
+
+import sys
+import time
+
+
+LOG_QUIET = 0
+LOG_NORMAL = 1
+LOG_DEBUG = 2
+
+
+
+class Logger(object):
+    """
+    Logger prints messages to sys.stderr if their level does not exceed
+    the current verbosity level (self.level).  It also keeps track of
+    "progress counters" which are printed periodically (rather than
+    every time they are incremented).
+    """
+
+    def __init__(self, level=LOG_NORMAL, interval=2.0):
+        self.level = level
+        self.interval = interval   # minimum time between progress reports
+        self.counts = {}
+        self.start_times = {}
+        self.report_times = {}
+
+    def SetLevel(self, level):
+        self.level = level
+
+    def IsEnabled(self, level):
+        return level <= self.level
+
+    def Write(self, level, msg, *args):
+        if level <= self.level:
+            if len(args) > 0:
+                msg = msg % args
+            sys.stderr.write(msg)
+
+    def Info(self, msg, *args):
+        if LOG_NORMAL <= self.level:
+            if len(args) > 0:
+                msg = msg % args
+            sys.stderr.write(msg)
+
+    def Debug(self, msg, *args):
+        if LOG_DEBUG <= self.level:
+            if len(args) > 0:
+                msg = msg % args
+            sys.stderr.write(msg)
+
+    def Progress(self, what, n=1):
+        """
+        Increment the counter named "what" by n.  If more than
+        self.interval seconds have passed since the last time this counter
+        was printed, print it again (along with the rate, eg. "objects/sec").
+        """
+        if self.level < LOG_NORMAL:
+            return
+        count = self.counts.get(what, 0) + n
+        self.counts[what] = count
+        now = time.time()
+        if what not in self.start_times:
+            self.start_times[what] = now
+            self.report_times[what] = now
+        elif now - self.report_times[what] >= self.interval:
+            self.report_times[what] = now
+            self._WriteCount(what, now)
+
+    def EndProgress(self, what):
+        """ Print the final value of the counter named "what" and reset it. """
+        if what in self.counts:
+            if (self.level >= LOG_NORMAL) and (what in self.start_times):
+                self._WriteCount(what, time.time())
+            del self.counts[what]
+            self.start_times.pop(what, None)
+            self.report_times.pop(what, None)
+
+    def _WriteCount(self, what, now):
+        count = self.counts[what]
+        elapsed = now - self.start_times[what]
+        if elapsed > 0.0:
+            sys.stderr.write('  %s: %d (%.0f/sec)\n' %
+                             (what, count, count / elapsed))
+        else:
+            sys.stderr.write('  %s: %d\n' % (what, count))
+
+
+
+# All of the modules in moltemplate share the same (global) logger.
+g_log = Logger()
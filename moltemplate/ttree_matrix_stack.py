@@ -2,7 +2,7 @@
 # License: MIT License  (See LICENSE.md)
 # Copyright (c) 2013
 
-import random, math
+import os, random, math
 from collections import deque
 from array import array
 
@@ -275,22 +275,26 @@ class AffineStack(object):
                 AffineCompose(Mtmp, M, Mdest)
                 CopyMat(Mdest, Mtmp)
 
-            # # if transform_str.find('movecm(') == 0:
-            # #     assert(xcm != None)
-            # #     i_paren_open = transform_str.find('(')
-            # #     i_paren_close = transform_str.find(')')
-            # #     if i_paren_close == -1:
-            # #         i_paren_close = len(transform_str)
-            # #     args =transform_str[i_paren_open+1:i_paren_close].split(',')
-            # #     if (len(args) != 3):
-            # #         raise InputError('Error near '+ErrorLeader(src_loc.infile, src_loc.lineno)+':\n'
-            # #                          '       Invalid command: \"'+transform_str+'\"\n'
-            # #                          '       This command requires 3 numerical arguments.')
-            # #     M = [[1.0, 0.0, 0.0, float(args[0])-(xcm[0])],
-            # #         [0.0, 1.0, 0.0, float(args[1])-(xcm[1])],
-            # #          [0.0, 0.0, 1.0, float(args[2])-(xcm[2])]]
-            # #     AffineCompose(Mtmp, M, Mdest)
-            # #     CopyMat(Mdest, Mtmp)
+            elif transform_str.find('movecm(') == 0:
+                # "movecm(x,y,z)" moves the object's center of mass to (x,y,z)
+                if xcm is None:
+                    raise InputError('Error near ' + ErrorLeader(src_loc.infile, src_loc.lineno) + ':\n'
+                                     '       Invalid command: \"' + transform_str + '\"\n'
+                                     '       The center of mass of the object is not known here.\n')
+                i_paren_open = transform_str.find('(')
+                i_paren_close = transform_str.find(')')
+                if i_paren_close == -1:
+                    i_paren_close = len(transform_str)
+                args = transform_str[i_paren_open+1:i_paren_close].split(',')
+                if (len(args) != 3):
+                    raise InputError('Error near ' + ErrorLeader(src_loc.infile, src_loc.lineno) + ':\n'
+                                     '       Invalid command: \"' + transform_str + '\"\n'
+                                     '       This command requires 3 numerical arguments.')
+                M = [[1.0, 0.0, 0.0, float(args[0]) - xcm[0]],
+                     [0.0, 1.0, 0.0, float(args[1]) - xcm[1]],
+                     [0.0, 0.0, 1.0, float(args[2]) - xcm[2]]]
+                AffineCompose(Mtmp, M, Mdest)
+                CopyMat(Mdest, Mtmp)
 
             elif transform_str.find('move_rand(') == 0:
                 i_paren_open = transform_str.find('(')
@@ -466,37 +470,44 @@ class AffineStack(object):
                     AffineCompose(Mtmp, moveCentBack, Mdest)
                     CopyMat(Mdest, Mtmp)
 
-            # # elif transform_str.find('rotcm(') == 0:
-            # #     i_paren_open = transform_str.find('(')
-            # #     i_paren_close = transform_str.find(')')
-            # #     if i_paren_close == -1:
-            # #         i_paren_close = len(transform_str)
-            # #     args =transform_str[i_paren_open+1:i_paren_close].split(',')
-            # #     if (len(args) != 4):
-            # #         raise InputError('Error near '+ErrorLeader(src_loc.infile, src_loc.lineno)+':\n'
-            # #                          '       Invalid command: \"'+transform_str+'\"\n'
-            # #                          '       This command requires 4 numerical arguments.')
-            # #
-            # #     moveCMtoOrig = [[1.0, 0.0, 0.0, -xcm[0]],
-            # #                     [0.0, 1.0, 0.0, -xcm[1]],
-            # #                     [0.0, 0.0, 1.0, -xcm[2]]]
-            # #     AffineCompose(Mtmp, moveCMtoOrig, Mdest)
-            # #     CopyMat(Mdest, Mtmp)
-            # #     M[0][3] = 0.0#RotMatAXYZ() only modifies 3x3 submatrix of M
-            # #     M[1][3] = 0.0#The remaining final column must be zeroed by hand
-            # #     M[2][3] = 0.0
-            # #     RotMatAXYZ(M,
-            # #                float(args[0])*math.pi/180.0,
-            # #                float(args[1]),
-            # #                float(args[2]),
-            # #                float(args[3]))
-            # #     AffineCompose(Mtmp, M, Mdest)
-            # #     CopyMat(Mdest, Mtmp)
-            # #     moveCmBack = [[1.0, 0.0, 0.0, xcm[0]],
-            # #                   [0.0, 1.0, 0.0, xcm[1]],
-            # #                   [0.0, 0.0, 1.0, xcm[2]]]
-            # #     AffineCompose(Mtmp, moveCmBack, Mdest)
-            # #     CopyMat(Mdest, Mtmp)
+            elif transform_str.find('rotcm(') == 0:
+                # "rotcm(angle,X,Y,Z)" rotates the object around its center of mass
+                if xcm is None:
+                    raise InputError('Error near ' + ErrorLeader(src_loc.infile, src_loc.lineno) + ':\n'
+                                     '       Invalid command: \"' + transform_str + '\"\n'
+                                     '       The center of mass of the object is not known here.\n')
+                i_paren_open = transform_str.find('(')
+                i_paren_close = transform_str.find(')')
+                if i_paren_close == -1:
+                    i_paren_close = len(transform_str)
+                args = transform_str[i_paren_open+1:i_paren_close].split(',')
+                if (len(args) != 4):
+                    raise InputError('Error near ' + ErrorLeader(src_loc.infile, src_loc.lineno) + ':\n'
+                                     '       Invalid command: \"' + transform_str + '\"\n'
+                                     '       This command requires 4 numerical arguments.')
+                # Move the center of mass to the origin
+                moveCMtoOrig = [[1.0, 0.0, 0.0, -xcm[0]],
+                                [0.0, 1.0, 0.0, -xcm[1]],
+                                [0.0, 0.0, 1.0, -xcm[2]]]
+                AffineCompose(Mtmp, moveCMtoOrig, Mdest)
+                CopyMat(Mdest, Mtmp)
+                # Rotate the coordinates (relative to the origin)
+                M[0][3] = 0.0  # RotMatAXYZ() only modifies 3x3 submatrix of M
+                M[1][3] = 0.0  # The remaining final column must be zeroed by hand
+                M[2][3] = 0.0
+                RotMatAXYZ(M,
+                           float(args[0]) * math.pi / 180.0,
+                           float(args[1]),
+                           float(args[2]),
+                           float(args[3]))
+                AffineCompose(Mtmp, M, Mdest)
+                CopyMat(Mdest, Mtmp)
+                # Move the center of mass back where it was
+                moveCMBack = [[1.0, 0.0, 0.0, xcm[0]],
+                              [0.0, 1.0, 0.0, xcm[1]],
+                              [0.0, 0.0, 1.0, xcm[2]]]
+                AffineCompose(Mtmp, moveCMBack, Mdest)
+                CopyMat(Mdest, Mtmp)
 
             elif transform_str.find('rot_rand(') == 0:
                 i_paren_open = transform_str.find('(')
@@ -640,39 +651,32 @@ class AffineStack(object):
                 AffineCompose(Mtmp, M, Mdest)
                 CopyMat(Mdest, Mtmp)
 
-            # # elif transform_str.find('scalecm(') == 0:
-            # #     assert(xcm != None)
-            # #     i_paren_open = transform_str.find('(')
-            # #     i_paren_close = transform_str.find(')')
-            # #     if i_paren_close == -1:
-            # #         i_paren_close = len(transform_str)
-            # #     args =transform_str[i_paren_open+1:i_paren_close].split(',')
-            # #
-            # #     moveCMtoOrig = [[1.0, 0.0, 0.0, -xcm[0]],
-            # #                     [0.0, 1.0, 0.0, -xcm[1]],
-            # #                     [0.0, 0.0, 1.0, -xcm[2]]]
-            # #     AffineCompose(Mtmp, moveCMtoOrig, Mdest)
-            # #     CopyMat(Mdest, Mtmp)
-            # #
-            # #     M[0][3] = 0.0 #ScaleMat() only modifies 3x3 submatrix of M
-            # #     M[1][3] = 0.0 #The remaining final column must be zeroed by hand
-            # #     M[2][3] = 0.0
-            # #     if (len(args) == 1):
-            # #         ScaleMat(M, args[0])
-            # #     elif (len(args) == 3):
-            # #         ScaleMat(M, args)
-            # #     else:
-            # #         raise InputError('Error near '+ErrorLeader(src_loc.infile, src_loc.lineno)+':\n'
-            # #                          '       Invalid command: \"'+transform_str+'\"\n'
-            # #                          '       This command requires either 1 or 3 numerical arguments.')
-            # #
-            # #     AffineCompose(Mtmp, M, Mdest)
-            # #     CopyMat(Mdest, Mtmp)
-            # #     moveCmBack = [[1.0, 0.0, 0.0, xcm[0]],
-            # #                   [0.0, 1.0, 0.0, xcm[1]],
-            # #                   [0.0, 0.0, 1.0, xcm[2]]]
-            # #     AffineCompose(Mtmp, moveCmBack, Mdest)
-            # #     CopyMat(Mdest, Mtmp)
+            elif transform_str.find('scalecm(') == 0:
+                # "scalecm(ratio)" expands the object around its center of mass
+                if xcm is None:
+                    raise InputError('Error near ' + ErrorLeader(src_loc.infile, src_loc.lineno) + ':\n'
+                                     '       Invalid command: \"' + transform_str + '\"\n'
+                                     '       The center of mass of the object is not known here.\n')
+                i_paren_open = transform_str.find('(')
+                i_paren_close = transform_str.find(')')
+                if i_paren_close == -1:
+                    i_paren_close = len(transform_str)
+                args = transform_str[i_paren_open+1:i_paren_close].split(',')
+                if (len(args) == 1):
+                    scale_v = [float(args[0]), float(args[0]), float(args[0])]
+                elif (len(args) == 3):
+                    scale_v = [float(args[0]), float(args[1]), float(args[2])]
+                else:
+                    raise InputError('Error near ' + ErrorLeader(src_loc.infile, src_loc.lineno) + ':\n'
+                                     '       Invalid command: \"' + transform_str + '\"\n'
+                                     '       This command requires either 1 or 3 numerical arguments. Either:\n'
+                                     '           scalecm(ratio), or \n'
+                                     '           scalecm(ratioX, ratioY, ratioZ)')
+                ScaleMat(M, scale_v)
+                for d in range(0, 3):
+                    M[d][3] = xcm[d] * (1.0 - scale_v[d])
+                AffineCompose(Mtmp, M, Mdest)
+                CopyMat(Mdest, Mtmp)
 
             #elif transform_str.find('read_xyz(') == 0:
             #    i_paren_open = transform_str.find('(')
@@ -710,6 +714,63 @@ class AffineStack(object):
         return Mdest
 
 
+# Files of affine transformation matrices read by LoadFrames()
+# (The key is the real path of each file.  The value is a tuple containing
+#  the FramesFileStamp() of the file, and its contents.)
+g_frame_files = {}
+
+
+def FramesFileStamp(file_name):
+    """
+    Return the (real) path, modification time, and size of a file.
+    If any of these change, the file must be read again.
+    """
+    path = os.path.realpath(file_name)
+    st = os.stat(path)
+    return (path, st.st_mtime, st.st_size)
+
+
+def LoadFrames(file_name, src_loc=OSrcLoc()):
+    """
+    Read a file containing a NumPy array of shape (N,3,4) (created using
+    numpy.save()) whose entries are 3x4 affine transformation matrices.
+    Each file is only read once, unless it was modified since then.
+    (It is memory-mapped, not loaded, so that files containing millions of
+    matrices can be used.  See also CloseFrames().)
+
+    """
+    try:
+        stamp = FramesFileStamp(file_name)
+    except OSError:
+        raise InputError('Error near ' + ErrorLeader(src_loc.infile, src_loc.lineno) + ':\n'
+                         '       Unable to find file \"' + file_name + '\"\n')
+    path = stamp[0]
+    if (path in g_frame_files) and (g_frame_files[path][0] == stamp):
+        return g_frame_files[path][1]
+    import numpy as np
+    try:
+        frames = np.load(path, mmap_mode='r')
+    except (IOError, OSError, ValueError):
+        raise InputError('Error near ' + ErrorLeader(src_loc.infile, src_loc.lineno) + ':\n'
+                         '       Unable to read file \"' + file_name + '\"\n'
+                         '       (This file should be in NumPy (.npy) format.)\n')
+    if (len(frames.shape) != 3) or (frames.shape[1:] != (3, 4)):
+        raise InputError('Error near ' + ErrorLeader(src_loc.infile, src_loc.lineno) + ':\n'
+                         '       File \"' + file_name + '\" should contain an array of 3x4 matrices.\n'
+                         '       (Its shape should be (N,3,4), not ' + str(frames.shape) + ')\n')
+    g_frame_files[path] = (stamp, frames)
+    return frames
+
+
+def CloseFrames():
+    """
+    Forget all of the files read by LoadFrames().  (This should be invoked
+    after the coordinates have been written.  Each file is unmapped as soon
+    as nothing else refers to it.)
+    """
+    g_frame_files.clear()
+
+
 class MultiAffineStack(object):
 
     def __init__(self, which_stack=None):
@@ -777,6 +838,24 @@ class MultiAffineStack(object):
         else:
             self._Update()
 
+    def FrameMatrix(self, which_stack=None, right_not_left=True):
+        """
+        Return (a copy of) the product of the matrices on the stacks
+        which precede "which_stack" (including "which_stack" itself,
+        if right_not_left is True).  Matrices pushed onto "which_stack"
+        transform coordinates which are expressed in this frame.
+        """
+        frame = AffineStack()
+        if (which_stack == None) and (len(self.stacks) > 0):
+            which_stack = self.stack_keys[-1]
+        for key, stack in zip(self.stack_keys, self.stacks):
+            if (key is which_stack) and (not right_not_left):
+                break
+            frame.PushRight(stack.M)
+            if key is which_stack:
+                break
+        return frame.M
+
     def PushRight(self, M, which_stack=None):
         self.Push(M, which_stack, right_not_left=True)
 
@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+
+# License: MIT License  (See LICENSE.md)
+# Copyright (c) 2026, the moltemplate contributors
+
+"""
+ttree_profile.py
+
+This module measures the time and memory consumed by each stage of a
+moltemplate build.  It is used by lttree.py, nbody_by_type.py,
+bonds_by_type.py and ttree_render.py when they are invoked with the
+"-profile FILE" argument.  (moltemplate.sh forwards this argument to each
+of the programs it runs.)
+
+For each named stage, the following quantities are recorded:
+    wall time, CPU time, and the peak RSS (resident memory) of the
+    process so far ("process_peak_rss_kb").  (This is the peak for the
+    whole process, not for that stage alone.  It includes the memory
+    used by the earlier stages.)
+Each program may also increment named counters (such as the number of
+nodes in the instance tree, or the number of lines written).
+
+If the "-profile-memory" argument is also used, then the source lines
+which allocated the most memory during each stage are also recorded
+(using tracemalloc).  This slows these programs down considerably, so it
+is disabled by default.  (The number of source lines reported can also
+be set using the MOLTEMPLATE_PROFILE_NTOP environment variable.  The time
+spent comparing tracemalloc snapshots is excluded from the time reported
+for each stage, but not from the total.)
+
+Each program appends its own record to the same JSON FILE.  After every
+write, the "totals" entry in that file is recomputed so that, at the end
+of a moltemplate.sh run, FILE contains one merged report for all programs.
+(The file is locked while it is being updated, so programs which run
+ simultaneously do not overwrite each other's records.)
+
+By default profiling is disabled, and Stage() and Count() do nothing.
+
+"""
+
+import sys
+import os
+import time
+import json
+import atexit
+
+try:
+    import resource
+except ImportError:
+    # (not available on windows)
+    resource = None
+
+try:
+    import fcntl
+except ImportError:
+    # (not available on windows)
+    fcntl = None
+
+try:
+    import tracemalloc
+except ImportError:
+    # (python versions earlier than 3.4)
+    tracemalloc = None
+
+if sys.version < '2.7':
+    from ordereddict import OrderedDict
+else:
+    from collections import OrderedDict
+
+try:
+    CpuTime = time.process_time
+except AttributeError:
+    # (python versions earlier than 3.3)
+    CpuTime = time.clock
+
+
+
+def PeakRSS():
+    """
+    Return the maximum resident memory used by this process (so far) in KiB.
+    (Returns None if this information is not available on this platform.)
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak //= 1024   # (ru_maxrss is reported in bytes on MacOS)
+    return peak
+
+
+
+class _NullStage(object):
+    """ A stage which does nothing (used when profiling is disabled). """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_null_stage = _NullStage()
+
+
+
+class _ProfiledStage(object):
+    """
+    A context manager which measures the resources consumed by the
+    code inside its "with" block, and appends the result to
+    profiler.stages.
+    """
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.snapshot = None
+        if self.profiler.tracing:
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            self.snapshot = tracemalloc.take_snapshot()
+        self.wall_start = time.time()
+        self.cpu_start = CpuTime()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        record = OrderedDict()
+        record['name'] = self.name
+        record['wall_time'] = time.time() - self.wall_start
+        record['cpu_time'] = CpuTime() - self.cpu_start
+        # (ru_maxrss is the peak for the whole process, not for this stage)
+        record['process_peak_rss_kb'] = PeakRSS()
+        if self.snapshot is not None:
+            record['traced_peak_bytes'] = tracemalloc.get_traced_memory()[1]
+            record['top_allocations'] = \
+                self.profiler.TopAllocations(self.snapshot)
+            self.snapshot = None
+        self.profiler.stages.append(record)
+        return False
+
+
+
+class StageProfiler(object):
+    """
+    StageProfiler keeps track of the resources consumed by each stage of
+    a program, as well as a set of counters, and writes them to a JSON file.
+
+    Typical usage:
+
+        g_profiler.Enable('profile.json', 'lttree.py')
+        with g_profiler.Stage('parse'):
+            ...
+        g_profiler.Count('lines written', len(lines))
+
+    (The report is written automatically when the program exits.)
+
+    """
+
+    def __init__(self):
+        self.filename = None
+        self.program_name = ''
+        self.ntop = 0
+        self.tracing = False
+        self.stages = []
+        self.counters = OrderedDict()
+        self.wall_start = None
+        self.cpu_start = None
+
+    def IsEnabled(self):
+        return self.filename is not None
+
+    def Enable(self, filename, program_name, ntop=None):
+        if self.filename is not None:
+            return   # (already enabled)
+        if ntop is None:
+            # The number of allocation sites reported for each stage can also
+            # be set using the MOLTEMPLATE_PROFILE_NTOP environment variable.
+            # (By default it is 0, which disables tracemalloc.  See below.)
+            ntop = int(os.environ.get('MOLTEMPLATE_PROFILE_NTOP',
+                                      str(self.ntop)))
+        self.filename = filename
+        self.program_name = program_name
+        self.wall_start = time.time()
+        self.cpu_start = CpuTime()
+        self.TraceMemory(ntop)
+        atexit.register(self.WriteReport)
+
+    def TraceMemory(self, ntop=10):
+        """
+        Record the "ntop" source lines which allocated the most memory during
+        each stage (using tracemalloc).  This is slow, so it is off by default.
+        (This can be invoked before or after Enable().)
+        """
+        self.ntop = ntop
+        if (self.filename is None) or (tracemalloc is None) or (ntop <= 0):
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.tracing = True
+
+    def Stage(self, name):
+        if self.filename is None:
+            return _null_stage
+        return _ProfiledStage(self, name)
+
+    def Count(self, name, n=1):
+        if self.filename is None:
+            return
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def TopAllocations(self, snapshot_before):
+        """
+        Return a list of the source lines which allocated the most
+        memory since "snapshot_before" was taken (and did not free it).
+        """
+        snapshot = tracemalloc.take_snapshot()
+        # (Snapshot.filter_traces() is slow for large snapshots, so we
+        #  skip the allocations made by the profiler in the loop below.)
+        ignore = (tracemalloc.__file__, __file__)
+        top = []
+        for stat in snapshot.compare_to(snapshot_before, 'lineno'):
+            if len(top) >= self.ntop:
+                break
+            frame = stat.traceback[0]
+            if (stat.size_diff <= 0) or (frame.filename in ignore):
+                continue
+            top.append(OrderedDict([
+                ('location', frame.filename + ':' + str(frame.lineno)),
+                ('size_bytes', stat.size_diff),
+                ('count', stat.count_diff)]))
+        return top
+
+    def Record(self):
+        """ Return a summary of this program's measurements. """
+        record = OrderedDict()
+        record['program'] = self.program_name
+        record['argv'] = sys.argv[1:]
+        record['wall_time'] = time.time() - self.wall_start
+        record['cpu_time'] = CpuTime() - self.cpu_start
+        record['peak_rss_kb'] = PeakRSS()
+        record['stages'] = self.stages
+        record['counters'] = self.counters
+        return record
+
+    def WriteReport(self):
+        """
+        Append this program's record to the JSON file (if profiling is
+        enabled), and update the "totals" for every program in that file.
+        """
+        if self.filename is None:
+            return
+        record = self.Record()
+        # (Several programs may write to this file at the same time, for
+        #  example when moltemplate.sh is invoked with "-nbody-jobs".
+        #  Lock the file while it is being read, modified, and rewritten.)
+        fd = os.open(self.filename, os.O_RDWR | os.O_CREAT, 0o666)
+        with os.fdopen(fd, 'r+') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            f.seek(0)
+            text = f.read()
+            report = None
+            if text.strip() != '':
+                try:
+                    report = json.loads(text, object_pairs_hook=OrderedDict)
+                except ValueError:
+                    sys.stderr.write('WARNING(' + self.program_name + '): '
+                                     'unable to read profile \"' +
+                                     self.filename + '\". Overwriting it.\n')
+            if (not isinstance(report, dict)) or ('programs' not in report):
+                report = OrderedDict([('programs', [])])
+            report['programs'].append(record)
+            report['totals'] = MergeRecords(report['programs'])
+            f.seek(0)
+            f.truncate()
+            json.dump(report, f, indent=2)
+            f.write('\n')
+            f.flush()
+            # (The lock is released when the file is closed.)
+        # Make sure this record is only written once
+        self.filename = None
+
+
+
+def MergeRecords(records):
+    """
+    Combine the records from several programs into a single summary.
+    Times and counters are summed.  Peak memory is the maximum over
+    all programs.  Stages with the same name are merged together.
+    """
+    totals = OrderedDict()
+    totals['wall_time'] = 0.0
+    totals['cpu_time'] = 0.0
+    totals['peak_rss_kb'] = None
+    stages = OrderedDict()
+    counters = OrderedDict()
+    for record in records:
+        totals['wall_time'] += record['wall_time']
+        totals['cpu_time'] += record['cpu_time']
+        if record['peak_rss_kb'] is not None:
+            totals['peak_rss_kb'] = max(totals['peak_rss_kb'] or 0,
+                                        record['peak_rss_kb'])
+        for stage in record['stages']:
+            name = stage['name']
+            if name not in stages:
+                stages[name] = OrderedDict([('calls', 0),
+                                            ('wall_time', 0.0),
+                                            ('cpu_time', 0.0)])
+            stages[name]['calls'] += 1
+            stages[name]['wall_time'] += stage['wall_time']
+            stages[name]['cpu_time'] += stage['cpu_time']
+        for name, n in record['counters'].items():
+            counters[name] = counters.get(name, 0) + n
+    totals['stages'] = stages
+    totals['counters'] = counters
+    return totals
+
+
+
+# All of the programs in moltemplate share the same (global) profiler.
+g_profiler = StageProfiler()
@@ -26,10 +26,12 @@ import gc
 try:
     from .ttree import ExtractFormattingCommands
     from .ttree_lex import SplitQuotedString, InputError, TemplateLexer
+    from .ttree_profile import g_profiler
 except (ImportError, SystemError, ValueError):
     # not installed as a package
     from ttree import ExtractFormattingCommands
     from ttree_lex import SplitQuotedString, InputError, TemplateLexer
+    from ttree_profile import g_profiler
 
 
 g_filename = __file__.split('/')[-1]
@@ -46,7 +48,18 @@ g_program_name = g_filename
 
 def main():
     try:
-        if (len(sys.argv) < 2):
+        argv = [arg for arg in sys.argv]
+        if '-profile' in argv:
+            # (The time and memory used by each program invocation
+            #  is recorded by g_profiler.  See "ttree_profile.py")
+            i = argv.index('-profile')
+            if i + 1 >= len(argv):
+                raise InputError('Error: ' + argv[i] + ' flag should be followed by the name of a file\n'
+                                 '       where the profiling report (in JSON format) will be saved.\n')
+            g_profiler.Enable(argv[i + 1], g_program_name)
+            del(argv[i:i + 2])
+
+        if (len(argv) < 2):
             raise InputError('Error running  \"' + g_program_name + '\"\n'
                              ' Typical usage:\n'
                              ' ttree_render.py ttree_assignments.txt < file.template > file.rendered\n'
@@ -57,11 +70,11 @@ def main():
                              '   (This is likely a programmer error.\n'
                              '    This script was not intended to be run by end users.)\n')
 
-        bindings_filename = sys.argv[1]
+        bindings_filename = argv[1]
         ftemplate = sys.stdin
         ftemplate_name = '__standard_input_for_ttree_render__'
-        if len(sys.argv) >= 3:
-            ftemplate_name = sys.argv[2]
+        if len(argv) >= 3:
+            ftemplate_name = argv[2]
             ftemplate = open(ftemplate_name, 'r')
 
 
@@ -86,7 +99,8 @@ def main():
         lex = TemplateLexer(ftemplate, ftemplate_name)
         lex.var_delim = '$@'
 
-        text_block_list = lex.ReadTemplate(simplify_output=True)
+        with g_profiler.Stage('render: parse template'):
+            text_block_list = lex.ReadTemplate(simplify_output=True)
 
         output = []
 
@@ -154,7 +168,14 @@ def main():
             else:
                 output += entry
 
-        sys.stdout.write(''.join(output))
+        text = ''.join(output)
+        sys.stdout.write(text)
+        if g_profiler.IsEnabled():
+            g_profiler.Count('VarRefs rendered',
+                             len([entry for entry in text_block_list
+                                  if ((len(entry) > 1) and
+                                      (entry[0] in lex.var_delim))]))
+            g_profiler.Count('lines written', text.count('\n'))
 
         # If we are not reading the file from sys.stdin, then close the file:
         if ftemplate_name == '__standard_input_for_ttree_render__':
@@ -90,6 +90,7 @@ setup(
         'lttree.py=moltemplate.lttree:main',
         'lttree_check.py=moltemplate.lttree_check:main',
         'lttree_postprocess.py=moltemplate.lttree_postprocess:main',
+        'lttree_server.py=moltemplate.lttree_server:main',
         'nbody_by_type.py=moltemplate.nbody_by_type:main',
         'nbody_fix_ttree_assignments.py=moltemplate.nbody_fix_ttree_assignments:main',
         'nbody_reorder_atoms.py=moltemplate.nbody_reorder_atoms:main',
@@ -0,0 +1,71 @@
+#!/usr/bin/env bash
+
+test_genpoly_lt_frames() {
+  cd tests/
+    rm -rf genpoly_frames
+    mkdir genpoly_frames
+    cd genpoly_frames
+      # a simple monomer containing 2 atoms (with different masses)
+      cat > monomer.lt <<EOF
+Monomer {
+  write("Data Atoms") {
+    \$atom:a \$mol:... @atom:A 0.0  0.0 0.0 0.0
+    \$atom:b \$mol:... @atom:B 0.0  0.5 1.0 0.0
+  }
+  write_once("Data Masses") {
+    @atom:A 1.0
+    @atom:B 2.0
+  }
+  write_once("In Init") {
+    atom_style full
+    bond_style harmonic
+  }
+}
+EOF
+      # a helical curve (with 30 monomers)
+      awk 'BEGIN{for(i=0;i<30;i++){print 5*cos(0.3*i), 5*sin(0.3*i), 0.4*i}}' > coords.raw
+
+      # build the polymer using push(), pop() commands, and using "-frames"
+      for mode in pushpop frames; do
+        mkdir $mode
+        cp monomer.lt coords.raw $mode/
+        cd $mode
+          FRAMES_ARGS=""
+          if [ $mode = "frames" ]; then
+            FRAMES_ARGS="-frames polymer_frames.npy"
+          fi
+          genpoly_lt.py -helix 30 -bond Backbone a a \
+                        -polymer-name Polymer -monomer-name Monomer \
+                        -header 'import "monomer.lt"' \
+                        $FRAMES_ARGS < coords.raw > polymer.lt
+          printf 'import "polymer.lt"\npolymer = new Polymer\n' > system.lt
+          moltemplate.sh -nocheck system.lt
+          assertTrue "system.data file not created ($mode)" "[ -s system.data ]"
+        cd ../
+      done
+
+      NUM_NEW_FRAMES=`awk "/= new Monomer .*\.frames\(/{sum+=1} END{print sum}" < frames/polymer.lt`
+      assertTrue "genpoly_lt.py -frames did not use .frames()" "[ $NUM_NEW_FRAMES -eq 1 ]"
+      assertTrue "genpoly_lt.py -frames did not create polymer_frames.npy" "[ -s frames/polymer_frames.npy ]"
+
+      # The coordinates should agree (apart from round-off error)
+      python - <<'EOF_PY'
+import sys
+import numpy as np
+def ReadAtoms(fname):
+    lines = open(fname).read().split('Atoms')[1].split('\n\n')[1].split('\n')
+    return np.array([[float(x) for x in l.split()[4:7]] for l in lines if l.strip()])
+x_pushpop = ReadAtoms('pushpop/system.data')
+x_frames = ReadAtoms('frames/system.data')
+if (x_pushpop.shape != (60, 3)) or (x_frames.shape != x_pushpop.shape):
+    sys.exit('wrong number of atoms')
+if np.abs(x_frames - x_pushpop).max() > 1.0e-9:
+    sys.exit('coordinates differ')
+EOF_PY
+      assertTrue "genpoly_lt.py -frames coordinates differ from push/pop coordinates" "[ $? -eq 0 ]"
+    cd ../
+    rm -rf genpoly_frames
+  cd ../
+}
+
+. shunit2/shunit2
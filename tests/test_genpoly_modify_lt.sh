@@ -0,0 +1,115 @@
+#!/usr/bin/env bash
+
+test_genpoly_modify_lt_periodic() {
+  cd tests/
+    rm -rf genpoly_modify_lt_periodic
+    mkdir genpoly_modify_lt_periodic
+    cd genpoly_modify_lt_periodic
+      genpoly_modify_lt.py -length 100 \
+                           -locations-periodic 10 3 \
+                           -width 2 \
+                           -write-locations locations.txt \
+                           -write-occupancy occupancy.txt
+      LOCATIONS=`cat locations.txt | tr '\n' ' '`
+      assertTrue "genpoly_modify_lt.py -locations-periodic: wrong locations: $LOCATIONS" "[ \"$LOCATIONS\" = \"3 13 23 33 43 53 63 73 83 93 \" ]"
+      NUM_OCCUPIED=`awk '{if (NF==1) {sum+=1}} END{print sum}' < occupancy.txt`
+      assertTrue "genpoly_modify_lt.py -write-occupancy: wrong number of sites" "[ $NUM_OCCUPIED -eq 20 ]"
+
+      # Now place the modifications near these locations, avoiding the sites
+      # which are already occupied.  (The expected locations were generated
+      # using earlier versions of genpoly_modify_lt.py.)
+      printf '5\n6\n7\n20\n21\n40\n41\n42\n43\n44\n45\n70\n' > occupancy.txt
+      genpoly_modify_lt.py -length 100 \
+                           -locations-periodic 12 5 \
+                           -width 3 \
+                           -read-occupancy occupancy.txt \
+                           -write-locations locations.txt
+      LOCATIONS=`cat locations.txt | tr '\n' ' '`
+      assertTrue "genpoly_modify_lt.py -read-occupancy: wrong locations: $LOCATIONS" "[ \"$LOCATIONS\" = \"2 13 22 30 37 46 55 63 71 80 88 96 \" ]"
+      genpoly_modify_lt.py -length 97 \
+                           -locations-periodic 9 0 \
+                           -width 4 \
+                           -read-occupancy occupancy.txt \
+                           -circular yes \
+                           -write-locations locations.txt
+      LOCATIONS=`cat locations.txt | tr '\n' ' '`
+      assertTrue "genpoly_modify_lt.py -circular yes: wrong locations: $LOCATIONS" "[ \"$LOCATIONS\" = \"0 10 22 32 46 53 64 75 86 \" ]"
+
+      # Modifications which wrap around the end of a circular polymer
+      printf '10\n98\n' > locations.txt
+      genpoly_modify_lt.py -length 100 \
+                           -locations locations.txt \
+                           -width 3 \
+                           -circular yes \
+                           -polymer-name Poly \
+                           -bond Link c c 0 2 \
+                           -write-occupancy occupancy.txt > poly_mod.lt
+      assertTrue "genpoly_modify_lt.py failed near the end of a circular polymer" "[ $? -eq 0 ]"
+      OCCUPIED=`cat occupancy.txt | tr '\n' ' '`
+      assertTrue "genpoly_modify_lt.py -circular yes: wrong occupancy: $OCCUPIED" "[ \"$OCCUPIED\" = \"0 10 11 12 98 99 \" ]"
+      NUM_BONDS=`grep -c '@bond:Link \$atom:mon\[98\]/c \$atom:mon\[0\]/c' < poly_mod.lt`
+      assertTrue "genpoly_modify_lt.py -bond did not wrap around the polymer" "[ $NUM_BONDS -eq 1 ]"
+    cd ../
+    rm -rf genpoly_modify_lt_periodic
+  cd ../
+}
+
+test_genpoly_modify_lt_random() {
+  cd tests/
+    rm -rf genpoly_modify_lt_random
+    mkdir genpoly_modify_lt_random
+    cd genpoly_modify_lt_random
+      printf '5\n6\n7\n20\n21\n40\n41\n42\n43\n44\n45\n70\n' > occupancy.txt
+      genpoly_modify_lt.py -length 100 \
+                           -locations-random 15 1 \
+                           -width 3 \
+                           -read-occupancy occupancy.txt \
+                           -circular yes \
+                           -write-locations locations1.txt
+      # Modifications of different widths
+      printf '1\n2\n3\n4\n5\n' > widths2.txt
+      genpoly_modify_lt.py -length 40 \
+                           -locations-random 5 7 \
+                           -widths widths2.txt \
+                           -write-locations locations2.txt
+      # If the modifications have the same width, and there is only just
+      # enough room for them, then they should be placed on the first attempt.
+      seq 0 9 > occupancy3.txt
+      genpoly_modify_lt.py -length 40 \
+                           -locations-random 10 3 \
+                           -width 3 \
+                           -read-occupancy occupancy3.txt \
+                           -locations-random-attempts 1 \
+                           -write-locations locations3.txt
+      assertTrue "genpoly_modify_lt.py -locations-random failed to fit the modifications" "[ $? -eq 0 ]"
+
+      # Check that the modifications do not overlap with each other
+      # (or with the occupied sites), and lie within the polymer.
+      python - <<'EOF_PY'
+import sys
+def Check(locations_file, N, widths, occupied, circular):
+    locations = [int(x) for x in open(locations_file).read().split()]
+    if len(locations) != len(widths):
+        sys.exit(locations_file + ': wrong number of locations')
+    sites = list(occupied)
+    for loc, w in zip(locations, widths):
+        if (loc < 0) or (loc >= N) or ((not circular) and (loc + w > N)):
+            sys.exit(locations_file + ': location out of range')
+        sites += [(loc + j) % N for j in range(0, w)]
+    if len(set(sites)) != len(sites):
+        sys.exit(locations_file + ': overlapping modifications')
+    return locations
+occupied = [5, 6, 7, 20, 21, 40, 41, 42, 43, 44, 45, 70]
+Check('locations1.txt', 100, [3]*15, occupied, True)
+Check('locations2.txt', 40, [1, 2, 3, 4, 5], [], False)
+locations = Check('locations3.txt', 40, [3]*10, range(0, 10), False)
+if sorted(locations) != list(range(10, 40, 3)):
+    sys.exit('locations3.txt: wrong locations')
+EOF_PY
+      assertTrue "genpoly_modify_lt.py -locations-random: bad locations" "[ $? -eq 0 ]"
+    cd ../
+    rm -rf genpoly_modify_lt_random
+  cd ../
+}
+
+. shunit2/shunit2
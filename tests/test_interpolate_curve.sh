@@ -0,0 +1,79 @@
+#!/usr/bin/env bash
+
+test_interpolate_curve() {
+  cd tests/
+    rm -rf interpolate_curve
+    mkdir interpolate_curve
+    cd interpolate_curve
+      # a zig-zag curve containing 7 control points
+      awk 'BEGIN{for(i=0;i<7;i++){print i, 0.5*(i%2), 0.1*i*i}}' > coords.raw
+
+      # If alpha=0, the control points are evenly spaced in time.
+      # If we also choose (7-1)*5+1 points, then every 5th point should
+      # coincide with one of the control points.
+      interpolate_curve.py 31 1.0 0.0 < coords.raw > coords_new.raw
+      NUM_LINES=`awk '{if (NF==3) {sum+=1}} END{print sum}' < coords_new.raw`
+      assertTrue "interpolate_curve.py generated the wrong number of points" "[ $NUM_LINES -eq 31 ]"
+      NUM_BAD=`awk '{if ((NR-1)%5==0) {print $0}}' < coords_new.raw | paste - coords.raw | awk 'function abs(x){return (x<0)?-x:x} {if (abs($1-$4)+abs($2-$5)+abs($3-$6) > 1.0e-9) {sum+=1}} END{print sum+0}'`
+      assertTrue "interpolated curve does not pass through the control points" "[ $NUM_BAD -eq 0 ]"
+
+      # If -uniform-arc-length is used, the points should be evenly spaced.
+      # (The distances between neighboring points are slightly shorter than
+      #  the arc lengths between them.  Use enough points to make this small.)
+      interpolate_curve.py -uniform-arc-length 401 < coords.raw > coords_new.raw
+      python - <<'EOF_PY'
+import sys
+import numpy as np
+x = np.loadtxt('coords_new.raw')
+x_orig = np.loadtxt('coords.raw')
+if x.shape != (401, 3):
+    sys.exit('wrong number of points')
+if (np.abs(x[0] - x_orig[0]).max() > 1.0e-9 or
+    np.abs(x[-1] - x_orig[-1]).max() > 1.0e-9):
+    sys.exit('the curve does not begin and end at the control points')
+spacing = np.sqrt(np.sum((x[1:] - x[:-1])**2, axis=1))
+if spacing.max() - spacing.min() > 1.0e-3 * spacing.mean():
+    sys.exit('the points are not evenly spaced')
+EOF_PY
+      assertTrue "interpolate_curve.py -uniform-arc-length points are not evenly spaced" "[ $? -eq 0 ]"
+
+      # Check the tridiagonal solver, and the second derivatives of the
+      # (natural) spline.  They should be continuous and vanish at the ends.
+      python - <<'EOF_PY'
+import sys
+import numpy as np
+from moltemplate.interpolate_curve import TDMAsolver, \
+    CalcNaturalCubicSplineCoeffs, SplineInterpEvalD2
+np.random.seed(0)
+n = 12
+a = np.random.rand(n)
+c = np.random.rand(n)
+b = 3.0 + np.random.rand(n)
+a[0] = 0.0
+c[-1] = 0.0
+d = np.random.rand(n, 3)
+M = np.diag(b) + np.diag(a[1:], -1) + np.diag(c[:-1], 1)
+if np.abs(TDMAsolver(a, b, c, d) - np.linalg.solve(M, d)).max() > 1.0e-9:
+    sys.exit('TDMAsolver() returned the wrong solution')
+if np.abs(TDMAsolver(a, b, c, d[:, 0]) -
+          np.linalg.solve(M, d[:, 0])).max() > 1.0e-9:
+    sys.exit('TDMAsolver() returned the wrong solution (1 column)')
+c3a, c3b, c1a, c1b, tcontrol = \
+    CalcNaturalCubicSplineCoeffs(np.loadtxt('coords.raw'), 0.5)
+eps = 1.0e-7
+d2_left = SplineInterpEvalD2(tcontrol[1:-1] - eps, c3a, c3b, c1a, c1b, tcontrol)
+d2_right = SplineInterpEvalD2(tcontrol[1:-1] + eps, c3a, c3b, c1a, c1b, tcontrol)
+if np.abs(d2_left - d2_right).max() > 1.0e-5:
+    sys.exit('the second derivative of the spline is discontinuous')
+d2_ends = SplineInterpEvalD2(np.array([0.0, tcontrol[-1]]),
+                             c3a, c3b, c1a, c1b, tcontrol)
+if np.abs(d2_ends).max() > 1.0e-9:
+    sys.exit('the second derivative of the spline is not 0 at the ends')
+EOF_PY
+      assertTrue "the spline coefficients are incorrect (see TDMAsolver())" "[ $? -eq 0 ]"
+    cd ../
+    rm -rf interpolate_curve
+  cd ../
+}
+
+. shunit2/shunit2
@@ -122,4 +122,43 @@ test_ltemplify() {
   cd ../
 }
 
+test_ltemplify_selections() {
+  cd tests/
+
+    # test for the "-atomid" selection (which is compiled into a SelectionIndex)
+    cp -r test_ltemplify_files deleteme
+    cd deleteme
+      ltemplify.py -atomid "1*2 5" input_script_w_coeffs.in input_data_no_coeffs.data > out.lt 2> /dev/null
+      N_ATOMS=`awk '/write\("Data Atoms"\)/{inside=1; next} /^}/{inside=0} inside{sum+=1} END{print sum}' < out.lt`
+      assertEquals "ltemplify.py -atomid selected the wrong number of atoms" 3 "$N_ATOMS"
+      N_BONDS=`awk '/write\("Data Bonds"\)/{inside=1; next} /^}/{inside=0} inside{sum+=1} END{print sum}' < out.lt`
+      assertEquals "ltemplify.py -atomid selected the wrong number of bonds" 2 "$N_BONDS"
+    cd ../
+    rm -rf deleteme/
+
+    # compare SelectionIndex lookups with a search through the original list
+    python - <<'EOF_PY'
+import sys, random
+from moltemplate.ltemplify import LammpsSelectToIntervals, SelectionIndex, BelongsToSel
+random.seed(1)
+sel_strs = ['1*2 5', '*3 8*', '*', '4*4 2*9 7', '1*400000000']
+for n in range(20):
+    # many short intervals (which should be searched using a mask)
+    sel_strs.append(' '.join(str(random.randint(1, 500)) + '*' +
+                             str(random.randint(1, 500)) for k in range(40)))
+for sel_str in sel_strs:
+    intervals = LammpsSelectToIntervals(sel_str)
+    sel = SelectionIndex(intervals)
+    for i in list(range(0, 600)) + [399999999, 400000000, 400000001]:
+        if BelongsToSel(i, sel) != BelongsToSel(i, intervals):
+            sys.exit('SelectionIndex("' + sel_str + '") disagrees at ' + str(i))
+# a single wide interval must not allocate a lookup table
+if SelectionIndex(LammpsSelectToIntervals('1*400000000')).mask != None:
+    sys.exit('SelectionIndex allocated a mask for a single wide interval')
+EOF_PY
+    assertTrue "SelectionIndex lookups differ from the original intervals" "[ $? -eq 0 ]"
+
+  cd ../
+}
+
 . shunit2/shunit2
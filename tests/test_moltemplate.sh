@@ -0,0 +1,345 @@
+#!/usr/bin/env bash
+
+test_moltemplate_cm_transforms() {
+  cd tests/
+    rm -rf moltemplate_cm_transforms
+    mkdir moltemplate_cm_transforms
+    cd moltemplate_cm_transforms
+      # a simple molecule containing 2 atoms (with different masses)
+      cat > system.lt <<EOF
+write_once("In Init") {
+  atom_style full
+}
+write_once("Data Masses") {
+  @atom:O 16.0
+  @atom:H 1.0
+}
+W {
+  write("Data Atoms") {
+    \$atom:o \$mol:. @atom:O 0.0  0.0 0.0 0.0
+    \$atom:h \$mol:. @atom:H 0.0  0.0 1.7 0.0
+  }
+}
+
+a = new W.movecm(1,2,3)
+# Center-of-mass transformations following the array brackets
+# are applied to each element of the array separately:
+b = new W [3].move(0,0,4).rotcm(90,0,0,1)
+c = new W [3].move(4,0,0).scalecm(2)
+e = new W [2].move(4,0,0).movecm(0,15,0)
+# ...but within push() and pop(), they are applied to the whole group:
+push(movecm(0,15,0))
+d = new W [3].move(4,0,0)
+pop()
+EOF
+      moltemplate.sh -nocheck system.lt
+      assertTrue "system.data file not created" "[ -s system.data ]"
+
+      # Compare the coordinates with the coordinates we expect
+      python - <<'EOF_PY'
+import sys
+import numpy as np
+def ReadAtoms(fname):
+    lines = open(fname).read().split('Atoms')[1].split('\n\n')[1].split('\n')
+    rows = sorted([l.split() for l in lines if l.strip()],
+                  key=lambda row: int(row[0]))
+    return np.array([[float(x) for x in row[4:7]] for row in rows])
+X = np.array([[0.0, 0.0, 0.0],
+              [0.0, 1.7, 0.0]])
+masses = np.array([16.0, 1.0])
+def CM(X):
+    return np.dot(masses, X) / np.sum(masses)
+def RotZ(X, degrees):
+    t = np.radians(degrees)
+    R = np.array([[np.cos(t), -np.sin(t), 0.0],
+                  [np.sin(t), np.cos(t), 0.0],
+                  [0.0, 0.0, 1.0]])
+    return np.dot(X - CM(X), R.T) + CM(X)
+expected = [X - CM(X) + np.array([1.0, 2.0, 3.0])]
+for k in range(0, 3):
+    expected.append(RotZ(X + np.array([0.0, 0.0, 4.0*k]), 90.0*k))
+for k in range(0, 3):
+    Xk = X + np.array([4.0*k, 0.0, 0.0])
+    expected.append((Xk - CM(Xk)) * 2.0**k + CM(Xk))
+expected.append(X)
+expected.append(X - CM(X) + np.array([0.0, 15.0, 0.0]))
+group = np.array([X + np.array([4.0*k, 0.0, 0.0]) for k in range(0, 3)])
+group_cm = np.dot(np.tile(masses, 3), group.reshape(6, 3)) / (3*np.sum(masses))
+for k in range(0, 3):
+    expected.append(group[k] - group_cm + np.array([0.0, 15.0, 0.0]))
+expected = np.concatenate(expected)
+x = ReadAtoms('system.data')
+if x.shape != expected.shape:
+    sys.exit('wrong number of atoms')
+if np.abs(x - expected).max() > 1.0e-6:
+    sys.exit('coordinates differ')
+EOF_PY
+      assertTrue "movecm(), rotcm(), or scalecm() coordinates are incorrect" "[ $? -eq 0 ]"
+    cd ../
+    rm -rf moltemplate_cm_transforms
+  cd ../
+}
+
+test_moltemplate_checkpoint() {
+  cd tests/
+    rm -rf moltemplate_checkpoint
+    mkdir moltemplate_checkpoint
+    cd moltemplate_checkpoint
+      cat > mol.lt <<EOF
+write_once("In Init") {
+  atom_style full
+}
+write_once("Data Masses") {
+  @atom:O 16.0
+  @atom:H 1.0
+}
+W {
+  write("Data Atoms") {
+    \$atom:o \$mol:. @atom:O 0.0  0.0 0.0 0.0
+    \$atom:h \$mol:. @atom:H 0.0  0.0 1.7 0.0
+  }
+  write("Data Bonds") {
+    \$bond:oh @bond:OH \$atom:o \$atom:h
+  }
+}
+EOF
+      printf 'import "mol.lt"\nw = new W [3].move(0,0,4)\n' > system.lt
+
+      moltemplate.sh -nocheck -checkpoint system.ckpt system.lt 2> log1.txt
+      assertTrue "checkpoint file not created" "[ -s system.ckpt ]"
+      assertFalse "moltemplate.sh resumed from a checkpoint which did not exist" "grep -q 'resuming from' log1.txt"
+      cp system.data system.data.orig
+
+      # Nothing has changed, so lttree.py should resume from the checkpoint.
+      moltemplate.sh -nocheck -checkpoint system.ckpt system.lt 2> log2.txt
+      assertTrue "moltemplate.sh did not resume from the checkpoint" "grep -q 'resuming from' log2.txt"
+      assertTrue "resuming from the checkpoint changed system.data" "cmp -s system.data system.data.orig"
+
+      # Modifying an imported file should invalidate the checkpoint.
+      sed -i 's/0.0  0.0 1.7 0.0/0.0  0.0 1.9 0.0/' mol.lt
+      moltemplate.sh -nocheck -checkpoint system.ckpt system.lt 2> log3.txt
+      assertFalse "moltemplate.sh resumed from an out-of-date checkpoint" "grep -q 'resuming from' log3.txt"
+      NUM_MOVED=`awk '/Atoms/{a=1} /Bonds/{a=0} {if (a && (NF>=7) && ($6==1.9)) {sum+=1}} END{print sum+0}' < system.data`
+      assertTrue "the modified file was not read" "[ $NUM_MOVED -eq 3 ]"
+    cd ../
+    rm -rf moltemplate_checkpoint
+  cd ../
+}
+
+test_moltemplate_incremental() {
+  cd tests/
+    rm -rf moltemplate_incremental
+    mkdir moltemplate_incremental
+    cd moltemplate_incremental
+      cat > mol.lt <<EOF
+write_once("In Init") {
+  atom_style full
+  bond_style harmonic
+}
+write_once("Data Masses") {
+  @atom:O 16.0
+  @atom:H 1.0
+}
+write_once("In Settings") {
+  bond_coeff @bond:OH 500.0 1.0
+}
+W {
+  write("Data Atoms") {
+    \$atom:o \$mol:. @atom:O 0.0  0.0 0.0 0.0
+    \$atom:h \$mol:. @atom:H 0.0  0.0 1.7 0.0
+  }
+  write("Data Bonds") {
+    \$bond:oh @bond:OH \$atom:o \$atom:h
+  }
+}
+EOF
+      printf 'import "mol.lt"\nw = new W [3].move(0,0,4)\n' > system.lt
+
+      moltemplate.sh -nocheck -incremental system.rec system.lt 2> log1.txt
+      assertTrue "build record not created" "[ -s system.rec ]"
+      # (The sections are stored in separate files, next to the record.)
+      assertTrue "build record sections not saved" "[ -n \"`ls system.rec.sections`\" ]"
+      cp system.data system.data.orig
+
+      # Nothing has changed, so the files should be copied from system.rec
+      moltemplate.sh -nocheck -incremental system.rec system.lt 2> log2.txt
+      assertTrue "moltemplate.sh -incremental did not notice nothing changed" "grep -q 'are up to date' log2.txt"
+      assertTrue "moltemplate.sh -incremental changed system.data" "cmp -s system.data system.data.orig"
+
+      # If the sections are missing, everything should be generated again.
+      mv system.rec.sections system.rec.sections.orig
+      moltemplate.sh -nocheck -incremental system.rec system.lt 2> log2.txt
+      assertFalse "moltemplate.sh -incremental used a record without its sections" "grep -q 'are up to date' log2.txt"
+      assertTrue "moltemplate.sh -incremental changed system.data" "cmp -s system.data system.data.orig"
+      rm -rf system.rec.sections.orig
+
+      # After each change, the result should be the same as it would be
+      # if we started from scratch (without using -incremental).
+      # 1) Change the force field parameters (but not the coordinates):
+      # 2) Add another molecule (which changes the atom, bond, mol IDs):
+      # 3) Change the coordinates:
+      for CHANGE in 's/500.0 1.0/450.0 1.1/' \
+                    's/^w = new W \[3\]/w = new W [4]/' \
+                    's/0.0  0.0 1.7 0.0/0.0  0.0 1.9 0.0/'; do
+        sed -i "$CHANGE" mol.lt system.lt
+        moltemplate.sh -nocheck -incremental system.rec system.lt 2> log3.txt
+        assertTrue "moltemplate.sh -incremental failed ($CHANGE)" "[ $? -eq 0 ]"
+        rm -rf scratch
+        mkdir scratch
+        cp mol.lt system.lt scratch/
+        cd scratch
+          moltemplate.sh -nocheck system.lt 2> /dev/null
+        cd ../
+        for f in system.data system.in.init system.in.settings; do
+          assertTrue "moltemplate.sh -incremental: $f differs ($CHANGE)" "cmp -s $f scratch/$f"
+        done
+      done
+      # (The last change only modified the coordinates, so the sections
+      #  which do not depend on them should have been reused.)
+      assertTrue "moltemplate.sh -incremental did not reuse any sections" "grep -q 'reusing [1-9]' log3.txt"
+    cd ../
+    rm -rf moltemplate_incremental
+  cd ../
+}
+
+test_moltemplate_server() {
+  cd tests/
+    rm -rf moltemplate_server
+    mkdir moltemplate_server
+    cd moltemplate_server
+      cat > mol.lt <<EOF
+write_once("In Init") {
+  atom_style full
+  bond_style harmonic
+}
+write_once("Data Masses") {
+  @atom:O 16.0
+  @atom:H 1.0
+}
+write_once("In Settings") {
+  bond_coeff @bond:OH 500.0 1.0
+}
+W {
+  write("Data Atoms") {
+    \$atom:o \$mol:. @atom:O 0.0  0.0 0.0 0.0
+    \$atom:h \$mol:. @atom:H 0.0  0.0 1.7 0.0
+  }
+  write("Data Bonds") {
+    \$bond:oh @bond:OH \$atom:o \$atom:h
+  }
+}
+EOF
+      printf 'import "mol.lt"\nw = new W [3].move(0,0,4)\n' > system.lt
+      # This file does not begin by importing the preloaded file,
+      # so the server must parse it from scratch.
+      cp mol.lt mol_copy.lt
+      printf 'import "mol_copy.lt"\nw = new W [2].move(0,0,4)\n' > other.lt
+
+      # Build both systems directly (without the server) first.
+      mkdir direct
+      for SYSTEM in system other; do
+        moltemplate.sh -nocheck $SYSTEM.lt 2> /dev/null
+        for f in $SYSTEM.data $SYSTEM.in.init $SYSTEM.in.settings; do
+          mv $f direct/
+        done
+      done
+
+      SOCK="${TMPDIR:-/tmp}/moltemplate_test_server.$$.sock"
+      lttree_server.py -listen "$SOCK" mol.lt 2> server_log.txt < /dev/null &
+      SERVER_PID=$!
+      for i in `seq 100`; do
+        [ -S "$SOCK" ] && break
+        sleep 0.2
+      done
+      assertTrue "lttree_server.py did not create the socket" "[ -S \"$SOCK\" ]"
+
+      moltemplate.sh -server "$SOCK" -nocheck system.lt 2> log1.txt
+      assertTrue "moltemplate.sh -server failed" "[ $? -eq 0 ]"
+      assertFalse "the server did not use the preloaded files" "grep -q 'not using the preloaded' log1.txt"
+      for f in system.data system.in.init system.in.settings; do
+        assertTrue "moltemplate.sh -server: $f differs" "cmp -s $f direct/$f"
+      done
+
+      moltemplate.sh -server "$SOCK" -nocheck other.lt 2> log2.txt
+      assertTrue "moltemplate.sh -server failed (other.lt)" "[ $? -eq 0 ]"
+      assertTrue "the server used the preloaded files for other.lt" "grep -q 'not using the preloaded' log2.txt"
+      for f in other.data other.in.init other.in.settings; do
+        assertTrue "moltemplate.sh -server: $f differs" "cmp -s $f direct/$f"
+      done
+
+      kill $SERVER_PID
+      wait $SERVER_PID 2> /dev/null
+      assertFalse "lttree_server.py did not remove the socket" "[ -e \"$SOCK\" ]"
+    cd ../
+    rm -rf moltemplate_server
+  cd ../
+}
+
+test_moltemplate_batch() {
+  cd tests/
+    rm -rf moltemplate_batch
+    mkdir moltemplate_batch
+    cd moltemplate_batch
+      mkdir ff
+      cat > ff/mol.lt <<EOF
+write_once("In Init") {
+  atom_style full
+  bond_style harmonic
+}
+write_once("Data Masses") {
+  @atom:O 16.0
+  @atom:H 1.0
+}
+write_once("In Settings") {
+  bond_coeff @bond:OH 500.0 1.0
+}
+W {
+  write("Data Atoms") {
+    \$atom:o \$mol:. @atom:O 0.0  0.0 0.0 0.0
+    \$atom:h \$mol:. @atom:H 0.0  0.0 1.7 0.0
+  }
+  write("Data Bonds") {
+    \$bond:oh @bond:OH \$atom:o \$atom:h
+  }
+}
+EOF
+      mkdir sysA sysB sysC
+      printf 'import "mol.lt"\nw = new W [3].move(0,0,4)\n' > sysA/system.lt
+      printf 'import "mol.lt"\nw = new W [5].move(0,4,0)\n' > sysB/system.lt
+      # (sysC is broken.  It refers to a class which does not exist.)
+      printf 'import "mol.lt"\nw = new Undefined [2]\n' > sysC/system.lt
+
+      # Build the systems directly (without -batch) first.
+      for DIR in sysA sysB; do
+        mkdir direct_$DIR
+        cp $DIR/system.lt direct_$DIR/
+        cd direct_$DIR
+          moltemplate.sh -nocheck -importpath ../ff system.lt 2> /dev/null
+        cd ../
+      done
+
+      # (The temporary files (socket, list of failures) are created in $TMPDIR.)
+      mkdir tmp
+      printf 'import "mol.lt"\nsysA system.lt\nsysB system.lt\n' > manifest.txt
+      TMPDIR="$PWD/tmp" moltemplate.sh -nocheck -importpath ../ff -batch manifest.txt -batch-jobs 2 2> log1.txt
+      assertTrue "moltemplate.sh -batch failed" "[ $? -eq 0 ]"
+      for DIR in sysA sysB; do
+        for f in system.data system.in.init system.in.settings; do
+          assertTrue "moltemplate.sh -batch: $DIR/$f differs" "cmp -s $DIR/$f direct_$DIR/$f"
+        done
+      done
+      assertTrue "moltemplate.sh -batch did not remove its temporary files" "[ -z \"`ls -A tmp`\" ]"
+
+      # A system which cannot be built should cause an error (and be listed).
+      printf 'import "mol.lt"\nsysA system.lt\nsysC system.lt\nsysB system.lt\n' > manifest.txt
+      TMPDIR="$PWD/tmp" moltemplate.sh -nocheck -importpath ../ff -batch manifest.txt -batch-jobs 2 2> log2.txt
+      assertFalse "moltemplate.sh -batch did not fail" "[ $? -eq 0 ]"
+      assertTrue "moltemplate.sh -batch did not list the failed system" "grep -q '^sysC$' log2.txt"
+      assertFalse "moltemplate.sh -batch listed a system which did not fail" "grep -q '^sys[AB]$' log2.txt"
+      assertTrue "moltemplate.sh -batch did not remove its temporary files" "[ -z \"`ls -A tmp`\" ]"
+    cd ../
+    rm -rf moltemplate_batch
+  cd ../
+}
+
+. shunit2/shunit2
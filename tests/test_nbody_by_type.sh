@@ -0,0 +1,122 @@
+#!/usr/bin/env bash
+
+test_nbody_by_type_sections() {
+  cd tests/
+    rm -rf nbody_by_type_sections
+    mkdir nbody_by_type_sections
+    cd nbody_by_type_sections
+      # a branched chain of atoms: 1-2-3-4-5-6 (and 3-7)
+      cat > atoms.data <<EOF
+1 1 1 0.0 0.0 0.0 0.0
+2 1 1 0.0 1.0 0.0 0.0
+3 1 2 0.0 2.0 0.0 0.0
+4 1 1 0.0 3.0 0.0 0.0
+5 1 1 0.0 4.0 0.0 0.0
+6 1 1 0.0 5.0 0.0 0.0
+7 1 3 0.0 2.0 1.0 0.0
+EOF
+      cat > bonds.data <<EOF
+1 1 1 2
+2 1 2 3
+3 1 3 4
+4 1 4 5
+5 1 5 6
+6 2 3 7
+EOF
+      printf '1 * * *\n' > angles_by_type.data
+      printf '1 * * * *\n' > dihedrals_by_type.data
+      printf '1 2 * * *\n' > impropers_by_type.data
+
+      # Generate each kind of interaction separately
+      for SECTION in Angles Dihedrals Impropers; do
+        NAME=`echo $SECTION | tr 'A-Z' 'a-z'`
+        nbody_by_type.py $SECTION \
+                         -atoms atoms.data \
+                         -bonds bonds.data \
+                         -nbodybytype ${NAME}_by_type.data \
+                         > separate_${NAME}.data
+      done
+      NUM_ANGLES=`awk '{if (NF==5) {sum+=1}} END{print sum}' < separate_angles.data`
+      assertTrue "nbody_by_type.py generated the wrong number of angles" "[ $NUM_ANGLES -eq 6 ]"
+      NUM_DIHEDRALS=`awk '{if (NF==6) {sum+=1}} END{print sum}' < separate_dihedrals.data`
+      assertTrue "nbody_by_type.py generated the wrong number of dihedrals" "[ $NUM_DIHEDRALS -eq 5 ]"
+      NUM_IMPROPERS=`awk '{if ((NF==6) && ($3==3)) {sum+=1}} END{print sum}' < separate_impropers.data`
+      assertTrue "nbody_by_type.py generated the wrong number of impropers" "[ $NUM_IMPROPERS -eq 3 ]"
+
+      # Now generate them all at once (and then simultaneously, using -jobs).
+      # The results should be identical.  (The "-prefix" argument should
+      # only effect the interactions preceding the next "-out" argument.)
+      for JOBS in 1 3; do
+        nbody_by_type.py -jobs $JOBS \
+                         -atoms atoms.data \
+                         -bonds bonds.data \
+                         -section Angles \
+                         -nbodybytype angles_by_type.data \
+                         -out angles_jobs${JOBS}.data \
+                         -section Dihedrals \
+                         -nbodybytype dihedrals_by_type.data \
+                         -prefix D \
+                         -out dihedrals_jobs${JOBS}.data \
+                         -section Impropers \
+                         -nbodybytype impropers_by_type.data \
+                         -out impropers_jobs${JOBS}.data
+        assertTrue "nbody_by_type.py -jobs $JOBS failed" "[ $? -eq 0 ]"
+        assertTrue "nbody_by_type.py -jobs $JOBS: angles differ" "cmp -s separate_angles.data angles_jobs${JOBS}.data"
+        assertTrue "nbody_by_type.py -jobs $JOBS: impropers differ" "cmp -s separate_impropers.data impropers_jobs${JOBS}.data"
+        awk '{print "D"$0}' < separate_dihedrals.data > separate_dihedrals_prefix.data
+        assertTrue "nbody_by_type.py -jobs $JOBS: dihedrals differ" "cmp -s separate_dihedrals_prefix.data dihedrals_jobs${JOBS}.data"
+      done
+    cd ../
+    rm -rf nbody_by_type_sections
+  cd ../
+}
+
+test_nbody_fix_ttree_assignments_compact() {
+  cd tests/
+    rm -rf nbody_fix_ttree_assignments_compact
+    mkdir nbody_fix_ttree_assignments_compact
+    cd nbody_fix_ttree_assignments_compact
+      # (There are explicit angles and impropers, but no dihedrals.)
+      cat > ttree_assignments.txt <<EOF
+@/atom:C 1
+@/atom:H 2
+@/bond:CC 1
+@/angle:CCC 1
+\$/atom:m[0]/c1 1
+\$/atom:m[0]/c2 2
+\$/atom:m[0]/c3 3
+\$/atom:m[0]/c4 4
+\$/bond:m[0]/b1 1
+\$/angle:m[0]/a1 1
+\$/angle:m[0]/a2 2
+\$/mol:m[0] 1
+\$/improper:m[0]/i1 1
+EOF
+      printf '$/angle:gen1 @/angle:CCC $/atom:m[0]/c1 $/atom:m[0]/c2 $/atom:m[0]/c3\n$/angle:gen2 @/angle:CCC $/atom:m[0]/c2 $/atom:m[0]/c3 $/atom:m[0]/c4\n' > gen_angles1.template
+      printf '$/angle:gen3 @/angle:CCC $/atom:m[0]/c4 $/atom:m[0]/c3 $/atom:m[0]/c1\n' > gen_angles2.template
+      printf '$/dihedral:gen1 @/dihedral:CCCC $/atom:m[0]/c1 $/atom:m[0]/c2 $/atom:m[0]/c3 $/atom:m[0]/c4\n' > gen_dihedrals.template
+      printf '$/improper:gen1 @/improper:CCCC $/atom:m[0]/c1 $/atom:m[0]/c2 $/atom:m[0]/c3 $/atom:m[0]/c4\n' > gen_impropers.template
+
+      # Add the interactions (in the same order as moltemplate.sh) using the
+      # original (stdin/stdout) mode, and then using -append and -compact.
+      # The results should be identical.
+      cp ttree_assignments.txt old.txt
+      cp ttree_assignments.txt new.txt
+      for STEP in angle:gen_angles1 angle:gen_angles2 dihedral:gen_dihedrals improper:gen_impropers; do
+        CATEGORY=`echo $STEP | cut -d: -f1`
+        TEMPLATE=`echo $STEP | cut -d: -f2`.template
+        nbody_fix_ttree_assignments.py "/$CATEGORY" $TEMPLATE < old.txt > old.tmp 2> /dev/null
+        mv -f old.tmp old.txt
+        nbody_fix_ttree_assignments.py -append new.txt "/$CATEGORY" $TEMPLATE
+      done
+      assertTrue "nbody_fix_ttree_assignments.py -append did not create an index" "[ -s new.txt.index ]"
+      nbody_fix_ttree_assignments.py -compact new.txt
+      assertTrue "nbody_fix_ttree_assignments.py -compact failed" "[ $? -eq 0 ]"
+      assertTrue "nbody_fix_ttree_assignments.py -compact differs from the original mode" "cmp -s old.txt new.txt"
+      assertFalse "nbody_fix_ttree_assignments.py -compact did not delete the index" "[ -e new.txt.index ]"
+    cd ../
+    rm -rf nbody_fix_ttree_assignments_compact
+  cd ../
+}
+
+. shunit2/shunit2